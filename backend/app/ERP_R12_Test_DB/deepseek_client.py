@@ -18,6 +18,7 @@ from app.config import (
     API_MODELS,
     DEEPSEEK_ENABLED
 )
+from app.prompt_budget import count_message_tokens, fit_schema_context
 
 # Import the token logger
 try:
@@ -37,7 +38,8 @@ _erp_total_tokens_used = {
     "prompt_tokens": 0,
     "completion_tokens": 0,
     "total_tokens": 0,
-    "requests_count": 0
+    "requests_count": 0,
+    "prompt_tokens_saved": 0
 }
 
 def get_erp_token_usage_stats() -> Dict[str, int]:
@@ -51,7 +53,8 @@ def reset_erp_token_usage_stats() -> None:
         "prompt_tokens": 0,
         "completion_tokens": 0,
         "total_tokens": 0,
-        "requests_count": 0
+        "requests_count": 0,
+        "prompt_tokens_saved": 0
     }
 
 @dataclass
@@ -109,23 +112,16 @@ class ERPDeepSeekClient:
     async def _make_request(
         self,
         payload: Dict[str, Any],
-        headers: Dict[str, str]
+        headers: Dict[str, str],
+        prompt_tokens_saved: int = 0
     ) -> DeepSeekResponse:
         """Make HTTP request to DeepSeek API with retry logic."""
         
         start_time = time.time()
         last_error = None
         
-        # Track tokens in the request
-        request_tokens = 0
-        if "messages" in payload:
-            # Simple token estimation based on message content
-            for message in payload["messages"]:
-                if isinstance(message, dict) and "content" in message:
-                    content = message["content"]
-                    if isinstance(content, str):
-                        # Rough estimation: 1 token ≈ 4 characters
-                        request_tokens += len(content) // 4
+        # Tokenizer count of the request, used when the API omits usage
+        request_tokens = count_message_tokens(payload.get("messages") or [])
         
         for attempt in range(self.max_retries + 1):
             try:
@@ -161,11 +157,14 @@ class ERPDeepSeekClient:
                                 _erp_total_tokens_used["completion_tokens"] += completion_tokens
                                 _erp_total_tokens_used["total_tokens"] += total_tokens
                                 _erp_total_tokens_used["requests_count"] += 1
+                                _erp_total_tokens_used["prompt_tokens_saved"] += prompt_tokens_saved
                                 
                                 # Enhanced logging for cost tracking with more details
                                 logger.info(f"ERP DeepSeek API Token Usage - Model: {payload.get('model', 'unknown')}")
                                 logger.info(f"  Prompt Tokens: {prompt_tokens} (estimated: {request_tokens})")
                                 logger.info(f"  Completion Tokens: {completion_tokens}")
+                                if prompt_tokens_saved:
+                                    logger.info(f"  Prompt Tokens Saved by budgeting: {prompt_tokens_saved}")
                                 logger.info(f"  Total Tokens: {total_tokens}")
                                 logger.info(f"  Running Totals - Prompt: {_erp_total_tokens_used['prompt_tokens']}, "
                                           f"Completion: {_erp_total_tokens_used['completion_tokens']}, "
@@ -188,7 +187,8 @@ class ERPDeepSeekClient:
                                         usage={
                                             "prompt_tokens": prompt_tokens,
                                             "completion_tokens": completion_tokens,
-                                            "total_tokens": total_tokens
+                                            "total_tokens": total_tokens,
+                                            "prompt_tokens_saved": prompt_tokens_saved
                                         },
                                         request_content=first_message_content
                                     )
@@ -221,7 +221,8 @@ class ERPDeepSeekClient:
                                         "token_usage": {
                                             "prompt_tokens": prompt_tokens,
                                             "completion_tokens": completion_tokens,
-                                            "total_tokens": total_tokens
+                                            "total_tokens": total_tokens,
+                                            "prompt_tokens_saved": prompt_tokens_saved
                                         }
                                     }
                                 )
@@ -446,6 +447,7 @@ class ERPDeepSeekClient:
         top_p: float = 0.9,
         frequency_penalty: float = 0.0,
         presence_penalty: float = 0.0,
+        prompt_tokens_saved: int = 0,
         **kwargs
     ) -> DeepSeekResponse:
         """
@@ -459,6 +461,7 @@ class ERPDeepSeekClient:
             top_p: Nucleus sampling parameter
             frequency_penalty: Frequency penalty (-2.0 to 2.0)
             presence_penalty: Presence penalty (-2.0 to 2.0)
+            prompt_tokens_saved: Tokens the caller trimmed from the prompt, reported to the token log
             **kwargs: Additional model-specific parameters
             
         Returns:
@@ -483,7 +486,7 @@ class ERPDeepSeekClient:
         }
         
         logger.debug(f"Sending request to {model} with {len(messages)} messages")
-        return await self._make_request(payload, headers)
+        return await self._make_request(payload, headers, prompt_tokens_saved)
     
     async def test_model_availability(self, model: str) -> ModelTestResult:
         """
@@ -618,6 +621,13 @@ class ERPDeepSeekClient:
         model_config = API_MODELS.get(model_type, API_MODELS["hr"])
         model = model_config["primary"]
         
+        # Dedupe and trim the schema context to the configured token budget
+        fitted = fit_schema_context(schema_context, query=user_query)
+        schema_context = fitted.text
+        if fitted.saved_tokens:
+            logger.info(f"ERP schema context trimmed {fitted.original_tokens} -> {fitted.tokens} tokens "
+                        f"({fitted.dropped_duplicates} duplicate, {fitted.dropped_over_budget} over-budget blocks)")
+        
         # Enhanced system prompt with better guidance for inventory analysis
         system_prompt = f"""
 You are an **EXPERT Oracle ERP R12 SQL Generator and Validator**. Your persona is a senior Oracle DBA with over 20 years of experience in the **E-Business Suite R12 global data model**. Your sole purpose is to generate **100% executable, optimized, and syntactically correct Oracle SQL** based on the user's natural language request. **You must anticipate and prevent the most common Oracle errors (like ORA-00937, ORA-00904).**
@@ -737,7 +747,8 @@ ORDER BY total_quantity DESC;
             model=model,
             temperature=0.1,  # Low temperature for precise SQL generation
             max_tokens=1500,  # Increased token limit for complex queries
-            top_p=0.9
+            top_p=0.9,
+            prompt_tokens_saved=fitted.saved_tokens
         )
     
     async def get_model_with_fallback(
@@ -6,7 +6,11 @@ from typing import Dict, Any, Optional, List, Callable
 from dataclasses import dataclass
 from app.ERP_R12_Test_DB.query_router import route_query
 from app.ERP_R12_Test_DB.query_classifier import QueryClassifier
-from app.ERP_R12_Test_DB.vector_store_chroma import search_similar_schema
+from app.ERP_R12_Test_DB.vector_store_chroma import (
+    ERP_TABLE_PREFIXES,
+    search_similar_schema,
+    search_similar_schema_many,
+)
 from app.ERP_R12_Test_DB.query_interpreter import erp_query_interpreter
 from app.config import (
     HYBRID_ENABLED, LOCAL_CONFIDENCE_THRESHOLD, 
@@ -260,10 +264,9 @@ class ERPHybridProcessor:
             # If we didn't find any tables, try a broader search
             if not table_names:
                 logger.debug("No tables found in initial search, trying broader search")
-                # Search for common ERP table prefixes
-                prefixes = ["HR_", "ORG_", "MTL_", "PO_", "AP_", "AR_", "GL_", "FA_", "CST_", "BOM_", "WIP_", "INV_"]
-                for prefix in prefixes:
-                    prefix_docs = search_similar_schema(f"{prefix} tables", "source_db_2", top_k=20)
+                # Search for common ERP table prefixes (one batched search)
+                prefix_queries = [f"{prefix} tables" for prefix in ERP_TABLE_PREFIXES]
+                for prefix_docs in search_similar_schema_many(prefix_queries, "source_db_2", top_k=20):
                     for doc in prefix_docs:
                         if 'document' in doc and 'metadata' in doc:
                             if doc['metadata'].get('kind') == 'table':
@@ -296,10 +299,12 @@ class ERPHybridProcessor:
             
             erp_tables = {}
             
+            # Search schema information for all discovered tables in one batch
+            docs_by_table = dict(zip(table_names, search_similar_schema_many(table_names, "source_db_2", top_k=50)))
+            
             # Process each discovered table
             for table_name in table_names:
-                # Search for schema information about this table
-                table_docs = search_similar_schema(table_name, "source_db_2", top_k=50)
+                table_docs = docs_by_table[table_name]
                 
                 # Extract column information from schema documents
                 columns = []
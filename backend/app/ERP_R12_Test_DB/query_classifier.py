@@ -2,9 +2,14 @@ import logging
 import re
 from typing import Dict, Any, List, Tuple, Optional
 from app.ERP_R12_Test_DB.vector_store_chroma import search_similar_schema
+from app.query_features import QueryFeatures, analyze_query, register_keywords
 
 logger = logging.getLogger(__name__)
 
+_QUOTED_RX = re.compile(r'"([^"]*)"')
+_ID_RX = re.compile(r'\b\d+[a-zA-Z]*\b')
+_QUESTION_WORDS = ["what", "how", "when", "where", "which", "who"]
+
 class QueryClassifier:
     """
     Enhanced dynamic query classifier for ERP R12 that uses vector store
@@ -40,35 +45,44 @@ class QueryClassifier:
             "OPERATIONAL": ["create", "update", "delete", "process", "execute"],
             "INFORMATIONAL": ["what", "how", "when", "where", "which", "who"]
         }
+
+        register_keywords(
+            *self.domains.values(),
+            *self.complexity_indicators.values(),
+            *self.intent_categories.values(),
+        )
     
-    def classify_query(self, query: str, schema_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def classify_query(self, query: str, schema_context: Optional[Dict[str, Any]] = None,
+                       features: Optional[QueryFeatures] = None) -> Dict[str, Any]:
         """
         Dynamically classify a query based on content and schema context.
         
         Args:
             query: The user's natural language query
             schema_context: Optional schema context from vector store
+            features: Shared QueryFeatures for ``query`` (computed if omitted)
             
         Returns:
             Classification results with domain, complexity, and intent
         """
-        query_lower = query.lower()
+        features = features or analyze_query(query)
+        query_lower = features.lower
         
         # Get dynamic schema context if not provided
         if schema_context is None:
             schema_context = self._get_dynamic_schema_context(query)
         
         # Determine business domain
-        domain = self._classify_domain(query_lower, schema_context)
+        domain = self._classify_domain(features, schema_context)
         
         # Determine complexity level
-        complexity = self._classify_complexity(query_lower)
+        complexity = self._classify_complexity(features)
         
         # Determine intent category
-        intent = self._classify_intent(query_lower)
+        intent = self._classify_intent(features)
         
         # Determine confidence level
-        confidence = self._calculate_confidence(query_lower, domain, complexity, intent)
+        confidence = self._calculate_confidence(features, domain, complexity, intent)
         
         # Extract key entities
         entities = self._extract_entities(query_lower, schema_context)
@@ -122,12 +136,12 @@ class QueryClassifier:
             logger.warning(f"Failed to get dynamic schema context: {e}")
             return {"tables": [], "columns": [], "document_count": 0}
     
-    def _classify_domain(self, query: str, schema_context: Dict[str, Any]) -> str:
+    def _classify_domain(self, features: QueryFeatures, schema_context: Dict[str, Any]) -> str:
         """
         Classify the business domain of the query.
         
         Args:
-            query: Lowercase query string
+            features: Shared QueryFeatures of the query
             schema_context: Schema context information
             
         Returns:
@@ -158,27 +172,29 @@ class QueryClassifier:
         
         # Check query content
         for domain, keywords in self.domains.items():
-            matches = sum(1 for keyword in keywords if keyword in query)
+            matches = features.count(keywords)
             if matches >= 2:  # At least 2 keywords match
                 return domain
         
         # Default to most common domain
         return "INV"
     
-    def _classify_complexity(self, query: str) -> str:
+    def _classify_complexity(self, features: QueryFeatures) -> str:
         """
         Classify the complexity level of the query.
         
         Args:
-            query: Lowercase query string
+            features: Shared QueryFeatures of the query
             
         Returns:
             Complexity level classification
         """
+        query = features.lower
+        
         # Count complexity indicators
-        simple_matches = sum(1 for keyword in self.complexity_indicators["SIMPLE"] if keyword in query)
-        moderate_matches = sum(1 for keyword in self.complexity_indicators["MODERATE"] if keyword in query)
-        complex_matches = sum(1 for keyword in self.complexity_indicators["COMPLEX"] if keyword in query)
+        simple_matches = features.count(self.complexity_indicators["SIMPLE"])
+        moderate_matches = features.count(self.complexity_indicators["MODERATE"])
+        complex_matches = features.count(self.complexity_indicators["COMPLEX"])
         
         # Determine complexity based on matches
         if complex_matches >= 2:
@@ -196,21 +212,21 @@ class QueryClassifier:
             else:
                 return "SIMPLE"
     
-    def _classify_intent(self, query: str) -> str:
+    def _classify_intent(self, features: QueryFeatures) -> str:
         """
         Classify the intent category of the query.
         
         Args:
-            query: Lowercase query string
+            features: Shared QueryFeatures of the query
             
         Returns:
             Intent category classification
         """
         # Count intent indicators
-        reporting_matches = sum(1 for keyword in self.intent_categories["REPORTING"] if keyword in query)
-        analytics_matches = sum(1 for keyword in self.intent_categories["ANALYTICS"] if keyword in query)
-        operational_matches = sum(1 for keyword in self.intent_categories["OPERATIONAL"] if keyword in query)
-        informational_matches = sum(1 for keyword in self.intent_categories["INFORMATIONAL"] if keyword in query)
+        reporting_matches = features.count(self.intent_categories["REPORTING"])
+        analytics_matches = features.count(self.intent_categories["ANALYTICS"])
+        operational_matches = features.count(self.intent_categories["OPERATIONAL"])
+        informational_matches = features.count(self.intent_categories["INFORMATIONAL"])
         
         # Determine intent based on matches
         intent_scores = {
@@ -232,17 +248,17 @@ class QueryClassifier:
             return max_intent
         else:
             # Default to informational for questions
-            if any(q_word in query for q_word in ["what", "how", "when", "where", "which", "who"]):
+            if features.has_any(_QUESTION_WORDS):
                 return "INFORMATIONAL"
             else:
                 return "REPORTING"
     
-    def _calculate_confidence(self, query: str, domain: str, complexity: str, intent: str) -> float:
+    def _calculate_confidence(self, features: QueryFeatures, domain: str, complexity: str, intent: str) -> float:
         """
         Calculate confidence level for the classification.
         
         Args:
-            query: Lowercase query string
+            features: Shared QueryFeatures of the query
             domain: Classified domain
             complexity: Classified complexity
             intent: Classified intent
@@ -254,7 +270,7 @@ class QueryClassifier:
         confidence = 0.5
         
         # Adjust based on query characteristics
-        query_length = len(query.split())
+        query_length = len(features.lower.split())
         
         # Longer queries generally have more context
         if query_length > 15:
@@ -264,7 +280,7 @@ class QueryClassifier:
         
         # Check for clear domain indicators
         domain_keywords = self.domains.get(domain, [])
-        domain_matches = sum(1 for keyword in domain_keywords if keyword in query)
+        domain_matches = features.count(domain_keywords)
         if domain_matches >= 3:
             confidence += 0.2
         elif domain_matches >= 1:
@@ -272,7 +288,7 @@ class QueryClassifier:
         
         # Check for clear intent indicators
         intent_keywords = self.intent_categories.get(intent, [])
-        intent_matches = sum(1 for keyword in intent_keywords if keyword in query)
+        intent_matches = features.count(intent_keywords)
         if intent_matches >= 2:
             confidence += 0.15
         
@@ -293,11 +309,11 @@ class QueryClassifier:
         entities = []
         
         # Extract potential entity names (quoted strings)
-        quoted_entities = re.findall(r'"([^"]*)"', query)
+        quoted_entities = _QUOTED_RX.findall(query)
         entities.extend(quoted_entities)
         
         # Extract potential IDs (numeric patterns)
-        id_patterns = re.findall(r'\b\d+[a-zA-Z]*\b', query)
+        id_patterns = _ID_RX.findall(query)
         entities.extend(id_patterns)
         
         # Extract column/table names from schema context
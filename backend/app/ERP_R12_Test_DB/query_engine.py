@@ -5,8 +5,14 @@ import cx_Oracle
 from typing import Dict, List, Any, Optional, Callable
 from contextlib import contextmanager
 from app.db_connector import connect_to_source
+from app.sql_ast import COMMA, LPAREN, NUMBER, RPAREN, STRING, Statement, drop_stray_commas, parse_sql, rewrite_calls
 # Import ERP-specific vector store
-from app.ERP_R12_Test_DB.vector_store_chroma import hybrid_schema_value_search, search_similar_schema
+from app.ERP_R12_Test_DB.vector_store_chroma import (
+    ERP_TABLE_PREFIXES,
+    hybrid_schema_value_search,
+    search_similar_schema,
+    search_similar_schema_many,
+)
 # Import database configuration
 from app.config import DATABASE_CONFIG
 import time
@@ -139,10 +145,9 @@ def discover_erp_tables(query: str, selected_db: str = "source_db_2") -> List[st
         # If we didn't find any tables, try a broader search
         if not table_names:
             logger.debug("No tables found in initial search, trying broader search")
-            # Search for common ERP table prefixes
-            prefixes = ["HR_", "ORG_", "MTL_", "PO_", "AP_", "AR_", "GL_", "FA_", "CST_", "BOM_", "WIP_", "INV_"]
-            for prefix in prefixes:
-                prefix_docs = search_similar_schema(f"{prefix} tables", selected_db, top_k=20)
+            # Search for common ERP table prefixes (one batched search)
+            prefix_queries = [f"{prefix} tables" for prefix in ERP_TABLE_PREFIXES]
+            for prefix_docs in search_similar_schema_many(prefix_queries, selected_db, top_k=20):
                 for doc in prefix_docs:
                     if 'document' in doc and 'metadata' in doc:
                         if doc['metadata'].get('kind') == 'table':
@@ -177,13 +182,12 @@ def detect_table_relationships(query: str, selected_db: str = "source_db_2") ->
     query_lower = query.lower()
     
     # Dynamic detection based on schema context and natural language understanding
-    # Import vector store to get dynamic schema information
-    from app.ERP_R12_Test_DB.vector_store_chroma import search_similar_schema
-    
     # Discover tables mentioned in the query
     discovered_tables = discover_erp_tables(query, selected_db)
     
-    # Get schema information for discovered tables
+    # Get schema information for discovered tables. One batched search fills the
+    # recent-query cache that the per-table lookups below are served from.
+    search_similar_schema_many(discovered_tables, selected_db, top_k=20)
     table_schemas = {}
     for table_name in discovered_tables:
         table_schemas[table_name] = get_table_schema_info(table_name, selected_db)
@@ -476,6 +480,11 @@ def _deep_clean_sql(sql: str) -> str:
 def _fix_common_oracle_issues(sql: str) -> str:
     """
     Fix common Oracle SQL issues that might cause ORA-00933.
+
+    The statement is parsed once; structural fixes run as AST passes and the
+    table-specific fixers below only render/re-parse the text when the tokens
+    they look for are present. The SQL is rendered once at the end with
+    normalized whitespace.
     
     Args:
         sql: The SQL query to fix
@@ -484,73 +493,98 @@ def _fix_common_oracle_issues(sql: str) -> str:
         Fixed SQL query
     """
     # Remove the trailing semicolon for processing
-    sql = sql.rstrip(';')
-    
-    # Fix TRUNC(SYSDATE) issues - sometimes AI models generate problematic date functions
-    # Replace TRUNC(SYSDATE) with SYSDATE if it's causing issues
-    sql = sql.replace('TRUNC(SYSDATE)', 'SYSDATE')
-    
-    # Fix incorrect date function patterns like TRUNC(ADD_MONTHS(SYSDATE, -1), 'MM')
-    # Should be ADD_MONTHS(TRUNC(SYSDATE, 'MM'), -1)
-    import re
-    # Pattern to match: TRUNC(ADD_MONTHS(SYSDATE, <number>), 'MM')
-    sql = re.sub(r"TRUNC\s*\(\s*ADD_MONTHS\s*\(\s*SYSDATE\s*,\s*(-?\d+)\s*\)\s*,\s*'MM'\s*\)", r"ADD_MONTHS(TRUNC(SYSDATE, 'MM'), \1)", sql, flags=re.IGNORECASE)
-    
-    # Fix another common pattern: TRUNC(ADD_MONTHS(SYSDATE, <number>), <format>) where format is not 'MM'
-    # This pattern is also incorrect and should be ADD_MONTHS(TRUNC(SYSDATE, <format>), <number>)
-    # Only match formats other than 'MM' to avoid conflicts with the previous pattern
-    sql = re.sub(r"TRUNC\s*\(\s*ADD_MONTHS\s*\(\s*SYSDATE\s*,\s*(-?\d+)\s*\)\s*,\s*'((?!MM)[^']*)'\s*\)", r"ADD_MONTHS(TRUNC(SYSDATE, '\2'), \1)", sql, flags=re.IGNORECASE)
-    
-    # Fix common column reference issues - cost information is in CST_ITEM_COSTS, not MTL_SYSTEM_ITEMS_B
-    sql = _fix_cost_column_references(sql)
-    
-    # Fix common HR_OPERATING_UNITS query issues - handle NULL values properly
-    sql = _fix_hr_operating_units_conditions(sql)
+    stmt = parse_sql(sql.rstrip(';'))
     
-    # Fix GROUP BY issues - ensure all non-aggregate columns in SELECT are in GROUP BY
-    sql = _fix_group_by_issues(sql)
+    # Fix TRUNC(SYSDATE) and TRUNC(ADD_MONTHS(SYSDATE, n), 'fmt') - AI models generate problematic date functions
+    _fix_date_function_order(stmt)
     
-    # Fix trailing comma in GROUP BY clause before ORDER BY
-    import re
-    # Pattern to match: GROUP BY ... , ORDER BY
-    sql = re.sub(r'(GROUP BY\s+[^,]+(?:\s*,\s*[^,]+)*)\s*,\s*(ORDER BY)', r'\1 \2', sql, flags=re.IGNORECASE)
-    
-    # Fix trailing comma in GROUP BY clause before closing parenthesis or end of query
-    sql = re.sub(r'(GROUP BY\s+[^,]+(?:\s*,\s*[^,]+)*)\s*,\s*(\)|$)', r'\1\2', sql, flags=re.IGNORECASE)
-    
-    # Fix other common trailing comma issues
-    # Remove trailing comma before closing parenthesis in general
-    sql = re.sub(r',\s*\)', ')', sql)
-    
-    # Remove multiple consecutive commas
-    sql = re.sub(r',\s*,', ',', sql)
-    
-    # Fix ORDER BY clause issues - sometimes AI models generate ORDER BY clauses that are not properly formatted
-    # Remove any trailing commas before the end of the query in ORDER BY clauses
-    sql = re.sub(r'(ORDER BY\s+[^,]+(?:\s*,\s*[^,]+)*)\s*,\s*$', r'\1', sql, flags=re.IGNORECASE)
+    # Cost column references, HR_OPERATING_UNITS conditions, GROUP BY completeness
+    stmt = _run_text_fixers(stmt, _PRE_COMMA_FIXERS)
     
-    # Fix common date filtering issues for sales analysis
-    # Replace overly restrictive date filters with more reasonable ones
-    sql = _fix_sales_date_filters(sql)
-    
-    # Fix common join condition issues
-    sql = _fix_join_conditions(sql)
-    
-    # Clean up extra spaces that might have been introduced
-    sql = re.sub(r'\s+', ' ', sql)
-    
-    # Fix for ORA-00905: missing keyword error
-    # This can happen when there are syntax issues with expressions in GROUP BY or ORDER BY
-    # Ensure that expressions with quotes are properly formatted
-    sql = re.sub(r"TO_CHAR\s*\(\s*([^,]+),\s*'([^']*)'\s*\)\s+AS\s+(\w+)", r"TO_CHAR(\1, '\2') AS \3", sql, flags=re.IGNORECASE)
+    # Fix trailing / doubled commas (GROUP BY a, ORDER BY ..., "a, )", "a, , b", trailing ORDER BY comma)
+    drop_stray_commas(stmt)
     
-    # Fix for trailing commas in GROUP BY clauses
-    sql = re.sub(r'(GROUP BY\s+[^,]+(?:\s*,\s*[^,]+)*)\s*,\s*(ORDER BY|HAVING|;|$)', r'\1 \2', sql, flags=re.IGNORECASE)
+    # Sales date filters and ERP join conditions
+    stmt = _run_text_fixers(stmt, _POST_COMMA_FIXERS)
     
+    # Clean up whitespace (this also normalizes the TO_CHAR(x, 'fmt') AS y spacing that caused ORA-00905)
     # Note: Do not add semicolon back here as the execution logic handles that
     # The execute_query function will add it when needed
-    
-    return sql
+    return stmt.to_sql(compact=True)
+
+def _fix_date_function_order(stmt: Statement) -> bool:
+    """
+    TRUNC(SYSDATE) -> SYSDATE, and TRUNC(ADD_MONTHS(SYSDATE, n), 'fmt') ->
+    ADD_MONTHS(TRUNC(SYSDATE, 'fmt'), n).
+    """
+    def repl(tokens, start, close, args):
+        if len(args) == 1 and args[0][1] - args[0][0] == 1 and tokens[args[0][0]].is_name("SYSDATE"):
+            return "SYSDATE"
+        if len(args) != 2:
+            return None
+        (a0, a1), (b0, b1) = args
+        inner = tokens[a0:a1]
+        fmt = tokens[b0]
+        if (b1 - b0 != 1 or fmt.kind != STRING or len(inner) < 6 or not inner[0].is_name("ADD_MONTHS")
+                or inner[1].kind != LPAREN or not inner[2].is_name("SYSDATE") or inner[3].kind != COMMA
+                or inner[-1].kind != RPAREN):
+            return None
+        months = inner[4:-1]
+        if months and months[0].text == "-":
+            months = months[1:]
+            sign = "-"
+        else:
+            sign = ""
+        if len(months) != 1 or months[0].kind != NUMBER or not months[0].text.isdigit():
+            return None
+        return f"ADD_MONTHS(TRUNC(SYSDATE, {fmt.text}), {sign}{months[0].text})"
+
+    changed = False
+    for tokens in stmt.token_lists():
+        changed |= rewrite_calls(tokens, ("TRUNC",), repl)
+    return changed
+
+def _token_texts(stmt: Statement) -> List[str]:
+    return [t.text for t in stmt.tokens()]
+
+def _mentions_cost_columns(stmt: Statement) -> bool:
+    return any(t.startswith("MSIB.") and "COST" in t for t in map(str.upper, _token_texts(stmt)))
+
+def _mentions_hr_operating_units(stmt: Statement) -> bool:
+    return any("HR_OPERATING_UNITS" in t.upper() for t in _token_texts(stmt))
+
+_GROUP_BY_AGGREGATES = (
+    'SUM', 'COUNT', 'AVG', 'MIN', 'MAX', 'GROUP_CONCAT', 'LISTAGG',
+    'STDDEV', 'VARIANCE', 'FIRST', 'LAST', 'ROW_NUMBER', 'RANK',
+    'DENSE_RANK', 'LEAD', 'LAG', 'NTILE'
+)
+
+def _selects_aggregates(stmt: Statement) -> bool:
+    select = stmt.main.clause("SELECT")
+    if select is None or stmt.main.lead or stmt.prefix:
+        return False
+    texts = [t.text.upper() for t in select.body]
+    return any(func in t for t in texts for func in _GROUP_BY_AGGREGATES)
+
+def _mentions_sales_date_window(stmt: Statement) -> bool:
+    texts = _token_texts(stmt)
+    lowered = " ".join(texts).lower()
+    return "add_months" in lowered and any(i in lowered for i in ('sales', 'shipment', 'order', 'revenue', 'quantity'))
+
+def _mentions_erp_join_tables(stmt: Statement) -> bool:
+    texts = " ".join(_token_texts(stmt))
+    return "MTL_SYSTEM_ITEMS_B" in texts and ("OE_ORDER_LINES_ALL" in texts or "MTL_ONHAND_QUANTITIES_DETAIL" in texts)
+
+def _run_text_fixers(stmt: Statement, fixers) -> Statement:
+    """Apply text-level fixers whose trigger matches; re-parse only when one changed the SQL."""
+    for trigger, fixer in fixers:
+        if not trigger(stmt):
+            continue
+        before = stmt.to_sql()
+        after = fixer(before)
+        if after != before:
+            stmt = parse_sql(after)
+    return stmt
 
 def _fix_sales_date_filters(sql: str) -> str:
     """
@@ -1146,6 +1180,17 @@ def _fix_group_by_issues(sql: str) -> str:
     
     return sql
 
+# (trigger, fixer) pairs run by _fix_common_oracle_issues, in order.
+_PRE_COMMA_FIXERS = (
+    (_mentions_cost_columns, _fix_cost_column_references),
+    (_mentions_hr_operating_units, _fix_hr_operating_units_conditions),
+    (_selects_aggregates, _fix_group_by_issues),
+)
+_POST_COMMA_FIXERS = (
+    (_mentions_sales_date_window, _fix_sales_date_filters),
+    (_mentions_erp_join_tables, _fix_join_conditions),
+)
+
 def _generate_simple_erp_sql(user_query: str) -> Optional[str]:
     """
     Generate simple SQL for common ERP queries.
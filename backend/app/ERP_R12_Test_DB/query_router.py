@@ -1,11 +1,16 @@
 # ERP R12 Query Router
+import itertools
 import logging
 import re
-from typing import Dict, Any, List
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from app.config import QUERY_FEATURES_CONFIG
+from app.query_features import KeywordAutomaton, QueryFeatures, analyze_query, compile_any, register_keywords
 # Import from ERP-specific query_classifier instead of SOS
 from app.ERP_R12_Test_DB.query_classifier import QueryClassifier
 # Import vector store for dynamic schema retrieval
-from app.ERP_R12_Test_DB.vector_store_chroma import search_similar_schema
+from app.ERP_R12_Test_DB.vector_store_chroma import search_similar_schema, search_similar_schema_many
 
 logger = logging.getLogger(__name__)
 # Set logger level to INFO to reduce verbosity
@@ -23,8 +28,9 @@ def get_erp_schema_info() -> Dict[str, Any]:
     """
     try:
         # Search for schema information about our key tables
-        hr_ou_docs = search_similar_schema("HR_OPERATING_UNITS", "source_db_2", top_k=20)
-        org_def_docs = search_similar_schema("ORG_ORGANIZATION_DEFINITIONS", "source_db_2", top_k=20)
+        hr_ou_docs, org_def_docs = search_similar_schema_many(
+            ["HR_OPERATING_UNITS", "ORG_ORGANIZATION_DEFINITIONS"], "source_db_2", top_k=20
+        )
         
         # Extract table and column information from schema documents
         erp_tables = {}
@@ -189,93 +195,132 @@ def get_erp_keywords_and_patterns(erp_tables: Dict[str, Any], erp_relationships:
     
     return keywords, patterns
 
-def extract_erp_entities(user_query: str) -> Dict[str, List[str]]:
+class ErpVocabulary:
+    """
+    Schema-derived router keywords, compiled once.
+
+    ``is_erp_query`` used to run three vector-store searches and rebuild the
+    keyword set and pattern list from them for every question. The vocabulary
+    is now built once, kept for ``erp_vocabulary_ttl_s`` seconds, and matched
+    with one automaton scan plus one precompiled alternation.
+    """
+
+    # Build counter; memo keys use it because id() can be reused after a TTL rebuild
+    _versions = itertools.count(1)
+
+    def __init__(self, erp_tables: Dict[str, Any], erp_relationships: Dict[str, str]):
+        keywords, patterns = get_erp_keywords_and_patterns(erp_tables, erp_relationships)
+        self.tables: List[str] = list(erp_tables.keys())
+        self.columns: List[str] = [
+            column for table_info in erp_tables.values() for column in table_info.get("columns", [])
+        ]
+        self.automaton = KeywordAutomaton(
+            keywords | {t.lower() for t in self.tables} | {c.lower() for c in self.columns}
+        )
+        self.keywords = keywords
+        self.pattern_rx = compile_any(patterns) if patterns else None
+        self.built_at = time.monotonic()
+        self.version = next(ErpVocabulary._versions)
+
+    def hits(self, features: QueryFeatures) -> set:
+        """Schema keywords, table and column names present in the question."""
+        return features.memo(("erp_vocabulary", self.version), lambda: self.automaton.find(features.lower))
+
+
+_erp_vocabulary: Optional[ErpVocabulary] = None
+_erp_vocabulary_lock = threading.Lock()
+
+
+def get_erp_vocabulary() -> ErpVocabulary:
+    """Return the cached ERP router vocabulary, rebuilding it from the schema when it expires."""
+    global _erp_vocabulary
+    vocabulary = _erp_vocabulary
+    ttl = QUERY_FEATURES_CONFIG["erp_vocabulary_ttl_s"]
+    if vocabulary is None or time.monotonic() - vocabulary.built_at > ttl:
+        with _erp_vocabulary_lock:
+            vocabulary = _erp_vocabulary
+            if vocabulary is None or time.monotonic() - vocabulary.built_at > ttl:
+                vocabulary = ErpVocabulary(get_erp_schema_info(), get_erp_relationships())
+                _erp_vocabulary = vocabulary
+                logger.info(
+                    f"Built ERP router vocabulary: {len(vocabulary.tables)} tables, "
+                    f"{len(vocabulary.columns)} columns, {len(vocabulary.automaton.keywords)} keywords"
+                )
+    return vocabulary
+
+
+_JOIN_TERMS = ["join", "link", "connect", "relate"]
+_JOINED_ENTITY_TERMS = ["operating unit", "organization"]
+_BUSINESS_CONTEXT_TERMS = [
+    "active", "currently active", "enabled", "disabled", "inventory enabled",
+    "business group", "operating unit", "organization name", "organization code",
+    "short code", "legal entity", "set of books", "chart of accounts",
+    "usable", "currently usable", "usable flag", "inventory enabled flag"
+]
+
+register_keywords(_JOIN_TERMS, _JOINED_ENTITY_TERMS, _BUSINESS_CONTEXT_TERMS)
+
+def extract_erp_entities(user_query: str, features: Optional[QueryFeatures] = None) -> Dict[str, List[str]]:
     """
     Extract ERP-specific entities from the user query using dynamic schema information.
     
     Args:
         user_query: The user's natural language query
+        features: Shared QueryFeatures for ``user_query`` (computed if omitted)
         
     Returns:
         Dictionary of extracted entities by type
     """
     entities = {}
-    
-    # Get dynamic schema information
-    erp_tables = get_erp_schema_info()
-    erp_relationships = get_erp_relationships()
-    
-    # Convert to lowercase for matching
-    query_lower = user_query.lower()
+    features = features or analyze_query(user_query)
+    vocabulary = get_erp_vocabulary()
+    hits = vocabulary.hits(features)
     
     # Extract table references
-    table_matches = []
-    for table in erp_tables.keys():
-        if table.lower() in query_lower:
-            table_matches.append(table)
+    table_matches = [table for table in vocabulary.tables if table.lower() in hits]
     if table_matches:
         entities["tables"] = table_matches
     
     # Extract column references
-    column_matches = []
-    all_columns = []
-    for table_info in erp_tables.values():
-        all_columns.extend(table_info.get("columns", []))
-    
-    for column in all_columns:
-        if column.lower() in query_lower:
-            column_matches.append(column)
+    column_matches = [column for column in vocabulary.columns if column.lower() in hits]
     if column_matches:
         entities["columns"] = column_matches
     
     # Extract relationship references
-    if "join" in query_lower or "link" in query_lower or "connect" in query_lower:
+    if features.has_any(["join", "link", "connect"]):
         entities["relationships"] = ["table_join"]
     
     return entities
 
-def is_erp_query(user_query: str) -> bool:
+def is_erp_query(user_query: str, features: Optional[QueryFeatures] = None) -> bool:
     """
     Determine if a query should be routed to ERP R12 based on dynamic schema information.
     
     Args:
         user_query: The user's natural language query
+        features: Shared QueryFeatures for ``user_query`` (computed if omitted)
         
     Returns:
         True if the query should be routed to ERP R12, False otherwise
     """
-    query_lower = user_query.lower()
-    
-    # Get dynamic schema information
-    erp_tables = get_erp_schema_info()
-    erp_relationships = get_erp_relationships()
-    erp_keywords, erp_patterns = get_erp_keywords_and_patterns(erp_tables, erp_relationships)
+    features = features or analyze_query(user_query)
+    vocabulary = get_erp_vocabulary()
     
     # Check for ERP-specific keywords
-    for keyword in erp_keywords:
-        if keyword in query_lower:
-            return True
+    if vocabulary.keywords & vocabulary.hits(features):
+        return True
     
     # Check for ERP entity patterns
-    for pattern in erp_patterns:
-        if re.search(pattern, query_lower):
-            return True
+    if vocabulary.pattern_rx is not None and vocabulary.pattern_rx.search(features.lower):
+        return True
     
     # Check for relationship queries
     # Looking for queries that mention joining/linking operating units and organizations
-    if any(term in query_lower for term in ["join", "link", "connect", "relate"]) and \
-       any(term in query_lower for term in ["operating unit", "organization"]):
+    if features.has_any(_JOIN_TERMS) and features.has_any(_JOINED_ENTITY_TERMS):
         return True
     
     # Check for business context from sample questions
-    business_context_terms = [
-        "active", "currently active", "enabled", "disabled", "inventory enabled",
-        "business group", "operating unit", "organization name", "organization code",
-        "short code", "legal entity", "set of books", "chart of accounts",
-        "usable", "currently usable", "usable flag", "inventory enabled flag"
-    ]
-    context_matches = sum(1 for term in business_context_terms if term in query_lower)
-    if context_matches >= 2:  # If at least 2 business context terms are found
+    if features.count(_BUSINESS_CONTEXT_TERMS) >= 2:  # If at least 2 business context terms are found
         return True
     
     return False
@@ -336,9 +381,12 @@ def route_query(user_query: str, selected_db: str = "", mode: str = "General") -
                 "reason": "source_db_1 (SOS) explicitly selected"
             }
     
+    # One keyword scan of the question, shared by the classifier, entity extraction and keyword routing
+    features = analyze_query(user_query)
+    
     # Use query classification for intelligent routing
     try:
-        classification = query_classifier.classify_query(user_query)
+        classification = query_classifier.classify_query(user_query, features=features)
         intent = classification["intent"]
         confidence = classification["confidence"]
         entities = classification["entities"]
@@ -346,7 +394,7 @@ def route_query(user_query: str, selected_db: str = "", mode: str = "General") -
         logger.info(f"Query classified as {intent.value} with confidence {confidence:.2f}")
         
         # Extract ERP entities for additional context
-        erp_entities = extract_erp_entities(user_query)
+        erp_entities = extract_erp_entities(user_query, features)
         
         # High confidence routing for ERP-specific intents
         erp_intents = [
@@ -382,8 +430,8 @@ def route_query(user_query: str, selected_db: str = "", mode: str = "General") -
         logger.warning(f"Query classification failed: {e}")
     
     # Fallback to keyword-based detection
-    if is_erp_query(user_query):
-        erp_entities = extract_erp_entities(user_query)
+    if is_erp_query(user_query, features):
+        erp_entities = extract_erp_entities(user_query, features)
         reasoning = "ERP keywords, patterns, or entities detected in query"
         if erp_entities:
             reasoning += f": {list(erp_entities.keys())}"
@@ -4,7 +4,16 @@ import re
 from typing import Dict, List, Optional, Tuple, Any, Callable
 
 # Import ERP-specific modules
-from app.ERP_R12_Test_DB.vector_store_chroma import search_similar_schema
+from app.ERP_R12_Test_DB.vector_store_chroma import (
+    ERP_TABLE_PREFIXES,
+    RELATIONSHIP_KIND,
+    SCHEMA_OVERVIEW_PROBE,
+    SCHEMA_RELATIONSHIP_PROBE,
+    embed_schema_query,
+    search_schema_typed,
+    search_similar_schema,
+    search_similar_schema_many,
+)
 from app.ERP_R12_Test_DB.query_engine import execute_query, format_erp_results
 
 logger = logging.getLogger(__name__)
@@ -80,10 +89,9 @@ def _discover_erp_tables() -> List[str]:
         # If we didn't find any tables, try a broader search
         if not table_names:
             logger.debug("No tables found in initial search, trying broader search")
-            # Search for common ERP table prefixes
-            prefixes = ["HR_", "ORG_", "MTL_", "PO_", "AP_", "AR_", "GL_", "FA_", "CST_", "BOM_", "WIP_", "INV_"]
-            for prefix in prefixes:
-                prefix_docs = search_similar_schema(f"{prefix} tables", "source_db_2", top_k=20)
+            # Search for common ERP table prefixes (one batched search)
+            prefix_queries = [f"{prefix} tables" for prefix in ERP_TABLE_PREFIXES]
+            for prefix_docs in search_similar_schema_many(prefix_queries, "source_db_2", top_k=20):
                 for doc in prefix_docs:
                     if 'document' in doc and 'metadata' in doc:
                         if doc['metadata'].get('kind') == 'table':
@@ -116,10 +124,12 @@ def _get_erp_schema_info() -> Dict[str, Any]:
         
         erp_tables = {}
         
+        # Search schema information for all discovered tables in one batch
+        docs_by_table = dict(zip(table_names, search_similar_schema_many(table_names, "source_db_2", top_k=50)))
+        
         # Process each discovered table
         for table_name in table_names:
-            # Search for schema information about this table
-            table_docs = search_similar_schema(table_name, "source_db_2", top_k=50)
+            table_docs = docs_by_table[table_name]
             
             # Extract column information from schema documents
             columns = []
@@ -319,11 +329,11 @@ async def answer(user_query: str, selected_db: str = "source_db_2", mode: str =
     try:
         logger.info(f"Processing ERP R12 query with hybrid processor: {user_query}")
         
-        # Import the ERP hybrid processor locally to avoid circular imports
-        from app.ERP_R12_Test_DB.hybrid_processor import ERPHybridProcessor
+        # Imported locally to avoid circular imports (the registry imports the ERP hybrid processor)
+        from app.processor_registry import get_processor_registry
         
-        # Create an instance of the ERP hybrid processor
-        erp_hybrid_processor = ERPHybridProcessor()
+        # Per-request copy of the warmed application-scoped ERP hybrid processor
+        erp_hybrid_processor = get_processor_registry().erp_processor()
         
         # Use the hybrid processor for ERP queries
         result = await erp_hybrid_processor.process_query(
@@ -362,8 +372,14 @@ def get_erp_schema_context(user_query: str, selected_db: str = "source_db_2") ->
         Tuple containing (schema_context_texts, schema_context_ids)
     """
     try:
-        # Search for similar schema documents with higher top_k for better coverage
-        schema_docs = search_similar_schema(user_query, selected_db, top_k=30)
+        # Typed search: each kind is filtered server-side with its own quota, so the
+        # context gets exactly the table/column/relationship mix it needs. The
+        # overview/relationship probes are precomputed per index and cost no search.
+        query_vector = embed_schema_query(user_query)
+        table_docs = search_schema_typed(user_query, selected_db, {"table": 8}, query_vector=query_vector)["table"]
+        general_docs, relationship_docs = search_similar_schema_many(
+            [SCHEMA_OVERVIEW_PROBE, SCHEMA_RELATIONSHIP_PROBE], selected_db, top_k=15
+        )
         
         # Extract schema context texts and IDs
         schema_context_texts = []
@@ -371,43 +387,37 @@ def get_erp_schema_context(user_query: str, selected_db: str = "source_db_2") ->
         processed_tables = set()  # To avoid duplicates
         processed_columns = set()  # To avoid duplicate columns
         
-        # First pass: Get table-level information
-        for doc in schema_docs:
-            if 'document' in doc and 'metadata' in doc:
-                # Check if this document is about a table
-                if doc['metadata'].get('kind') == 'table':
-                    table_name = doc['metadata'].get('table')
-                    if table_name and table_name not in processed_tables:
-                        schema_context_texts.append(doc['document'])
-                        schema_context_ids.append(doc.get('id', ''))
-                        processed_tables.add(table_name)
-        
-        # Second pass: Get column-level information for the identified tables
-        for doc in schema_docs:
-            if 'document' in doc and 'metadata' in doc:
-                # Check if this document is about columns of tables we've identified
-                if doc['metadata'].get('kind') == 'column' and doc['metadata'].get('source_table') in processed_tables:
-                    column_key = f"{doc['metadata'].get('source_table')}.{doc['metadata'].get('column')}"
-                    if column_key not in processed_columns:
-                        schema_context_texts.append(doc['document'])
-                        schema_context_ids.append(doc.get('id', ''))
-                        processed_columns.add(column_key)
-        
-        # Third pass: Get relationship information between identified tables
-        for doc in schema_docs:
-            if 'document' in doc and 'metadata' in doc:
-                # Check if this document is about relationships between our tables
-                if doc['metadata'].get('kind') == 'relationship':
-                    left_table = doc['metadata'].get('left_table')
-                    right_table = doc['metadata'].get('right_table')
-                    if left_table in processed_tables and right_table in processed_tables:
-                        schema_context_texts.append(doc['document'])
-                        schema_context_ids.append(doc.get('id', ''))
+        # Table-level information
+        for doc in table_docs:
+            table_name = doc['metadata'].get('table') or doc['metadata'].get('source_table')
+            if table_name and table_name not in processed_tables:
+                schema_context_texts.append(doc['document'])
+                schema_context_ids.append(doc.get('id', ''))
+                processed_tables.add(table_name)
+        
+        # Column-level and relationship information, restricted to the identified tables
+        if processed_tables:
+            table_scoped = search_schema_typed(
+                user_query,
+                selected_db,
+                {"column": 16, RELATIONSHIP_KIND: 6},
+                source_table=sorted(processed_tables),
+                query_vector=query_vector,
+            )
+            for doc in table_scoped["column"]:
+                column_key = f"{doc['metadata'].get('source_table')}.{doc['metadata'].get('column')}"
+                if column_key not in processed_columns:
+                    schema_context_texts.append(doc['document'])
+                    schema_context_ids.append(doc.get('id', ''))
+                    processed_columns.add(column_key)
+            for doc in table_scoped[RELATIONSHIP_KIND]:
+                if doc['document'] not in schema_context_texts:
+                    schema_context_texts.append(doc['document'])
+                    schema_context_ids.append(doc.get('id', ''))
         
         # If we don't have enough context, get general ERP schema info
         if len(schema_context_texts) < 8:
-            # Get general schema information
-            general_docs = search_similar_schema("ERP R12 schema overview", selected_db, top_k=15)
+            # Add general schema information
             for doc in general_docs:
                 if 'document' in doc and doc['document'] not in schema_context_texts:
                     schema_context_texts.append(doc['document'])
@@ -415,8 +425,7 @@ def get_erp_schema_context(user_query: str, selected_db: str = "source_db_2") ->
         
         # If we still don't have enough context, get relationship information
         if len(schema_context_texts) < 15:
-            # Get relationship information
-            relationship_docs = search_similar_schema("ERP R12 table relationships", selected_db, top_k=15)
+            # Add relationship information
             for doc in relationship_docs:
                 if 'document' in doc and doc['document'] not in schema_context_texts:
                     schema_context_texts.append(doc['document'])
@@ -7,7 +7,8 @@ import re
 import numpy as np
 
 from app.db_connector import connect_to_source
-from app.embeddings import get_embedding, encode_texts_batch
+from app.embeddings import encode_texts_cached
+from app.embedding_store import get_embedding_store_stats
 from app.config import SOURCES
 
 # Disable ChromaDB telemetry
@@ -5169,7 +5170,7 @@ def load_schema_to_chroma():
                 table_ids.append(doc_id)
                 table_metas.append(enhanced_meta)
 
-            table_embs = encode_texts_batch(table_docs, batch_size=EMB_BATCH_SIZE)
+            table_embs = encode_texts_cached(table_docs, batch_size=EMB_BATCH_SIZE)
 
             # Add tables in large batches
             for i in range(0, len(table_docs), CHROMA_ADD_BATCH_SIZE):
@@ -5192,7 +5193,7 @@ def load_schema_to_chroma():
                         alias_ids.append(f"erp_shared.{table}::ALIAS::{a}")
                         alias_meta.append({"source_table": table, "source_id": "erp_shared", "kind": "alias"})
                 if alias_docs:
-                    alias_embs = encode_texts_batch(alias_docs, batch_size=EMB_BATCH_SIZE)
+                    alias_embs = encode_texts_cached(alias_docs, batch_size=EMB_BATCH_SIZE)
                     for i in range(0, len(alias_docs), CHROMA_ADD_BATCH_SIZE):
                         # Extract the embeddings for this batch
                         batch_embeddings = alias_embs[i:i+CHROMA_ADD_BATCH_SIZE]
@@ -5239,7 +5240,7 @@ def load_schema_to_chroma():
                             business_metas.append(business_meta)
 
             if business_docs:
-                business_embs = encode_texts_batch(business_docs, batch_size=EMB_BATCH_SIZE)
+                business_embs = encode_texts_cached(business_docs, batch_size=EMB_BATCH_SIZE)
                 for i in range(0, len(business_docs), CHROMA_ADD_BATCH_SIZE):
                     # Extract the embeddings for this batch
                     batch_embeddings = business_embs[i:i+CHROMA_ADD_BATCH_SIZE]
@@ -5301,7 +5302,7 @@ def load_schema_to_chroma():
 
                 # embed columns in batch
                 if col_docs:
-                    col_embs = encode_texts_batch(col_docs, batch_size=EMB_BATCH_SIZE)
+                    col_embs = encode_texts_cached(col_docs, batch_size=EMB_BATCH_SIZE)
                     # push to collection in chunks
                     for i in range(0, len(col_docs), CHROMA_ADD_BATCH_SIZE):
                         # Extract the embeddings for this batch
@@ -5323,7 +5324,7 @@ def load_schema_to_chroma():
                             alias_ids_c.append(f"erp_shared.{table}.{col_name}::ALIAS::{a}")
                             alias_meta_c.append({"source_table": table, "column": col_name, "source_id": "erp_shared", "kind": "alias"})
                     if alias_docs_c:
-                        alias_embs_c = encode_texts_batch(alias_docs_c, batch_size=EMB_BATCH_SIZE)
+                        alias_embs_c = encode_texts_cached(alias_docs_c, batch_size=EMB_BATCH_SIZE)
                         for i in range(0, len(alias_docs_c), CHROMA_ADD_BATCH_SIZE):
                             # Extract the embeddings for this batch
                             batch_embeddings = alias_embs_c[i:i+CHROMA_ADD_BATCH_SIZE]
@@ -5353,7 +5354,7 @@ def load_schema_to_chroma():
                                     "column": col_name, "kind": "column_value",
                                     "value": pv, "freq": cnt
                                 })
-                            v_embs = encode_texts_batch(v_docs, batch_size=EMB_BATCH_SIZE)
+                            v_embs = encode_texts_cached(v_docs, batch_size=EMB_BATCH_SIZE)
                             for i in range(0, len(v_docs), CHROMA_ADD_BATCH_SIZE):
                                 # Extract the embeddings for this batch
                                 batch_embeddings = v_embs[i:i+CHROMA_ADD_BATCH_SIZE]
@@ -5372,7 +5373,7 @@ def load_schema_to_chroma():
                             mn, avg, mx = rng
                             doc = f"ERP R12 RANGE for erp_shared.{table}.{col_name}: min {mn}, avg {avg}, max {mx}."
                             rid = f"erp_shared.{table}.{col_name}::RANGE"
-                            emb = get_embedding(doc)
+                            emb = encode_texts_cached([doc])[0]
                             shared_collection.add(
                                 documents=[doc], embeddings=[emb], ids=[rid],
                                 metadatas=[{
@@ -5396,11 +5397,17 @@ def load_schema_to_chroma():
                 + " indexed."
             )
             logger.info(f"[erp_shared] ✅ Schema loading completed for {len(tables)} tables")
+            logger.info(f"[{source_id}] Embedding store: {get_embedding_store_stats()}")
 
             # Create symbolic links or references for both source_db_2 and source_db_3 to use the shared collection
             # This ensures that when either database is queried, they'll use the shared schema context
             logger.info(f"[erp_shared] ✅ Creating references for source_db_2 and source_db_3 to use shared schema")
 
+            # Store the fixed overview/relationship/prefix probe results for this index,
+            # so serving processes load them instead of searching on every request
+            from app.ERP_R12_Test_DB.vector_store_chroma import precompute_schema_probes
+            precompute_schema_probes(source_id)
+
     except Exception as e:
         logger.error(f"❌ Failed to load shared ERP schema: {e}", exc_info=True)
 
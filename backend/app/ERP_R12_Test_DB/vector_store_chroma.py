@@ -1,8 +1,11 @@
 # ERP R12 Vector Store Chroma
 # Vector store helpers for ChromaDB (with query-time synonym expansion)
+import json
 import logging
 import os
-from typing import List, Dict
+import threading
+from collections import OrderedDict
+from typing import Any, List, Dict, Optional, Sequence, Tuple, Union
 
 import chromadb
 from chromadb.config import Settings
@@ -22,7 +25,10 @@ except ImportError:
 # Disable telemetry
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
 
-from app.embeddings import get_embedding
+from app.embeddings import get_embedding, encode_texts_batch
+from app.lexical_index import hybrid_search
+from app.schema_filters import RELATIONSHIP_KIND, query_by_kind
+from app.synonyms import SynonymExpander
 
 logger = logging.getLogger(__name__)
 # Set logger level to INFO to reduce verbosity
@@ -32,15 +38,29 @@ logger.setLevel(logging.INFO)
 # Environment switches
 # =========================
 ENABLE_QUERY_SYNONYMS = os.getenv("ENABLE_QUERY_SYNONYMS", "true").lower() == "true"
+# Recent (db, query) -> raw hits kept in memory, so the router, classifier and RAG
+# context builder do not repeat the same search within a request
+SCHEMA_QUERY_CACHE_SIZE = int(os.getenv("ERP_SCHEMA_QUERY_CACHE_SIZE", "256"))
 
 # =========================
 # Per-DB Chroma client
 # =========================
+_chroma_clients: Dict[str, Any] = {}
+_chroma_clients_lock = threading.Lock()
+
 def get_chroma_client(selected_db: str):
-    return chromadb.PersistentClient(
-        path=f"chroma_storage/{selected_db}",
-        settings=Settings(anonymized_telemetry=False)
-    )
+    # One client per DB for the life of the process (opened once, reused by every search).
+    client = _chroma_clients.get(selected_db)
+    if client is None:
+        with _chroma_clients_lock:
+            client = _chroma_clients.get(selected_db)
+            if client is None:
+                client = chromadb.PersistentClient(
+                    path=f"chroma_storage/{selected_db}",
+                    settings=Settings(anonymized_telemetry=False)
+                )
+                _chroma_clients[selected_db] = client
+    return client
 
 # =========================
 # Enhanced synonyms for ERP R12 tables and columns
@@ -873,7 +893,8 @@ COLUMN_SYNONYMS = {
     
     # Business context terms
     "BUSINESS_GROUP": ["business group", "bg", "business unit group", "business groups"],
-    "OPERATING_UNIT": ["operating unit", "ou", "business unit", "org unit", "operating units"],
+    # AP invoices are striped by operating unit (ORG_ID); substring matching used to reach this via "ou" in "invoice"
+    "OPERATING_UNIT": ["operating unit", "ou", "business unit", "org unit", "operating units", "invoice"],
     "ORGANIZATION": ["organization", "org", "entity", "organizations"],
     "LEGAL_ENTITY": ["legal entity", "le", "corporate entity", "legal context", "legal entities"],
     "SET_OF_BOOKS": ["set of books", "sob", "ledger", "accounting book", "books", "ledger id"],
@@ -1562,8 +1583,29 @@ COLUMN_SYNONYMS.update({
     "TYPE": ["type", "assignment type", "delivery assignment type"]
 })
 
-def _contains_phrase(q: str, phrase: str) -> bool:
-    return phrase.lower() in q
+def _relationship_hints(canonical: str, ql: str) -> List[str]:
+    """Join hints added in front of a canonical column that links the core tables."""
+    hints = []
+    if canonical in ["ORGANIZATION_ID", "OPERATING_UNIT"]:
+        # These columns establish the key relationship between tables
+        hints.append("HR_OPERATING_UNITS.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.OPERATING_UNIT")
+    elif canonical in ["ORGANIZATION_ID"]:
+        # Check if this is for MTL tables
+        if any(term in ql for term in ["onhand", "subinventory", "inventory"]):
+            hints.append("MTL_ONHAND_QUANTITIES_DETAIL.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.ORGANIZATION_ID")
+            hints.append("MTL_SECONDARY_INVENTORIES.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.ORGANIZATION_ID")
+        # Check if this is for MTL_DEMAND table
+        elif any(term in ql for term in ["demand", "material demand", "requirement"]):
+            hints.append("MTL_DEMAND.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.ORGANIZATION_ID")
+        # Check if this is for MTL_ITEM_LOCATIONS table
+        elif any(term in ql for term in ["item locations", "locator", "warehouse", "physical locations", "storage"]):
+            hints.append("MTL_ITEM_LOCATIONS.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.ORGANIZATION_ID")
+    return hints
+
+
+# Compiled once, after every COLUMN_SYNONYMS.update() above
+_SYNONYM_EXPANDER = SynonymExpander(COLUMN_SYNONYMS, hints=_relationship_hints, log_tag="[ERP QuerySynonyms]")
+
 
 def expand_query_with_synonyms(query: str) -> str:
     """
@@ -1574,44 +1616,12 @@ def expand_query_with_synonyms(query: str) -> str:
     - Core table names: HR_OPERATING_UNITS, ORG_ORGANIZATION_DEFINITIONS
     - Key column names with their business meanings
     - Relationship terms between tables
+
+    Synonyms match on word boundaries; expansions are memoized per query.
     """
     if not ENABLE_QUERY_SYNONYMS or not query:
         return query
-
-    ql = query.lower()
-    added = set()
-    extras = []
-
-    for canonical, syns in COLUMN_SYNONYMS.items():
-        canon_l = canonical.lower()
-        if canon_l in ql:
-            continue
-        if any(_contains_phrase(ql, s.lower()) for s in syns):
-            if canonical not in added:
-                # Add contextual hints for key relationships
-                if canonical in ["ORGANIZATION_ID", "OPERATING_UNIT"]:
-                    # These columns establish the key relationship between tables
-                    extras.append("HR_OPERATING_UNITS.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.OPERATING_UNIT")
-                elif canonical in ["ORGANIZATION_ID"]:
-                    # Check if this is for MTL tables
-                    if any(term in ql for term in ["onhand", "subinventory", "inventory"]):
-                        extras.append("MTL_ONHAND_QUANTITIES_DETAIL.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.ORGANIZATION_ID")
-                        extras.append("MTL_SECONDARY_INVENTORIES.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.ORGANIZATION_ID")
-                    # Check if this is for MTL_DEMAND table
-                    elif any(term in ql for term in ["demand", "material demand", "requirement"]):
-                        extras.append("MTL_DEMAND.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.ORGANIZATION_ID")
-                    # Check if this is for MTL_ITEM_LOCATIONS table
-                    elif any(term in ql for term in ["item locations", "locator", "warehouse", "physical locations", "storage"]):
-                        extras.append("MTL_ITEM_LOCATIONS.ORGANIZATION_ID=ORG_ORGANIZATION_DEFINITIONS.ORGANIZATION_ID")
-                extras.append(canonical)
-                added.add(canonical)
-
-    if not extras:
-        return query
-
-    expanded = query + " " + " ".join(extras)
-    logger.debug(f"[ERP QuerySynonyms] Expanded query: '{query}' → '{expanded}'")
-    return expanded
+    return _SYNONYM_EXPANDER.expand(query)
 
 def needs_join(query: str) -> bool:
     """
@@ -1700,55 +1710,268 @@ def needs_join(query: str) -> bool:
 # =========================
 # Core search helpers
 # =========================
-def search_similar_schema(query: str, selected_db: str, top_k: int = 5) -> List[Dict]:
-    """
-    Search for similar schema documents in the vector store.
-    
-    For ERP R12, this prioritizes matches for the two core tables:
-    - HR_OPERATING_UNITS
-    - ORG_ORGANIZATION_DEFINITIONS
-    
-    And their key columns and relationships.
-    """
+# Fixed probe strings the ERP pipeline searches on every request. Their results only
+# change when the index is rebuilt, so they are computed once per index (at load time,
+# or lazily on first use), stored next to the collection and served from memory.
+ERP_TABLE_PREFIXES = ["HR_", "ORG_", "MTL_", "PO_", "AP_", "AR_", "GL_", "FA_", "CST_", "BOM_", "WIP_", "INV_"]
+SCHEMA_OVERVIEW_PROBE = "ERP R12 schema overview"
+SCHEMA_RELATIONSHIP_PROBE = "ERP R12 table relationships"
+SCHEMA_TABLES_PROBE = "ERP R12 tables"
+SCHEMA_PROBES: Dict[str, int] = {  # probe -> top_k stored
+    SCHEMA_OVERVIEW_PROBE: 15,
+    SCHEMA_RELATIONSHIP_PROBE: 15,
+    SCHEMA_TABLES_PROBE: 100,
+    "ERP R12 schema": 10,
+    "HR_OPERATING_UNITS": 50,
+    "ORG_ORGANIZATION_DEFINITIONS": 50,
+    "relationship between HR_OPERATING_UNITS and ORG_ORGANIZATION_DEFINITIONS": 3,
+    **{f"{prefix} tables": 20 for prefix in ERP_TABLE_PREFIXES},
+}
+
+_schema_probes: Dict[str, Dict[str, List[Dict]]] = {}
+_schema_probes_lock = threading.Lock()
+
+
+class _RecentSchemaQueries:
+    """Small LRU of raw search hits per (db, query), with the n_results they were fetched at."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Tuple[str, str], Tuple[int, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, selected_db: str, query: str, top_k: int) -> Optional[List[Dict]]:
+        with self._lock:
+            item = self._items.get((selected_db, query))
+            if item is None or item[0] < top_k:
+                return None
+            self._items.move_to_end((selected_db, query))
+            return item[1]
+
+    def put(self, selected_db: str, query: str, n_results: int, hits: List[Dict]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[(selected_db, query)] = (n_results, hits)
+            self._items.move_to_end((selected_db, query))
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self, selected_db: str) -> None:
+        with self._lock:
+            for key in [k for k in self._items if k[0] == selected_db]:
+                del self._items[key]
+
+
+_recent_queries = _RecentSchemaQueries(SCHEMA_QUERY_CACHE_SIZE)
+
+
+def _get_schema_collection(selected_db: str):
     client = get_chroma_client(selected_db)
-    collection_name = f"schema_docs_{selected_db}"
-    collection = client.get_or_create_collection(name=collection_name)
+    return client.get_or_create_collection(name=f"schema_docs_{selected_db}")
 
-    q_expanded = expand_query_with_synonyms(query)
-    query_vector = get_embedding(q_expanded)
 
+def _query_schema_hits(collection, queries: Sequence[str], n_results: int) -> List[List[Dict]]:
+    """Embed ``queries`` in one batch and run them as one multi-vector Chroma query."""
+    vectors = encode_texts_batch([expand_query_with_synonyms(q) for q in queries])
     results = collection.query(
-        query_embeddings=[query_vector],
-        n_results=top_k,
+        query_embeddings=vectors,
+        n_results=n_results,
         include=["documents", "metadatas"]  # no "ids" for compatibility
     )
+    docs_per_query = results.get("documents") or [[] for _ in queries]
+    metas_per_query = results.get("metadatas") or [[] for _ in queries]
+    ids_per_query = results.get("ids") or [[None] * len(d) for d in docs_per_query]
 
-    docs  = results.get("documents", [[]])[0]
-    metas = results.get("metadatas", [[]])[0]
-    ids   = results.get("ids", [[]])[0] if results.get("ids") else [None] * len(docs)
+    out = []
+    for ids, docs, metas in zip(ids_per_query, docs_per_query, metas_per_query):
+        out.append([{"id": _id, "document": doc, "metadata": meta} for _id, doc, meta in zip(ids, docs, metas)])
+    return out
 
-    # Filter results to prioritize actual schema information
+
+def _schema_probe_path(selected_db: str) -> str:
+    return os.path.join("chroma_storage", selected_db, "schema_probes.json")
+
+
+def precompute_schema_probes(selected_db: str) -> Dict[str, List[Dict]]:
+    """
+    Run every ``SCHEMA_PROBES`` search in one batch and store the hits.
+
+    Called after the schema is (re)indexed. The hits are written next to the
+    collection together with its document count, so serving processes can
+    load them instead of searching.
+    """
+    collection = _get_schema_collection(selected_db)
+    count = collection.count()
+    probes = list(SCHEMA_PROBES)
+    hits = _query_schema_hits(collection, probes, max(SCHEMA_PROBES.values())) if count else [[] for _ in probes]
+    results = {probe: probe_hits[:SCHEMA_PROBES[probe]] for probe, probe_hits in zip(probes, hits)}
+    if count:
+        try:
+            with open(_schema_probe_path(selected_db), "w", encoding="utf-8") as f:
+                json.dump({"count": count, "probes": results}, f)
+        except OSError as e:
+            logger.warning(f"[ERP CHROMA] Could not store schema probes for {selected_db}: {e}")
+    with _schema_probes_lock:
+        _schema_probes[selected_db] = results
+    _recent_queries.clear(selected_db)
+    logger.info(f"[ERP CHROMA] Precomputed {len(results)} schema probes for {selected_db} ({count} docs)")
+    return results
+
+
+def load_schema_probes(selected_db: str) -> Dict[str, List[Dict]]:
+    """Probe hits for ``selected_db`` from memory, the stored file, or a fresh batch search."""
+    probes = _schema_probes.get(selected_db)
+    if probes is not None:
+        return probes
+    with _schema_probes_lock:
+        probes = _schema_probes.get(selected_db)
+        if probes is not None:
+            return probes
+        try:
+            with open(_schema_probe_path(selected_db), encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("count") == _get_schema_collection(selected_db).count() \
+                    and set(stored.get("probes", {})) == set(SCHEMA_PROBES):
+                _schema_probes[selected_db] = stored["probes"]
+                return stored["probes"]
+            logger.info(f"[ERP CHROMA] Stored schema probes for {selected_db} are stale; recomputing")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"[ERP CHROMA] Could not read schema probes for {selected_db}: {e}")
+    return precompute_schema_probes(selected_db)
+
+
+def _filter_schema_hits(hits: List[Dict], top_k: int) -> List[Dict]:
+    """Prefer table/column/relationship documents; top up with the rest when too few remain."""
     filtered_results = []
-    for _id, doc, meta in zip(ids, docs, metas):
+    for hit in hits:
+        doc, meta = hit["document"], hit["metadata"]
         # Only include results that have actual schema information
         if doc and meta and 'kind' in meta:
             # Prioritize column and table information
             if meta.get('kind') in ['column', 'table']:
-                filtered_results.append({"id": _id, "document": doc, "metadata": meta})
+                filtered_results.append(dict(hit))
             # Also include relationship information
             elif 'relationship' in doc.lower() or 'join' in doc.lower():
-                filtered_results.append({"id": _id, "document": doc, "metadata": meta})
-    
+                filtered_results.append(dict(hit))
+
     # If we don't have enough filtered results, include all results
     if len(filtered_results) < top_k // 2:
-        for _id, doc, meta in zip(ids, docs, metas):
-            if doc and {"id": _id, "document": doc, "metadata": meta} not in filtered_results:
-                filtered_results.append({"id": _id, "document": doc, "metadata": meta})
+        for hit in hits:
+            if hit["document"] and hit not in filtered_results:
+                filtered_results.append(dict(hit))
                 if len(filtered_results) >= top_k:
                     break
-    
+
     return filtered_results[:top_k]
 
+
+def search_similar_schema_many(
+    queries: Sequence[str],
+    selected_db: str,
+    top_k: Union[int, Sequence[int]] = 5,
+) -> List[List[Dict]]:
+    """
+    Search several queries at once.
+
+    Probe strings are answered from the precomputed probe hits and recent
+    queries from memory; the remaining queries are embedded in one batch and
+    sent to Chroma as one multi-vector query.
+
+    Args:
+        queries: Query texts
+        selected_db: Database ID
+        top_k: Result count for all queries, or one per query
+
+    Returns:
+        One result list per query, in order, each shaped like ``search_similar_schema``
+    """
+    if not queries:
+        return []
+    ks = [top_k] * len(queries) if isinstance(top_k, int) else list(top_k)
+
+    probes: Dict[str, List[Dict]] = {}
+    if any(q in SCHEMA_PROBES for q in queries):
+        try:
+            probes = load_schema_probes(selected_db)
+        except Exception as e:
+            logger.warning(f"[ERP CHROMA] Schema probes unavailable for {selected_db}: {e}")
+
+    raw: List[Optional[List[Dict]]] = []
+    missing: Dict[str, int] = {}
+    for query, k in zip(queries, ks):
+        hits = probes.get(query) if k <= SCHEMA_PROBES.get(query, 0) else None
+        if hits is None:
+            hits = _recent_queries.get(selected_db, query, k)
+        if hits is None:
+            missing[query] = max(missing.get(query, 0), k)
+        raw.append(hits)
+
+    if missing:
+        n_results = max(missing.values())
+        fetched = _query_schema_hits(_get_schema_collection(selected_db), list(missing), n_results)
+        fetched_by_query = dict(zip(missing, fetched))
+        for query, hits in fetched_by_query.items():
+            _recent_queries.put(selected_db, query, n_results, hits)
+        raw = [hits if hits is not None else fetched_by_query[q] for q, hits in zip(queries, raw)]
+        logger.debug(f"[ERP CHROMA] Batched {len(missing)} of {len(queries)} schema queries into one search")
+
+    return [_filter_schema_hits(hits[:k], k) for hits, k in zip(raw, ks)]
+
+
+def search_similar_schema(query: str, selected_db: str, top_k: int = 5) -> List[Dict]:
+    """
+    Search for similar schema documents in the vector store.
+    
+    For ERP R12, this prioritizes matches for the two core tables:
+    - HR_OPERATING_UNITS
+    - ORG_ORGANIZATION_DEFINITIONS
+    
+    And their key columns and relationships.
+    """
+    return search_similar_schema_many([query], selected_db, top_k)[0]
+
+
+def embed_schema_query(query: str) -> List[float]:
+    """Embedding of the synonym-expanded query, reusable across typed searches."""
+    return get_embedding(expand_query_with_synonyms(query))
+
+
+def search_schema_typed(
+    query: str,
+    selected_db: str,
+    quotas: Dict[str, int],
+    source_table: Optional[Union[str, Sequence[str]]] = None,
+    is_critical: Optional[bool] = None,
+    query_vector: Optional[List[float]] = None,
+) -> Dict[str, List[Dict]]:
+    """
+    Search schema documents with a per-kind quota, filtered server-side.
+
+    Args:
+        query: Query text
+        selected_db: Database ID
+        quotas: Kind -> number of hits, e.g. ``{"table": 8, "column": 16}``;
+            ``RELATIONSHIP_KIND`` matches relationship/join documents
+        source_table: Restrict to documents of these tables
+        is_critical: Restrict to critical-table documents
+        query_vector: Precomputed ``embed_schema_query(query)``
+
+    Returns:
+        Kind -> hits shaped like ``search_similar_schema`` output
+    """
+    if query_vector is None:
+        query_vector = embed_schema_query(query)
+    return query_by_kind(
+        _get_schema_collection(selected_db),
+        query_vector,
+        quotas,
+        source_table=source_table,
+        is_critical=is_critical,
+    )
+
 def search_vector_store_detailed(query: str, selected_db: str, top_k: int = 3) -> List[Dict]:
     """
     Perform detailed vector search with distance scores.
@@ -1799,16 +2022,30 @@ def search_vector_store_detailed(query: str, selected_db: str, top_k: int = 3) -
 # ✅ Unified hybrid search used by query_engine.py
 def hybrid_schema_value_search(query: str, selected_db: str, top_k: int = 10) -> List[Dict]:
     """
-    Simple hybrid: detailed semantic search after query-time expansion.
-    
+    Hybrid retrieval: BM25 over the schema documents fused (RRF) with the detailed
+    semantic search after query-time expansion.
+
     For ERP R12, this ensures:
     - Proper synonym expansion for business terms
     - Relationship awareness for key table joins
-    - Enhanced matching for core ERP concepts
-    
-    If you add keyword/metadata filtering later, integrate here.
+    - Exact matching for table/column names such as PO_HEADERS_ALL
+
+    A query naming an exact identifier (table/column name, sampled value) is
+    answered from the lexical index alone, without running the embedding model.
     """
-    return search_vector_store_detailed(query, selected_db=selected_db, top_k=top_k)
+    collection_name = f"schema_docs_{selected_db}"
+    try:
+        collection = get_chroma_client(selected_db).get_or_create_collection(name=collection_name)
+    except Exception as e:
+        logger.warning(f"[ERP CHROMA] Could not get/create collection '{collection_name}': {e}")
+        return []
+    return hybrid_search(
+        selected_db,
+        collection,
+        query,
+        top_k,
+        lambda n: search_vector_store_detailed(query, selected_db=selected_db, top_k=n),
+    )
 
 # ✅ Persist to disk (no-op on PersistentClient; keep for compatibility)
 def persist_chroma(selected_db: str):
@@ -5,7 +5,7 @@ import logging
 import time
 import json
 import requests
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, Union, Callable
 from datetime import datetime as _dt
 from dataclasses import dataclass, field
 
@@ -16,8 +16,11 @@ from app.config import (
     API_MAX_RETRIES,
     API_RETRY_DELAY,
     API_MODELS,
-    DEEPSEEK_ENABLED
+    DEEPSEEK_ENABLED,
+    SQL_STREAM_CONFIG
 )
+from app.prompt_budget import count_message_tokens, count_tokens, fit_schema_context
+from app.sql_stream import SqlEarlyStop
 
 # Import the token logger
 try:
@@ -35,7 +38,8 @@ _total_tokens_used = {
     "prompt_tokens": 0,
     "completion_tokens": 0,
     "total_tokens": 0,
-    "requests_count": 0
+    "requests_count": 0,
+    "prompt_tokens_saved": 0
 }
 
 def get_token_usage_stats() -> Dict[str, int]:
@@ -49,7 +53,8 @@ def reset_token_usage_stats() -> None:
         "prompt_tokens": 0,
         "completion_tokens": 0,
         "total_tokens": 0,
-        "requests_count": 0
+        "requests_count": 0,
+        "prompt_tokens_saved": 0
     }
 
 @dataclass
@@ -104,26 +109,175 @@ class DeepSeekClient:
         
         logger.info(f"DeepSeek client initialized with {self.max_retries} retries, {self.timeout}s timeout")
     
+    def _record_usage(
+        self,
+        payload: Dict[str, Any],
+        usage: Dict[str, Any],
+        request_tokens: int,
+        prompt_tokens_saved: int,
+        response_time: float
+    ) -> Dict[str, int]:
+        """Add one successful request to the token counters, token log and model status."""
+        prompt_tokens = usage.get("prompt_tokens", request_tokens)
+        completion_tokens = usage.get("completion_tokens", 0)
+        total_tokens = usage.get("total_tokens", prompt_tokens + completion_tokens)
+        
+        # Update global token counters
+        global _total_tokens_used
+        _total_tokens_used["prompt_tokens"] += prompt_tokens
+        _total_tokens_used["completion_tokens"] += completion_tokens
+        _total_tokens_used["total_tokens"] += total_tokens
+        _total_tokens_used["requests_count"] += 1
+        _total_tokens_used["prompt_tokens_saved"] += prompt_tokens_saved
+        
+        # Enhanced logging for cost tracking with more details
+        logger.info(f"DeepSeek API Token Usage - Model: {payload.get('model', 'unknown')}")
+        logger.info(f"  Prompt Tokens: {prompt_tokens} (estimated: {request_tokens})")
+        logger.info(f"  Completion Tokens: {completion_tokens}")
+        if prompt_tokens_saved:
+            logger.info(f"  Prompt Tokens Saved by budgeting: {prompt_tokens_saved}")
+        logger.info(f"  Total Tokens: {total_tokens}")
+        logger.info(f"  Running Totals - Prompt: {_total_tokens_used['prompt_tokens']}, "
+                  f"Completion: {_total_tokens_used['completion_tokens']}, "
+                  f"Total: {_total_tokens_used['total_tokens']}, "
+                  f"Requests: {_total_tokens_used['requests_count']}")
+        
+        token_usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "prompt_tokens_saved": prompt_tokens_saved
+        }
+        
+        # Log to detailed token logger
+        if TOKEN_LOGGER_AVAILABLE and token_logger:
+            # Extract first message content for context
+            first_message_content = ""
+            if payload.get("messages"):
+                for msg in payload["messages"]:
+                    if isinstance(msg, dict) and msg.get("content"):
+                        first_message_content = str(msg["content"])
+                        break
+            
+            token_logger.log_token_usage(
+                module="SOS",
+                model=payload.get("model", "unknown"),
+                usage=dict(token_usage),
+                request_content=first_message_content
+            )
+        
+        # Record model status as available with response time
+        try:
+            from app.dashboard_recorder import get_dashboard_recorder
+            recorder = get_dashboard_recorder()
+            if recorder:
+                recorder.record_model_status(
+                    model_type="api",
+                    model_name=payload.get("model", "unknown"),
+                    status="available",
+                    response_time_ms=int(response_time * 1000)
+                )
+        except Exception as e:
+            logger.warning(f"Failed to record model status: {e}")
+        
+        return token_usage
+    
+    async def _make_stream_request(
+        self,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        stop_when: Callable[[str], bool],
+        prompt_tokens_saved: int = 0
+    ) -> DeepSeekResponse:
+        """
+        Stream a chat completion and stop as soon as ``stop_when(text)`` holds.
+        
+        Closing the connection ends the generation server-side, so the tokens
+        after the stop point are neither produced nor billed. If the stream
+        cannot be opened or breaks, the request is repeated through the buffered
+        ``_make_request`` path with its retry handling.
+        """
+        start_time = time.time()
+        request_tokens = count_message_tokens(payload.get("messages") or [])
+        stream_payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        content = ""
+        usage: Dict[str, Any] = {}
+        stopped_early = False
+        
+        try:
+            time_since_last = time.time() - self.last_request_time
+            if time_since_last < self.min_request_interval:
+                await asyncio.sleep(self.min_request_interval - time_since_last)
+            
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.post(self.base_url, headers=headers, json=stream_payload) as response:
+                    self.last_request_time = time.time()
+                    self.request_count += 1
+                    if response.status != 200:
+                        response_text = await response.text()
+                        logger.warning(f"Streaming request failed (HTTP {response.status}): {response_text[:200]}; "
+                                       f"falling back to a buffered request")
+                        return await self._make_request(payload, headers, prompt_tokens_saved)
+                    
+                    # Server-sent events: "data: {chunk}" lines, ending with "data: [DONE]"
+                    async for raw in response.content:
+                        line = raw.strip()
+                        if not line.startswith(b"data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == b"[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        if chunk.get("usage"):
+                            usage = chunk["usage"]
+                        for choice in chunk.get("choices") or []:
+                            piece = (choice.get("delta") or {}).get("content") or ""
+                            if piece:
+                                content += piece
+                                if stop_when(content):
+                                    stopped_early = True
+                        if stopped_early:
+                            break
+        except (asyncio.TimeoutError, aiohttp.ClientError, json.JSONDecodeError) as e:
+            logger.warning(f"Streaming request failed: {e}; falling back to a buffered request")
+            return await self._make_request(payload, headers, prompt_tokens_saved)
+        
+        response_time = time.time() - start_time
+        if not usage:
+            # The usage chunk only comes at the end of a finished stream
+            usage = {"prompt_tokens": request_tokens, "completion_tokens": count_tokens(content)}
+        token_usage = self._record_usage(payload, usage, request_tokens, prompt_tokens_saved, response_time)
+        
+        return DeepSeekResponse(
+            content=content.strip(),
+            model=payload.get("model", "unknown"),
+            usage=usage,
+            response_time=response_time,
+            success=True,
+            status_code=200,
+            metadata={
+                "attempt": 1,
+                "total_requests": self.request_count,
+                "streamed": True,
+                "stopped_early": stopped_early,
+                "token_usage": token_usage
+            }
+        )
+    
     async def _make_request(
         self,
         payload: Dict[str, Any],
-        headers: Dict[str, str]
+        headers: Dict[str, str],
+        prompt_tokens_saved: int = 0
     ) -> DeepSeekResponse:
         """Make HTTP request to DeepSeek API with retry logic."""
         
         start_time = time.time()
         last_error = None
         
-        # Track tokens in the request
-        request_tokens = 0
-        if "messages" in payload:
-            # Simple token estimation based on message content
-            for message in payload["messages"]:
-                if isinstance(message, dict) and "content" in message:
-                    content = message["content"]
-                    if isinstance(content, str):
-                        # Rough estimation: 1 token ≈ 4 characters
-                        request_tokens += len(content) // 4
+        # Tokenizer count of the request, used when the API omits usage
+        request_tokens = count_message_tokens(payload.get("messages") or [])
         
         for attempt in range(self.max_retries + 1):
             try:
@@ -148,62 +302,9 @@ class DeepSeekClient:
                                 content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
                                 usage = data.get("usage", {})
                                 
-                                # Track token usage
-                                prompt_tokens = usage.get("prompt_tokens", request_tokens)
-                                completion_tokens = usage.get("completion_tokens", 0)
-                                total_tokens = usage.get("total_tokens", prompt_tokens + completion_tokens)
-                                
-                                # Update global token counters
-                                global _total_tokens_used
-                                _total_tokens_used["prompt_tokens"] += prompt_tokens
-                                _total_tokens_used["completion_tokens"] += completion_tokens
-                                _total_tokens_used["total_tokens"] += total_tokens
-                                _total_tokens_used["requests_count"] += 1
-                                
-                                # Enhanced logging for cost tracking with more details
-                                logger.info(f"DeepSeek API Token Usage - Model: {payload.get('model', 'unknown')}")
-                                logger.info(f"  Prompt Tokens: {prompt_tokens} (estimated: {request_tokens})")
-                                logger.info(f"  Completion Tokens: {completion_tokens}")
-                                logger.info(f"  Total Tokens: {total_tokens}")
-                                logger.info(f"  Running Totals - Prompt: {_total_tokens_used['prompt_tokens']}, "
-                                          f"Completion: {_total_tokens_used['completion_tokens']}, "
-                                          f"Total: {_total_tokens_used['total_tokens']}, "
-                                          f"Requests: {_total_tokens_used['requests_count']}")
-                                
-                                # Log to detailed token logger
-                                if TOKEN_LOGGER_AVAILABLE and token_logger:
-                                    # Extract first message content for context
-                                    first_message_content = ""
-                                    if payload.get("messages"):
-                                        for msg in payload["messages"]:
-                                            if isinstance(msg, dict) and msg.get("content"):
-                                                first_message_content = str(msg["content"])
-                                                break
-                                    
-                                    token_logger.log_token_usage(
-                                        module="SOS",
-                                        model=payload.get("model", "unknown"),
-                                        usage={
-                                            "prompt_tokens": prompt_tokens,
-                                            "completion_tokens": completion_tokens,
-                                            "total_tokens": total_tokens
-                                        },
-                                        request_content=first_message_content
-                                    )
-                                
-                                # Record model status as available with response time
-                                try:
-                                    from app.dashboard_recorder import get_dashboard_recorder
-                                    recorder = get_dashboard_recorder()
-                                    if recorder:
-                                        recorder.record_model_status(
-                                            model_type="api",
-                                            model_name=payload.get("model", "unknown"),
-                                            status="available",
-                                            response_time_ms=int(response_time * 1000)
-                                        )
-                                except Exception as e:
-                                    logger.warning(f"Failed to record model status: {e}")
+                                token_usage = self._record_usage(
+                                    payload, usage, request_tokens, prompt_tokens_saved, response_time
+                                )
                                 
                                 return DeepSeekResponse(
                                     content=content.strip(),
@@ -216,11 +317,7 @@ class DeepSeekClient:
                                         "attempt": attempt + 1, 
                                         "total_requests": self.request_count,
                                         "raw_response": data,
-                                        "token_usage": {
-                                            "prompt_tokens": prompt_tokens,
-                                            "completion_tokens": completion_tokens,
-                                            "total_tokens": total_tokens
-                                        }
+                                        "token_usage": token_usage
                                     }
                                 )
                             except json.JSONDecodeError as e:
@@ -370,6 +467,8 @@ class DeepSeekClient:
         top_p: float = 0.9,
         frequency_penalty: float = 0.0,
         presence_penalty: float = 0.0,
+        prompt_tokens_saved: int = 0,
+        stop_when: Optional[Callable[[str], bool]] = None,
         **kwargs
     ) -> DeepSeekResponse:
         """
@@ -383,6 +482,9 @@ class DeepSeekClient:
             top_p: Nucleus sampling parameter
             frequency_penalty: Frequency penalty (-2.0 to 2.0)
             presence_penalty: Presence penalty (-2.0 to 2.0)
+            prompt_tokens_saved: Tokens the caller trimmed from the prompt, reported to the token log
+            stop_when: If given, the completion is streamed and cut off once this
+                returns True for the text generated so far
             **kwargs: Additional model-specific parameters
             
         Returns:
@@ -407,7 +509,9 @@ class DeepSeekClient:
         }
         
         logger.debug(f"Sending request to {model} with {len(messages)} messages")
-        return await self._make_request(payload, headers)
+        if stop_when is not None:
+            return await self._make_stream_request(payload, headers, stop_when, prompt_tokens_saved)
+        return await self._make_request(payload, headers, prompt_tokens_saved)
     
     async def test_model_availability(self, model: str) -> ModelTestResult:
         """
@@ -543,6 +647,13 @@ class DeepSeekClient:
         model_config = API_MODELS.get(model_type, API_MODELS["general"])
         model = model_config["primary"]
         
+        # Dedupe and trim the schema context to the configured token budget
+        fitted = fit_schema_context(schema_context, query=user_query)
+        schema_context = fitted.text
+        if fitted.saved_tokens:
+            logger.info(f"Schema context trimmed {fitted.original_tokens} -> {fitted.tokens} tokens "
+                        f"({fitted.dropped_duplicates} duplicate, {fitted.dropped_over_budget} over-budget blocks)")
+        
         # Manufacturing domain-specific system prompt with comprehensive schema awareness
         system_prompt = f"""You are an expert Oracle SQL assistant for a manufacturing company (Chorka Apparel Limited - CAL, Winner, BIP). 
 Generate precise Oracle SQL queries based on user questions and ONLY use tables and columns that exist in the provided schema.
@@ -619,14 +730,32 @@ VALIDATION CHECKLIST:
         
         logger.info(f"Generating SQL for {model_type} query using {model}")
         
+        # Stream the completion and stop at the end of the first complete statement
+        stop = SqlEarlyStop(f"deepseek:{model}") if SQL_STREAM_CONFIG["deepseek_stream"] else None
+        
         response = await self.chat_completion(
             messages=messages, 
             model=model,
             temperature=0.1,  # Low temperature for precise SQL generation
             max_tokens=1024,
-            top_p=0.9
+            top_p=0.9,
+            prompt_tokens_saved=fitted.saved_tokens,
+            stop_when=stop
         )
         
+        if stop is not None and response.success and response.metadata.get("streamed"):
+            stopped_early = response.metadata["stopped_early"]
+            response.metadata["sql_stream"] = stop.finish(
+                response.metadata["token_usage"]["completion_tokens"], stopped_early
+            )
+            if stopped_early:
+                response.content = stop.text.strip()
+        elif stop is not None and response.success:
+            # The stream fell back to the buffered request; still count the run
+            response.metadata["sql_stream"] = stop.finish(
+                response.metadata.get("token_usage", {}).get("completion_tokens", 0), False, buffered=True
+            )
+        
         # Enhance response with token usage information if available
         if response.success and response.metadata and "token_usage" in response.metadata:
             # Add token usage to the response metadata for tracking
@@ -2,6 +2,7 @@
 import logging
 from typing import Dict, Any, Optional, Tuple, List
 from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime
 import re
 import time
@@ -9,7 +10,7 @@ import asyncio
 
 from .query_classifier import QueryClassifier, ConfidenceThresholdManager, QueryIntent, ModelSelectionStrategy
 from .deepseek_client import get_deepseek_client, DeepSeekResponse
-from app.ollama_llm import ask_sql_model
+from app.ollama_llm import ask_sql_model_async
 from app import config
 from app.sql_generator import extract_sql as _extract_sql_basic  # Import the existing function
 
@@ -215,6 +216,178 @@ class ProcessingResult:
     api_completion_tokens: Optional[int] = None
 
 
+# ------------------------------ SQL features ------------------------------
+
+# Every literal the scorers test against the upper-cased SQL. Presence of all of
+# them is computed once per statement; SQLFeatures.has() falls back to a plain
+# substring test for anything not listed here.
+_SQL_VOCAB: Tuple[str, ...] = (
+    # Oracle functions / elements
+    'TO_DATE', 'TO_CHAR', 'SYSDATE', 'ADD_MONTHS', 'MONTHS_BETWEEN', 'DECODE', 'NVL', 'NVL2',
+    'COALESCE', 'CASE', 'TRUNC', 'ROUND', 'DUAL',
+    # Clauses / keywords
+    'SELECT', 'WHERE', 'GROUP BY', 'ORDER BY', 'HAVING', 'DESC', 'ASC', 'SELECT *',
+    'SELECT 1 FROM DUAL', 'COMPANY',
+    'INNER JOIN', 'LEFT JOIN', 'RIGHT JOIN', 'FULL OUTER JOIN',
+    'OVER', 'PARTITION BY', 'ROW_NUMBER', 'RANK', 'LAG', 'LEAD',
+    'MONTH', 'YEAR', 'WEEK', 'QUARTER',
+    # Aggregates
+    'SUM', 'COUNT', 'AVG', 'MAX', 'MIN',
+    # Tables
+    'T_PROD', 'T_PROD_DAILY', 'T_TNA_STATUS', 'EMP', 'T_DEFECT_DETAILS', 'T_EFFICIENCY_LOG',
+    # Columns
+    'PRODUCTION_QTY', 'TOTAL_PRODUCTION', 'DEFECT_QTY', 'TOTAL_DEFECTS', 'DHU', 'FLOOR_EF',
+    'EFFICIENCY', 'FLOOR_NAME', 'PROD_DATE', 'TASK_FINISH_DATE', 'DATE', 'JOB_NO', 'EMP_ID',
+    'CTL_CODE', 'CTL_NUMBER', 'TASK_SHORT_NAME', 'PO_NUMBER', 'BUYER_NAME', 'STYLE_REF',
+    'SALARY', 'WAGE', 'JOB_TITLE', 'FULL_NAME', 'PP APPROVAL', 'PP_APPROVAL',
+)
+_SQL_VOCAB_SET = frozenset(_SQL_VOCAB)
+
+# Literals tested case-sensitively against the original SQL text.
+_SQL_RAW_VOCAB: Tuple[str, ...] = (
+    'WHERE', 'PROD_DATE', 'JOB_NO', 'EMP_ID',
+    'DD-MON-YY', 'DD-MON-YYYY', 'DD/MM/YYYY', 'YYYY-MM-DD',
+    'dd-mon-yy', 'dd-mon-yyyy', 'dd/mm/yyyy', 'yyyy-mm-dd',
+)
+_SQL_RAW_VOCAB_SET = frozenset(_SQL_RAW_VOCAB)
+
+_ORACLE_FUNCTIONS = (
+    'TO_DATE', 'TO_CHAR', 'SYSDATE', 'ADD_MONTHS', 'MONTHS_BETWEEN',
+    'DECODE', 'NVL', 'NVL2', 'COALESCE', 'CASE', 'TRUNC', 'ROUND'
+)
+_DATE_FORMATS = ('DD-MON-YY', 'DD-MON-YYYY', 'DD/MM/YYYY', 'YYYY-MM-DD')
+_MONTHS = ('JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC')
+
+_FIRST_TABLE_RX = re.compile(
+    r'\bFROM\s+([A-Z_][A-Z0-9_]*)(?=\s*(?:AS\b|\bJOIN\b|\bWHERE\b|\bGROUP\b|\bORDER\b|\bHAVING\b|,|\)|$))',
+    re.IGNORECASE
+)
+_TABLE_REF_RX = re.compile(r'\b(FROM|JOIN)\s+([A-Z_][A-Z0-9_]*)')
+_SELECT_LIST_RX = re.compile(r'SELECT\s+(.*?)\s+FROM', re.IGNORECASE | re.DOTALL)
+_SCHEMA_TABLE_RX = re.compile(r'\bTABLE:\s*([A-Z_][A-Z0-9_]*)')
+_DATE_GROUPING_RX = re.compile(
+    r'TO_CHAR\s*\(\s*[A-Z_][A-Z0-9_]*_DATE\s*,\s*\'MON-YYYY\'\s*\)'
+    r'|TRUNC\s*\(\s*[A-Z_][A-Z0-9_]*_DATE\s*,\s*\'MM\'\s*\)'
+    r'|TRUNC\s*\(\s*[A-Z_][A-Z0-9_]*_DATE\s*,\s*\'IW\'\s*\)',
+    re.IGNORECASE
+)
+_PROD_DATE_GROUPING_RX = re.compile(
+    r'TO_CHAR\s*\(\s*PROD_DATE\s*,\s*\'MON-YYYY\'\s*\)'
+    r'|TRUNC\s*\(\s*PROD_DATE\s*,\s*\'MM\'\s*\)'
+    r'|TRUNC\s*\(\s*PROD_DATE\s*,\s*\'IW\'\s*\)'
+)
+_DANGEROUS_PATTERNS = [
+    r'\bDROP\s+TABLE\b', r'\bDELETE\s+FROM\b.*WHERE\s*1\s*=\s*1',
+    r'\bTRUNCATE\b', r'\bALTER\s+TABLE\b', r';\s*--',
+    r'\bUNION\s+ALL\s+SELECT\b.*FROM\s+DUAL'
+]
+# Each pattern paired with a literal it cannot match without, so the regex only
+# runs when that literal is present in the upper-cased SQL.
+_DANGEROUS_RXS = [
+    (p, literal, re.compile(p, re.IGNORECASE))
+    for p, literal in zip(_DANGEROUS_PATTERNS, ('DROP', 'DELETE', 'TRUNCATE', 'ALTER', ';', 'UNION'))
+]
+
+
+@dataclass(frozen=True)
+class SQLFeatures:
+    """Everything the SQLValidator scorers look at, extracted once per statement."""
+    sql: str
+    upper: str
+    is_text: bool
+    tokens: frozenset
+    raw_tokens: frozenset
+    first_table: Optional[str]
+    tables: Tuple[str, ...]
+    select_list: Optional[str]
+    functions: Tuple[str, ...]
+    date_format: Optional[str]
+    month_literal: Optional[str]
+    has_date_grouping: bool
+    has_prod_date_grouping: bool
+    dangerous: Tuple[str, ...]
+    select_count: int
+    join_count: int
+    and_or_count: int
+    like_count: int
+    comma_count: int
+    clause_count: int
+    balanced_parens: bool
+
+    def has(self, token: str) -> bool:
+        """Substring test against the upper-cased SQL."""
+        if token in _SQL_VOCAB_SET:
+            return token in self.tokens
+        return token in self.upper
+
+    def has_raw(self, token: str) -> bool:
+        """Case-sensitive substring test against the original SQL."""
+        if token in _SQL_RAW_VOCAB_SET:
+            return token in self.raw_tokens
+        return token in self.sql
+
+
+@lru_cache(maxsize=512)
+def _extract_sql_features(sql: str) -> SQLFeatures:
+    upper = sql.upper()
+    select_match = _SELECT_LIST_RX.search(upper)
+    tokens = frozenset(t for t in _SQL_VOCAB if t in upper)
+    raw_tokens = frozenset(t for t in _SQL_RAW_VOCAB if t in sql)
+    first_table = _FIRST_TABLE_RX.search(sql)
+    refs = _TABLE_REF_RX.findall(upper)
+    month = next((m for m in _MONTHS if f"'{m}'" in upper or f"'-{m}-'" in upper), None)
+    return SQLFeatures(
+        sql=sql,
+        upper=upper,
+        is_text=True,
+        tokens=tokens,
+        raw_tokens=raw_tokens,
+        first_table=first_table.group(1) if first_table else None,
+        tables=tuple(
+            [name for kw, name in refs if kw == 'FROM'] + [name for kw, name in refs if kw == 'JOIN']
+        ),
+        select_list=select_match.group(1).strip() if select_match else None,
+        functions=tuple(f for f in _ORACLE_FUNCTIONS if f in tokens),
+        date_format=next((p for p in _DATE_FORMATS if p in raw_tokens or p.lower() in raw_tokens), None),
+        month_literal=month,
+        has_date_grouping=bool(_DATE_GROUPING_RX.search(upper)),
+        has_prod_date_grouping=bool(_PROD_DATE_GROUPING_RX.search(upper)),
+        dangerous=tuple(p for p, literal, rx in _DANGEROUS_RXS if literal in upper and rx.search(sql)),
+        select_count=upper.count('SELECT'),
+        join_count=upper.count('JOIN'),
+        and_or_count=upper.count(' AND ') + upper.count(' OR '),
+        like_count=upper.count(' LIKE '),
+        comma_count=upper.count(','),
+        clause_count=upper.count('GROUP BY') + upper.count('ORDER BY') + upper.count('HAVING'),
+        balanced_parens=sql.count('(') == sql.count(')'),
+    )
+
+
+_EMPTY_FEATURES = SQLFeatures(
+    sql="", upper="", is_text=False, tokens=frozenset(), raw_tokens=frozenset(), first_table=None,
+    tables=(), select_list=None, functions=(), date_format=None, month_literal=None,
+    has_date_grouping=False, has_prod_date_grouping=False, dangerous=(), select_count=0,
+    join_count=0, and_or_count=0, like_count=0, comma_count=0, clause_count=0, balanced_parens=True,
+)
+
+
+def sql_features(sql: Any) -> SQLFeatures:
+    """
+    Return the feature record for ``sql`` (memoized; the same SQL is usually scored several times).
+
+    Args:
+        sql: SQL text, or an existing SQLFeatures record (returned unchanged).
+
+    Returns:
+        SQLFeatures for the statement; a non-string input yields an empty record.
+    """
+    if isinstance(sql, SQLFeatures):
+        return sql
+    if not isinstance(sql, str):
+        return _EMPTY_FEATURES
+    return _extract_sql_features(sql)
+
+
 # ------------------------------ SQL Validator ------------------------------
 
 class SQLValidator:
@@ -227,17 +400,6 @@ class SQLValidator:
             'TO_DATE', 'SYSDATE', 'DECODE', 'NVL', 'ROWNUM', 'DUAL'
         }
 
-        # Table patterns for schema compliance validation
-        self.table_patterns = {
-            'T_PROD': r'\bT_PROD\b',
-            'T_PROD_DAILY': r'\bT_PROD_DAILY\b',
-            'T_TNA_STATUS': r'\bT_TNA_STATUS\b',
-            'EMP': r'\bEMP\b',
-            'T_EMP_ATTENDANCE': r'\bT_EMP_ATTENDANCE\b',
-            'T_DEFECT_DETAILS': r'\bT_DEFECT_DETAILS\b',
-            'T_EFFICIENCY_LOG': r'\bT_EFFICIENCY_LOG\b'
-        }
-
         # Dynamic sets (populate from schema when available)
         self.manufacturing_tables = set()
         self.manufacturing_columns = set()
@@ -245,45 +407,33 @@ class SQLValidator:
         self.ctl_pattern = re.compile(r'\bCTL-\d{2}-\d{5,6}\b', re.IGNORECASE)
         self.indexed_columns = set()
 
-        # Safety
-        self.dangerous_patterns = [
-            r'\bDROP\s+TABLE\b', r'\bDELETE\s+FROM\b.*WHERE\s*1\s*=\s*1',
-            r'\bTRUNCATE\b', r'\bALTER\s+TABLE\b', r';\s*--',
-            r'\bUNION\s+ALL\s+SELECT\b.*FROM\s+DUAL'
-        ]
-
-        self.oracle_functions = {
-            'TO_DATE', 'TO_CHAR', 'SYSDATE', 'ADD_MONTHS', 'MONTHS_BETWEEN',
-            'DECODE', 'NVL', 'NVL2', 'COALESCE', 'CASE', 'TRUNC', 'ROUND'
-        }
+        # Safety (compiled at import time, see _DANGEROUS_RXS)
+        self.dangerous_patterns = _DANGEROUS_PATTERNS
+        self.oracle_functions = set(_ORACLE_FUNCTIONS)
 
     def _first_table_after_from(self, sql: str) -> Optional[str]:
         """
         Return the first base table name that appears immediately after FROM,
         ignoring whitespace, aliases, commas, and JOIN keywords.
         """
-        m = re.search(
-            r'\bFROM\s+([A-Z_][A-Z0-9_]*)(?=\s*(?:AS\b|\bJOIN\b|\bWHERE\b|\bGROUP\b|\bORDER\b|\bHAVING\b|,|\)|$))',
-            sql,
-            re.IGNORECASE
-        )
-        return m.group(1) if m else None
+        return sql_features(sql).first_table
 
 
     def validate_sql(self, sql: str, query_context: Dict[str, Any]) -> ResponseMetrics:
         reasoning: List[str] = []
+        f = sql_features(sql)
 
-        sql_validity_score = self._assess_sql_validity(sql, reasoning)
-        schema_compliance_score = self._assess_schema_compliance(sql, query_context, reasoning)
-        business_logic_score = self._assess_business_logic(sql, query_context, reasoning)
-        performance_score = self._assess_performance_potential(sql, reasoning)
+        sql_validity_score = self._assess_sql_validity(f, reasoning)
+        schema_compliance_score = self._assess_schema_compliance(f, query_context, reasoning)
+        business_logic_score = self._assess_business_logic(f, query_context, reasoning)
+        performance_score = self._assess_performance_potential(f, reasoning)
 
-        technical_validation_score = self._assess_technical_validation(sql, reasoning)
-        manufacturing_domain_score = self._assess_manufacturing_domain(sql, query_context, reasoning)
-        query_safety_score = self._assess_query_safety(sql, reasoning)
-        execution_time_prediction = self._predict_execution_time(sql, query_context)
-        user_satisfaction_prediction = self._predict_user_satisfaction(sql, query_context)
-        relevance_score = self._assess_relevance(sql, query_context, reasoning)
+        technical_validation_score = self._assess_technical_validation(f, reasoning)
+        manufacturing_domain_score = self._assess_manufacturing_domain(f, query_context, reasoning)
+        query_safety_score = self._assess_query_safety(f, reasoning)
+        execution_time_prediction = self._predict_execution_time(f, query_context)
+        user_satisfaction_prediction = self._predict_user_satisfaction(f, query_context)
+        relevance_score = self._assess_relevance(f, query_context, reasoning)
 
         overall_score = (
             sql_validity_score * 0.20 +
@@ -311,110 +461,90 @@ class SQLValidator:
             relevance_score=relevance_score
         )
 
-    def _assess_technical_validation(self, sql: str, reasoning: List[str]) -> float:
+    def _assess_technical_validation(self, sql: Any, reasoning: List[str]) -> float:
         score = 0.5
-        sql_upper = sql.upper()
+        f = sql_features(sql)
+        t = f.tokens
 
-        oracle_functions_used = 0
-        for func in self.oracle_functions:
-            if func in sql_upper:
-                oracle_functions_used += 1
-                score += 0.06
-                reasoning.append(f"Uses Oracle function: {func}")
+        for func in f.functions:
+            score += 0.06
+            reasoning.append(f"Uses Oracle function: {func}")
 
-        if 'TO_DATE' in sql_upper:
-            date_format_patterns = ['DD-MON-YY', 'DD-MON-YYYY', 'DD/MM/YYYY', 'YYYY-MM-DD']
+        if 'TO_DATE' in t:
             found_format = False
-            for pattern in date_format_patterns:
-                if pattern in sql or pattern.lower() in sql:
-                    found_format = True
-                    score += 0.2
-                    reasoning.append(f"Proper Oracle date format: {pattern}")
-                    break
+            if f.date_format:
+                found_format = True
+                score += 0.2
+                reasoning.append(f"Proper Oracle date format: {f.date_format}")
 
-            for mon in ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']:
-                if f"'{mon}'" in sql_upper or f"'-{mon}-'" in sql_upper:
-                    score += 0.1
-                    reasoning.append(f"Uses correct month abbreviation: {mon}")
-                    found_format = True
-                    break
+            if f.month_literal:
+                score += 0.1
+                reasoning.append(f"Uses correct month abbreviation: {f.month_literal}")
+                found_format = True
 
             if not found_format:
                 score -= 0.05
                 reasoning.append("TO_DATE without proper format")
 
-        advanced_functions = ['ADD_MONTHS', 'MONTHS_BETWEEN', 'ROUND', 'TRUNC']
-        advanced_used = sum(1 for f in advanced_functions if f in sql_upper)
+        advanced_used = len(t.intersection(('ADD_MONTHS', 'MONTHS_BETWEEN', 'ROUND', 'TRUNC')))
         if advanced_used > 0:
             score += min(advanced_used * 0.08, 0.15)
             reasoning.append(f"Uses advanced Oracle functions ({advanced_used})")
 
-        join_types = ['INNER JOIN', 'LEFT JOIN', 'RIGHT JOIN', 'FULL OUTER JOIN']
-        proper_joins = sum(1 for jt in join_types if jt in sql_upper)
+        proper_joins = len(t.intersection(('INNER JOIN', 'LEFT JOIN', 'RIGHT JOIN', 'FULL OUTER JOIN')))
         if proper_joins > 0:
             score += min(proper_joins * 0.12, 0.25)
             reasoning.append(f"Uses proper JOIN syntax ({proper_joins} joins)")
 
-        if 'GROUP BY' in sql_upper and 'HAVING' in sql_upper:
+        if 'GROUP BY' in t and 'HAVING' in t:
             score += 0.1
             reasoning.append("Uses advanced GROUP BY with HAVING")
 
-        if 'SELECT' in sql_upper:
-            if sql_upper.count('SELECT') > 1:
-                if '(' in sql and ')' in sql:
-                    score += 0.12
-                    reasoning.append("Properly structured subqueries")
-                else:
-                    score -= 0.1
-                    reasoning.append("Potential subquery syntax issues")
+        if f.select_count > 1:
+            if '(' in f.sql and ')' in f.sql:
+                score += 0.12
+                reasoning.append("Properly structured subqueries")
+            else:
+                score -= 0.1
+                reasoning.append("Potential subquery syntax issues")
 
         # Enhanced time-series and trend analysis detection
-        time_series_indicators = ['TO_CHAR', 'TRUNC', 'ADD_MONTHS', 'MONTHS_BETWEEN']
-        time_series_used = sum(1 for ind in time_series_indicators if ind in sql_upper)
+        time_series_used = len(t.intersection(('TO_CHAR', 'TRUNC', 'ADD_MONTHS', 'MONTHS_BETWEEN')))
         if time_series_used > 0:
             score += min(time_series_used * 0.1, 0.2)
             reasoning.append(f"Uses time-series functions ({time_series_used} functions)")
 
         # Enhanced date grouping patterns for trend analysis
-        if 'GROUP BY' in sql_upper:
-            date_grouping_patterns = [
-                r'TO_CHAR\s*\(\s*[A-Z_][A-Z0-9_]*_DATE\s*,\s*\'MON-YYYY\'\s*\)',
-                r'TRUNC\s*\(\s*[A-Z_][A-Z0-9_]*_DATE\s*,\s*\'MM\'\s*\)',
-                r'TRUNC\s*\(\s*[A-Z_][A-Z0-9_]*_DATE\s*,\s*\'IW\'\s*\)'
-            ]
-            for pattern in date_grouping_patterns:
-                if re.search(pattern, sql_upper, re.IGNORECASE):
-                    score += 0.15
-                    reasoning.append("Uses appropriate date grouping for trend analysis")
-                    break
+        if 'GROUP BY' in t and f.has_date_grouping:
+            score += 0.15
+            reasoning.append("Uses appropriate date grouping for trend analysis")
 
         # Enhanced window function detection for trend analysis
-        window_functions = ['OVER', 'PARTITION BY', 'ROW_NUMBER', 'RANK', 'LAG', 'LEAD']
-        window_used = sum(1 for wf in window_functions if wf in sql_upper)
+        window_used = len(t.intersection(('OVER', 'PARTITION BY', 'ROW_NUMBER', 'RANK', 'LAG', 'LEAD')))
         if window_used > 0:
             score += min(window_used * 0.08, 0.2)
             reasoning.append(f"Uses window functions for trend analysis ({window_used} functions)")
 
         # Enhanced ordering for time-series data
-        if 'ORDER BY' in sql_upper:
+        if 'ORDER BY' in t:
             # Check for date-based ordering
-            date_columns = ['PROD_DATE', 'TASK_FINISH_DATE', 'DATE']
-            if any(col in sql_upper for col in date_columns):
+            if not t.isdisjoint(('PROD_DATE', 'TASK_FINISH_DATE', 'DATE')):
                 score += 0.1
                 reasoning.append("Orders by date column for time-series analysis")
 
         return max(0.0, min(score, 1.0))
 
-    def _assess_manufacturing_domain(self, sql: str, query_context: Dict[str, Any], reasoning: List[str]) -> float:
+    def _assess_manufacturing_domain(self, sql: Any, query_context: Dict[str, Any], reasoning: List[str]) -> float:
         score = 0.0
         entities = query_context.get('entities', {})
         intent = query_context.get('intent')
         user_query = query_context.get('user_query', '').lower()
-        sql_upper = sql.upper()
+        f = sql_features(sql)
+        t = f.tokens
 
         companies_mentioned = entities.get('companies', [])
         for company in companies_mentioned:
-            if company.upper() in sql_upper:
+            if company.upper() in f.upper:
                 score += 0.3
                 reasoning.append(f"Accurately recognizes company: {company}")
 
@@ -427,12 +557,12 @@ class SQLValidator:
         for company_code, patterns in company_patterns.items():
             if any(pattern in user_query for pattern in patterns):
                 # Check for flexible company matching in SQL
-                if f"UPPER(FLOOR_NAME) LIKE '%{company_code}%'" in sql_upper or company_code.upper() in sql_upper:
+                if f"UPPER(FLOOR_NAME) LIKE '%{company_code}%'" in f.upper or company_code.upper() in f.upper:
                     score += 0.2
                     reasoning.append(f"Uses flexible company pattern matching for {company_code}")
 
         if intent == QueryIntent.PRODUCTION_QUERY or intent == 'production_query' or intent == 'floor_production_summary':
-            if any(t in sql_upper for t in ['T_PROD', 'T_PROD_DAILY']):
+            if not t.isdisjoint(('T_PROD', 'T_PROD_DAILY')):
                 score += 0.25
                 reasoning.append("Uses appropriate production tables")
 
@@ -443,11 +573,11 @@ class SQLValidator:
                 'DHU': ['dhu', 'defect per hundred', 'defect rate'],
                 'FLOOR_EF': ['efficiency', 'ef', 'floor ef']
             }
-            
+
             # Check for proper metric usage based on query context
             metrics_used = []
             for metric, keywords in production_metrics.items():
-                if metric in sql_upper:
+                if metric in t:
                     metrics_used.append(metric)
                     # Check if the query context matches the metric
                     if any(keyword in user_query for keyword in keywords):
@@ -461,9 +591,9 @@ class SQLValidator:
             if 'DHU' in metrics_used and ('DEFECT_QTY' in metrics_used or 'PRODUCTION_QTY' in metrics_used):
                 score += 0.1
                 reasoning.append("Correctly relates DHU with defect/production quantities")
-            
+
             # Check for proper aggregation in production queries
-            if 'GROUP BY' in sql_upper and 'FLOOR_NAME' in sql_upper:
+            if 'GROUP BY' in t and 'FLOOR_NAME' in t:
                 score += 0.15
                 reasoning.append("Properly groups by FLOOR_NAME for production analysis")
 
@@ -471,135 +601,123 @@ class SQLValidator:
             trend_indicators = entities.get('trend_indicators', [])
             if trend_indicators:
                 # Check for date-based grouping
-                date_grouping_patterns = [
-                    r'TO_CHAR\s*\(\s*PROD_DATE\s*,\s*\'MON-YYYY\'\s*\)',
-                    r'TRUNC\s*\(\s*PROD_DATE\s*,\s*\'MM\'\s*\)',
-                    r'TRUNC\s*\(\s*PROD_DATE\s*,\s*\'IW\'\s*\)'
-                ]
-                for pattern in date_grouping_patterns:
-                    if re.search(pattern, sql_upper):
-                        score += 0.2
-                        reasoning.append("Uses appropriate date grouping for production trend analysis")
-                        break
-                
+                if f.has_prod_date_grouping:
+                    score += 0.2
+                    reasoning.append("Uses appropriate date grouping for production trend analysis")
+
                 # Check for time-based ordering
-                if 'ORDER BY' in sql_upper and 'PROD_DATE' in sql_upper:
+                if 'ORDER BY' in t and 'PROD_DATE' in t:
                     score += 0.1
                     reasoning.append("Orders production data by date for trend analysis")
 
         if intent == QueryIntent.TNA_TASK_QUERY or intent == 'tna_task_query':
-            if 'T_TNA_STATUS' in sql_upper:
+            if 'T_TNA_STATUS' in t:
                 score += 0.3
                 reasoning.append("Uses TNA status table")
-            
+
             ctl_codes = entities.get('ctl_codes', [])
             for ctl in ctl_codes:
-                if ctl.upper() in sql_upper:
+                if ctl.upper() in f.upper:
                     score += 0.3
                     reasoning.append(f"Handles CTL code: {ctl}")
-            
+
             # Enhanced CTL code validation and business context awareness
-            if ctl_codes and 'WHERE' in sql_upper:
+            if ctl_codes and 'WHERE' in t:
                 # Check for proper CTL code filtering
-                ctl_columns = ['JOB_NO', 'CTL_NUMBER', 'CTL_CODE']
-                if any(col in sql_upper for col in ctl_columns):
+                if not t.isdisjoint(('JOB_NO', 'CTL_NUMBER', 'CTL_CODE')):
                     score += 0.2
                     reasoning.append("Uses appropriate CTL code filtering columns")
-            
-            tna_columns = ['TASK_SHORT_NAME', 'TASK_FINISH_DATE', 'JOB_NO', 'PO_NUMBER', 'BUYER_NAME', 'STYLE_REF']
-            used = sum(1 for c in tna_columns if c in sql_upper)
+
+            used = len(t.intersection(('TASK_SHORT_NAME', 'TASK_FINISH_DATE', 'JOB_NO', 'PO_NUMBER', 'BUYER_NAME', 'STYLE_REF')))
             if used > 0:
                 score += min(used * 0.08, 0.2)
                 reasoning.append(f"Uses TNA-specific columns ({used} columns)")
-            
-            if 'PP APPROVAL' in sql_upper or 'PP_APPROVAL' in sql_upper:
+
+            if 'PP APPROVAL' in t or 'PP_APPROVAL' in t:
                 score += 0.15
                 reasoning.append("Handles PP Approval tasks specifically")
-            
+
             # Business context awareness for TNA tasks
-            if 'TASK_FINISH_DATE' in sql_upper and 'ORDER BY' in sql_upper:
+            if 'TASK_FINISH_DATE' in t and 'ORDER BY' in t:
                 score += 0.1
                 reasoning.append("Properly orders TNA tasks by finish date")
 
         if intent == QueryIntent.HR_EMPLOYEE_QUERY or intent == 'hr_employee_query':
-            if 'EMP' in sql_upper:
+            if 'EMP' in t:
                 score += 0.25
                 reasoning.append("Uses employee table")
-            hr_columns = ['SALARY', 'JOB_TITLE', 'FULL_NAME', 'EMP_ID']
-            used = sum(1 for c in hr_columns if c in sql_upper)
+            used = len(t.intersection(('SALARY', 'JOB_TITLE', 'FULL_NAME', 'EMP_ID')))
             if used > 0:
                 score += min(used * 0.1, 0.2)
                 reasoning.append(f"Uses HR-specific columns ({used} columns)")
 
         dates_mentioned = entities.get('dates', [])
-        if dates_mentioned and 'WHERE' in sql_upper:
+        if dates_mentioned and 'WHERE' in t:
             score += 0.2
             reasoning.append("Incorporates date context in filtering")
-            
+
             # Enhanced date handling validation
-            if 'PROD_DATE' in sql_upper and any(t in sql_upper for t in ['T_PROD', 'T_PROD_DAILY']):
+            if 'PROD_DATE' in t and not t.isdisjoint(('T_PROD', 'T_PROD_DAILY')):
                 score += 0.1
                 reasoning.append("Uses appropriate date column for production tables")
 
         # Enhanced multi-field query handling
         multi_field_indicators = ['vs', 'versus', 'compare', ' and ', '&', ' with ', 'vs.']
         has_multi_fields = any(ind in user_query for ind in multi_field_indicators)
-        if has_multi_fields:
-            select_match = re.search(r'SELECT\s+(.*?)\s+FROM', sql_upper, re.IGNORECASE | re.DOTALL)
-            if select_match:
-                select_content = select_match.group(1).strip()
-                if ',' in select_content:
-                    score += 0.2
-                    reasoning.append("Properly handles multi-field query with multiple SELECT columns")
-                elif select_content.count(' ') > 2:  # Complex single field (e.g., SUM(x) as total)
-                    score += 0.1
-                    reasoning.append("Handles complex single-field query in multi-field context")
+        if has_multi_fields and f.select_list is not None:
+            select_content = f.select_list
+            if ',' in select_content:
+                score += 0.2
+                reasoning.append("Properly handles multi-field query with multiple SELECT columns")
+            elif select_content.count(' ') > 2:  # Complex single field (e.g., SUM(x) as total)
+                score += 0.1
+                reasoning.append("Handles complex single-field query in multi-field context")
 
         # Enhanced trend analysis detection
         trend_indicators = entities.get('trend_indicators', [])
         if trend_indicators:
             # Check for time-series functions
-            time_series_functions = ['TO_CHAR', 'TRUNC', 'ADD_MONTHS', 'MONTHS_BETWEEN']
-            if any(func in sql_upper for func in time_series_functions):
+            if not t.isdisjoint(('TO_CHAR', 'TRUNC', 'ADD_MONTHS', 'MONTHS_BETWEEN')):
                 score += 0.15
                 reasoning.append("Uses time-series functions for trend analysis")
-            
+
             # Check for grouping by time periods
-            if 'GROUP BY' in sql_upper:
-                time_groupings = ['MONTH', 'YEAR', 'WEEK', 'QUARTER']
-                if any(group in sql_upper for group in time_groupings):
+            if 'GROUP BY' in t:
+                if not t.isdisjoint(('MONTH', 'YEAR', 'WEEK', 'QUARTER')):
                     score += 0.1
                     reasoning.append("Groups by time periods for trend analysis")
 
         return min(score, 1.0)
 
-    def _assess_query_safety(self, sql: str, reasoning: List[str]) -> float:
+    def _assess_query_safety(self, sql: Any, reasoning: List[str]) -> float:
         score = 1.0
-        for pattern in self.dangerous_patterns:
-            if re.search(pattern, sql, re.IGNORECASE):
-                score -= 0.3
-                reasoning.append(f"Potential security risk: {pattern}")
+        f = sql_features(sql)
+        t = f.tokens
+        for pattern in f.dangerous:
+            score -= 0.3
+            reasoning.append(f"Potential security risk: {pattern}")
 
-        if "'" in sql and 'TO_DATE' not in sql.upper():
+        if "'" in f.sql and not 'TO_DATE' in t:
             score -= 0.1
             reasoning.append("Unescaped string literals (injection risk)")
 
-        if sql.upper().strip().startswith('SELECT'):
+        if f.upper.strip().startswith('SELECT'):
             pass  # safe
         else:
             score -= 0.2
             reasoning.append("Non-SELECT operation (higher risk)")
 
-        if 'WHERE' not in sql.upper() and 'T_PROD' in sql.upper():
+        if not 'WHERE' in t and 'T_PROD' in t:
             score -= 0.1
             reasoning.append("Missing WHERE clause on large table")
 
         return max(0.0, min(score, 1.0))
 
-    def _predict_execution_time(self, sql: str, query_context: Dict[str, Any]) -> float:
+    def _predict_execution_time(self, sql: Any, query_context: Dict[str, Any]) -> float:
         base_time = 0.5
-        sql_upper = sql.upper()
-        
+        f = sql_features(sql)
+        t = f.tokens
+
         # Enhanced table-based time prediction
         table_times = {
             'T_PROD': 2.0,
@@ -609,100 +727,90 @@ class SQLValidator:
             'T_DEFECT_DETAILS': 2.5,
             'T_EFFICIENCY_LOG': 2.0
         }
-        
+
         for table, time_value in table_times.items():
-            if table in sql_upper:
+            if table in t:
                 base_time += time_value
 
         # Enhanced JOIN complexity prediction
-        join_count = sql_upper.count('JOIN')
-        base_time += join_count * 0.8
-        
+        base_time += f.join_count * 0.8
+
         # Enhanced WHERE clause analysis
-        if 'WHERE' in sql_upper:
+        if 'WHERE' in t:
             # Count complex conditions
-            complex_conditions = sql_upper.count(' AND ') + sql_upper.count(' OR ')
-            base_time += complex_conditions * 0.3
-            
+            base_time += f.and_or_count * 0.3
+
             # Check for indexed column usage
-            indexed_columns = ['PROD_DATE', 'JOB_NO', 'EMP_ID', 'CTL_CODE', 'FLOOR_NAME']
-            indexed_filters = sum(1 for col in indexed_columns if col in sql_upper)
+            indexed_filters = len(t.intersection(('PROD_DATE', 'JOB_NO', 'EMP_ID', 'CTL_CODE', 'FLOOR_NAME')))
             base_time -= indexed_filters * 0.25  # Indexes reduce time
-            
+
             # Check for LIKE operations (slower)
-            like_operations = sql_upper.count(' LIKE ')
-            base_time += like_operations * 0.5
+            base_time += f.like_count * 0.5
 
         # Enhanced aggregation analysis
-        agg_operations = ['SUM', 'COUNT', 'AVG', 'MAX', 'MIN']
-        agg_count = sum(1 for agg in agg_operations if agg in sql_upper)
+        agg_count = len(t.intersection(('SUM', 'COUNT', 'AVG', 'MAX', 'MIN')))
         base_time += agg_count * 0.4
-        
+
         # GROUP BY complexity
-        if 'GROUP BY' in sql_upper:
-            group_fields = sql_upper.count(',')
-            base_time += 0.5 + (group_fields * 0.3)
-            
+        if 'GROUP BY' in t:
+            base_time += 0.5 + (f.comma_count * 0.3)
+
         # ORDER BY complexity
-        if 'ORDER BY' in sql_upper:
-            order_fields = sql_upper.count(',')
-            base_time += 0.3 + (order_fields * 0.2)
+        if 'ORDER BY' in t:
+            base_time += 0.3 + (f.comma_count * 0.2)
 
         return max(0.1, base_time)
 
 
-    def _predict_user_satisfaction(self, sql: str, query_context: Dict[str, Any]) -> float:
+    def _predict_user_satisfaction(self, sql: Any, query_context: Dict[str, Any]) -> float:
         score = 0.5
         intent = query_context.get('intent')
         entities = query_context.get('entities', {})
         user_query = query_context.get('user_query', '').lower()
-        sql_upper = sql.upper()
+        f = sql_features(sql)
+        t = f.tokens
 
         # Enhanced intent matching
-        if intent in (QueryIntent.PRODUCTION_QUERY, 'production_query') and 'PRODUCTION_QTY' in sql_upper:
+        if intent in (QueryIntent.PRODUCTION_QUERY, 'production_query') and 'PRODUCTION_QTY' in t:
             score += 0.25
-        elif intent in (QueryIntent.TNA_TASK_QUERY, 'tna_task_query') and 'T_TNA_STATUS' in sql_upper:
+        elif intent in (QueryIntent.TNA_TASK_QUERY, 'tna_task_query') and 'T_TNA_STATUS' in t:
             score += 0.25
-        elif intent in (QueryIntent.HR_EMPLOYEE_QUERY, 'hr_employee_query') and 'EMP' in sql_upper:
+        elif intent in (QueryIntent.HR_EMPLOYEE_QUERY, 'hr_employee_query') and 'EMP' in t:
             score += 0.25
 
         # Enhanced company recognition
         for company in entities.get('companies', []):
-            if company.upper() in sql_upper:
+            if company.upper() in f.upper:
                 score += 0.15
 
         # Enhanced date handling
-        if entities.get('dates') and 'WHERE' in sql_upper:
+        if entities.get('dates') and 'WHERE' in t:
             score += 0.15
 
         # Enhanced ordering validation
-        if 'ORDER BY' in sql_upper:
+        if 'ORDER BY' in t:
             score += 0.1
             # Check if ordering makes sense for the query type
-            if intent in (QueryIntent.PRODUCTION_QUERY, 'production_query') and ('PRODUCTION_QTY' in sql_upper or 'DEFECT_QTY' in sql_upper):
-                if 'DESC' in sql_upper:
+            if intent in (QueryIntent.PRODUCTION_QUERY, 'production_query') and ('PRODUCTION_QTY' in t or 'DEFECT_QTY' in t):
+                if 'DESC' in t:
                     score += 0.05  # Descending order often preferred for production data
-            elif intent in (QueryIntent.TNA_TASK_QUERY, 'tna_task_query') and 'TASK_FINISH_DATE' in sql_upper:
-                if 'ASC' in sql_upper:
+            elif intent in (QueryIntent.TNA_TASK_QUERY, 'tna_task_query') and 'TASK_FINISH_DATE' in t:
+                if 'ASC' in t:
                     score += 0.05  # Ascending order for task dates
 
         # Enhanced grouping validation
-        if 'GROUP BY' in sql_upper and intent in (QueryIntent.PRODUCTION_QUERY, 'production_query', 'floor_production_summary'):
+        if 'GROUP BY' in t and intent in (QueryIntent.PRODUCTION_QUERY, 'production_query', 'floor_production_summary'):
             score += 0.15
             # Check if grouping is by appropriate columns
-            if 'FLOOR_NAME' in sql_upper:
+            if 'FLOOR_NAME' in t:
                 score += 0.05
 
         # Enhanced multi-field handling
         multi_field_indicators = ['vs', 'versus', 'compare', ' and ', '&', ' with ', 'vs.']
         has_multi_fields = any(ind in user_query for ind in multi_field_indicators)
-        if has_multi_fields:
-            select_match = re.search(r'SELECT\s+(.*?)\s+FROM', sql_upper, re.IGNORECASE | re.DOTALL)
-            if select_match:
-                select_content = select_match.group(1).strip()
-                if ',' in select_content and select_content.count(',') >= 1:
-                    score += 0.2
-                    # Removed invalid reference to 'reasoning' variable
+        if has_multi_fields and f.select_list is not None:
+            if ',' in f.select_list:
+                score += 0.2
 
         # Enhanced metric selection based on query context
         query_metrics = {
@@ -711,38 +819,35 @@ class SQLValidator:
             'efficiency': ['FLOOR_EF', 'EFFICIENCY'],
             'salary': ['SALARY', 'WAGE']
         }
-        
+
         for keyword, metrics in query_metrics.items():
             if keyword in user_query:
-                if any(metric in sql_upper for metric in metrics):
+                if not t.isdisjoint(metrics):
                     score += 0.1
                 break
 
         return max(0.0, min(score, 1.0))
 
-    def _assess_relevance(self, sql: str, query_context: Dict[str, Any], reasoning: List[str]) -> float:
+    def _assess_relevance(self, sql: Any, query_context: Dict[str, Any], reasoning: List[str]) -> float:
         score = 0.5
         user_query = query_context.get('user_query', '').lower()
-
-        query_keywords = ['production', 'defect', 'efficiency', 'salary', 'task', 'approval', 'employee']
-        relevant = 0
-        for kw in query_keywords:
-            if kw in user_query:
-                if kw == 'production' and 'PRODUCTION_QTY' in sql.upper():
-                    relevant += 1
-                elif kw == 'defect' and 'DEFECT_QTY' in sql.upper():
-                    relevant += 1
-                elif kw == 'salary' and 'SALARY' in sql.upper():
-                    relevant += 1
-                elif kw == 'task' and 'TASK_SHORT_NAME' in sql.upper():
-                    relevant += 1
-                elif kw == 'employee' and 'EMP' in sql.upper():
-                    relevant += 1
+        f = sql_features(sql)
+        t = f.tokens
+
+        # query keyword -> column that makes the SQL relevant to it
+        keyword_columns = {
+            'production': 'PRODUCTION_QTY',
+            'defect': 'DEFECT_QTY',
+            'salary': 'SALARY',
+            'task': 'TASK_SHORT_NAME',
+            'employee': 'EMP',
+        }
+        relevant = sum(1 for kw, col in keyword_columns.items() if kw in user_query and col in t)
         if relevant > 0:
             score += min(relevant * 0.1, 0.3)
             reasoning.append(f"Relevant to query keywords ({relevant} matches)")
 
-        if 'SELECT *' in sql.upper():
+        if 'SELECT *' in t:
             score -= 0.1
             reasoning.append("Generic column selection (less specific)")
         else:
@@ -751,20 +856,22 @@ class SQLValidator:
 
         return max(0.0, min(score, 1.0))
 
-    def _assess_sql_validity(self, sql: str, reasoning: List[str]) -> float:
+    def _assess_sql_validity(self, sql: Any, reasoning: List[str]) -> float:
         score = 0.0
-        if not sql or not isinstance(sql, str):
+        f = sql_features(sql)
+        t = f.tokens
+        if not f.is_text or not f.sql:
             reasoning.append("Empty or invalid SQL")
             return 0.0
 
-        sql_upper = sql.upper().strip()
+        sql_upper = f.upper.strip()
 
-        if '...' in sql:
+        if '...' in f.sql:
             reasoning.append("Incomplete SQL with ellipsis")
             return 0.0
 
         # Check for truncated SQL ending with comma
-        if sql.endswith(','):
+        if f.sql.endswith(','):
             reasoning.append("Truncated SQL ending with comma")
             return 0.0
 
@@ -775,37 +882,34 @@ class SQLValidator:
             reasoning.append("Missing SELECT statement")
             return 0.0
 
-        # ✅ Correct FROM parsing (uses helper)
-        first_table = self._first_table_after_from(sql)
-        if first_table:
+        # ✅ Correct FROM parsing
+        if f.first_table:
             score += 0.3
-            reasoning.append(f"Has FROM clause with table: {first_table}")
+            reasoning.append(f"Has FROM clause with table: {f.first_table}")
         else:
             reasoning.append("Missing or malformed FROM clause")
             return 0.0
 
-        if sql.count('(') == sql.count(')'):
+        if f.balanced_parens:
             score += 0.2
             reasoning.append("Balanced parentheses")
         else:
             reasoning.append("Unbalanced parentheses")
             score -= 0.2
 
-        oracle_elements = ['TO_DATE', 'SYSDATE', 'DUAL', 'NVL', 'DECODE']
-        oracle_count = sum(1 for el in oracle_elements if el in sql_upper)
+        oracle_count = len(t.intersection(('TO_DATE', 'SYSDATE', 'DUAL', 'NVL', 'DECODE')))
         if oracle_count > 0:
             score += min(oracle_count * 0.1, 0.3)
             reasoning.append(f"Uses Oracle-specific elements ({oracle_count})")
 
-        for kw in ['SELECT ', 'FROM ', 'WHERE ', 'GROUP ', 'ORDER ', 'HAVING ']:
-            if sql_upper.strip().endswith(kw.strip()):
-                reasoning.append(f"Incomplete SQL ending with {kw.strip()}")
+        for kw in ['SELECT', 'FROM', 'WHERE', 'GROUP', 'ORDER', 'HAVING']:
+            if sql_upper.endswith(kw):
+                reasoning.append(f"Incomplete SQL ending with {kw}")
                 return 0.0
 
         # Multi-field completeness check
-        sm = re.search(r'SELECT\s+(.*?)\s+FROM', sql_upper, re.IGNORECASE | re.DOTALL)
-        if sm:
-            select_content = sm.group(1).strip()
+        if f.select_list is not None:
+            select_content = f.select_list
             if ',' in select_content:
                 if select_content.endswith(',') or any(select_content.endswith(kw) for kw in ['SELECT', 'AS']):
                     reasoning.append("Incomplete multi-field SELECT clause")
@@ -813,9 +917,10 @@ class SQLValidator:
 
         return max(0.0, min(score, 1.0))
 
-    def _assess_schema_compliance(self, sql: str, query_context: Dict[str, Any], reasoning: List[str]) -> float:
+    def _assess_schema_compliance(self, sql: Any, query_context: Dict[str, Any], reasoning: List[str]) -> float:
         score = 0.5
-        sql_upper = sql.upper()
+        f = sql_features(sql)
+        t = f.tokens
         user_query = query_context.get('user_query', '').lower()
 
         # Detect multi-field intent
@@ -823,102 +928,96 @@ class SQLValidator:
         has_multi_fields = any(ind in user_query for ind in multi_field_indicators)
 
         # Hard penalty: SELECT 1 FROM DUAL for multi-field user ask
-        if has_multi_fields and "SELECT 1 FROM DUAL" in sql_upper:
+        if has_multi_fields and "SELECT 1 FROM DUAL" in t:
             reasoning.append("❌ CRITICAL: Using SELECT 1 FROM DUAL for a multi-field query")
             return 0.0
 
-        if 'COMPANY' in sql_upper and 'T_PROD' in sql_upper:
+        if 'COMPANY' in t and 'T_PROD' in t:
             score -= 0.5
             reasoning.append("❌ CRITICAL: Uses non-existent COMPANY column in production tables")
             reasoning.append("💡 Should use FLOOR_NAME for company grouping instead")
 
         # Validate tables
-        tables = re.findall(r'\bFROM\s+([A-Z_][A-Z0-9_]*)', sql_upper)
-        tables += re.findall(r'\bJOIN\s+([A-Z_][A-Z0-9_]*)', sql_upper)
-
         schema_context = query_context.get('schema_context', '')
         valid_tables_from_schema: List[str] = []
         if schema_context:
-            valid_tables_from_schema = re.findall(r'\bTABLE:\s*([A-Z_][A-Z0-9_]*)', schema_context)
+            valid_tables_from_schema = _SCHEMA_TABLE_RX.findall(schema_context)
 
-        for t in tables:
-            if t in self.manufacturing_tables:
+        for table in f.tables:
+            if table in self.manufacturing_tables:
                 score += 0.1
-                reasoning.append(f"✅ Valid manufacturing table: {t}")
-            elif valid_tables_from_schema and t in valid_tables_from_schema:
+                reasoning.append(f"✅ Valid manufacturing table: {table}")
+            elif valid_tables_from_schema and table in valid_tables_from_schema:
                 score += 0.1
-                reasoning.append(f"✅ Schema-validated table: {t}")
+                reasoning.append(f"✅ Schema-validated table: {table}")
             else:
                 score -= 0.1
-                reasoning.append(f"⚠️ Unvalidated table reference: {t}")
+                reasoning.append(f"⚠️ Unvalidated table reference: {table}")
 
-        if 'FLOOR_NAME' in sql_upper:
+        if 'FLOOR_NAME' in t:
             score += 0.2
             reasoning.append("✅ Uses correct FLOOR_NAME column for grouping")
 
         for col in ['PRODUCTION_QTY', 'DEFECT_QTY', 'DHU', 'FLOOR_EF']:
-            if col in sql_upper:
+            if col in t:
                 score += 0.05
                 reasoning.append(f"✅ Valid production metric: {col}")
 
-        if any(col in sql_upper for col in ['PROD_DATE', 'TASK_FINISH_DATE']):
+        if not t.isdisjoint(('PROD_DATE', 'TASK_FINISH_DATE')):
             score += 0.1
             reasoning.append("✅ Uses appropriate date column")
 
         return min(score, 1.0)
 
-    def _assess_business_logic(self, sql: str, query_context: Dict[str, Any], reasoning: List[str]) -> float:
+    def _assess_business_logic(self, sql: Any, query_context: Dict[str, Any], reasoning: List[str]) -> float:
         score = 0.0
         entities = query_context.get('entities', {})
         user_query = query_context.get('user_query', '').lower()
-        sql_upper = sql.upper()
+        f = sql_features(sql)
+        t = f.tokens
 
         # Enhanced company recognition
         if entities.get('companies'):
             for company in entities['companies']:
-                if company.upper() in sql_upper:
+                if company.upper() in f.upper:
                     score += 0.3
                     reasoning.append(f"Recognizes company: {company}")
                     break
                 # Check for flexible company pattern matching
-                elif any(pattern in sql_upper for pattern in [f"LIKE '%{company.upper()}%'", f"LIKE '%{company}%'"]):
+                elif any(pattern in f.upper for pattern in [f"LIKE '%{company.upper()}%'", f"LIKE '%{company}%'"]):
                     score += 0.25
                     reasoning.append(f"Uses flexible company pattern matching: {company}")
 
         # Enhanced CTL code handling
         if entities.get('ctl_codes'):
             for ctl in entities['ctl_codes']:
-                if ctl.upper() in sql_upper:
+                if ctl.upper() in f.upper:
                     score += 0.3
                     reasoning.append(f"Handles CTL code: {ctl}")
                     break
                 # Check for proper CTL code column usage
-                ctl_columns = ['JOB_NO', 'CTL_CODE', 'CTL_NUMBER']
-                if any(col in sql_upper for col in ctl_columns):
+                if not t.isdisjoint(('JOB_NO', 'CTL_CODE', 'CTL_NUMBER')):
                     score += 0.2
                     reasoning.append("Uses appropriate CTL code columns")
 
         # Enhanced multi-field relevance with manufacturing context
         multi_field_indicators = ['vs', 'versus', 'compare', ' and ', '&', ' with ', 'vs.']
         has_multi_fields = any(ind in user_query for ind in multi_field_indicators)
-        if has_multi_fields:
-            sm = re.search(r'SELECT\s+(.*?)\s+FROM', sql_upper, re.IGNORECASE | re.DOTALL)
-            if sm:
-                select_content = sm.group(1).strip()
-                field_count = select_content.count(',') + 1
-                if field_count > 1:
-                    score += min(field_count * 0.1, 0.4)
-                    reasoning.append(f"Handles multiple fields ({field_count} fields detected)")
-                    
-                    # Enhanced validation for manufacturing multi-field queries
-                    manufacturing_metrics = ['PRODUCTION_QTY', 'DEFECT_QTY', 'DHU', 'FLOOR_EF']
-                    used_metrics = [metric for metric in manufacturing_metrics if metric in sql_upper]
-                    if len(used_metrics) > 1:
-                        score += 0.15
-                        reasoning.append(f"Properly combines manufacturing metrics: {', '.join(used_metrics)}")
-                else:
-                    reasoning.append("User requested multiple fields but SQL only contains one field")
-                    score -= 0.2
+        if has_multi_fields and f.select_list is not None:
+            field_count = f.select_list.count(',') + 1
+            if field_count > 1:
+                score += min(field_count * 0.1, 0.4)
+                reasoning.append(f"Handles multiple fields ({field_count} fields detected)")
+
+                # Enhanced validation for manufacturing multi-field queries
+                manufacturing_metrics = ['PRODUCTION_QTY', 'DEFECT_QTY', 'DHU', 'FLOOR_EF']
+                used_metrics = [metric for metric in manufacturing_metrics if metric in t]
+                if len(used_metrics) > 1:
+                    score += 0.15
+                    reasoning.append(f"Properly combines manufacturing metrics: {', '.join(used_metrics)}")
+            else:
+                reasoning.append("User requested multiple fields but SQL only contains one field")
+                score -= 0.2
 
         # Enhanced metric recognition based on query context
         metric_mappings = {
@@ -927,10 +1026,10 @@ class SQLValidator:
             'efficiency': ['FLOOR_EF', 'EFFICIENCY'],
             'dhu': ['DHU', 'DEFECT_QTY']
         }
-        
+
         for keyword, metrics in metric_mappings.items():
             if keyword in user_query:
-                if any(metric in sql_upper for metric in metrics):
+                if not t.isdisjoint(metrics):
                     score += 0.2
                     reasoning.append(f"Correctly uses {keyword} metrics")
                 break
@@ -938,83 +1037,80 @@ class SQLValidator:
         # Enhanced aggregation function validation
         aggregations = entities.get('aggregations', [])
         if aggregations:
-            agg_functions = ['SUM', 'AVG', 'COUNT', 'MAX', 'MIN']
-            used_aggs = [agg for agg in agg_functions if agg in sql_upper]
+            used_aggs = [agg for agg in ('SUM', 'AVG', 'COUNT', 'MAX', 'MIN') if agg in t]
             if used_aggs:
                 score += min(len(used_aggs) * 0.1, 0.3)
                 reasoning.append(f"Uses appropriate aggregation functions: {', '.join(used_aggs)}")
 
         # Enhanced date handling
-        if entities.get('dates') and 'WHERE' in sql_upper:
+        if entities.get('dates') and 'WHERE' in t:
             score += 0.2
             reasoning.append("Incorporates date filtering")
-            
+
             # Check for proper date column usage
-            date_columns = ['PROD_DATE', 'TASK_FINISH_DATE']
-            if any(col in sql_upper for col in date_columns):
+            if not t.isdisjoint(('PROD_DATE', 'TASK_FINISH_DATE')):
                 score += 0.1
                 reasoning.append("Uses appropriate date columns")
 
         # Enhanced intent-specific validation
         intent = query_context.get('intent')
-        if intent in ['tna_task_query', QueryIntent.TNA_TASK_QUERY] and 'T_TNA_STATUS' in sql_upper:
+        if intent in ['tna_task_query', QueryIntent.TNA_TASK_QUERY] and 'T_TNA_STATUS' in t:
             score += 0.25
             reasoning.append("Proper TNA table usage")
-            
+
             # Enhanced TNA validation
             tna_required_columns = ['TASK_SHORT_NAME', 'TASK_FINISH_DATE', 'JOB_NO']
-            used_tna_columns = [col for col in tna_required_columns if col in sql_upper]
+            used_tna_columns = [col for col in tna_required_columns if col in t]
             if used_tna_columns:
                 score += 0.1
                 reasoning.append(f"Uses key TNA columns: {', '.join(used_tna_columns)}")
-                
-        elif intent in ['production_query', 'floor_production_summary', QueryIntent.PRODUCTION_QUERY] and any(
-            t in sql_upper for t in ['T_PROD', 'T_PROD_DAILY']
-        ):
+
+        elif intent in ['production_query', 'floor_production_summary', QueryIntent.PRODUCTION_QUERY] and not t.isdisjoint(('T_PROD', 'T_PROD_DAILY')):
             score += 0.25
             reasoning.append("Proper production table usage")
-            
+
             # Enhanced production validation
-            if 'GROUP BY' in sql_upper and 'FLOOR_NAME' in sql_upper:
+            if 'GROUP BY' in t and 'FLOOR_NAME' in t:
                 score += 0.15
                 reasoning.append("Properly groups production data by floor")
-                
-        elif intent in ['hr_employee_query', QueryIntent.HR_EMPLOYEE_QUERY] and 'EMP' in sql_upper:
+
+        elif intent in ['hr_employee_query', QueryIntent.HR_EMPLOYEE_QUERY] and 'EMP' in t:
             score += 0.2
             reasoning.append("Proper employee table usage")
 
         # Enhanced ordering direction validation
         ordering_directions = entities.get('ordering_directions', [])
-        if ordering_directions and 'ORDER BY' in sql_upper:
-            if any(direction in ['desc', 'descending'] for direction in ordering_directions) and 'DESC' in sql_upper:
+        if ordering_directions and 'ORDER BY' in t:
+            if any(direction in ['desc', 'descending'] for direction in ordering_directions) and 'DESC' in t:
                 score += 0.1
                 reasoning.append("Correctly uses descending order")
-            elif any(direction in ['asc', 'ascending'] for direction in ordering_directions) and 'ASC' in sql_upper:
+            elif any(direction in ['asc', 'ascending'] for direction in ordering_directions) and 'ASC' in t:
                 score += 0.1
                 reasoning.append("Correctly uses ascending order")
 
         return min(score, 1.0)
 
-    def _assess_performance_potential(self, sql: str, reasoning: List[str]) -> float:
+    def _assess_performance_potential(self, sql: Any, reasoning: List[str]) -> float:
         score = 0.5
-        if 'WHERE' in sql:
+        f = sql_features(sql)
+        t = f.tokens
+        if f.has_raw('WHERE'):
             score += 0.2
             reasoning.append("Uses WHERE clause for filtering")
 
-        if any(idx in sql for idx in ['PROD_DATE', 'JOB_NO', 'EMP_ID']):
+        if any(f.has_raw(idx) for idx in ('PROD_DATE', 'JOB_NO', 'EMP_ID')):
             score += 0.15
             reasoning.append("Uses likely indexed columns")
 
-        if 'SELECT *' in sql.upper():
+        if 'SELECT *' in t:
             score -= 0.2
             reasoning.append("Uses SELECT * (performance concern)")
 
-        if sql.upper().count('JOIN') > 3:
+        if f.join_count > 3:
             score -= 0.1
             reasoning.append("Multiple JOINs (complexity concern)")
 
-        complexity_keywords = sql.upper().count('GROUP BY') + sql.upper().count('ORDER BY') + sql.upper().count('HAVING')
-        if complexity_keywords <= 2:
+        if f.clause_count <= 2:
             score += 0.15
             reasoning.append("Reasonable query complexity")
 
@@ -2432,7 +2528,7 @@ class HybridProcessor:
                 "source_db_1"  # keep as-is; UI now controls DB routing in your app
             )
 
-            sql_response = await asyncio.to_thread(ask_sql_model, dynamic_prompt)
+            sql_response = await ask_sql_model_async(dynamic_prompt)
 
             self._local_processing_time = time.time() - local_start
             if sql_response and isinstance(sql_response, str):
@@ -6,6 +6,8 @@ from enum import Enum
 from dataclasses import dataclass
 from datetime import datetime as _dt
 
+from app.query_features import QueryFeatures, analyze_query, register_keywords
+
 logger = logging.getLogger(__name__)
 
 VISUALIZATION_PATTERNS = {
@@ -13,6 +15,18 @@ VISUALIZATION_PATTERNS = {
     'chart_types': ['bar chart', 'line chart', 'pie chart', 'doughnut chart']
 }
 
+# Substring checks used by QueryClassifier._calculate_complexity
+_COMPLEX_OPERATIONS = ['group by', 'sum', 'average', 'count', 'max', 'min', 'trend', 'compare']
+_MULTI_FIELD_INDICATORS = ['vs', 'versus', 'compare', ' and ', '&', ' with ', 'vs.']
+_TIME_SERIES_INDICATORS = ['monthly', 'weekly', 'daily', 'quarterly', 'over time', 'trend']
+
+register_keywords(
+    VISUALIZATION_PATTERNS['keywords'],
+    _COMPLEX_OPERATIONS,
+    _MULTI_FIELD_INDICATORS,
+    _TIME_SERIES_INDICATORS,
+)
+
 def has_visualization_intent(query: str) -> bool:
     """
     Detect if the query is requesting a visualization/chart.
@@ -23,8 +37,7 @@ def has_visualization_intent(query: str) -> bool:
     Returns:
         bool: True if visualization is requested, False otherwise
     """
-    query_lower = query.lower()
-    return any(keyword in query_lower for keyword in VISUALIZATION_PATTERNS['keywords'])
+    return analyze_query(query).has_any(VISUALIZATION_PATTERNS['keywords'])
 
 
 
@@ -134,27 +147,42 @@ class QueryClassifier:
             'database_entities': r'\b(dba|database|system|oracle|sql|session|tablespace|schema|object|user|invalid|constraint|index|view|procedure|function|trigger|package|metadata|administration|admin|performance|tuning|monitoring|statistics|privilege|grant|revoke|free\s+space|used\s+space|storage|memory|sga|pga|buffer|cache|redo|undo|archive)\b'
         }
 
-    def classify_query(self, query: str) -> QueryClassification:
+        # Compile every pattern list once instead of per classify_query call
+        self._intent_rx = {
+            intent: [re.compile(p, re.IGNORECASE) for p in patterns]
+            for intent, patterns in (
+                (QueryIntent.PRODUCTION_QUERY, self.production_patterns),
+                (QueryIntent.HR_EMPLOYEE_QUERY, self.hr_patterns),
+                (QueryIntent.TNA_TASK_QUERY, self.tna_patterns),
+                (QueryIntent.SIMPLE_LOOKUP, self.simple_patterns),
+                (QueryIntent.COMPLEX_ANALYTICS, self.complex_patterns),
+                (QueryIntent.DATABASE_QUERY, self.database_patterns),
+            )
+        }
+        self._entity_rx = {
+            entity_type: re.compile(pattern, re.IGNORECASE)
+            for entity_type, pattern in self.entity_patterns.items()
+        }
+
+    def classify_query(self, query: str, features: Optional[QueryFeatures] = None) -> QueryClassification:
         """
         Classify a user query and determine the best processing strategy.
         
         Args:
             query: User's natural language query
+            features: Shared QueryFeatures for ``query`` (computed if omitted)
             
         Returns:
             QueryClassification with intent, confidence, and strategy
         """
-        query_lower = query.lower()
+        features = features or analyze_query(query)
+        query_lower = features.lower
         entities = self._extract_entities(query)
         
-        # Calculate pattern matches for each intent
+        # Calculate pattern matches for each intent (SIMPLE_LOOKUP patterns are anchored on the raw text)
         intent_scores = {
-            QueryIntent.PRODUCTION_QUERY: self._calculate_pattern_score(query_lower, self.production_patterns),
-            QueryIntent.HR_EMPLOYEE_QUERY: self._calculate_pattern_score(query_lower, self.hr_patterns),
-            QueryIntent.TNA_TASK_QUERY: self._calculate_pattern_score(query_lower, self.tna_patterns),
-            QueryIntent.SIMPLE_LOOKUP: self._calculate_pattern_score(query, self.simple_patterns),
-            QueryIntent.COMPLEX_ANALYTICS: self._calculate_pattern_score(query_lower, self.complex_patterns),
-            QueryIntent.DATABASE_QUERY: self._calculate_pattern_score(query_lower, self.database_patterns)
+            intent: self._calculate_pattern_score(query if intent == QueryIntent.SIMPLE_LOOKUP else query_lower, patterns)
+            for intent, patterns in self._intent_rx.items()
         }
         
         # Determine primary intent
@@ -167,7 +195,7 @@ class QueryClassifier:
             confidence = 0.5  # Default confidence for general queries
         
         # Calculate complexity score
-        complexity_score = self._calculate_complexity(query, entities)
+        complexity_score = self._calculate_complexity(features, entities)
         
         # Determine processing strategy
         strategy = self._determine_strategy(primary_intent, confidence, complexity_score)
@@ -188,23 +216,18 @@ class QueryClassifier:
         
         return classification
     
-    def _calculate_pattern_score(self, text: str, patterns: List[str]) -> float:
+    def _calculate_pattern_score(self, text: str, patterns: List["re.Pattern[str]"]) -> float:
         """Calculate pattern matching score for given text."""
-        matches = 0
         total_patterns = len(patterns)
-        
-        for pattern in patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                matches += 1
-        
+        matches = sum(1 for pattern in patterns if pattern.search(text))
         return matches / total_patterns if total_patterns > 0 else 0.0
     
     def _extract_entities(self, query: str) -> Dict[str, List[str]]:
         """Extract relevant entities from the query."""
         entities = {}
         
-        for entity_type, pattern in self.entity_patterns.items():
-            matches = re.findall(pattern, query, re.IGNORECASE)
+        for entity_type, pattern in self._entity_rx.items():
+            matches = pattern.findall(query)
             if matches:
                 # Handle both string matches and tuple matches from multiple capturing groups
                 processed_matches = []
@@ -227,12 +250,12 @@ class QueryClassifier:
         
         return entities
     
-    def _calculate_complexity(self, query: str, entities: Dict[str, List[str]]) -> float:
+    def _calculate_complexity(self, features: QueryFeatures, entities: Dict[str, List[str]]) -> float:
         """Calculate query complexity score."""
         complexity_factors = 0
         
         # Length factor
-        if len(query.split()) > 15:
+        if len(features.text.split()) > 15:
             complexity_factors += 0.3
         
         # Multiple entities factor
@@ -244,19 +267,16 @@ class QueryClassifier:
             complexity_factors += 0.2
         
         # Complex SQL operations (detected from natural language)
-        complex_operations = ['group by', 'sum', 'average', 'count', 'max', 'min', 'trend', 'compare']
-        for op in complex_operations:
-            if op in query.lower():
+        for op in _COMPLEX_OPERATIONS:
+            if features.has(op):
                 complexity_factors += 0.1
         
         # Multi-field queries
-        multi_field_indicators = ['vs', 'versus', 'compare', ' and ', '&', ' with ', 'vs.']
-        if any(ind in query.lower() for ind in multi_field_indicators):
+        if features.has_any(_MULTI_FIELD_INDICATORS):
             complexity_factors += 0.25
         
         # Time-series analysis
-        time_series_indicators = ['monthly', 'weekly', 'daily', 'quarterly', 'over time', 'trend']
-        if any(ind in query.lower() for ind in time_series_indicators):
+        if features.has_any(_TIME_SERIES_INDICATORS):
             complexity_factors += 0.25
         
         # Trend analysis indicators
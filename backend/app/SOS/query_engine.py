@@ -27,8 +27,11 @@ from calendar import monthrange
 
 # Import connect_to_source from db_connector
 from app.db_connector import connect_to_source
-# Import hybrid_schema_value_search from vector_store_chroma
-from app.SOS.vector_store_chroma import hybrid_schema_value_search
+from app.sql_ast import (
+    LPAREN, NAME, QNAME, RPAREN, STRING, Statement,
+    fragment, iter_calls, parse_sql, rewrite_calls,
+)
+from app.SOS.vector_store_chroma import search_schema_typed
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -421,26 +424,42 @@ def _build_date_filter_from_relative_expression(expression: str, date_column: st
     
     return None
 
-# replace the old _NAME_LITERAL_RX usage with:
-_WHERE_BLOCK_RX = re.compile(r"(?is)\bWHERE\b(.*?)(?=\bGROUP\b|\bORDER\b|\bFETCH\b|\bOFFSET\b|\bLIMIT\b|$)")
+def _as_statement(sql) -> Statement:
+    """Accept SQL text or an already parsed statement."""
+    return sql if isinstance(sql, Statement) else parse_sql(sql or "")
 
-def _has_text_literal_predicate(sql: str) -> bool:
-    m = _WHERE_BLOCK_RX.search(sql or "")
-    if not m:
+# String arguments of these calls are date/format literals, not label values.
+_DATE_LITERAL_FUNCS = ("TO_DATE", "TO_CHAR")
+
+def _has_text_literal_predicate(sql) -> bool:
+    where = _as_statement(sql).main.clause("WHERE")
+    if where is None:
         return False
-    w = m.group(1) or ""
+    body = where.body
 
-    # strip date/function literals
-    w = re.sub(r"(?is)TO_DATE\s*\(\s*'[^']+'\s*,\s*'[^']+'\s*\)", "X", w)
-    w = re.sub(r"(?is)TO_CHAR\s*\(\s*[^)]+?\s*,\s*'[^']+'\s*\)", "X", w)
+    # skip date/function literals
+    skip = set()
+    for _, _, args in iter_calls(body, _DATE_LITERAL_FUNCS):
+        skip.update(a for a, b in args if b - a == 1 and body[a].kind == STRING)
 
     # any remaining quoted literal likely belongs to a text predicate
-    return bool(re.search(r"'[^']+'", w))
+    return any(tok.kind == STRING and tok.value and i not in skip for i, tok in enumerate(body))
 
 def ensure_label_filter(sql: str, user_query: str, selected_db: str) -> str:
     """
     Add a label/code filter inferred from the user's query to the main table in `sql`,
     but only if the SQL does not already contain a text literal predicate.
+    See _ensure_label_filter_pass.
+    """
+    if not sql:
+        return sql
+    stmt = parse_sql(sql)
+    _ensure_label_filter_pass(stmt, user_query, selected_db)
+    return stmt.to_sql()
+
+def _ensure_label_filter_pass(stmt: Statement, user_query: str, selected_db: str) -> None:
+    """
+    AST pass behind ensure_label_filter; ANDs the filter into the main block's WHERE.
 
     Behaviors:
       - Skips English "X-wise" phrasing (meaning "by X") — not a label filter.
@@ -453,26 +472,17 @@ def ensure_label_filter(sql: str, user_query: str, selected_db: str) -> str:
     """
 
     # Fast exits
-    if not sql or _has_text_literal_predicate(sql):
-        return sql
+    if _has_text_literal_predicate(stmt):
+        return
 
     # Skip English "X-wise" phrasing ("by X"), not a label
     if re.search(r"\b\w+(?:\s*-\s*|\s+)wise\b", (user_query or "").lower()):
         logger.debug("[ensure_label_filter] skip: '-wise' phrasing detected")
-        return sql
+        return
 
-    table = extract_main_table(sql or "")
+    table = stmt.main.main_table()
     if not table:
-        return sql
-
-    # Helper: inject a predicate at the right spot (before GROUP/ORDER/... or append)
-    def _inject_predicate(_sql: str, _pred: str) -> str:
-        parts = re.split(r"(?i)\bWHERE\b", _sql, maxsplit=1)
-        if len(parts) == 2:
-            head, tail = parts[0], (parts[1] or "").strip()
-            return f"{head}WHERE {_pred} AND {tail}" if tail else f"{head}WHERE {_pred}"
-        m = re.search(r"(?i)\b(GROUP|ORDER|FETCH|OFFSET|LIMIT)\b", _sql or "")
-        return (_sql[:m.start()] + f" WHERE {_pred} " + _sql[m.start():]) if m else (_sql + f" WHERE {_pred}")
+        return
 
     # ---------- 1) Code detection path (strict/equality style) ----------
     # Example: CTL-22-004522, barcode 22990000228077, etc.
@@ -494,7 +504,8 @@ def ensure_label_filter(sql: str, user_query: str, selected_db: str) -> str:
                     f"( UPPER({best_col}) = UPPER('{esc}') "
                     f"  OR UPPER(REPLACE(REPLACE({best_col},'-',''),' ','')) = UPPER('{norm}') )"
                 )
-                return _inject_predicate(sql, pred)
+                stmt.main.add_predicate(pred)
+                return
 
             # If no column on the base table matched, try direct FK parents (e.g., JOBS → JOB_CODE)
             try:
@@ -521,8 +532,7 @@ def ensure_label_filter(sql: str, user_query: str, selected_db: str) -> str:
                     f"( UPPER({ptext}) = UPPER('{esc}') "
                     f"  OR UPPER(REPLACE(REPLACE({ptext},'-',''),' ','')) = UPPER('{norm}') )"
                 )
-                return _inject_exists_on_parent(
-                    sql,
+                stmt.main.add_predicate(_exists_on_parent_predicate(
                     child_table=table,
                     parent_table=ptab,
                     parent_text_col=ptext,
@@ -530,7 +540,8 @@ def ensure_label_filter(sql: str, user_query: str, selected_db: str) -> str:
                     parent_pk_col=parent_pk_col,
                     literal=code_value,
                     parent_pred_override=parent_pred,
-                )
+                ))
+                return
 
     # ---------- 2) Generic literal path (LIKE / normalized LIKE) ----------
     cands = _candidate_literals_from_question(user_query)
@@ -549,7 +560,8 @@ def ensure_label_filter(sql: str, user_query: str, selected_db: str) -> str:
                 f"( UPPER({best_col}) LIKE UPPER('%{esc}%') "
                 f"  OR UPPER(REPLACE(REPLACE({best_col},'-',''),' ','')) LIKE UPPER('%{norm}%') )"
             )
-            return _inject_predicate(sql, pred)
+            stmt.main.add_predicate(pred)
+            return
 
         # If no column on the base table matched, try direct FK parents (e.g., JOBS → JOB_TITLE)
         try:
@@ -574,8 +586,7 @@ def ensure_label_filter(sql: str, user_query: str, selected_db: str) -> str:
             child_fk_col = fk.get("child_col")
             parent_pk_col = fk.get("parent_col")
             if child_fk_col and parent_pk_col:
-                return _inject_exists_on_parent(
-                    sql,
+                stmt.main.add_predicate(_exists_on_parent_predicate(
                     child_table=table,
                     parent_table=ptab,
                     parent_text_col=ptext,
@@ -583,10 +594,10 @@ def ensure_label_filter(sql: str, user_query: str, selected_db: str) -> str:
                     parent_pk_col=parent_pk_col,
                     literal=mapped,
                     parent_pred_override=parent_pred,
-                )
+                ))
+                return
 
     # Nothing to add
-    return sql
 
 def _fk_parents_for_child(selected_db: str, child_table: str) -> List[Dict[str, str]]:
     """
@@ -627,8 +638,7 @@ def _fk_parents_for_child(selected_db: str, child_table: str) -> List[Dict[str,
             except: pass
     return parents
 
-def _inject_exists_on_parent(
-    sql: str, 
+def _exists_on_parent_predicate(
     child_table: str, 
     parent_table: str, 
     parent_text_col: str, 
@@ -638,8 +648,8 @@ def _inject_exists_on_parent(
     parent_pred_override: Optional[str] = None
 ) -> str:
     """
-    Inject an EXISTS clause to join a child table with its parent table
-    and apply a filter on the parent table's text column.
+    Build an EXISTS predicate that joins a child table with its parent table
+    and applies a filter on the parent table's text column.
     """
     # Build the EXISTS predicate
     if parent_pred_override:
@@ -658,18 +668,7 @@ def _inject_exists_on_parent(
         f"AND {parent_pred})"
     )
     
-    # Inject the EXISTS clause into the SQL
-    parts = re.split(r"(?i)\bWHERE\b", sql, maxsplit=1)
-    if len(parts) == 2:
-        head, tail = parts[0], (parts[1] or "").strip()
-        return f"{head}WHERE {exists_clause} AND {tail}" if tail else f"{head}WHERE {exists_clause}"
-    
-    # If no WHERE clause, add one before GROUP/ORDER/FETCH/OFFSET/LIMIT or at the end
-    m = re.search(r"(?i)\b(GROUP|ORDER|FETCH|OFFSET|LIMIT)\b", sql or "")
-    if m:
-        return sql[:m.start()] + f" WHERE {exists_clause} " + sql[m.start():]
-    
-    return sql + f" WHERE {exists_clause}"
+    return exists_clause
 
 # --- table exclude patterns used during runtime metadata build ---
 EXCLUDE_TABLE_PATTERNS = [
@@ -754,8 +753,6 @@ _MON_ABBR = {m: i+1 for i, m in enumerate(_MON3)}
 def _to_oracle_date(dt: datetime) -> str:
     return f"TO_DATE('{dt.day:02d}-{_MON3[dt.month-1]}-{dt.year}','DD-MON-YYYY')"
 
-_TO_DATE_RX = re.compile(r"(?is)TO_DATE\s*\(\s*'([^']+)'\s*,\s*'([^']+)'\s*\)")
-
 def _parse_literal_with_format(lit: str, fmt: str) -> Optional[datetime]:
     fmt = (fmt or "").upper().strip()
     py_map = {
@@ -777,11 +774,22 @@ def _parse_literal_with_format(lit: str, fmt: str) -> Optional[datetime]:
         return None
 
 def normalize_dates(sql: str) -> str:
-    def repl(m: re.Match) -> str:
-        lit, fmt = m.group(1), m.group(2)
-        dt = _parse_literal_with_format(lit, fmt)
-        return _to_oracle_date(dt) if dt else m.group(0)
-    return _TO_DATE_RX.sub(repl, sql or "")
+    stmt = parse_sql(sql or "")
+    _normalize_dates_pass(stmt)
+    return stmt.to_sql()
+
+def _normalize_dates_pass(stmt: Statement) -> None:
+    """Rewrite TO_DATE('<literal>', '<format>') calls to the canonical DD-MON-YYYY form."""
+    def repl(tokens, start, close, args) -> Optional[str]:
+        if len(args) != 2 or any(b - a != 1 for a, b in args):
+            return None
+        lit, fmt = tokens[args[0][0]], tokens[args[1][0]]
+        if lit.kind != STRING or fmt.kind != STRING or not lit.value or not fmt.value:
+            return None
+        dt = _parse_literal_with_format(lit.value, fmt.value)
+        return _to_oracle_date(dt) if dt else None
+    for tokens in stmt.token_lists():
+        rewrite_calls(tokens, ("TO_DATE",), repl)
 
 # --- Explicit date-range detection in natural text --------------------------------
 def _parse_day_first_date(s: str) -> Optional[datetime]:
@@ -972,17 +980,9 @@ def apply_date_range_constraint(sql: str, rng: Optional[Dict[str, str]]) -> str:
         return sql
     col = rng["column"]
     between = f"{col} BETWEEN {rng['start']} AND {rng['end']}"
-    parts = re.split(r"(?i)\bWHERE\b", sql or "", maxsplit=1)
-    if len(parts) == 2:
-        before, after = parts[0], parts[1].strip()
-        if after:
-            return f"{before}WHERE ({between}) AND ({after})"
-        else:
-            return f"{before}WHERE {between}"
-    m = re.search(r"(?i)\b(GROUP|ORDER|FETCH|OFFSET|LIMIT)\b", sql or "")
-    if m:
-        return sql[:m.start()] + f" WHERE {between} " + sql[m.start():]
-    return sql + f" WHERE {between}"
+    stmt = parse_sql(sql or "")
+    stmt.main.add_predicate(between)
+    return stmt.to_sql()
 
 def extract_year_only_range(user_query: str) -> Optional[Dict[str, str]]:
     m = re.search(_YEAR_TOKEN, user_query or "")
@@ -1088,52 +1088,33 @@ def _is_generic_browse(q: str) -> bool:
         return False
     return not _looks_specific_question(q)
 
-_SELECT_HEAD_RX = re.compile(r"(?is)^\s*select\s+.*?\bfrom\b")
-_GROUP_BY_TAIL = re.compile(
-    r'(?is)\s+group\s+by\b.*?(?=(\s*\border\b|\s*\bfetch\b|\s*\boffset\b|\s*\blimit\b|$))'
-)
-
-
-def _strip_group_by_with_star(sql: str) -> str:
-    if re.match(r'(?is)^\s*select\s+\*\s+from\b', sql or '') and re.search(r'(?is)\bgroup\s+by\b', sql or ''):
-        # keep a spacer so "DEPT ORDER BY" doesn’t become "DEPTORDER BY"
-        out = _GROUP_BY_TAIL.sub(' ', sql)
-        # normalize double spaces that can appear after rewrites
-        out = re.sub(r'\s{2,}', ' ', out)
-        return out.strip()
-    return sql
-
 def enforce_wide_projection_for_generic(user_query: str, sql: str) -> str:
     if not sql or not _is_generic_browse(user_query):
         return sql
-    if re.search(r"(?is)^\s*select\s+\*\s+from\b", sql):
-        out = sql
-    else:
-        out = _SELECT_HEAD_RX.sub("SELECT * FROM ", sql, count=1)
-    if not re.search(r"(?is)\bfetch\s+first\s+\d+\s+rows\s+only\b", out):
-        m = re.search(r"(?is)\b(offset|limit)\b", out)
-        if m:
-            out = out[:m.start()].rstrip() + " FETCH FIRST 200 ROWS ONLY " + out[m.start():]
-        else:
-            out = out.rstrip() + " FETCH FIRST 200 ROWS ONLY"
-    out = _strip_group_by_with_star(out)
-    return out
-
-_FROM_BLOCK_RE = re.compile(r'(?is)\bfrom\b\s+(.*?)\s*(?:\bwhere\b|\bgroup\b|\border\b|\bfetch\b|\bunion\b|\bminus\b|\bintersect\b|$)')
-
-def extract_main_table(sql: str) -> Optional[str]:
+    stmt = parse_sql(sql)
+    _wide_projection_pass(stmt, user_query)
+    return stmt.to_sql()
+
+def _wide_projection_pass(stmt: Statement, user_query: str) -> None:
+    """Generic browse questions: SELECT * with a 200-row cap and no GROUP BY."""
+    if not _is_generic_browse(user_query):
+        return
+    main = stmt.main
+    select = main.clause("SELECT")
+    if select is None or not main.has("FROM"):
+        return
+    if select.text() != "*":
+        select.set_body("*")
+    if not stmt.last.has("FETCH"):
+        stmt.last.insert_clause("FETCH", "FIRST 200 ROWS ONLY")
+    # GROUP BY (and its HAVING) is invalid with SELECT *
+    if main.remove_clause("GROUP BY"):
+        main.remove_clause("HAVING")
+
+def extract_main_table(sql) -> Optional[str]:
     if not sql:
         return None
-    m = _FROM_BLOCK_RE.search(sql)
-    if not m:
-        return None
-    block = m.group(1).strip()
-    head = re.split(r'(?i)\bjoin\b|\bnatural\b|\bon\b|,', block)[0].strip()
-    m2 = re.match(r'\s*(?:"([^"]+)"|([A-Za-z0-9_\.]+))', head)
-    if not m2:
-        return None
-    t = m2.group(1) or m2.group(2)
-    return t.strip()
+    return _as_statement(sql).main.main_table()
 
 def widen_results_if_needed(rows: list, original_sql: str, selected_db: str, display_mode: str, user_query: str) -> list:
     # Only widen for generic browse-style queries
@@ -1737,44 +1718,70 @@ def build_sql_from_plan(plan: Dict[str, Any], selected_db: str, user_query: str)
 # ------------------------------------------------------------------------------
 # Type/predicate guards
 # ------------------------------------------------------------------------------
-_ALIAS_ITEM_RX = re.compile(r'(?is)\bfrom\b\s+(.*?)\s*(?:\bwhere\b|\bgroup\b|\border\b|\bfetch\b|$)')
-_SPLIT_ITEMS_RX = re.compile(r'(?is)\bjoin\b|,')
-_TABLE_ALIAS_RX = re.compile(r'(?is)^\s*(?:"([^"]+)"|([A-Za-z0-9_\.]+))\s*(?:AS\s+)?([A-Za-z0-9_]+)?')
-
-def _parse_tables_and_aliases(sql: str) -> Dict[str, str]:
+def _parse_tables_and_aliases(sql) -> Dict[str, str]:
     out = {}
-    m = _ALIAS_ITEM_RX.search(sql or "")
-    if not m: return out
-    block = m.group(1)
-    for it in [s.strip() for s in _SPLIT_ITEMS_RX.split(block) if s.strip()]:
-        mm = _TABLE_ALIAS_RX.match(it)
-        if not mm: continue
-        table = mm.group(1) or mm.group(2)
-        alias = (mm.group(3) or table.split(".")[-1]).upper()
-        out[alias] = table
+    for table, alias in _as_statement(sql).main.tables():
+        out[(alias or table.split(".")[-1]).upper()] = table
     return out
 
-def enforce_predicate_type_compat(sql: str, selected_db: str) -> None:
-    alias2table = _parse_tables_and_aliases(sql)
+# Pseudo-columns are functions, not table columns.
+_PSEUDO_COLUMNS = {"SYSDATE", "SYSTIMESTAMP", "CURRENT_DATE", "CURRENT_TIMESTAMP", "LOCALTIMESTAMP"}
+_COMPARISON_OPS = {"=", "<>", "<=", ">=", "<", ">"}
+
+def _column_ref(tok, alias2table: Dict[str, str]) -> Optional[Tuple[Optional[str], str]]:
+    """(alias, column) for a column token; the alias is kept only when it names a FROM table."""
+    if tok.kind == QNAME:
+        parts = tok.text.split(".")
+        if len(parts) != 2:
+            return None
+        return parts[0].strip('"'), parts[1]
+    if tok.kind != NAME or tok.upper in _PSEUDO_COLUMNS:
+        return None
+    alias, _, col = tok.text.rpartition(".")
+    if not re.fullmatch(r"[A-Za-z0-9_]+", col):
+        return None
+    return (alias if alias and alias.upper() in alias2table else None), col
+
+def enforce_predicate_type_compat(sql, selected_db: str) -> None:
+    stmt = _as_statement(sql)
+    alias2table = _parse_tables_and_aliases(stmt)
     def dtype(alias, col):
         tbl = alias2table.get(alias.upper()) if alias else (next(iter(alias2table.values())) if len(alias2table)==1 else None)
         if not tbl: return None
         return _get_table_colmeta(selected_db, tbl).get(col.upper(), "")
-    # TRUNC(col)
-    for m in re.finditer(r'(?is)TRUNC\s*\(\s*(?:"([^"]+)"\.)?([A-Za-z0-9_]+)\s*\)', sql or ""):
-        dt = dtype(m.group(1), m.group(2)) or ""
-        if "DATE" not in dt and "TIMESTAMP" not in dt:
-            raise ValueError(f"TRUNC used on non-date column {m.group(2)}")
-    # col LIKE ...
-    for m in re.finditer(r'(?is)\b(?:"([^"]+)"\.)?([A-Za-z0-9_]+)\s+LIKE\s+', sql or ""):
-        dt = dtype(m.group(1), m.group(2)) or ""
-        if not any(k in dt for k in ("CHAR","VARCHAR","NCHAR","CLOB")):
-            raise ValueError(f"LIKE used on non-text column {m.group(2)}")
-    # col = TO_DATE(...)
-    for m in re.finditer(r'(?is)\b(?:"([^"]+)"\.)?([A-Za-z0-9_]+)\s*(=|<>|<=|>=|<|>|between)\s*TO_DATE\s*\(', sql or ""):
-        dt = dtype(m.group(1), m.group(2)) or ""
-        if "DATE" not in dt and "TIMESTAMP" not in dt:
-            raise ValueError(f"TO_DATE compared to non-date column {m.group(2)}")
+    for tokens in stmt.token_lists():
+        # TRUNC(col)
+        for start, close, args in iter_calls(tokens, ("TRUNC",)):
+            if close - start != 3:
+                continue
+            tok = tokens[start + 2]
+            ref = _column_ref(tok, alias2table)
+            if ref is None or (tok.kind == NAME and "." in tok.text and ref[0] is None):
+                continue
+            dt = dtype(*ref) or ""
+            if "DATE" not in dt and "TIMESTAMP" not in dt:
+                raise ValueError(f"TRUNC used on non-date column {ref[1]}")
+        for i, tok in enumerate(tokens):
+            # col [NOT] LIKE ...
+            if tok.is_name("LIKE") and i:
+                j = i - 1
+                if tokens[j].is_name("NOT") and j:
+                    j -= 1
+                ref = _column_ref(tokens[j], alias2table)
+                if ref is None:
+                    continue
+                dt = dtype(*ref) or ""
+                if not any(k in dt for k in ("CHAR","VARCHAR","NCHAR","CLOB")):
+                    raise ValueError(f"LIKE used on non-text column {ref[1]}")
+            # col = TO_DATE(...)
+            elif (tok.is_name("TO_DATE") and i >= 2 and i + 1 < len(tokens) and tokens[i + 1].kind == LPAREN
+                  and (tokens[i - 1].text in _COMPARISON_OPS or tokens[i - 1].is_name("BETWEEN"))):
+                ref = _column_ref(tokens[i - 2], alias2table)
+                if ref is None:
+                    continue
+                dt = dtype(*ref) or ""
+                if "DATE" not in dt and "TIMESTAMP" not in dt:
+                    raise ValueError(f"TO_DATE compared to non-date column {ref[1]}")
 
 _ORPHAN_LITERAL_WHERE = re.compile(r"(?is)\bwhere\s*'[^']+'\s*(?:group|order|fetch|offset|limit|$)")
 def _has_orphan_literal_where(sql: str) -> bool:
@@ -1870,39 +1877,81 @@ def _guess_text_column_for_literal(selected_db: str, table: str, literal: str) -
 def value_aware_text_filter(sql: str, selected_db: str) -> str:
     """
     Make human-entered labels robust to space/hyphen differences.
-    Rewrites the first simple text predicate into:
+    See _value_aware_text_filter_pass.
+    """
+    if not sql:
+        return sql
+    stmt = parse_sql(sql)
+    _value_aware_text_filter_pass(stmt, selected_db)
+    return stmt.to_sql()
+
+_PLAIN_COLUMN_RX = re.compile(r"[A-Za-z_][A-Za-z0-9_.]*")
+
+def _simple_text_predicate(tokens) -> Optional[Tuple[int, int, str]]:
+    """
+    Find the first ``col = 'x'`` / ``col LIKE 'x'`` predicate (UPPER(...) allowed on
+    either side). Returns its token span and the literal value.
+    """
+    n = len(tokens)
+    for i in range(n):
+        j = i
+        col_upper = tokens[j].is_name("UPPER") and j + 1 < n and tokens[j + 1].kind == LPAREN
+        if col_upper:
+            j += 2
+        if j >= n or tokens[j].kind != NAME or not _PLAIN_COLUMN_RX.fullmatch(tokens[j].text):
+            continue
+        j += 1
+        if col_upper:
+            if j >= n or tokens[j].kind != RPAREN:
+                continue
+            j += 1
+        if j >= n or not (tokens[j].text == "=" or tokens[j].is_name("LIKE")):
+            continue
+        j += 1
+        val_upper = j + 1 < n and tokens[j].is_name("UPPER") and tokens[j + 1].kind == LPAREN
+        if val_upper:
+            j += 2
+        if j >= n or tokens[j].kind != STRING or "''" in tokens[j].text or not tokens[j].value:
+            continue
+        value = tokens[j].value
+        j += 1
+        if val_upper:
+            if j >= n or tokens[j].kind != RPAREN:
+                continue
+            j += 1
+        if j < n and not tokens[j].ws and tokens[j].kind != RPAREN:
+            continue
+        return i, j, value
+    return None
+
+def _value_aware_text_filter_pass(stmt: Statement, selected_db: str) -> None:
+    """
+    Rewrites the first simple text predicate of the main WHERE into:
       UPPER(col) LIKE '%VAL%' OR UPPER(REPLACE(REPLACE(col,'-',''),' ','')) LIKE '%NORM%'
     If the matched predicate is already inside (...), we do NOT add another pair of ().
     Also ensures the WHERE block has balanced parentheses before the next clause.
     """
-    table = extract_main_table(sql or "")
+    table = stmt.main.main_table()
     if not table:
-        return sql
+        return
 
-    m = _WHERE_BLOCK_RX.search(sql or "")
-    if not m:
-        return sql
-
-    w_start, w_end = m.span(1)
-    where_part = m.group(1)
+    where = stmt.main.clause("WHERE")
+    if where is None:
+        return
 
     # Match a single column =/LIKE 'literal' (tolerate UPPER(...) on either side)
-    pred_rx = re.compile(
-        r"(?is)(?<!\w)(?:UPPER\(\s*)?([A-Za-z_][A-Za-z0-9_\.]*)\s*(?:\)\s*)?"
-        r"(=|LIKE)\s*(?:UPPER\(\s*)?'([^']+)'(?:\)\s*)?(?=\s*[)\s]|$)"
-    )
-    pm = pred_rx.search(where_part)
-    if not pm:
-        return sql
+    hit = _simple_text_predicate(where.body)
+    if not hit:
+        return
+    s, e, raw_val = hit
 
-    raw_val = pm.group(3)
     esc = raw_val.replace("'", "''")
     esc_like = esc if any(ch in esc for ch in ("%","_")) else f"%{esc}%"
     norm = re.sub(r"[\s\-]", "", esc).upper()
 
     best_col = _guess_text_column_for_literal(selected_db, table, raw_val)
     if not best_col:
-        return sql
+        return
 
     # Enhanced pattern matching for company names in floor names
     # If the value contains company identifiers, create additional flexible patterns
@@ -1927,29 +1976,44 @@ def value_aware_text_filter(sql: str, selected_db: str) -> str:
     if additional_patterns:
         pred_core = " OR ".join([pred_core] + additional_patterns)
 
-    s, e = pm.span()
-    left = where_part[:s]
-    right = where_part[e:]
-
     # Is the matched predicate already inside parentheses?
-    left_trim  = left.rstrip()
-    right_trim = right.lstrip()
-    already_wrapped = left_trim.endswith("(") and right_trim.startswith(")")
+    body = where.body
+    already_wrapped = s > 0 and body[s - 1].kind == LPAREN and e < len(body) and body[e].kind == RPAREN
 
     replacement = pred_core if already_wrapped else f"({pred_core})"
-    new_where = left + replacement + right
+    body[s:e] = fragment(replacement, body[s].ws)
 
     # Final safety: ensure WHERE block has balanced parentheses
-    opens = new_where.count("(")
-    closes = new_where.count(")")
-    if closes < opens:
-        new_where = new_where + (")" * (opens - closes))
+    depth = sum(1 if t.kind == LPAREN else -1 if t.kind == RPAREN else 0 for t in body)
+    if depth > 0:
+        body.extend(fragment(")" * depth, ""))
 
-    # Keep a space before the next clause token (GROUP|ORDER|...)
-    if not new_where.endswith(" "):
-        new_where = new_where + " "
+def apply_sql_rewrites(sql: str, user_query: str, selected_db: str, *, check_types: bool = True) -> str:
+    """
+    Run the SQL rewrite chain on one parsed statement and render the text once:
+    normalize_dates → enforce_wide_projection_for_generic → value_aware_text_filter
+    → ensure_label_filter → enforce_predicate_type_compat.
 
-    return sql[:w_start] + new_where + sql[w_end:]
+    Args:
+        sql: Generated SQL candidate.
+        user_query: The user's question (drives projection widening and label filters).
+        selected_db: Source database id for column metadata lookups.
+        check_types: Also run the predicate/column type guard.
+
+    Returns:
+        The rewritten SQL.
+
+    Raises:
+        ValueError: If check_types is set and a predicate does not fit its column type.
+    """
+    stmt = parse_sql(sql or "")
+    _normalize_dates_pass(stmt)
+    _wide_projection_pass(stmt, user_query)
+    _value_aware_text_filter_pass(stmt, selected_db)
+    _ensure_label_filter_pass(stmt, user_query, selected_db)
+    if check_types:
+        enforce_predicate_type_compat(stmt, selected_db)
+    return stmt.to_sql()
 
 # ------------------------------------------------------------------------------
 # Entity-lookup helpers (needle → candidate columns → probe)
@@ -2137,11 +2201,11 @@ def _merge_candidates(primary: List[Dict[str, str]], fallback: List[Dict[str, st
     return merged
 
 def _candidate_columns(selected_db: str, query_text: str, top_k: int = 12) -> List[Dict[str, str]]:
-    hits = hybrid_schema_value_search(query_text, selected_db=selected_db, top_k=top_k)
+    hits = search_schema_typed(query_text, selected_db, {"column": top_k})["column"]
     cols = []
     for h in hits:
-        meta = (h or {}).get("metadata", {})
-        if meta.get("kind") == "column" and meta.get("source_table") and meta.get("column"):
+        meta = h["metadata"]
+        if meta.get("source_table") and meta.get("column"):
             cols.append({"table": meta["source_table"], "column": meta["column"]})
     seen = set(); dedup = []
     for c in cols:
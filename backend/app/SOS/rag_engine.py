@@ -1,4 +1,6 @@
 # app/rag_engine.py
+import asyncio
+import copy
 import json
 import logging
 import re
@@ -10,11 +12,12 @@ from decimal import Decimal
 from .query_engine import _MONTH_ALIASES
 from .vector_store_chroma import hybrid_schema_value_search
 from app.db_connector import connect_to_source
-from app.ollama_llm import ask_sql_planner
-from app.config import SUMMARY_ENGINE, SUMMARY_MAX_ROWS, SUMMARY_CHAR_BUDGET, SUMMARIZATION_CONFIG
+from app.ollama_llm import ask_sql_planner_async
+from app.config import SUMMARY_MAX_ROWS, SUMMARY_CHAR_BUDGET, SUMMARIZATION_CONFIG, TABLE_RERANK_CONFIG
 from .query_engine import _get_table_colmeta
 from functools import lru_cache
-from .summarizer import summarize_results_async
+from .summarizer import summarize_answer_async
+from .table_features import dailyish_tables, get_table_features
 
 # Add debug logging
 logger = logging.getLogger(__name__)
@@ -24,15 +27,12 @@ logger.info("Loading RAG engine with new summarizer integration")
 from .query_engine import (
     build_sql_from_plan,
     normalize_dates,
-    enforce_wide_projection_for_generic,
-    value_aware_text_filter,
     enforce_predicate_type_compat,
+    apply_sql_rewrites,
     is_valid_sql,
     run_sql,
     determine_display_mode,
     widen_results_if_needed,
-    summarize_results,
-    ensure_label_filter,
     extract_explicit_date_range,
     extract_relative_date_range,
     extract_enhanced_date_range,
@@ -52,26 +52,22 @@ from .query_engine import (
     _set_case_insensitive_session,
 )
 
-from .summarizer import summarize_with_mistral, _fallback_summarization
-
-# Add this import to ensure we're using the API-based summarizer
-from .summarizer import summarize_results
-
-
 from .query_classifier import has_visualization_intent
+from app.query_features import QueryFeatures, analyze_query, compile_any, register_keywords
+from app.prompt_budget import assemble_schema_context, fit_schema_context
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 try:
-    from .hybrid_processor import HybridProcessor
+    from app.processor_registry import get_processor_registry
     from app.config import HYBRID_ENABLED, DEEPSEEK_ENABLED as OPENROUTER_ENABLED, COLLECT_TRAINING_DATA
     HYBRID_PROCESSING_AVAILABLE = HYBRID_ENABLED and OPENROUTER_ENABLED
     if HYBRID_PROCESSING_AVAILABLE:
         logger.info("[RAG] Hybrid AI processing system enabled")
-        # Test hybrid processor initialization
+        # Build the shared processor once; requests check out copies from the registry
         try:
-            _test_processor = HybridProcessor()
+            get_processor_registry().sos_processor()
             logger.info("[RAG] Hybrid processor initialized successfully")
         except Exception as test_error:
             HYBRID_PROCESSING_AVAILABLE = False
@@ -175,6 +171,34 @@ INTENT_CLASSIFICATION_PATTERNS = {
     }
 }
 
+# Precompiled forms of the pattern lists above, used by dynamic_entity_recognition
+_FLOOR_RX = [re.compile(p) for p in DYNAMIC_ENTITY_PATTERNS['floor_patterns']]
+_DATE_RX = [re.compile(p, re.IGNORECASE) for p in DYNAMIC_ENTITY_PATTERNS['date_patterns']]
+_RELATIVE_DATE_RX = [re.compile(p, re.IGNORECASE) for p in (
+    r'\blast\s+day\b',
+    r'\blast\s+week\b',
+    r'\blast\s+month\b',
+    r'\blast\s+\d+\s+days?\b',
+    r'\byesterday\b'
+)]
+_CTL_CODE_RX = re.compile(r'\bCTL-\d{2}-\d{5,6}\b')
+_ASC_RX = re.compile(r'\basc\b|\bascending\b')
+_DESC_RX = re.compile(r'\bdesc\b|\bdescending\b')
+_LOWEST_RX = re.compile(r'\blowest\b|\bmin\b|\bsmallest\b|\bleast\b')
+_HIGHEST_RX = re.compile(r'\bhighest\b|\bmax\b|\bbiggest\b|\btop\b|\bmost\b')
+
+_AGGREGATION_WORDS = ['max', 'min', 'sum', 'total', 'avg', 'top', 'big', 'maximum']
+_METRIC_WORDS = ['production', 'defect', 'efficiency', 'dhu', 'salary']
+_EMPLOYEE_HINT_WORDS = ['president', 'salary', 'email']
+_TNA_WORDS = ['task', 'tna', 'job', 'po', 'buyer', 'style']
+_PRODUCTION_WORDS = ['production', 'defect', 'floor', 'dhu']
+
+register_keywords(
+    [v for variations in DYNAMIC_ENTITY_PATTERNS['company_variations'].values() for v in variations],
+    [k for config in INTENT_CLASSIFICATION_PATTERNS.values() for k in config['keywords'] + config.get('variations', [])],
+    _AGGREGATION_WORDS, _METRIC_WORDS, _EMPLOYEE_HINT_WORDS, _TNA_WORDS, _PRODUCTION_WORDS,
+)
+
 # Prefer daily-granularity tables when the question mentions a specific day
 _DAILY_HINT_RX = re.compile(
     r"\b\d{4}-\d{2}-\d{2}\b|"          # 2025-08-21
@@ -250,20 +274,6 @@ def _build_date_filter_from_relative_expression(expression: str, date_column: st
     
     return None
 
-def _bias_tables_for_day(tables: List[str], user_query: str) -> List[str]:
-    if not tables:
-        return tables
-    if not _DAILY_HINT_RX.search(user_query or ""):
-        return tables
-
-    def score(t: str) -> tuple[int, str]:
-        T = t.upper()
-        # very simple daily-ish signal: *_DAILY, *_DLY, *_DAY
-        dailyish = bool(re.search(r"(?:^|_)(DAILY|DLY|DAY)(?:$|_)", T))
-        return (0 if dailyish else 1, T)   # daily tables first, then alpha for determinism
-
-    return sorted(tables, key=score)
-
 # ---- Multi-metric, schema-driven selection -----------------------------------
 _METRIC_WORDS_RX = re.compile(
     r"\b(qty|quantity|pcs?|pieces?|rate|percent|pct|eff|efficiency|score|dhu|"
@@ -394,8 +404,9 @@ def _augment_plan_with_metrics(uq: str, plan: dict, options: dict) -> dict:
 
     return plan
 
-def dynamic_entity_recognition(user_query: str) -> Dict[str, Any]:
+def dynamic_entity_recognition(user_query: str, features: Optional[QueryFeatures] = None) -> Dict[str, Any]:
     """Enhanced entity recognition with pattern matching"""
+    features = features or analyze_query(user_query)
     
     entities = {
         'companies': [],
@@ -409,72 +420,52 @@ def dynamic_entity_recognition(user_query: str) -> Dict[str, Any]:
         'relative_dates': []
     }
     
-    query_lower = user_query.lower()
+    query_lower = features.lower
     
     # Company recognition
     for company, variations in DYNAMIC_ENTITY_PATTERNS['company_variations'].items():
-        if any(var in query_lower for var in variations):
+        if features.has_any(variations):
             entities['companies'].append(company)
     
     # Floor pattern recognition
-    for pattern in DYNAMIC_ENTITY_PATTERNS['floor_patterns']:
-        matches = re.finditer(pattern, user_query)
-        for match in matches:
+    for pattern in _FLOOR_RX:
+        for match in pattern.finditer(user_query):
             entities['floors'].append(match.group(0))
     
     # Date pattern recognition
-    for pattern in DYNAMIC_ENTITY_PATTERNS['date_patterns']:
-        matches = re.findall(pattern, user_query, re.IGNORECASE)
-        entities['dates'].extend(matches)
+    for pattern in _DATE_RX:
+        entities['dates'].extend(pattern.findall(user_query))
     
     # Special handling for relative date expressions
-    relative_date_patterns = [
-        r'\blast\s+day\b',
-        r'\blast\s+week\b',
-        r'\blast\s+month\b',
-        r'\blast\s+\d+\s+days?\b',
-        r'\byesterday\b'
-    ]
-    
-    for pattern in relative_date_patterns:
-        matches = re.findall(pattern, user_query, re.IGNORECASE)
-        entities['relative_dates'].extend(matches)
+    for pattern in _RELATIVE_DATE_RX:
+        entities['relative_dates'].extend(pattern.findall(user_query))
     
     # CTL code recognition
-    ctl_matches = re.finditer(r'\bCTL-\d{2}-\d{5,6}\b', user_query)
-    for match in ctl_matches:
+    for match in _CTL_CODE_RX.finditer(user_query):
         entities['ctl_codes'].append(match.group(0))
     
-    # Aggregation detection
-    agg_patterns = ['max', 'min', 'sum', 'total', 'avg', 'top', 'big', 'maximum']
-    for agg in agg_patterns:
-        if agg in query_lower:
-            entities['aggregations'].append(agg)
-    
-    # Metric detection
-    metric_patterns = ['production', 'defect', 'efficiency', 'dhu', 'salary']
-    for metric in metric_patterns:
-        if metric in query_lower:
-            entities['metrics'].append(metric)
+    # Aggregation and metric detection
+    entities['aggregations'] = features.matched(_AGGREGATION_WORDS)
+    entities['metrics'] = features.matched(_METRIC_WORDS)
     
     # Ordering direction detection
-    if re.search(r'\basc\b|\bascending\b', query_lower):
+    if _ASC_RX.search(query_lower):
         entities['ordering'] = 'ASC'
-    elif re.search(r'\bdesc\b|\bdescending\b', query_lower):
+    elif _DESC_RX.search(query_lower):
         entities['ordering'] = 'DESC'
     
     # Extreme value detection (min/max)
-    if re.search(r'\blowest\b|\bmin\b|\bsmallest\b|\bleast\b', query_lower):
+    if _LOWEST_RX.search(query_lower):
         entities['extremes'].append('min')
-    if re.search(r'\bhighest\b|\bmax\b|\bbiggest\b|\btop\b|\bmost\b', query_lower):
+    if _HIGHEST_RX.search(query_lower):
         entities['extremes'].append('max')
     
     return entities
 
-def enhanced_intent_classification(user_query: str, entities: Dict) -> Dict[str, Any]:
+def enhanced_intent_classification(user_query: str, entities: Dict,
+                                   features: Optional[QueryFeatures] = None) -> Dict[str, Any]:
     """Enhanced intent classification based on patterns and entities"""
-    
-    query_lower = user_query.lower()
+    features = features or analyze_query(user_query)
     intent_scores = {}
     
     # Check for CTL codes first - this should be high priority
@@ -487,12 +478,12 @@ def enhanced_intent_classification(user_query: str, entities: Dict) -> Dict[str,
         
         # Keyword matching
         for keyword in config['keywords']:
-            if keyword in query_lower:
+            if features.has(keyword):
                 score += 0.3
         
         # Variation matching
         for variation in config.get('variations', []):
-            if variation in query_lower:
+            if features.has(variation):
                 score += 0.2
         
         # Entity alignment
@@ -500,7 +491,7 @@ def enhanced_intent_classification(user_query: str, entities: Dict) -> Dict[str,
             score += 0.2
         elif intent == 'defect_analysis' and entities.get('aggregations'):
             score += 0.3
-        elif intent == 'employee_lookup' and any(word in query_lower for word in ['president', 'salary', 'email']):
+        elif intent == 'employee_lookup' and features.has_any(_EMPLOYEE_HINT_WORDS):
             score += 0.4
         
         intent_scores[intent] = score
@@ -559,77 +550,49 @@ def _parse_day_token(s: str) -> Optional[_dt]:
 # Enhanced Entity Recognition (Integrated from enhanced_entity_recognizer.py)
 # -------------------------
 
-def extract_enhanced_companies(query: str) -> List[Dict[str, str]]:
-    """Extract company references from query."""
-    company_mappings = {
-        'CAL': {
-            'full_name': 'Chorka Apparel Limited',
-            'variations': ['cal', 'CAL', 'chorka', 'Chorka'],
-            'floor_patterns': [r'CAL.*?Sewing-F\d+', r'Sewing.*?CAL-\d+[A-Z]?']
-        },
-        'WINNER': {
-            'full_name': 'Winner',
-            'variations': ['winner', 'Winner', 'WINNER'],
-            'floor_patterns': [r'Winner.*?BIP.*?sewing', r'Sewing.*?Winner-\d+']
-        },
-        'BIP': {
-            'full_name': 'BIP',
-            'variations': ['bip', 'BIP'],
-            'floor_patterns': [r'Winner.*?BIP']
-        }
-    }
-    
-    companies = []
-    query_lower = query.lower()
-    
-    for company_code, company_info in company_mappings.items():
-        for variation in company_info['variations']:
-            if variation.lower() in query_lower:
-                companies.append({
-                    'code': company_code,
-                    'full_name': company_info['full_name'],
-                    'variation_found': variation
-                })
-                break
-    
-    return companies
-
-def extract_enhanced_floors(query: str) -> List[Dict[str, str]]:
-    """Extract floor references from query."""
-    floor_patterns = {
-        'sewing_floors': [
-            r'Sewing\s+Floor-\d+[A-Z]?',  # Sewing Floor-5B
-            r'Sewing\s+CAL-\d+[A-Z]?',    # Sewing CAL-2A
-            r'CAL\s+Sewing-F\d+',         # CAL Sewing-F1
-            r'Winner.*?BIP.*?sewing',      # Winner BIP sewing
-            r'Sewing\s+Winner-\d+',       # Sewing Winner-1
-        ],
-        'cutting_floors': [
-            r'Cutting\s+Floor-\d+[A-Z]?',
-            r'Cutting\s+CAL-\d+[A-Z]?'
-        ],
-        'finishing_floors': [
-            r'Finishing\s+Floor-\d+[A-Z]?'
-        ]
+_COMPANY_MAPPINGS = {
+    'CAL': {
+        'full_name': 'Chorka Apparel Limited',
+        'variations': ['cal', 'CAL', 'chorka', 'Chorka'],
+        'floor_patterns': [r'CAL.*?Sewing-F\d+', r'Sewing.*?CAL-\d+[A-Z]?']
+    },
+    'WINNER': {
+        'full_name': 'Winner',
+        'variations': ['winner', 'Winner', 'WINNER'],
+        'floor_patterns': [r'Winner.*?BIP.*?sewing', r'Sewing.*?Winner-\d+']
+    },
+    'BIP': {
+        'full_name': 'BIP',
+        'variations': ['bip', 'BIP'],
+        'floor_patterns': [r'Winner.*?BIP']
     }
-    
-    floors = []
-    
-    for floor_type, patterns in floor_patterns.items():
-        for pattern in patterns:
-            matches = re.finditer(pattern, query, re.IGNORECASE)
-            for match in matches:
-                floors.append({
-                    'type': floor_type.replace('_floors', ''),
-                    'name': match.group(0),
-                    'pattern_matched': pattern
-                })
-    
-    return floors
+}
 
-def extract_enhanced_metrics(query: str) -> List[str]:
-    """Extract metric-related terms from query."""
-    metric_patterns = [
+_ENHANCED_FLOOR_PATTERNS = {
+    'sewing_floors': [
+        r'Sewing\s+Floor-\d+[A-Z]?',  # Sewing Floor-5B
+        r'Sewing\s+CAL-\d+[A-Z]?',    # Sewing CAL-2A
+        r'CAL\s+Sewing-F\d+',         # CAL Sewing-F1
+        r'Winner.*?BIP.*?sewing',      # Winner BIP sewing
+        r'Sewing\s+Winner-\d+',       # Sewing Winner-1
+    ],
+    'cutting_floors': [
+        r'Cutting\s+Floor-\d+[A-Z]?',
+        r'Cutting\s+CAL-\d+[A-Z]?'
+    ],
+    'finishing_floors': [
+        r'Finishing\s+Floor-\d+[A-Z]?'
+    ]
+}
+_ENHANCED_FLOOR_RX = [
+    (floor_type, pattern, re.compile(pattern, re.IGNORECASE))
+    for floor_type, patterns in _ENHANCED_FLOOR_PATTERNS.items()
+    for pattern in patterns
+]
+
+_ENHANCED_METRIC_RX = [
+    (pattern.strip(r'\b'), re.compile(pattern, re.IGNORECASE))
+    for pattern in (
         r'\bproduction\s+qty\b',
         r'\bdefect\s+qty\b',
         r'\bDHU\b',
@@ -638,20 +601,13 @@ def extract_enhanced_metrics(query: str) -> List[str]:
         r'\bsalary\b',
         r'\bstock\b',
         r'\bon[-\s]?hand\s+qty\b'
-    ]
-    
-    metrics = []
-    for pattern in metric_patterns:
-        if re.search(pattern, query, re.IGNORECASE):
-            metrics.append(pattern.strip(r'\b'))
-    
-    return metrics
-
-def classify_enhanced_query_intent(query: str) -> str:
-    """Enhanced query intent classification based on user patterns."""
-    query_lower = query.lower()
+    )
+]
 
-    intent_patterns = {
+# Each intent matches if any of its patterns does, so every list is one alternation
+_ENHANCED_INTENT_RX = {
+    intent: compile_any(patterns)
+    for intent, patterns in {
         'floor_production_summary': [
             r'floor.*wise.*production.*summary',
             r'show.*floor.*production'
@@ -708,35 +664,91 @@ def classify_enhanced_query_intent(query: str) -> str:
             r'maximum.*production',
             r'highest.*production'
         ]
-    }
+    }.items()
+}
+
+_ENHANCED_INTENT_FALLBACKS = [
+    ('production_data', ['production', 'defect', 'floor']),
+    ('employee_data', ['employee', 'salary', 'president', 'email', 'contact']),
+    ('tna_task_data', ['task', 'tna', 'job', 'po', 'buyer', 'style', 'shipment', 'approval']),
+    ('inventory_data', ['stock', 'inventory', 'item', 'product']),
+]
+
+register_keywords(
+    [v.lower() for info in _COMPANY_MAPPINGS.values() for v in info['variations']],
+    [w for _, words in _ENHANCED_INTENT_FALLBACKS for w in words],
+)
+
+def extract_enhanced_companies(query: str, features: Optional[QueryFeatures] = None) -> List[Dict[str, str]]:
+    """Extract company references from query."""
+    features = features or analyze_query(query)
+    companies = []
+    
+    for company_code, company_info in _COMPANY_MAPPINGS.items():
+        for variation in company_info['variations']:
+            if features.has(variation.lower()):
+                companies.append({
+                    'code': company_code,
+                    'full_name': company_info['full_name'],
+                    'variation_found': variation
+                })
+                break
+    
+    return companies
+
+def extract_enhanced_floors(query: str) -> List[Dict[str, str]]:
+    """Extract floor references from query."""
+    floors = []
+    
+    for floor_type, pattern, rx in _ENHANCED_FLOOR_RX:
+        for match in rx.finditer(query):
+            floors.append({
+                'type': floor_type.replace('_floors', ''),
+                'name': match.group(0),
+                'pattern_matched': pattern
+            })
+    
+    return floors
+
+def extract_enhanced_metrics(query: str) -> List[str]:
+    """Extract metric-related terms from query."""
+    return [label for label, rx in _ENHANCED_METRIC_RX if rx.search(query)]
+
+def classify_enhanced_query_intent(query: str, features: Optional[QueryFeatures] = None) -> str:
+    """Enhanced query intent classification based on user patterns."""
+    features = features or analyze_query(query)
 
-    for intent, patterns in intent_patterns.items():
-        if any(re.search(p, query_lower) for p in patterns):
+    for intent, rx in _ENHANCED_INTENT_RX.items():
+        if rx.search(features.lower):
             return intent
 
-    if any(w in query_lower for w in ['production', 'defect', 'floor']):
-        return 'production_data'
-    elif any(w in query_lower for w in ['employee', 'salary', 'president', 'email', 'contact']):
-        return 'employee_data'
-    elif any(w in query_lower for w in ['task', 'tna', 'job', 'po', 'buyer', 'style', 'shipment', 'approval']):
-        return 'tna_task_data'
-    elif any(w in query_lower for w in ['stock', 'inventory', 'item', 'product']):
-        return 'inventory_data'
+    for intent, words in _ENHANCED_INTENT_FALLBACKS:
+        if features.has_any(words):
+            return intent
 
     return 'general'
 
 
-def analyze_enhanced_query(user_query: str) -> Dict[str, Any]:
-    """Main enhanced query analysis function integrating all components"""
-    
+def analyze_enhanced_query(user_query: str, features: Optional[QueryFeatures] = None) -> Dict[str, Any]:
+    """
+    Main enhanced query analysis function integrating all components.
+
+    The analysis is computed once per question (the hybrid processor and
+    sos_rag_answer both ask for it) and memoized on the shared QueryFeatures;
+    every caller gets its own copy.
+    """
+    features = features or analyze_query(user_query)
+    return copy.deepcopy(features.memo("sos_enhanced_analysis", lambda: _analyze_enhanced_query(user_query, features)))
+
+def _analyze_enhanced_query(user_query: str, features: QueryFeatures) -> Dict[str, Any]:
     # Step 1: Dynamic entity recognition
-    entities = dynamic_entity_recognition(user_query)
+    entities = dynamic_entity_recognition(user_query, features)
     
     # Step 2: Enhanced intent classification
-    intent_result = enhanced_intent_classification(user_query, entities)
+    intent_result = enhanced_intent_classification(user_query, entities, features)
     
     # Step 3: Smart table selection
-    selected_tables = smart_table_selection(user_query, entities, intent_result['intent'])
+    selected_tables = smart_table_selection(user_query, entities, intent_result['intent'], features)
     
     # Step 4: Dynamic column selection
     column_selections = dynamic_column_selection(selected_tables, entities, intent_result['intent'])
@@ -760,11 +772,11 @@ def analyze_enhanced_query(user_query: str) -> Dict[str, Any]:
     
     return analysis_result
 
-def smart_table_selection(user_query: str, entities: Dict, intent: str) -> List[str]:
+def smart_table_selection(user_query: str, entities: Dict, intent: str,
+                          features: Optional[QueryFeatures] = None) -> List[str]:
     """Smart table selection based on query analysis"""
-    
+    features = features or analyze_query(user_query)
     selected_tables = []
-    query_lower = user_query.lower()
     
     # Priority 1: CTL code detection - always use T_TNA_STATUS
     if entities.get('ctl_codes'):
@@ -799,11 +811,11 @@ def smart_table_selection(user_query: str, entities: Dict, intent: str) -> List[
     
     # Priority 4: Keyword-based fallback
     if not selected_tables:
-        if any(word in query_lower for word in ['task', 'tna', 'job', 'po', 'buyer', 'style']):
+        if features.has_any(_TNA_WORDS):
             selected_tables.append('T_TNA_STATUS')
-        elif any(word in query_lower for word in ['production', 'defect', 'floor', 'dhu']):
+        elif features.has_any(_PRODUCTION_WORDS):
             selected_tables.append('T_PROD_DAILY')
-        elif any(word in query_lower for word in ['employee', 'salary', 'president']):
+        elif features.has_any(['employee', 'salary', 'president']):
             selected_tables.extend(['EMP', 'T_USERS'])
     
     # Fallback
@@ -946,6 +958,14 @@ def _table_exists(selected_db: str, name: str) -> bool:
         return False
 
 
+def _known_table(selected_db: str, name: str) -> bool:
+    # In-memory schema features first; Oracle only when the schema collection is unreadable
+    features = get_table_features(selected_db)
+    if features:
+        return name.upper() in features
+    return _table_exists(selected_db, name)
+
+
 def _maybe_force_tprod_tables(uq: str, selected_db: str, candidates: list[str]) -> list[str]:
     """
     For source_db_1 'production/defect qty' style questions with a concrete asked window,
@@ -979,36 +999,17 @@ def _maybe_force_tprod_tables(uq: str, selected_db: str, candidates: list[str])
         # straddles cutoff → don’t force
         return candidates
 
-    if not _table_exists(selected_db, forced):
+    if not _known_table(selected_db, forced):
         return candidates
 
-    if forced == "T_PROD" and _table_exists(selected_db, "T_PROD"):
+    if forced == "T_PROD" and _known_table(selected_db, "T_PROD"):
         logger.info("[RAG] Forced table by cutoff rule → T_PROD (strict)")
         return ["T_PROD"]
-    if forced == "T_PROD_DAILY" and _table_exists(selected_db, "T_PROD_DAILY"):
+    if forced == "T_PROD_DAILY" and _known_table(selected_db, "T_PROD_DAILY"):
         logger.info("[RAG] Forced table by cutoff rule → T_PROD_DAILY (strict)")
         return ["T_PROD_DAILY"]
     return candidates
 
-@lru_cache(maxsize=64)
-def _discover_dailyish_tables(selected_db: str, limit: int = 6,
-                              must_have_cols: tuple[str,...] = ('PRODUCTION_QTY',)) -> list[str]:
-    sql = f"""
-    SELECT ut.table_name
-      FROM user_tables ut
-     WHERE REGEXP_LIKE(ut.table_name, '(DAILY|DLY|_DAY)', 'i')
-       AND NOT REGEXP_LIKE(ut.table_name, '(^|_)AI_', 'i')
-       AND { " AND ".join([f"EXISTS (SELECT 1 FROM user_tab_columns c WHERE c.table_name = ut.table_name AND UPPER(c.column_name) = '{col}')" for col in must_have_cols]) }
-     ORDER BY ut.table_name
-     FETCH FIRST :lim ROWS ONLY
-    """
-    out = []
-    with connect_to_source(selected_db) as (conn, _):
-        cur = conn.cursor()
-        cur.execute(sql, lim=limit)
-        out = [r[0] for r in cur.fetchall()]
-    return out
-
 # Phase 4: Hybrid Processing Integration Helper Functions
 # ============================================================================
 
@@ -1080,18 +1081,22 @@ async def _try_hybrid_processing(
     classification_start_time = time.time()
     
     try:
-        # Initialize hybrid processor
-        processor = HybridProcessor()
+        # Per-request copy of the warmed application-scoped processor
+        processor = get_processor_registry().sos_processor()
         
         # Use enhanced schema context for better API model performance
         enhanced_schema_context = _search_schema_enhanced(user_query, "source_db_1", top_k=20)
-        # Add forced table information to the schema context if available
+        # Add forced table information to the schema context if available. It goes
+        # first: the prompt budgeter always keeps the leading block.
         if hybrid_context_info and hybrid_context_info.get("forced_table"):
             forced_table = hybrid_context_info["forced_table"]
-            enhanced_schema_context += f"\n\nCRITICAL TABLE SELECTION INFORMATION:\n"
-            enhanced_schema_context += f"FORCED TABLE: {forced_table}\n"
-            enhanced_schema_context += f"REASON: Date cutoff rule applied\n"
-            enhanced_schema_context += f"IMPORTANT: MUST USE {forced_table} TABLE FOR THIS QUERY\n"
+            enhanced_schema_context = (
+                f"CRITICAL TABLE SELECTION INFORMATION:\n"
+                f"FORCED TABLE: {forced_table}\n"
+                f"REASON: Date cutoff rule applied\n"
+                f"IMPORTANT: MUST USE {forced_table} TABLE FOR THIS QUERY\n\n"
+                + enhanced_schema_context
+            )
         # Phase 5.1: Query Classification and Entity Extraction for Training Data
         classification_result = None
         if COLLECT_TRAINING_DATA and turn_id:
@@ -1239,10 +1244,7 @@ async def _try_hybrid_processing(
                     fallback_sql = build_sql_from_plan(plan, "source_db_1", user_query)
                     
                     # Apply existing validations
-                    fallback_sql = normalize_dates(fallback_sql)
-                    fallback_sql = enforce_wide_projection_for_generic(user_query, fallback_sql)
-                    fallback_sql = value_aware_text_filter(fallback_sql, "source_db_1")
-                    fallback_sql = ensure_label_filter(fallback_sql, user_query, "source_db_1")
+                    fallback_sql = apply_sql_rewrites(fallback_sql, user_query, "source_db_1", check_types=False)
                     
                     # Execute the fallback SQL
                     logger.info(f"[RAG] Generated fallback SQL: {fallback_sql}")
@@ -1252,12 +1254,6 @@ async def _try_hybrid_processing(
                         # Process results using existing RAG pipeline
                         display_mode = determine_display_mode(user_query, rows)
                         rows_for_summary = widen_results_if_needed(rows, fallback_sql, "source_db_1", display_mode, user_query)
-                        python_summary = summarize_results(
-                            rows_for_summary,
-                            user_query,
-                            fallback_sql,
-                        ) if display_mode in ["summary", "both"] else ""
-                        
                         # Generate natural language summary if needed
                         summary = ""
                         if display_mode in ["summary", "both"]:
@@ -1267,8 +1263,6 @@ async def _try_hybrid_processing(
                                 rows=rows,
                                 sql=fallback_sql
                             )
-                        else:
-                            summary = python_summary
                         
                         # Record training data as usual
                         if COLLECT_TRAINING_DATA and turn_id and 'classification_result' in locals():
@@ -1340,14 +1334,11 @@ async def _try_hybrid_processing(
         
         sql_response = ' '.join(sql_lines) if sql_lines else sql_response
         
-        # Apply existing RAG validations to hybrid-generated SQL
-        sql = normalize_dates(sql_response.rstrip(";"))
-        sql = enforce_wide_projection_for_generic(user_query, sql)
-        sql = value_aware_text_filter(sql, "source_db_1")  # Default to main DB
-        sql = ensure_label_filter(sql, user_query, "source_db_1")
+        # Apply existing RAG validations to hybrid-generated SQL (default to main DB);
+        # the rewrite chain ends with the predicate type check
+        sql = apply_sql_rewrites(sql_response.rstrip(";"), user_query, "source_db_1")
         
         # Validate SQL syntax
-        enforce_predicate_type_compat(sql, "source_db_1")
         if not is_valid_sql(sql, "source_db_1"):
             logger.warning(f"[RAG] Hybrid-generated SQL failed validation: {sql}")
             
@@ -1402,12 +1393,6 @@ async def _try_hybrid_processing(
     # Process results using existing RAG pipeline
     display_mode = determine_display_mode(user_query, rows)
     rows_for_summary = widen_results_if_needed(rows, sql, "source_db_1", display_mode, user_query)
-    python_summary = summarize_results(
-        rows_for_summary,
-        user_query,
-        sql,
-    ) if display_mode in ["summary", "both"] else ""
-
     # Generate natural language summary if needed
     summary = ""
     if display_mode in ["summary", "both"]:
@@ -1418,8 +1403,6 @@ async def _try_hybrid_processing(
             rows=rows,
             sql=sql
         )
-    else:
-        summary = python_summary
     
     # Phase 5.3: Record successful hybrid processing with complete training data
     if COLLECT_TRAINING_DATA and turn_id and classification_result:
@@ -1536,6 +1519,12 @@ def create_dynamic_prompt_context(user_query: str, schema_context: str, selected
     """
     Create dynamic prompt context that adapts to query and learned patterns.
     """
+    # Same budget as the API prompt; the local model's context window is smaller still
+    fitted = fit_schema_context(schema_context, query=user_query)
+    if fitted.saved_tokens:
+        logger.debug(f"[RAG] Local prompt schema context trimmed by {fitted.saved_tokens} tokens")
+    schema_context = fitted.text
+
     # Extract table mentions from schema context
     mentioned_tables = []
     for line in schema_context.split('\n'):
@@ -1788,37 +1777,83 @@ def enhance_query_with_critical_table_knowledge(user_query: str, plan: Dict, opt
 
     return out
 
-def _intelligent_table_selection(user_query: str, candidate_tables: List[str], selected_db: str) -> List[str]:
-    q = (user_query or "").lower()
-    crit = {'T_PROD','T_PROD_DAILY','T_TNA_STATUS'}
-    scores: Dict[str,int] = {}
-
-    for t in candidate_tables:
-        T = t.upper()
-        s = 0
-        if T in crit: s += 10
-
-        if any(w in q for w in ['production','defect','floor','dhu','efficiency']):
-            if T in {'T_PROD','T_PROD_DAILY'}:
-                s += 20
-                if T == 'T_PROD_DAILY' and _DAILY_HINT_RX.search(user_query or ''):
-                    s += 5
-
-        if any(w in q for w in ['task','tna','job','po','buyer','style','shipment','approval','ctl']):
-            if T == 'T_TNA_STATUS':
-                s += 20
-
-        if T in {'T_PROD','T_PROD_DAILY'}:
-            start_dt, end_dt = _asked_range(user_query or "")
-            if start_dt and end_dt:
-                if end_dt < _CUTOFF_DT and T == 'T_PROD':
-                    s += 10
-                elif start_dt >= _CUTOFF_DT and T == 'T_PROD_DAILY':
-                    s += 10
+_CORE_TABLES = {'T_PROD', 'T_PROD_DAILY', 'T_TNA_STATUS'}
+_TIME_WORDS_RX = re.compile(
+    r"\b(date|dates|day|days|daily|week|weekly|month|monthly|year|yearly|trend|since|between|today|yesterday)\b",
+    re.I,
+)
+
+def _rerank_tables(user_query: str, results: List[Dict[str, Any]], selected_db: str, max_tables: int = 12) -> List[str]:
+    """
+    Second retrieval stage: score the tables behind a wide candidate set and
+    return the final table list.
+
+    Every signal comes from memory: the stage-1 rank, the critical-table and
+    domain rules, key-metric overlap with ``CRITICAL_TABLE_ENHANCED_INFO``,
+    date-column presence and daily-table naming, read from ``get_table_features``.
+    Day-level questions also pull in daily tables that have production columns,
+    even when retrieval missed them. Nothing here queries Oracle or runs
+    another vector search.
+
+    Args:
+        user_query: The user's natural language question
+        results: Schema hits from one search, best first
+        selected_db: Database ID
+        max_tables: Most tables returned
+
+    Returns:
+        Table names, best first, with denylisted tables removed
+    """
+    uq = user_query or ""
+    q = uq.lower()
+    features = get_table_features(selected_db)
+    retrieved = _filter_banned_tables(_tables_from_results(results, limit=None))
+    daily = bool(_DAILY_HINT_RX.search(uq))
+    pool = list(retrieved)
+    if daily:
+        seen = set(pool)
+        extras = dailyish_tables(features, must_have_cols=("PRODUCTION_QTY", "FLOOR_NAME"))
+        pool += [t for t in _filter_banned_tables(extras) if t not in seen]
+    if not pool:
+        return []
 
+    start_dt, end_dt = _asked_range(uq)
+    timed = bool((start_dt and end_dt) or daily or _TIME_WORDS_RX.search(uq))
+    tokens = frozenset(p for w in re.findall(r"[A-Za-z0-9_]+", uq.upper()) for p in (w, *w.split("_")) if p)
+    production_q = any(w in q for w in ['production', 'defect', 'floor', 'dhu', 'efficiency'])
+    tna_q = any(w in q for w in ['task', 'tna', 'job', 'po', 'buyer', 'style', 'shipment', 'approval', 'ctl'])
+    rank = {t: i for i, t in enumerate(retrieved)}
+
+    scores: Dict[str, float] = {}
+    for T in pool:
+        f = features.get(T)
+        s = 10.0 * (1 - rank[T] / len(retrieved)) if T in rank else 0.0
+        if T in _CORE_TABLES:
+            s += 10
+        elif f is not None and f.is_critical:
+            s += 4
+        if production_q and T in {'T_PROD', 'T_PROD_DAILY'}:
+            s += 20
+            if T == 'T_PROD_DAILY' and daily:
+                s += 5
+        if tna_q and T == 'T_TNA_STATUS':
+            s += 20
+        if start_dt and end_dt:
+            if T == 'T_PROD' and end_dt < _CUTOFF_DT:
+                s += 10
+            elif T == 'T_PROD_DAILY' and start_dt >= _CUTOFF_DT:
+                s += 10
+        if daily and _DAILY_NAME_RX.search(T):
+            s += 30
+        if f is not None:
+            s += 6 * min(len(f.metric_overlap(tokens)), 3)
+            if timed and f.date_columns:
+                s += 4
         scores[T] = s
 
-    return sorted(candidate_tables, key=lambda x: (-scores.get(x.upper(), 0), x.upper()))
+    ranked = sorted(pool, key=lambda t: (-scores[t], t))[:max_tables]
+    logger.debug(f"[RAG] Re-ranked {len(pool)} candidate tables: {[(t, round(scores[t], 1)) for t in ranked]}")
+    return ranked
 
 def get_smart_column_suggestions(table: str, user_query: str, selected_db: str) -> List[str]:
     T = (table or "").upper()
@@ -2024,8 +2059,8 @@ def _extract_context_ids(results: List[Dict[str, Any]]) -> List[str]:
     return out
 
 
-def _tables_from_results(results: List[Dict[str, Any]]) -> List[str]:
-    """Prefer table names from metadata; dedup while preserving order."""
+def _tables_from_results(results: List[Dict[str, Any]], limit: Optional[int] = 12) -> List[str]:
+    """Prefer table names from metadata; dedup while preserving order (``limit=None`` keeps all)."""
     seen = set()
     out: List[str] = []
     for r in results or []:
@@ -2036,7 +2071,7 @@ def _tables_from_results(results: List[Dict[str, Any]]) -> List[str]:
         if u not in seen:
             seen.add(u)
             out.append(u)
-        if len(out) >= 12:
+        if limit is not None and len(out) >= limit:
             break
     return out
 
@@ -2212,11 +2247,11 @@ def _extract_first_json(text: str) -> Optional[dict]:
         return None
 
 
-def _ask_planner(user_query: str, options: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+async def _ask_planner(user_query: str, options: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Call the planner LLM and parse JSON."""
     try:
         prompt = _planner_prompt(user_query, options)
-        raw = ask_sql_planner(prompt)
+        raw = await ask_sql_planner_async(prompt)
         plan = _extract_first_json((raw or "").strip().strip("`"))
         logger.debug("[RAG] planner_raw=%s", (raw or "")[:1000])
         logger.debug("[RAG] planner_json=%s", plan)
@@ -2394,7 +2429,25 @@ def _validate_plan(plan: Dict[str, Any], options: Dict[str, Any]) -> Tuple[bool,
     # order_by/limit are optional; keys are checked later by the SQL builder
     return True, None
 
-def _enhanced_employee_lookup(user_query: str, selected_db: str, enhanced_analysis: Dict) -> Dict[str, Any]:
+async def _single_summary(user_query: str, rows: List[Dict[str, Any]], sql: str, display_mode: str) -> str:
+    """
+    One summary for the lookup/fallback paths.
+
+    Goes through summarize_answer_async like the main path: the configured
+    model under the latency budget, with the local report as fallback. Empty
+    when the display mode shows no summary.
+    """
+    if display_mode not in ("summary", "both"):
+        return ""
+    return await summarize_answer_async(
+        user_query=user_query,
+        columns=list(rows[0].keys()) if rows else [],
+        rows=rows,
+        sql=sql,
+    )
+
+
+async def _enhanced_employee_lookup(user_query: str, selected_db: str, enhanced_analysis: Dict) -> Dict[str, Any]:
     """Enhanced employee lookup using intent analysis."""
     try:
         # Extract person name or role from query
@@ -2456,20 +2509,8 @@ def _enhanced_employee_lookup(user_query: str, selected_db: str, enhanced_analys
         rows_for_summary = widen_results_if_needed(rows, sql, selected_db, display_mode, user_query)
         
         # Use enhanced summarizer for employee lookup
-        python_summary = summarize_results(
-            rows_for_summary,
-            user_query,
-            sql
-        ) if display_mode in ["summary", "both"] else ""
         try:
-            from decimal import Decimal
-            summary = summarize_with_mistral(
-                user_query=user_query,
-                columns=list(rows[0].keys()) if rows else [],
-                rows=rows,
-                backend_summary=python_summary,
-                sql=sql,
-            ) if SUMMARY_ENGINE == "llm" and display_mode in ["summary","both"] else python_summary
+            summary = await _single_summary(user_query, rows_for_summary, sql, display_mode)
         except Exception as e:
             logger.error(f"Natural language summary error: {e}")
             summary = f"Found {len(rows)} records matching your query."
@@ -2495,9 +2536,9 @@ def _enhanced_employee_lookup(user_query: str, selected_db: str, enhanced_analys
     except Exception as e:
         logger.error(f"[RAG] Enhanced employee lookup failed: {e}")
         # Fall back to generic entity lookup
-        return _entity_lookup_path(user_query, selected_db, [], [])
+        return await _entity_lookup_path(user_query, selected_db, [], [])
     
-def _enhanced_tna_task_lookup(user_query: str, selected_db: str, enhanced_analysis: Dict) -> Dict[str, Any]:
+async def _enhanced_tna_task_lookup(user_query: str, selected_db: str, enhanced_analysis: Dict) -> Dict[str, Any]:
     """Enhanced TNA task lookup using intent analysis."""
     try:
         # Initialize empty variables that will be used in the return statement
@@ -2609,20 +2650,8 @@ def _enhanced_tna_task_lookup(user_query: str, selected_db: str, enhanced_analys
             rows = run_sql(sql, selected_db)
             display_mode = determine_display_mode(user_query, rows)
             rows_for_summary = widen_results_if_needed(rows, sql, selected_db, display_mode, user_query)
-            python_summary = summarize_results(
-                rows_for_summary,
-                user_query,
-                sql,
-            ) if display_mode in ["summary","both"] else ""
             try:
-                from decimal import Decimal
-                summary = summarize_with_mistral(
-                    user_query=user_query,
-                    columns=list(rows[0].keys()) if rows else [],
-                    rows=rows,
-                    backend_summary=python_summary,
-                    sql=sql,
-                ) if SUMMARY_ENGINE == "llm" and display_mode in ["summary","both"] else python_summary
+                summary = await _single_summary(user_query, rows_for_summary, sql, display_mode)
             except Exception as e:
                 logger.error(f"Natural language summary error: {e}")
                 summary = f"Found {len(rows)} records matching your query."
@@ -2692,29 +2721,11 @@ def _enhanced_tna_task_lookup(user_query: str, selected_db: str, enhanced_analys
         rows = run_sql(sql, selected_db)
         display_mode = determine_display_mode(user_query, rows)
         rows_for_summary = widen_results_if_needed(rows, sql, selected_db, display_mode, user_query)
-        python_summary = summarize_results(
-            rows_for_summary,
-            user_query,
-        ) if display_mode in ["summary", "both"] else ""
-        
         try:
-            # Import SUMMARY_ENGINE to avoid "not defined" error
-            from app.config import SUMMARY_ENGINE
-            
-            summary = (
-                summarize_with_mistral(
-                    user_query=user_query,
-                    columns=list(rows_for_summary[0].keys()) if rows_for_summary else [],
-                    rows=rows_for_summary,
-                    backend_summary=python_summary,
-                    sql=sql,
-                )
-                if SUMMARY_ENGINE == "llm" and display_mode in ["summary", "both"]
-                else python_summary
-            )
+            summary = await _single_summary(user_query, rows_for_summary, sql, display_mode)
         except Exception as e:
             logger.error(f"[RAG] Summary generation failed: {e}")
-            summary = python_summary
+            summary = f"Found {len(rows)} records matching your query."
         
         # Then modify the return statement to include the visualization flag:
         return {
@@ -2734,13 +2745,13 @@ def _enhanced_tna_task_lookup(user_query: str, selected_db: str, enhanced_analys
 
     except Exception as e:
         logger.error(f"[RAG] Enhanced TNA task lookup failed: {e}")
-        return _entity_lookup_path(user_query, selected_db, [], [])
+        return await _entity_lookup_path(user_query, selected_db, [], [])
 
 
 # ---------------------------
 # Fallback: entity lookup
 # ---------------------------
-def _entity_lookup_path(user_query: str, selected_db: str,
+async def _entity_lookup_path(user_query: str, selected_db: str,
                         schema_chunks: List[str],
                         schema_context_ids: List[str]) -> Dict[str, Any]:
     """
@@ -2791,38 +2802,7 @@ def _entity_lookup_path(user_query: str, selected_db: str,
                 rows = run_sql(sql, selected_db)
                 display_mode = determine_display_mode(user_query, rows)
                 rows_for_summary = widen_results_if_needed(rows, sql, selected_db, display_mode, user_query)
-                py_sum = summarize_results(
-                    rows_for_summary,
-                    user_query,
-                ) if display_mode in ["summary", "both"] else ""
-                if display_mode in ["summary", "both"]:
-                    summary = (
-                        summarize_with_mistral(
-                            user_query=user_query,
-                            columns=list(rows_for_summary[0].keys()) if rows_for_summary else [],
-                            rows=rows_for_summary,
-                            backend_summary=py_sum,
-                            sql=sql,
-                        )
-                        if SUMMARY_ENGINE == "llm"
-                        else py_sum
-                    )
-                else:
-                    summary = ""
-                if trend_intent:
-                    # Prefer the trend-focused summary we just generated
-                    summary = python_summary
-                else:
-                    # Use the API-based summarizer for all cases
-                    summary = (
-                        summarize_results(
-                            rows,
-                            user_query,
-                            sql,
-                        )
-                        if SUMMARY_ENGINE == "llm" and display_mode in ["summary", "both"]
-                        else python_summary
-                    )
+                summary = await _single_summary(user_query, rows_for_summary, sql, display_mode)
 
                 return {
                     "status": "success",
@@ -2884,24 +2864,7 @@ def _entity_lookup_path(user_query: str, selected_db: str,
         rows = run_sql(sql, selected_db)
         display_mode = determine_display_mode(user_query, rows)
         rows_for_summary = widen_results_if_needed(rows, sql, selected_db, display_mode, user_query)
-        python_summary = summarize_results(
-            rows_for_summary,
-            user_query,
-        ) if display_mode in ["summary", "both"] else ""
-        if display_mode in ["summary", "both"]:
-            summary = (
-                summarize_with_mistral(
-                    user_query=user_query,
-                    columns=list(rows_for_summary[0].keys()) if rows_for_summary else [],
-                    rows=rows_for_summary,
-                    backend_summary=python_summary,
-                    sql=sql,
-                )
-                if SUMMARY_ENGINE == "llm"
-                else python_summary
-            )
-        else:
-            summary = ""
+        summary = await _single_summary(user_query, rows_for_summary, sql, display_mode)
         
         return {
             "status": "success",
@@ -2920,7 +2883,7 @@ def _entity_lookup_path(user_query: str, selected_db: str,
         logger.error(f"[EntityLookup] Oracle error: {e}")
         return {"status": "error", "message": f"Oracle query failed: {str(e)}", "sql": sql}
 
-def _generic_browse_fallback(user_query: str, selected_db: str, options: Dict[str, Any],
+async def _generic_browse_fallback(user_query: str, selected_db: str, options: Dict[str, Any],
                              schema_chunks: List[str], schema_context_ids: List[str]) -> Dict[str, Any]:
     """
     If the planner fails, show *something sensible*:
@@ -2955,19 +2918,8 @@ def _generic_browse_fallback(user_query: str, selected_db: str, options: Dict[st
         rows = run_sql(sql, selected_db)
         display_mode = determine_display_mode(user_query, rows)
         rows_for_summary = widen_results_if_needed(rows, sql, selected_db, display_mode, user_query)
-        python_summary = summarize_results(
-            rows_for_summary,
-            user_query,
-        ) if display_mode in ["summary", "both"] else ""
         try:
-            from decimal import Decimal
-            summary = summarize_with_mistral(
-                user_query=user_query,
-                columns=list(rows[0].keys()) if rows else [],
-                rows=rows,
-                backend_summary=python_summary,
-                sql=sql,
-            ) if SUMMARY_ENGINE == "llm" and display_mode in ["summary","both"] else python_summary
+            summary = await _single_summary(user_query, rows_for_summary, sql, display_mode)
         except Exception as e:
             logger.error(f"Natural language summary error: {e}")
             summary = f"Found {len(rows)} records matching your query."
@@ -3117,8 +3069,7 @@ async def answer(
         # For general queries, use the hybrid processor's general query handling
         try:
             if HYBRID_PROCESSING_AVAILABLE:
-                from .hybrid_processor import HybridProcessor
-                processor = HybridProcessor()
+                processor = get_processor_registry().sos_processor()
                 
                 # Process as a general knowledge query
                 processing_result = await processor._process_general_query(
@@ -3208,18 +3159,18 @@ async def answer(
     # Enhanced intent-based routing - use enhanced analysis before vector search
     if enhanced_analysis["intent"] == "employee_lookup":
         logger.info("[RAG] Routing to employee lookup based on enhanced analysis")
-        return _enhanced_employee_lookup(uq, selected_db, enhanced_analysis)
+        return await _enhanced_employee_lookup(uq, selected_db, enhanced_analysis)
 
     # NEW: TNA/task routing
     if enhanced_analysis["intent"] in ("tna_task_query", "tna_task_data"):
         logger.info("[RAG] Routing to TNA task query based on enhanced analysis")
-        return _enhanced_tna_task_lookup(uq, selected_db, enhanced_analysis)
+        return await _enhanced_tna_task_lookup(uq, selected_db, enhanced_analysis)
 
     # 0) Fast paths -------------------------------------------------------------
     # 0.a) Raw SELECT passthrough (validated)
     if re.match(r"(?is)^\s*select\b", uq):
-        # Retrieve schema context for fast path
-        results = _search_schema(user_query, selected_db, top_k=12)
+        # Retrieve schema context for fast path (off the event loop: embedding blocks)
+        results = await asyncio.to_thread(_search_schema, user_query, selected_db, 12)
         schema_chunks = [r.get("document") for r in results] if results else []
         schema_context_ids = _extract_context_ids(results)
         sql = normalize_dates(uq.rstrip(";"))
@@ -3231,39 +3182,20 @@ async def answer(
             rows = run_sql(sql, selected_db)
             display_mode = determine_display_mode(user_query, rows)
 
-            # Build python_summary using async trend-aware summarizer when needed
             rows_for_summary = widen_results_if_needed(
                 rows, sql, selected_db, display_mode, user_query
             )
-            if display_mode in ["summary", "both"] or trend_intent:
-                columns_for_summary = list(rows[0].keys()) if rows else []
-                # Use the API-based summarizer instead of the basic one
-                python_summary = await summarize_results_async(
-                    results={"rows": rows_for_summary},
-                    user_query=user_query,
-                    columns=columns_for_summary,
-                    sql=sql,
-                )
-            else:
-                python_summary = ""
-
+            # One summary per answer: LLM under a latency budget, local report as fallback
             try:
-                from decimal import Decimal  # noqa: F401
-
-                if trend_intent:
-                    # Prefer the trend-focused summary we just generated
-                    summary = python_summary
-                else:
-                    # Use the API-based summarizer for all cases
-                    summary = (
-                        summarize_results(
-                            rows,
-                            user_query,
-                            sql,
-                        )
-                        if SUMMARY_ENGINE == "llm" and display_mode in ["summary", "both"]
-                        else python_summary
+                if display_mode in ["summary", "both"] or trend_intent:
+                    summary = await summarize_answer_async(
+                        user_query=user_query,
+                        columns=list(rows[0].keys()) if rows else [],
+                        rows=rows_for_summary,
+                        sql=sql,
                     )
+                else:
+                    summary = ""
             except Exception as e:
                 logger.error(f"Natural language summary error: {e}")
                 summary = f"Found {len(rows)} records matching your query."
@@ -3309,25 +3241,14 @@ async def answer(
         except Exception as e:
             return {"status": "error", "message": f"Oracle query failed: {e}"}
 
-    # 1) Retrieve schema context from vector store -----------------------------
-    results = _search_schema(user_query, selected_db, top_k=12)
-    schema_chunks = [r.get("document") for r in results] if results else []
-    schema_context_ids = _extract_context_ids(results)
+    # 1) Retrieve schema context: one wide search, then re-rank its tables in memory.
+    # In a worker thread, so concurrent requests can share embedding batches.
+    results = await asyncio.to_thread(_search_schema, user_query, selected_db, TABLE_RERANK_CONFIG["candidate_k"])
+    context_results = results[:TABLE_RERANK_CONFIG["context_k"]]
+    schema_chunks = [r.get("document") for r in context_results] if context_results else []
+    schema_context_ids = _extract_context_ids(context_results)
 
-    candidate_tables = _tables_from_results(results)
-    candidate_tables = _filter_banned_tables(candidate_tables)
-
-    # NEW: prioritize critical tables based on query content
-    candidate_tables = _intelligent_table_selection(user_query, candidate_tables, selected_db)
-    candidate_tables = _bias_tables_for_day(candidate_tables, uq)
-
-    # NEW: if it's a single-day/"day" query, make sure daily tables are present
-    if _DAILY_HINT_RX.search(uq):
-        extras = _discover_dailyish_tables(selected_db, must_have_cols=("PRODUCTION_QTY", "FLOOR_NAME"))
-        extras = _filter_banned_tables(extras)
-        # keep order: already-retrieved tables first, then extras not already present
-        seen = {t.upper() for t in candidate_tables}
-        candidate_tables += [t for t in extras if t.upper() not in seen]
+    candidate_tables = _rerank_tables(user_query, results, selected_db, TABLE_RERANK_CONFIG["max_tables"])
 
     # Force T_PROD vs T_PROD_DAILY ordering when applicable
     candidate_tables = _maybe_force_tprod_tables(uq, selected_db, candidate_tables)
@@ -3344,7 +3265,7 @@ async def answer(
     options = _build_runtime_options(selected_db, candidate_tables)
     if not options.get("tables"):
         if _is_entity_lookup(user_query):
-            return _entity_lookup_path(user_query, selected_db, schema_chunks, schema_context_ids)
+            return await _entity_lookup_path(user_query, selected_db, schema_chunks, schema_context_ids)
         return {
             "status": "error",
             "message": "No relevant tables found.",
@@ -3368,7 +3289,7 @@ async def answer(
 
         hybrid_result = await _try_hybrid_processing(
             user_query=user_query,
-            schema_context="\n\n".join(schema_chunks),
+            schema_context=assemble_schema_context(context_results).text,
             enhanced_analysis=enhanced_analysis,
             options=options,
             schema_chunks=schema_chunks,
@@ -3413,7 +3334,7 @@ async def answer(
             logger.info("[RAG] Hybrid processing failed or returned no result, falling back to traditional RAG pipeline")
 
     # 3) Planner → STRICT validation ------------------------------------------
-    plan = _ask_planner(user_query, options)
+    plan = await _ask_planner(user_query, options)
 
     # ---- Additional upfront plan structure check ----
     if not isinstance(plan, dict):
@@ -3426,9 +3347,9 @@ async def answer(
     if not ok:
         logger.info(f"[RAG] Planner not directly usable ({why}).")
         if _is_entity_lookup(user_query):
-            return _entity_lookup_path(user_query, selected_db, schema_chunks, schema_context_ids)
+            return await _entity_lookup_path(user_query, selected_db, schema_chunks, schema_context_ids)
         # NEW: graceful table-browse fallback
-        return _generic_browse_fallback(user_query, selected_db, options, schema_chunks, schema_context_ids)
+        return await _generic_browse_fallback(user_query, selected_db, options, schema_chunks, schema_context_ids)
 
     # NEW: add business-aware dims/metrics for critical tables
     plan = enhance_query_with_critical_table_knowledge(user_query, plan, options, selected_db)
@@ -3445,8 +3366,8 @@ async def answer(
     if not ok:
         logger.info(f"[RAG] Plan invalid after augmentation ({why}).")
         if _is_entity_lookup(user_query):
-            return _entity_lookup_path(user_query, selected_db, schema_chunks, schema_context_ids)
-        return _generic_browse_fallback(uq, selected_db, options, schema_chunks, schema_context_ids)
+            return await _entity_lookup_path(user_query, selected_db, schema_chunks, schema_context_ids)
+        return await _generic_browse_fallback(uq, selected_db, options, schema_chunks, schema_context_ids)
 
     # If planner returned raw SQL, validate and use it; otherwise build from plan
     maybe_sql = (plan or {}).get("sql") or (plan or {}).get("query")
@@ -3456,17 +3377,13 @@ async def answer(
         else:
             sql = build_sql_from_plan(plan, selected_db, user_query)
 
-        sql = normalize_dates(sql)
-        sql = enforce_wide_projection_for_generic(user_query, sql)
-        sql = value_aware_text_filter(sql, selected_db)
-        sql = ensure_label_filter(sql, user_query, selected_db)
-        enforce_predicate_type_compat(sql, selected_db)
+        sql = apply_sql_rewrites(sql, user_query, selected_db)
         if not is_valid_sql(sql, selected_db):
             raise ValueError("Generated SQL failed prepare() validation")
     except Exception as e:
         logger.warning(f"[RAG] SQL build/validation error: {e}")
         if _is_entity_lookup(user_query):
-            return _entity_lookup_path(user_query, selected_db, schema_chunks, schema_context_ids)
+            return await _entity_lookup_path(user_query, selected_db, schema_chunks, schema_context_ids)
         return {
             "status": "error",
             "message": f"SQL generation failed: {str(e)}",
@@ -3493,7 +3410,7 @@ async def answer(
             # Apply T_PROD vs T_PROD_DAILY forcing within the daily-only set
             forced_daily = _maybe_force_tprod_tables(uq, selected_db, daily_only)
             options2 = _build_runtime_options(selected_db, forced_daily)
-            plan2 = _ask_planner(uq, options2)
+            plan2 = await _ask_planner(uq, options2)
 
             # ---- Additional upfront check for retry plan as well ----
             if not isinstance(plan2, dict):
@@ -3503,11 +3420,7 @@ async def answer(
                 if ok2:
                     try:
                         sql2 = build_sql_from_plan(plan2, selected_db, uq)
-                        sql2 = normalize_dates(sql2)
-                        sql2 = enforce_wide_projection_for_generic(uq, sql2)
-                        sql2 = value_aware_text_filter(sql2, selected_db)
-                        sql2 = ensure_label_filter(sql2, uq, selected_db)
-                        enforce_predicate_type_compat(sql2, selected_db)
+                        sql2 = apply_sql_rewrites(sql2, uq, selected_db)
                         if is_valid_sql(sql2, selected_db):
                             rows2 = run_sql(sql2, selected_db, cancellation_token=cancellation_token)
                             if rows2:
@@ -3522,32 +3435,19 @@ async def answer(
     rows_for_summary = widen_results_if_needed(
         rows, sql, selected_db, display_mode, user_query
     )
-    if display_mode in ["summary", "both"] or trend_intent:
-        columns_for_summary = list(rows[0].keys()) if rows else []
-        python_summary = await summarize_results_async(
-            results={"rows": rows_for_summary},
-            user_query=user_query,
-            columns=columns_for_summary,
-            sql=sql,
-        )
-    else:
-        python_summary = ""
-
+    # One summary per answer: the analytical model runs under a latency budget
+    # while the deterministic local report is computed in parallel as fallback.
     if display_mode in ["summary", "both"] or trend_intent:
         try:
-            if trend_intent:
-                summary = python_summary
-            else:
-                summary = summarize_with_mistral(
-                    user_query=user_query,
-                    columns=list(rows[0].keys()) if rows else [],
-                    rows=rows,
-                    backend_summary=python_summary,
-                    sql=sql,
-                )
+            summary = await summarize_answer_async(
+                user_query=user_query,
+                columns=list(rows[0].keys()) if rows else [],
+                rows=rows_for_summary,
+                sql=sql,
+            )
         except Exception as e:
             logger.warning(f"[RAG] Natural language summary failed; falling back. Reason: {e}")
-            summary = python_summary
+            summary = f"Found {len(rows)} records matching your query."
     else:
         summary = ""
 
@@ -6,8 +6,10 @@ from chromadb.config import Settings
 import re
 
 from app.db_connector import connect_to_source
-from app.embeddings import get_embedding, encode_texts_batch
+from app.embeddings import encode_texts_cached
+from app.embedding_store import get_embedding_store_stats
 from app.config import SOURCES
+from app.memory_index import invalidate_memory_index
 
 import os
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
@@ -591,7 +593,7 @@ def load_schema_to_chroma():
                     table_ids.append(doc_id)
                     table_metas.append(enhanced_meta)
 
-                table_embs = encode_texts_batch(table_docs, batch_size=EMB_BATCH_SIZE)
+                table_embs = encode_texts_cached(table_docs, batch_size=EMB_BATCH_SIZE)
 
                 # Add tables in large batches
                 for i in range(0, len(table_docs), CHROMA_ADD_BATCH_SIZE):
@@ -612,7 +614,7 @@ def load_schema_to_chroma():
                             alias_ids.append(f"{source_id}.{table}::ALIAS::{a}")
                             alias_meta.append({"source_table": table, "source_id": source_id, "kind": "alias"})
                     if alias_docs:
-                        alias_embs = encode_texts_batch(alias_docs, batch_size=EMB_BATCH_SIZE)
+                        alias_embs = encode_texts_cached(alias_docs, batch_size=EMB_BATCH_SIZE)
                         for i in range(0, len(alias_docs), CHROMA_ADD_BATCH_SIZE):
                             collection.add(
                                 documents=alias_docs[i:i+CHROMA_ADD_BATCH_SIZE],
@@ -659,7 +661,7 @@ def load_schema_to_chroma():
                                 business_metas.append(business_meta)
 
                 if business_docs:
-                    business_embs = encode_texts_batch(business_docs, batch_size=EMB_BATCH_SIZE)
+                    business_embs = encode_texts_cached(business_docs, batch_size=EMB_BATCH_SIZE)
                     for i in range(0, len(business_docs), CHROMA_ADD_BATCH_SIZE):
                         collection.add(
                             documents=business_docs[i:i+CHROMA_ADD_BATCH_SIZE],
@@ -728,7 +730,7 @@ def load_schema_to_chroma():
 
                     # embed columns in batch
                     if col_docs:
-                        col_embs = encode_texts_batch(col_docs, batch_size=EMB_BATCH_SIZE)
+                        col_embs = encode_texts_cached(col_docs, batch_size=EMB_BATCH_SIZE)
                         # push to collection in chunks
                         for i in range(0, len(col_docs), CHROMA_ADD_BATCH_SIZE):
                             collection.add(
@@ -748,7 +750,7 @@ def load_schema_to_chroma():
                                 alias_ids_c.append(f"{source_id}.{table}.{col_name}::ALIAS::{a}")
                                 alias_meta_c.append({"source_table": table, "column": col_name, "source_id": source_id, "kind": "alias"})
                         if alias_docs_c:
-                            alias_embs_c = encode_texts_batch(alias_docs_c, batch_size=EMB_BATCH_SIZE)
+                            alias_embs_c = encode_texts_cached(alias_docs_c, batch_size=EMB_BATCH_SIZE)
                             for i in range(0, len(alias_docs_c), CHROMA_ADD_BATCH_SIZE):
                                 collection.add(
                                     documents=alias_docs_c[i:i+CHROMA_ADD_BATCH_SIZE],
@@ -778,7 +780,7 @@ def load_schema_to_chroma():
                                             "column": col_name, "kind": "column_value",
                                             "value": pv, "freq": cnt
                                         })
-                                    v_embs = encode_texts_batch(v_docs, batch_size=EMB_BATCH_SIZE)
+                                    v_embs = encode_texts_cached(v_docs, batch_size=EMB_BATCH_SIZE)
                                     for i in range(0, len(v_docs), CHROMA_ADD_BATCH_SIZE):
                                         collection.add(
                                             documents=v_docs[i:i+CHROMA_ADD_BATCH_SIZE],
@@ -795,7 +797,7 @@ def load_schema_to_chroma():
                                     mn, avg, mx = rng
                                     doc = f"RANGE for {source_id}.{table}.{col_name}: min {mn}, avg {avg}, max {mx}."
                                     rid = f"{source_id}.{table}.{col_name}::RANGE"
-                                    emb = get_embedding(doc)
+                                    emb = encode_texts_cached([doc])[0]
                                     collection.add(
                                         documents=[doc], embeddings=[emb], ids=[rid],
                                         metadatas=[{
@@ -820,6 +822,8 @@ def load_schema_to_chroma():
                     + (f", {system_view_count} system views" if system_view_count > 0 else "")
                     + " indexed."
                 )
+                invalidate_memory_index(source_id)
+                logger.info(f"[{source_id}] Embedding store: {get_embedding_store_stats()}")
 
 
         except Exception as e:
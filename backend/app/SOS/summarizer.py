@@ -17,12 +17,15 @@ from app.ollama_llm import ask_analytical_model_async
 from app.config import (
     SUMMARY_MAX_ROWS,
     SUMMARY_CHAR_BUDGET,
+    SUMMARY_LATENCY_BUDGET_S,
     DEEPSEEK_ENABLED as OPENROUTER_ENABLED,  # Use DEEPSEEK_ENABLED instead of OPENROUTER_ENABLED
     SUMMARY_ENGINE,
 )
 # Use the SOS-specific DeepSeek client
 from .deepseek_client import DeepSeekClient
-from app.config import API_MODELS
+from .result_profile import profile_results
+from app.config import API_MODELS, PROMPT_BUDGET_CONFIG
+from app.prompt_budget import thin_lines_to_budget
 
 logger = logging.getLogger(__name__)
 
@@ -65,13 +68,7 @@ def _pick_metric_columns(
         return []
 
     # Simple approach: pick numeric columns
-    numeric_cols = []
-    for col in columns:
-        # Check if column has numeric values
-        sample_values = [r.get(col) for r in rows[:10] if col in r]
-        if sample_values and any(_is_num(v) for v in sample_values):
-            numeric_cols.append(col)
-    return numeric_cols
+    return profile_results(columns, rows).numeric_columns
 
 
 def _pick_label_columns(
@@ -82,13 +79,7 @@ def _pick_label_columns(
     if not rows:
         return []
 
-    label_cols = []
-    for col in columns:
-        # Check if column has non-numeric values
-        sample_values = [r.get(col) for r in rows[:10] if col in r]
-        if sample_values and not all(_is_num(v) for v in sample_values):
-            label_cols.append(col)
-    return label_cols
+    return profile_results(columns, rows).label_columns
 
 
 def extract_production_context(user_query: str, columns: List[str]) -> Dict[str, Any]:
@@ -114,19 +105,9 @@ def _generate_comprehensive_report(
             return "No data found matching your criteria."
 
         # Find numeric and label columns
-        numeric_cols: List[str] = []
-        label_cols: List[str] = []
-        for col in columns:
-            # Sample a few values to determine column type
-            sample_values = [
-                r.get(col) for r in rows[:5] if col in r and r.get(col) is not None
-            ]
-            if not sample_values:
-                continue
-            if all(_is_num(v) for v in sample_values if v is not None):
-                numeric_cols.append(col)
-            else:
-                label_cols.append(col)
+        profile = profile_results(columns, rows)
+        numeric_cols = profile.numeric_columns
+        label_cols = profile.label_columns
 
         # Start building the report
         report_sections: List[str] = []
@@ -143,16 +124,12 @@ def _generate_comprehensive_report(
         metrics_section = "## Key Metrics\n\n"
         for col in numeric_cols[:4]:  # Focus on top 4 numeric columns
             try:
-                values = [
-                    float(r[col])
-                    for r in rows
-                    if col in r and _is_num(r.get(col))
-                ]
-                if values:
-                    total = sum(values)
-                    avg = total / len(values)
-                    max_val = max(values)
-                    min_val = min(values)
+                stats = profile[col]
+                if stats.numeric_count:
+                    total = stats.sum
+                    avg = stats.mean
+                    max_val = stats.max
+                    min_val = stats.min
                     metric_name = col.replace("_", " ").title()
 
                     # Different formatting for different metric types
@@ -165,13 +142,7 @@ def _generate_comprehensive_report(
                     elif "defect" in cl:
                         denom = 0.0
                         if numeric_cols and numeric_cols[0] != col:
-                            denom_values = [
-                                float(r.get(numeric_cols[0]))
-                                for r in rows
-                                if numeric_cols[0] in r
-                                and _is_num(r.get(numeric_cols[0]))
-                            ]
-                            denom = sum(denom_values) if denom_values else 0.0
+                            denom = profile[numeric_cols[0]].sum or 0.0
                         defect_rate = (total / denom * 100.0) if denom > 0 else 0.0
                         metrics_section += (
                             f"- **{metric_name}**: Total: {_fmt_num(total)}, "
@@ -209,31 +180,13 @@ def _generate_comprehensive_report(
                 f"## Analysis by {primary_label_col.replace('_', ' ').title()}\n\n"
             )
 
-            # Group and analyze data by the primary label
-            category_data: Dict[str, List[float]] = {}
-            for row in rows:
-                category = row.get(primary_label_col)
-                if (
-                    category
-                    and primary_metric_col in row
-                    and _is_num(row.get(primary_metric_col))
-                ):
-                    category_data.setdefault(category, []).append(
-                        float(row.get(primary_metric_col))
-                    )
-
-            # Calculate aggregates for each category
-            category_stats: Dict[str, Dict[str, float]] = {}
-            for category, values in category_data.items():
-                category_stats[category] = {
-                    "total": sum(values),
-                    "avg": (sum(values) / len(values)) if values else 0.0,
-                }
-
-            # Sort categories by total value
-            sorted_categories = sorted(
-                category_stats.items(), key=lambda x: x[1]["total"], reverse=True
-            )
+            # Group and analyze data by the primary label, sorted by total value
+            sorted_categories = [
+                (category, {"total": total, "avg": total / count})
+                for category, total, count in profile.group_totals(
+                    primary_label_col, primary_metric_col
+                )
+            ]
 
             # Display top performers
             if sorted_categories:
@@ -248,8 +201,8 @@ def _generate_comprehensive_report(
             # Comparison to average (if more than one category)
             if len(sorted_categories) > 1:
                 avg_total = (
-                    sum(stats["total"] for _, stats in category_stats.items())
-                    / len(category_stats)
+                    sum(stats["total"] for _, stats in sorted_categories)
+                    / len(sorted_categories)
                 )
                 diff_pct = (
                     (top_performer[1]["total"] - avg_total) / avg_total * 100.0
@@ -289,25 +242,14 @@ def _generate_comprehensive_report(
 
         if efficiency_col and production_col:
             # Check correlation between efficiency and production
-            high_ef_rows = [
-                r
-                for r in rows
-                if efficiency_col in r
-                and production_col in r
-                and _is_num(r.get(efficiency_col))
-                and float(r.get(efficiency_col)) > 70
-            ]
-            high_prod_from_high_ef = sum(
-                float(r.get(production_col))
-                for r in high_ef_rows
-                if _is_num(r.get(production_col))
-            )
-            total_prod = sum(
-                float(r.get(production_col))
-                for r in rows
-                if production_col in r and _is_num(r.get(production_col))
+            efficiency = profile[efficiency_col]
+            production = profile[production_col]
+            high_ef = efficiency.numeric_mask & (np.nan_to_num(efficiency.array) > 70)
+            high_prod_from_high_ef = float(
+                production.array[high_ef & production.numeric_mask].sum()
             )
-            if high_ef_rows and total_prod > 0:
+            total_prod = production.sum or 0.0
+            if high_ef.any() and total_prod > 0:
                 high_ef_contribution = high_prod_from_high_ef / total_prod * 100.0
                 insights_section += (
                     f"- Floors with efficiency above 70% contribute to "
@@ -320,27 +262,21 @@ def _generate_comprehensive_report(
 
         if defect_col and production_col and primary_label_col:
             # Check floors with high defect rates
-            floor_defect_rates: List[Tuple[str, float]] = []
-            for row in rows:
-                if (
-                    primary_label_col in row
-                    and defect_col in row
-                    and production_col in row
-                ):
-                    if _is_num(row.get(defect_col)) and _is_num(
-                        row.get(production_col)
-                    ):
-                        prod = float(row.get(production_col))
-                        if prod > 0:
-                            defect_rate = float(row.get(defect_col)) / prod * 100.0
-                            floor_defect_rates.append(
-                                (row.get(primary_label_col), defect_rate)
-                            )
-
-            if floor_defect_rates:
-                # Sort by defect rate
-                floor_defect_rates.sort(key=lambda x: x[1], reverse=True)
-                highest_defect_floor = floor_defect_rates[0]
+            defects = profile[defect_col]
+            production = profile[production_col]
+            valid = (
+                defects.numeric_mask
+                & production.numeric_mask
+                & (np.nan_to_num(production.array) > 0)
+            )
+            if valid.any():
+                rates = np.full(profile.row_count, -np.inf)
+                rates[valid] = defects.array[valid] / production.array[valid] * 100.0
+                worst = int(np.argmax(rates))
+                highest_defect_floor = (
+                    profile[primary_label_col].values[worst],
+                    float(rates[worst]),
+                )
                 insights_section += (
                     f"- **{highest_defect_floor[0]}** has the highest defect rate at "
                     f"{_fmt_num(highest_defect_floor[1])}%.\n"
@@ -425,29 +361,15 @@ def _format_data_for_api(columns: Sequence[str], rows: Sequence[Dict[str, Any]])
     summary += "Columns: " + ", ".join(columns) + "\n"
 
     # Group numeric columns for aggregation
-    numeric_cols: List[str] = []
-    for col in columns:
-        sample = next(
-            (r.get(col) for r in rows if col in r and r.get(col) is not None), None
-        )
-        if sample is not None and isinstance(sample, (int, float, Decimal)) and not isinstance(sample, bool):
-            numeric_cols.append(col)
+    profile = profile_results(columns, rows)
+    numeric_cols = profile.numeric_columns
 
     # Calculate aggregations for numeric columns
     if numeric_cols:
         summary += "\nAggregated data:\n"
         for col in numeric_cols:
-            values = [
-                float(r[col])
-                for r in rows
-                if col in r
-                and r.get(col) is not None
-                and isinstance(r.get(col), (int, float, Decimal))
-            ]
-            if values:
-                total = sum(values)
-                avg = total / len(values)
-                summary += f" {col}: Total={total:,.2f}, Average={avg:,.2f}\n"
+            stats = profile[col]
+            summary += f" {col}: Total={stats.sum:,.2f}, Average={stats.mean:,.2f}\n"
 
     # Show sample records
     summary += "\nSample records:\n"
@@ -477,11 +399,27 @@ def _create_summarization_prompt(
     sql: Optional[str] = None,
 ) -> str:
     """Create a prompt for the API to generate a natural language summary."""
+    return _build_summarization_prompt(user_query, columns, rows, sql)[0]
+
+
+def _build_summarization_prompt(
+    user_query: str,
+    columns: Sequence[str],
+    rows: Sequence[Dict[str, Any]],
+    sql: Optional[str] = None,
+) -> Tuple[str, int]:
+    """
+    Build the summarization prompt within the configured data token budget.
+
+    Returns:
+        Tuple of (prompt, prompt tokens saved by thinning inlined data points)
+    """
     from datetime import date as _date, datetime as _datetime
     from decimal import Decimal as _Decimal
 
     # Format the data for the API
     data_summary = _format_data_for_api(columns, rows)
+    saved_tokens = 0
 
     # Detect if this is a TNA task query by checking for CTL pattern or task-related terms
     is_tna_query = bool(
@@ -596,9 +534,17 @@ Structure your response with clear section headers and maintain a professional b
 
         # Append to prompt (only if we have at least 2 points)
         if len(data_points) >= 2:
+            point_lines, saved_tokens = thin_lines_to_budget(
+                [f"- Date: {d}, Value: {v}\n" for d, v in data_points],
+                PROMPT_BUDGET_CONFIG["summary_data_tokens"],
+            )
+            if saved_tokens:
+                logger.info(
+                    f"Trend data points thinned {len(data_points)} -> {len(point_lines)} "
+                    f"(saved {saved_tokens} prompt tokens)"
+                )
             prompt += "\n\n### Trend Analysis Data Points\n"
-            for d, v in data_points:
-                prompt += f"- Date: {d}, Value: {v}\n"
+            prompt += "".join(point_lines)
 
             prompt += (
                 "\n### Trend Analysis Instructions\n"
@@ -617,7 +563,7 @@ Structure your response with clear section headers and maintain a professional b
                 "that resemble trend-like behavior.\n"
             )
 
-    return prompt
+    return prompt, saved_tokens
 
 
 
@@ -640,13 +586,19 @@ async def _generate_api_summary_async(
     columns: Sequence[str],
     rows: Sequence[Dict[str, Any]],
     sql: Optional[str] = None,
+    fallback: bool = True,
 ) -> str:
-    """Generate a natural language summary using the OpenRouter API (async version)."""
+    """
+    Generate a natural language summary using the OpenRouter API (async version).
+
+    With ``fallback=False`` an API failure raises instead of returning the
+    local report, for callers that already compute that report themselves.
+    """
     try:
         # Prepare data for the API
         _ = _format_data_for_api(columns, rows)  # kept for parity
         # Create prompt for the API
-        prompt = _create_summarization_prompt(user_query, columns, rows, sql)
+        prompt, saved_tokens = _build_summarization_prompt(user_query, columns, rows, sql)
         # Select appropriate model based on query complexity
         model = _select_summarization_model(user_query, len(rows))
 
@@ -657,16 +609,21 @@ async def _generate_api_summary_async(
             model=model,
             temperature=0.3,
             max_tokens=500,
+            prompt_tokens_saved=saved_tokens,
         )
 
         if response.success and response.content:
             return response.content.strip()
 
         logger.warning(f"API summarization failed: {response.error}")
+        if not fallback:
+            raise RuntimeError(f"API summarization failed: {response.error}")
         # Fallback to traditional summarization
         return _fallback_summarization(user_query, columns, rows)
 
     except Exception as e:
+        if not fallback:
+            raise
         logger.error(f"API summarization error: {e}")
         # Fallback to traditional summarization
         return _fallback_summarization(user_query, columns, rows)
@@ -700,6 +657,34 @@ def _generate_api_summary(
         return _fallback_summarization(user_query, columns, rows)
 
 
+def _totals_summary(
+    columns: Sequence[str],
+    rows: Sequence[Dict[str, Any]],
+    metric_cols: List[str],
+    label_cols: List[str],
+) -> str:
+    """One-line "Found N records • Metric: total • Across K floors" summary."""
+    profile = profile_results(columns, rows)
+    summary_parts: List[str] = [f"Found {len(rows)} records"]
+
+    if metric_cols and label_cols:
+        # Add totals for key metrics
+        for col in metric_cols[:3]:  # Top 3 metrics
+            total = profile[col].sum
+            if total is not None and total > 0:
+                metric_name = col.replace("_", " ").title()
+                summary_parts.append(f"{metric_name}: {_fmt_num(total)}")
+
+    # Check for floor-wise data
+    floor_col = next((c for c in columns if "floor" in c.lower()), None)
+    if floor_col and len(rows) > 1:
+        floor_count = profile[floor_col].distinct_count
+        if floor_count > 1:
+            summary_parts.append(f"Across {floor_count} floors")
+
+    return " • ".join(summary_parts)
+
+
 def _create_default_response(
     user_query: str,
     columns: Sequence[str],
@@ -714,31 +699,7 @@ def _create_default_response(
         metric_cols = _pick_metric_columns(columns, rows, user_query)
         label_cols = _pick_label_columns(columns, rows)
 
-        summary_parts: List[str] = [f"Found {len(rows)} records"]
-
-        if metric_cols and label_cols:
-            # Add totals for key metrics
-            for col in metric_cols[:3]:  # Top 3 metrics
-                try:
-                    values = [
-                        float(r[col]) for r in rows if col in r and _is_num(r.get(col))
-                    ]
-                    if values:
-                        total = sum(values)
-                        if total > 0:
-                            metric_name = col.replace("_", " ").title()
-                            summary_parts.append(f"{metric_name}: {_fmt_num(total)}")
-                except (ValueError, TypeError):
-                    pass
-
-        # Check for floor-wise data
-        floor_col = next((c for c in columns if "floor" in c.lower()), None)
-        if floor_col and len(rows) > 1:
-            floor_count = len({r.get(floor_col) for r in rows if floor_col in r})
-            if floor_count > 1:
-                summary_parts.append(f"Across {floor_count} floors")
-
-        return " • ".join(summary_parts)
+        return _totals_summary(columns, rows, metric_cols, label_cols)
 
     except Exception as e:
         logger.error(f"Default response creation error: {e}")
@@ -775,7 +736,7 @@ def _fallback_summarization(
             or "summary" in user_query.lower()
             or "report" in user_query.lower()
         ):
-            return _generate_comprehensive_report(user_query, list(columns), list(rows))
+            return _generate_comprehensive_report(user_query, list(columns), rows)
 
         # For other queries, use the simplified logic
         if not rows:
@@ -792,31 +753,7 @@ def _fallback_summarization(
         metric_cols = _pick_metric_columns(columns, rows, user_query)
         label_cols = _pick_label_columns(columns, rows)
 
-        summary_parts: List[str] = [f"Found {len(rows)} records"]
-
-        if metric_cols and label_cols:
-            # Add totals for key metrics
-            for col in metric_cols[:3]:  # Top 3 metrics
-                try:
-                    values = [
-                        float(r[col]) for r in rows if col in r and _is_num(r.get(col))
-                    ]
-                    if values:
-                        total = sum(values)
-                        if total > 0:
-                            metric_name = col.replace("_", " ").title()
-                            summary_parts.append(f"{metric_name}: {_fmt_num(total)}")
-                except (ValueError, TypeError):
-                    pass
-
-        # Check for floor-wise data
-        floor_col = next((c for c in columns if "floor" in c.lower()), None)
-        if floor_col and len(rows) > 1:
-            floor_count = len({r.get(floor_col) for r in rows if floor_col in r})
-            if floor_count > 1:
-                summary_parts.append(f"Across {floor_count} floors")
-
-        return " • ".join(summary_parts)
+        return _totals_summary(columns, rows, metric_cols, label_cols)
 
     except Exception as e:
         logger.error(f"Fallback summarization error: {e}")
@@ -984,6 +921,94 @@ async def summarize_results_async(
         # graceful fallback
         return _fallback_summarization(user_query, columns, rows)
 
+def _unwrap_model_response(summary_response: Any) -> str:
+    """Be flexible about the analytical model's response envelope."""
+    if isinstance(summary_response, dict):
+        return (
+            summary_response.get("summary")
+            or summary_response.get("text")
+            or summary_response.get("content")
+            or ""
+        )
+    return str(summary_response or "")
+
+
+async def _summary_model_call(
+    user_query: str,
+    columns: Sequence[str],
+    rows: Sequence[Dict[str, Any]],
+    sql: Optional[str] = None,
+) -> Any:
+    """
+    The one model call for an answer summary, chosen from config.
+
+    OpenRouter/DeepSeek when the API engine is enabled, ``call_llm`` when
+    SUMMARY_ENGINE is "mistral", otherwise the local analytical model.
+    """
+    if _should_use_api_summarization(user_query, rows):
+        return await _generate_api_summary_async(user_query, columns, rows, sql, fallback=False)
+    prompt = _create_summarization_prompt(user_query, columns, rows, sql)
+    if SUMMARY_ENGINE == "mistral":
+        from app.llm_client import call_llm
+
+        return await asyncio.to_thread(call_llm, prompt, max_tokens=1000)
+    return await ask_analytical_model_async(prompt)
+
+
+async def summarize_answer_async(
+    user_query: str,
+    columns: Sequence[str],
+    rows: Sequence[Dict[str, Any]],
+    sql: Optional[str] = None,
+    latency_budget_s: float = SUMMARY_LATENCY_BUDGET_S,
+) -> str:
+    """
+    Produce the single summary for an answer.
+
+    The deterministic local report (_fallback_summarization) is computed in a
+    worker thread while the configured model (see _summary_model_call) runs.
+    If the model has not answered within ``latency_budget_s`` (or fails), it
+    is cancelled and the local report is returned, so a slow LLM costs at
+    most the budget.
+    """
+    if not rows:
+        return "No data found matching your criteria."
+
+    # Profile once; the prompt builder and the local report both reuse it.
+    profile_results(columns, rows)
+    local_task = asyncio.ensure_future(
+        asyncio.to_thread(_fallback_summarization, user_query, columns, rows)
+    )
+    # Mark its outcome retrieved even when the model wins and the task is dropped
+    local_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    llm_task = asyncio.ensure_future(_summary_model_call(user_query, columns, rows, sql))
+
+    t0 = time.perf_counter()
+    try:
+        done, _ = await asyncio.wait({llm_task}, timeout=max(0.0, latency_budget_s))
+        if llm_task in done and not llm_task.cancelled() and llm_task.exception() is None:
+            text = _unwrap_model_response(llm_task.result()).strip()
+            if text:
+                local_task.cancel()
+                return text
+            logger.warning("Summary model returned an empty summary; using local report")
+        elif llm_task in done:
+            logger.warning(f"Summary model call failed: {llm_task.exception()}; using local report")
+        else:
+            logger.warning(
+                f"Summary model exceeded {latency_budget_s:.1f}s budget; using local report"
+            )
+    finally:
+        if not llm_task.done():
+            llm_task.cancel()
+
+    try:
+        return await local_task
+    except Exception as e:
+        logger.error(f"Local summary failed after {time.perf_counter() - t0:.2f}s: {e}")
+        return f"Found {len(rows)} records matching your query."
+
+
 # (Optional) keep the old name as a thin wrapper so you don’t break other code
 def summarize_results(rows: list, user_query: str, sql: Optional[str] = None) -> str:
     """
@@ -0,0 +1,131 @@
+# app/SOS/table_features.py
+"""
+Per-table features for re-ranking SOS retrieval candidates in memory.
+
+The schema collection already holds everything the table-selection heuristics
+used to ask Oracle for: every table, its columns and their types, and the
+``is_critical`` flags the loader sets. ``get_table_features`` folds the
+collection's metadata, together with ``CRITICAL_TABLE_ENHANCED_INFO`` key
+metrics, into one ``TableFeatures`` per table. The result is cached per
+collection document count, and is read from the in-memory index when that is
+loaded.
+
+``rag_engine`` scores its candidates against these features, so choosing
+tables takes no DB or extra vector round trips.
+"""
+import logging
+import re
+import threading
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from app.memory_index import search_collection
+from .schema_loader_chroma import CRITICAL_TABLE_ENHANCED_INFO
+from .vector_store_chroma import get_chroma_client
+
+logger = logging.getLogger(__name__)
+
+_DAILY_NAME_RX = re.compile(r"(?:^|_)(DAILY|DLY|DAY)(?:$|_)", re.I)
+_DATE_TYPE_RX = re.compile(r"\b(DATE|TIMESTAMP)", re.I)
+_SYSTEM_PREFIXES = ("USER_", "ALL_", "DBA_")
+# Metric-name parts too generic to count as overlap on their own ("po number id")
+_GENERIC_PARTS = {"ID", "NO", "NUM", "NUMBER", "NAME", "CODE", "DATE", "QTY", "TYPE"}
+
+
+class TableFeatures:
+    """What the re-ranker knows about one table, without asking the database."""
+
+    __slots__ = ("name", "columns", "date_columns", "key_metrics", "metric_terms",
+                 "is_critical", "is_system_view", "dailyish")
+
+    def __init__(self, name: str, columns: Dict[str, str], is_critical: bool, is_system_view: bool):
+        self.name = name
+        self.columns: FrozenSet[str] = frozenset(columns)
+        self.date_columns: FrozenSet[str] = frozenset(c for c, t in columns.items() if _DATE_TYPE_RX.search(t or ""))
+        info = CRITICAL_TABLE_ENHANCED_INFO.get(name) or {}
+        self.key_metrics: Tuple[str, ...] = tuple(m.upper() for m in info.get("key_metrics") or ())
+        # key metric -> its distinctive name parts ("PRODUCTION_QTY" -> {"PRODUCTION"})
+        self.metric_terms: Dict[str, FrozenSet[str]] = {
+            m: frozenset(p for p in m.split("_") if len(p) >= 3 and p not in _GENERIC_PARTS) or frozenset([m])
+            for m in self.key_metrics
+        }
+        self.is_critical = is_critical or bool(info)
+        self.is_system_view = is_system_view or name.startswith(_SYSTEM_PREFIXES)
+        self.dailyish = bool(_DAILY_NAME_RX.search(name))
+
+    def metric_overlap(self, query_tokens: FrozenSet[str]) -> List[str]:
+        """Key metrics named in the upper-cased query tokens, whole or by a distinctive prefix ("SALARY" -> SAL)."""
+        return [
+            m for m, terms in self.metric_terms.items()
+            if m in query_tokens or any(tok.startswith(term) for term in terms for tok in query_tokens)
+        ]
+
+    def has_columns(self, columns: Iterable[str]) -> bool:
+        return all(c.upper() in self.columns for c in columns)
+
+
+def build_table_features(metadatas: Sequence[Optional[Dict[str, Any]]]) -> Dict[str, TableFeatures]:
+    """Group schema document metadata by ``source_table`` into TableFeatures."""
+    columns: Dict[str, Dict[str, str]] = {}
+    critical: Dict[str, bool] = {}
+    system: Dict[str, bool] = {}
+    for meta in metadatas:
+        meta = meta or {}
+        table = meta.get("source_table")
+        if not table:
+            continue
+        T = str(table).upper()
+        cols = columns.setdefault(T, {})
+        critical[T] = critical.get(T, False) or bool(meta.get("is_critical"))
+        system[T] = system.get(T, False) or meta.get("kind") == "system_view" or bool(meta.get("is_system_view"))
+        if meta.get("kind") == "column" and meta.get("column"):
+            cols[str(meta["column"]).upper()] = str(meta.get("type") or "")
+    return {T: TableFeatures(T, cols, critical[T], system[T]) for T, cols in columns.items()}
+
+
+_features: Dict[str, Tuple[int, Dict[str, TableFeatures]]] = {}
+_features_lock = threading.Lock()
+
+
+def get_table_features(selected_db: str) -> Dict[str, TableFeatures]:
+    """
+    Table name -> TableFeatures for ``selected_db``'s schema collection.
+
+    Rebuilt when the collection's document count changes. Returns an empty
+    dict when the collection cannot be read; callers then fall back to their
+    database checks.
+    """
+    try:
+        collection = get_chroma_client(selected_db).get_or_create_collection(name=f"schema_docs_{selected_db}")
+        source = search_collection(selected_db, collection)
+        count = source.count()
+    except Exception as e:
+        logger.warning(f"[TABLE FEATURES] Schema collection unavailable for {selected_db}: {e}")
+        return {}
+    cached = _features.get(selected_db)
+    if cached is not None and cached[0] == count:
+        return cached[1]
+    with _features_lock:
+        cached = _features.get(selected_db)
+        if cached is not None and cached[0] == count:
+            return cached[1]
+        if hasattr(source, "metadatas"):
+            metadatas = source.metadatas  # already in memory
+        else:
+            metadatas = (collection.get(include=["metadatas"]) if count else {}).get("metadatas") or []
+        features = build_table_features(metadatas)
+        _features[selected_db] = (count, features)
+        logger.info(f"[TABLE FEATURES] Built features for {len(features)} tables of {selected_db}")
+        return features
+
+
+def dailyish_tables(
+    features: Dict[str, TableFeatures],
+    must_have_cols: Sequence[str] = ("PRODUCTION_QTY",),
+    limit: int = 6,
+) -> List[str]:
+    """Daily-granularity tables (``*_DAILY``/``*_DLY``/``*_DAY``) having all ``must_have_cols``, by name."""
+    out = sorted(
+        T for T, f in features.items()
+        if f.dailyish and not re.search(r"(^|_)AI_", T) and f.has_columns(must_have_cols)
+    )
+    return out[:limit]
@@ -2,7 +2,8 @@
 # Vector store helpers for ChromaDB (with query-time synonym expansion)
 import logging
 import os
-from typing import List, Dict
+import threading
+from typing import Any, List, Dict, Optional, Sequence, Union
 
 import chromadb
 from chromadb.config import Settings
@@ -23,6 +24,10 @@ except ImportError:
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
 
 from app.embeddings import get_embedding
+from app.lexical_index import hybrid_search
+from app.memory_index import search_collection
+from app.schema_filters import query_by_kind
+from app.synonyms import SynonymExpander
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,11 +40,22 @@ ENABLE_QUERY_SYNONYMS = os.getenv("ENABLE_QUERY_SYNONYMS", "true").lower() == "t
 # =========================
 # Per-DB Chroma client
 # =========================
+_chroma_clients: Dict[str, Any] = {}
+_chroma_clients_lock = threading.Lock()
+
 def get_chroma_client(selected_db: str) -> chromadb.Client:
-    return chromadb.PersistentClient(
-        path=f"chroma_storage/{selected_db}",
-        settings=Settings(anonymized_telemetry=False)
-    )
+    # One client per DB for the life of the process (opened once, reused by every search).
+    client = _chroma_clients.get(selected_db)
+    if client is None:
+        with _chroma_clients_lock:
+            client = _chroma_clients.get(selected_db)
+            if client is None:
+                client = chromadb.PersistentClient(
+                    path=f"chroma_storage/{selected_db}",
+                    settings=Settings(anonymized_telemetry=False)
+                )
+                _chroma_clients[selected_db] = client
+    return client
 # =========================
 # Optional synonyms used ONLY at query-time (no indexing cost)
 # =========================
@@ -84,36 +100,17 @@ COLUMN_SYNONYMS = {
     "LAST_LOGIN": ["last login"]
 }
 
-def _contains_phrase(q: str, phrase: str) -> bool:
-    return phrase.lower() in q
+_SYNONYM_EXPANDER = SynonymExpander(COLUMN_SYNONYMS)
 
 def expand_query_with_synonyms(query: str) -> str:
     """
     Expand the user query with canonical tokens when a synonym/alias is detected.
     Keeps the index lean and improves recall without reindexing.
+    Synonyms match on word boundaries; expansions are memoized per query.
     """
     if not ENABLE_QUERY_SYNONYMS or not query:
         return query
-
-    ql = query.lower()
-    added = set()
-    extras = []
-
-    for canonical, syns in COLUMN_SYNONYMS.items():
-        canon_l = canonical.lower()
-        if canon_l in ql:
-            continue
-        if any(_contains_phrase(ql, s.lower()) for s in syns):
-            if canonical not in added:
-                extras.append(canonical)
-                added.add(canonical)
-
-    if not extras:
-        return query
-
-    expanded = query + " " + " ".join(extras)
-    logger.debug(f"[QuerySynonyms] Expanded query: '{query}' → '{expanded}'")
-    return expanded
+    return _SYNONYM_EXPANDER.expand(query)
 
 # =========================
 # Core search helpers
@@ -121,7 +118,7 @@ def expand_query_with_synonyms(query: str) -> str:
 def search_similar_schema(query: str, selected_db: str, top_k: int = 5) -> List[Dict]:
     client = get_chroma_client(selected_db)
     collection_name = f"schema_docs_{selected_db}"
-    collection = client.get_or_create_collection(name=collection_name)
+    collection = search_collection(selected_db, client.get_or_create_collection(name=collection_name))
 
     q_expanded = expand_query_with_synonyms(query)
     query_vector = get_embedding(q_expanded)
@@ -147,7 +144,7 @@ def search_vector_store_detailed(query: str, selected_db: str, top_k: int = 3) -
 
     # Will create an empty collection if missing (harmless), so queries just return [].
     try:
-        collection = client.get_or_create_collection(name=collection_name)
+        collection = search_collection(selected_db, client.get_or_create_collection(name=collection_name))
     except Exception as e:
         logger.warning(f"[CHROMA] Could not get/create collection '{collection_name}': {e}")
         return []
@@ -184,10 +181,62 @@ def search_vector_store_detailed(query: str, selected_db: str, top_k: int = 3) -
 # ✅ Unified hybrid search used by query_engine.py
 def hybrid_schema_value_search(query: str, selected_db: str, top_k: int = 10) -> List[Dict]:
     """
-    Simple hybrid: detailed semantic search after query-time expansion.
-    If you add keyword/metadata filtering later, integrate here.
+    Hybrid retrieval: BM25 over the schema documents fused (RRF) with the detailed
+    semantic search after query-time expansion.
+
+    A query naming an exact identifier (table/column name, sampled value) is
+    answered from the lexical index alone, without running the embedding model.
+    """
+    collection_name = f"schema_docs_{selected_db}"
+    try:
+        collection = get_chroma_client(selected_db).get_or_create_collection(name=collection_name)
+    except Exception as e:
+        logger.warning(f"[CHROMA] Could not get/create collection '{collection_name}': {e}")
+        return []
+    return hybrid_search(
+        selected_db,
+        collection,
+        query,
+        top_k,
+        lambda n: search_vector_store_detailed(query, selected_db=selected_db, top_k=n),
+    )
+
+def search_schema_typed(
+    query: str,
+    selected_db: str,
+    quotas: Dict[str, int],
+    source_table: Optional[Union[str, Sequence[str]]] = None,
+    is_critical: Optional[bool] = None,
+) -> Dict[str, List[Dict]]:
+    """
+    Search schema documents with a per-kind quota, filtered server-side.
+
+    Args:
+        query: Query text
+        selected_db: Database ID
+        quotas: Kind -> number of hits, e.g. ``{"column": 12}``
+        source_table: Restrict to documents of these tables
+        is_critical: Restrict to critical-table documents
+
+    Returns:
+        Kind -> hits shaped like ``search_vector_store_detailed`` output
     """
-    return search_vector_store_detailed(query, selected_db=selected_db, top_k=top_k)
+    collection_name = f"schema_docs_{selected_db}"
+    try:
+        collection = get_chroma_client(selected_db).get_or_create_collection(name=collection_name)
+    except Exception as e:
+        logger.warning(f"[CHROMA] Could not get/create collection '{collection_name}': {e}")
+        return {kind: [] for kind in quotas}
+
+    query_vector = get_embedding(expand_query_with_synonyms(query))
+    return query_by_kind(
+        search_collection(selected_db, collection),
+        query_vector,
+        quotas,
+        source_table=source_table,
+        is_critical=is_critical,
+        include_distances=True,
+    )
 
 # ✅ Persist to disk (no-op on PersistentClient; keep for compatibility)
 def persist_chroma(selected_db: str):
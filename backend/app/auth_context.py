@@ -0,0 +1,85 @@
+# app/auth_context.py
+"""
+Per-request authentication context.
+
+The bearer token is extracted and verified once per request and the result is
+stored on ``request.state``; later helpers in the same request (and the
+``get_auth_context`` FastAPI dependency) reuse it. Token verification and the
+admin/authorized lookups are backed by short-TTL caches in ``jwt_utils`` and
+``user_access``.
+"""
+import logging
+from typing import Optional
+
+from fastapi import Request
+
+import app.user_access as user_access
+from app.jwt_utils import decode_access_token_cached
+
+logger = logging.getLogger(__name__)
+
+_STATE_ATTR = "auth_context"
+
+
+class AuthContext:
+    """Identity of the caller for a single request."""
+
+    def __init__(self, username: Optional[str] = None, token_present: bool = False):
+        self.username = username
+        self.token_present = token_present
+        self._is_admin: Optional[bool] = None
+        self._is_authorized: Optional[bool] = None
+
+    @property
+    def is_authenticated(self) -> bool:
+        return self.username is not None
+
+    @property
+    def is_admin(self) -> bool:
+        if self._is_admin is None:
+            self._is_admin = bool(self.username) and user_access.is_user_admin_cached(self.username)
+        return self._is_admin
+
+    @property
+    def is_authorized(self) -> bool:
+        if self._is_authorized is None:
+            self._is_authorized = bool(self.username) and user_access.is_user_authorized_cached(self.username)
+        return self._is_authorized
+
+
+def _extract_token(request: Request) -> Optional[str]:
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        return auth_header[7:]  # Remove "Bearer " prefix
+    # Check for custom auth token header
+    return request.headers.get("X-Auth-Token") or request.headers.get("authToken")
+
+
+def resolve_auth_context(request: Request) -> AuthContext:
+    """Return the request's AuthContext, verifying the token on first use only."""
+    ctx = getattr(request.state, _STATE_ATTR, None)
+    if ctx is not None:
+        return ctx
+
+    token = _extract_token(request)
+    username = None
+    if token:
+        try:
+            payload = decode_access_token_cached(token)
+            if payload and "sub" in payload:
+                username = payload["sub"]
+            else:
+                logger.warning("Invalid or expired JWT token")
+        except Exception as e:
+            logger.warning(f"Failed to extract username from request: {e}")
+    else:
+        logger.debug("No token found in request to %s", request.url.path)
+
+    ctx = AuthContext(username=username, token_present=bool(token))
+    setattr(request.state, _STATE_ATTR, ctx)
+    return ctx
+
+
+async def get_auth_context(request: Request) -> AuthContext:
+    """FastAPI dependency: ``ctx: AuthContext = Depends(get_auth_context)``."""
+    return resolve_auth_context(request)
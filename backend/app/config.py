@@ -137,10 +137,117 @@ OLLAMA_SQL_NUM_PREDICT = int(os.getenv("OLLAMA_SQL_NUM_PREDICT", "512"))
 OLLAMA_SQL_NUM_CTX = int(os.getenv("OLLAMA_SQL_NUM_CTX", "4096"))
 OLLAMA_SQL_SEED = int(os.getenv("OLLAMA_SQL_SEED", "7"))
 
+# Async Ollama client (app/ollama_llm.AsyncOllamaClient): shared HTTP session, streaming, residency
+OLLAMA_CLIENT_CONFIG = {
+    "keep_alive": os.getenv("OLLAMA_KEEP_ALIVE", "30m"),  # how long Ollama keeps a model loaded after a request
+    "preload_models": [m.strip() for m in os.getenv("OLLAMA_PRELOAD_MODELS", "").split(",") if m.strip()],
+    "default_concurrency": int(os.getenv("OLLAMA_DEFAULT_CONCURRENCY", "2")),  # in-flight requests per model
+    # per-model overrides, e.g. "deepseek-coder-v2:16b=1,mistral=3"
+    "model_concurrency": {
+        k.strip(): int(v) for k, v in
+        (item.rsplit("=", 1) for item in os.getenv("OLLAMA_MODEL_CONCURRENCY", "").split(",") if "=" in item)
+    },
+    "connection_limit": int(os.getenv("OLLAMA_CONNECTION_LIMIT", "16")),
+    "keepalive_timeout_s": float(os.getenv("OLLAMA_HTTP_KEEPALIVE_S", "60")),
+}
+
 # app/config.py
 SUMMARY_ENGINE = (os.getenv("SUMMARY_ENGINE") or "py").strip().lower()
 SUMMARY_MAX_ROWS = int(os.getenv("SUMMARY_MAX_ROWS", 120))
 SUMMARY_CHAR_BUDGET = int(os.getenv("SUMMARY_CHAR_BUDGET", 24000))
+# Seconds the answer path waits for the LLM summary before serving the local report
+SUMMARY_LATENCY_BUDGET_S = float(os.getenv("SUMMARY_LATENCY_BUDGET_S", "20"))
+
+# Token usage log store (buffered, rotated daily, gzip archives + offset index)
+TOKEN_LOG_CONFIG = {
+    "dir": os.getenv("TOKEN_LOG_DIR", "logs"),
+    "flush_entries": int(os.getenv("TOKEN_LOG_FLUSH_ENTRIES", "50")),
+    "flush_interval_s": float(os.getenv("TOKEN_LOG_FLUSH_INTERVAL_S", "2.0")),
+    "buffer_bytes": int(os.getenv("TOKEN_LOG_BUFFER_BYTES", "65536")),
+    "retention_days": int(os.getenv("TOKEN_LOG_RETENTION_DAYS", "90")),
+}
+
+# Training-data exports (/export/sql, /export/summary)
+EXPORT_CONFIG = {
+    "max_rows": int(os.getenv("EXPORT_MAX_ROWS", "5000000")),  # server-side cap per export
+    "fetch_batch_size": int(os.getenv("EXPORT_FETCH_BATCH_SIZE", "5000")),
+}
+
+# Rate limiting backend: "memory" (per process) or "sqlite" (shared by all workers on the host)
+RATE_LIMIT_CONFIG = {
+    "backend": os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower(),
+    "sqlite_path": os.getenv("RATE_LIMIT_SQLITE_PATH", os.path.join(os.path.dirname(__file__), "..", "rate_limits.sqlite3")),
+    "max_keys": int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")),
+}
+
+# Processor registry warm-up (run in the FastAPI startup hook)
+PROCESSOR_REGISTRY_CONFIG = {
+    "warm_embeddings": os.getenv("WARM_EMBEDDINGS_ON_STARTUP", "true").lower() == "true",
+    "warm_chroma_dbs": [db.strip() for db in os.getenv("WARM_CHROMA_DBS", "source_db_1,source_db_2").split(",") if db.strip()],
+}
+
+# Shared query-understanding stage (app/query_features.py)
+QUERY_FEATURES_CONFIG = {
+    "cache_size": int(os.getenv("QUERY_FEATURES_CACHE_SIZE", "256")),  # questions kept in the analyze_query memo
+    "erp_vocabulary_ttl_s": float(os.getenv("ERP_VOCABULARY_TTL_S", "3600")),  # rebuild ERP router keywords from schema
+}
+
+# Prompt assembly (app/prompt_budget.py): schema-context dedupe/ranking and token budgets
+PROMPT_BUDGET_CONFIG = {
+    "tokenizer": os.getenv("PROMPT_TOKENIZER", "deepseek-ai/DeepSeek-V3"),  # HF tokenizer used for token counts
+    "schema_context_tokens": int(os.getenv("PROMPT_SCHEMA_CONTEXT_TOKENS", "1800")),  # 0 disables the budget
+    "summary_data_tokens": int(os.getenv("PROMPT_SUMMARY_DATA_TOKENS", "1200")),  # trend points inlined in summaries
+    "count_cache_size": int(os.getenv("PROMPT_TOKEN_COUNT_CACHE_SIZE", "4096")),
+}
+
+# Streaming SQL generation (app/sql_stream.py): stop the LLM at the first complete statement
+SQL_STREAM_CONFIG = {
+    "early_stop": os.getenv("SQL_STREAM_EARLY_STOP", "true").lower() == "true",
+    "deepseek_stream": os.getenv("SQL_STREAM_DEEPSEEK", "true").lower() == "true",  # stream API SQL calls too
+    "observe_every": int(os.getenv("SQL_STREAM_OBSERVE_EVERY", "20")),  # 1 in N runs to completion to measure savings; 0 = never
+}
+
+# Request coalescing (app/singleflight.py): identical concurrent /chat questions share one answer
+CHAT_SINGLEFLIGHT_ENABLED = os.getenv("CHAT_SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+# Embedding inference backend (app/embedding_backends.py)
+EMBEDDING_CONFIG = {
+    "backend": os.getenv("EMBEDDING_BACKEND", "sentence_transformers").strip().lower(),  # or "onnx"
+    "model": os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en"),
+    "onnx_dir": os.getenv("EMBEDDING_ONNX_DIR", os.path.join(os.path.dirname(__file__), "..", "models", "bge-small-en-onnx")),
+    "onnx_int8": os.getenv("EMBEDDING_ONNX_INT8", "true").lower() == "true",  # use model_int8.onnx when present
+    "threads": int(os.getenv("EMBEDDING_THREADS", "0")),  # intra-op threads; 0 = library default
+    "max_seq_length": int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "512")),
+    "preload": os.getenv("EMBEDDING_PRELOAD", "false").lower() == "true",  # load at app.main import (before a pre-fork server forks)
+}
+
+# Micro-batching of concurrent single-text embeddings (app/embedding_batcher.py)
+EMBEDDING_BATCH_CONFIG = {
+    "enabled": os.getenv("EMBEDDING_BATCHING", "true").lower() == "true",
+    "max_batch_size": int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32")),  # texts per forward pass
+    "max_wait_ms": float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")),  # how long a request waits for others
+}
+
+# Persistent content-hash embedding store used by the schema loaders (app/embedding_store.py)
+EMBEDDING_STORE_CONFIG = {
+    "enabled": os.getenv("EMBEDDING_STORE", "true").lower() == "true",
+    "path": os.getenv("EMBEDDING_STORE_PATH", os.path.join(os.path.dirname(__file__), "..", "embedding_store")),
+}
+
+# In-memory NumPy search for small schema collections (app/memory_index.py)
+MEMORY_INDEX_CONFIG = {
+    "dbs": [db.strip() for db in os.getenv("MEMORY_INDEX_DBS", "source_db_1").split(",") if db.strip()],
+    "max_docs": int(os.getenv("MEMORY_INDEX_MAX_DOCS", "50000")),  # larger collections stay on Chroma
+    "refresh_s": float(os.getenv("MEMORY_INDEX_REFRESH_S", "30")),  # how often the collection count is re-checked
+    "consistency_every": int(os.getenv("MEMORY_INDEX_CONSISTENCY_EVERY", "0")),  # 1 in N searches also asks Chroma and compares; 0 = off
+}
+
+# Two-stage SOS table selection: one wide vector call, then in-memory re-ranking (app/SOS/rag_engine.py)
+TABLE_RERANK_CONFIG = {
+    "candidate_k": int(os.getenv("TABLE_RERANK_CANDIDATES", "40")),  # schema hits fetched for candidate generation
+    "context_k": int(os.getenv("TABLE_RERANK_CONTEXT_DOCS", "12")),  # of those, docs kept as prompt context
+    "max_tables": int(os.getenv("TABLE_RERANK_MAX_TABLES", "12")),
+}
 
 # ChromaDB Path
 CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", os.path.join(os.path.dirname(__file__), "..", "chroma_db"))
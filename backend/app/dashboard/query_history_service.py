@@ -3,14 +3,74 @@ Query History Service for Uttoron Admin Dashboard
 This service handles storage and retrieval of query history with final SQL.
 """
 
+import base64
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 from .base_service import BaseService
 
 logger = logging.getLogger(__name__)
 
+# Column list shared by every history read; kept in one place so the keyset
+# queries below stay aligned with the composite indexes in setup_dashboard_tables.sql.
+_HISTORY_COLUMNS = """
+            SELECT query_id, user_id, session_id, user_query, final_sql, execution_status,
+                   execution_time_ms, row_count, database_type, query_mode, feedback_type,
+                   feedback_comment, created_at, completed_at
+            FROM dashboard_query_history
+"""
+
+# Keyset predicate for ORDER BY created_at DESC, query_id DESC. The leading
+# "created_at <= :cursor_ts" gives the optimizer an index range start; the OR
+# only breaks ties between rows sharing the cursor timestamp.
+_KEYSET_PREDICATE = """
+            AND created_at <= :cursor_ts
+            AND (created_at < :cursor_ts OR query_id < :cursor_id)
+"""
+
+_KEYSET_ORDER = """
+            ORDER BY created_at DESC, query_id DESC
+            FETCH FIRST :limit ROWS ONLY
+"""
+
+
+def encode_history_cursor(created_at: datetime, query_id: int) -> str:
+    """
+    Encode a (created_at, query_id) position as an opaque, URL-safe cursor.
+
+    Args:
+        created_at: Creation timestamp of the last row on the page
+        query_id: Query identifier of the last row on the page
+
+    Returns:
+        Cursor string to pass back as ``cursor`` for the next page
+    """
+    raw = f"{created_at.isoformat()}|{int(query_id)}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by ``encode_history_cursor``.
+
+    Args:
+        cursor: Opaque cursor string
+
+    Returns:
+        Tuple of (created_at, query_id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        ts_part, id_part = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts_part), int(id_part)
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
+
 class QueryHistoryService(BaseService):
     """Service for managing query history with final SQL storage."""
     
@@ -195,72 +255,66 @@ class QueryHistoryService(BaseService):
         result = self._execute_query(query, {"query_id": query_id})
         return result[0] if result and len(result) > 0 else None
     
-    def get_queries_by_user(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_queries_by_user(self, user_id: str, limit: int = 100,
+                            cursor: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Get query records by user.
         
         Args:
             user_id: User identifier
             limit: Maximum number of records to return
+            cursor: Keyset cursor from a previous page (optional)
             
         Returns:
             List of query records
         """
-        query = """
-            SELECT query_id, user_id, session_id, user_query, final_sql, execution_status,
-                   execution_time_ms, row_count, database_type, query_mode, feedback_type,
-                   feedback_comment, created_at, completed_at
-            FROM dashboard_query_history 
+        query = _HISTORY_COLUMNS + """
             WHERE user_id = :user_id
-            ORDER BY created_at DESC
-            FETCH FIRST :limit ROWS ONLY
         """
+        params: Dict[str, Any] = {"user_id": user_id, "limit": limit}
+        query = self._apply_keyset(query, params, cursor)
         
-        return self._execute_query(query, {"user_id": user_id, "limit": limit})
+        return self._execute_query(query, params)
     
-    def get_queries_by_session(self, session_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+    def get_queries_by_session(self, session_id: str, limit: int = 100,
+                               cursor: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Get query records by session.
         
         Args:
             session_id: Session identifier
             limit: Maximum number of records to return
+            cursor: Keyset cursor from a previous page (optional)
             
         Returns:
             List of query records
         """
-        query = """
-            SELECT query_id, user_id, session_id, user_query, final_sql, execution_status,
-                   execution_time_ms, row_count, database_type, query_mode, feedback_type,
-                   feedback_comment, created_at, completed_at
-            FROM dashboard_query_history 
+        query = _HISTORY_COLUMNS + """
             WHERE session_id = :session_id
-            ORDER BY created_at DESC
-            FETCH FIRST :limit ROWS ONLY
         """
+        params: Dict[str, Any] = {"session_id": session_id, "limit": limit}
+        query = self._apply_keyset(query, params, cursor)
         
-        return self._execute_query(query, {"session_id": session_id, "limit": limit})
+        return self._execute_query(query, params)
     
-    def get_recent_queries(self, limit: int = 50) -> List[Dict[str, Any]]:
+    def get_recent_queries(self, limit: int = 50, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Get recent query records.
         
         Args:
             limit: Maximum number of records to return
+            cursor: Keyset cursor from a previous page (optional)
             
         Returns:
             List of recent query records
         """
-        query = """
-            SELECT query_id, user_id, session_id, user_query, final_sql, execution_status,
-                   execution_time_ms, row_count, database_type, query_mode, feedback_type,
-                   feedback_comment, created_at, completed_at
-            FROM dashboard_query_history 
-            ORDER BY created_at DESC
-            FETCH FIRST :limit ROWS ONLY
+        query = _HISTORY_COLUMNS + """
+            WHERE 1 = 1
         """
+        params: Dict[str, Any] = {"limit": limit}
+        query = self._apply_keyset(query, params, cursor)
         
-        return self._execute_query(query, {"limit": limit})
+        return self._execute_query(query, params)
     
     def get_query_statistics(self) -> Dict[str, Any]:
         """
@@ -317,25 +371,30 @@ class QueryHistoryService(BaseService):
         Returns:
             Query record or None if not found
         """
+        # Resolve the message and its chat by primary key, then probe the
+        # (session_id, created_at, query_id) index instead of correlating
+        # scalar subqueries. CLOB columns cannot be compared with "=".
         query = """
-            SELECT query_id, user_id, session_id, user_query, final_sql, execution_status,
-                   execution_time_ms, row_count, database_type, query_mode, feedback_type,
-                   feedback_comment, created_at, completed_at
-            FROM dashboard_query_history 
-            WHERE session_id = (
-                SELECT session_id FROM dashboard_chats WHERE chat_id = :chat_id
-            )
-            AND user_query = (
-                SELECT content FROM dashboard_messages WHERE message_id = :message_id AND chat_id = :chat_id
-            )
-            AND ROWNUM = 1
+            SELECT qh.query_id, qh.user_id, qh.session_id, qh.user_query, qh.final_sql,
+                   qh.execution_status, qh.execution_time_ms, qh.row_count, qh.database_type,
+                   qh.query_mode, qh.feedback_type, qh.feedback_comment, qh.created_at,
+                   qh.completed_at
+            FROM dashboard_messages m
+            JOIN dashboard_chats c ON c.chat_id = m.chat_id
+            JOIN dashboard_query_history qh ON qh.session_id = c.session_id
+            WHERE m.message_id = :message_id
+            AND m.chat_id = :chat_id
+            AND DBMS_LOB.COMPARE(qh.user_query, m.content) = 0
+            ORDER BY qh.created_at DESC, qh.query_id DESC
+            FETCH FIRST 1 ROWS ONLY
         """
         
         result = self._execute_query(query, {"chat_id": chat_id, "message_id": message_id})
         return result[0] if result and len(result) > 0 else None
 
     def get_filtered_query_history(self, user_id: str, database_type: Optional[str] = None, 
-                                 query_mode: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+                                 query_mode: Optional[str] = None, limit: int = 100,
+                                 cursor: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Get filtered query history based on user, database type, and query mode.
         
@@ -344,6 +403,7 @@ class QueryHistoryService(BaseService):
             database_type: Database type filter (optional)
             query_mode: Query mode filter (optional)
             limit: Maximum number of records to return
+            cursor: Keyset cursor from a previous page (optional)
             
         Returns:
             List of query records filtered by success status and ordered by creation time
@@ -354,11 +414,7 @@ class QueryHistoryService(BaseService):
             normalized_query_mode = self._normalize_mode(query_mode)
         
         # Base query with required filters
-        query = """
-            SELECT query_id, user_id, session_id, user_query, final_sql, execution_status,
-                   execution_time_ms, row_count, database_type, query_mode, feedback_type,
-                   feedback_comment, created_at, completed_at
-            FROM dashboard_query_history 
+        query = _HISTORY_COLUMNS + """
             WHERE user_id = :user_id
             AND execution_status = 'success'
         """
@@ -378,14 +434,44 @@ class QueryHistoryService(BaseService):
             query += " AND query_mode = :query_mode"
             params["query_mode"] = normalized_query_mode
             
-        # Add ordering and limit
-        query += """
-            ORDER BY created_at DESC
-            FETCH FIRST :limit ROWS ONLY
-        """
+        # Add keyset position, ordering and limit
+        query = self._apply_keyset(query, params, cursor)
         
         return self._execute_query(query, params)
     
+    @staticmethod
+    def next_cursor(rows: List[Dict[str, Any]], limit: int) -> Optional[str]:
+        """
+        Build the cursor for the page following ``rows``.
+        
+        Args:
+            rows: Rows returned for the current page
+            limit: Page size that was requested
+            
+        Returns:
+            Cursor string, or None when the page was not full (no more rows)
+        """
+        if not rows or len(rows) < limit:
+            return None
+        last = rows[-1]
+        created_at = last.get("created_at")
+        query_id = last.get("query_id")
+        if created_at is None or query_id is None:
+            return None
+        return encode_history_cursor(created_at, query_id)
+    
+    def _apply_keyset(self, query: str, params: Dict[str, Any], cursor: Optional[str]) -> str:
+        """
+        Append the keyset predicate (when a cursor is given) plus the stable
+        (created_at DESC, query_id DESC) ordering and row limit.
+        """
+        if cursor:
+            cursor_ts, cursor_id = decode_history_cursor(cursor)
+            query += _KEYSET_PREDICATE
+            params["cursor_ts"] = cursor_ts
+            params["cursor_id"] = cursor_id
+        return query + _KEYSET_ORDER
+    
     def _normalize_mode(self, mode: Optional[str]) -> str:
         """
         Normalize inbound mode strings to one of: 'General', 'SOS', 'PRAN_ERP', 'RFL_ERP'
@@ -403,3 +489,100 @@ class QueryHistoryService(BaseService):
         if m in ("rfl erp", "source_db_3", "db3"):
             return "RFL_ERP"
         return "General"
+
+
+def _benchmark_pagination(total_rows: int = 1_000_000, page_size: int = 50,
+                          pages: Tuple[int, ...] = (1, 100, 500, 900)) -> None:
+    """
+    Compare OFFSET paging against keyset paging over ``total_rows`` history rows.
+
+    Runs on an in-memory SQLite table that mirrors dashboard_query_history and the
+    IDX_DASHBOARD_QUERY_HISTORY_USER_KEYSET / _USER_CREATED indexes, so it needs
+    no Oracle instance.
+    """
+    import random
+    import sqlite3
+    import time
+    from datetime import timedelta
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE TABLE dashboard_query_history (
+            query_id INTEGER PRIMARY KEY,
+            user_id TEXT, session_id TEXT, user_query TEXT, final_sql TEXT,
+            execution_status TEXT, database_type TEXT, query_mode TEXT,
+            created_at TEXT
+        )
+    """)
+    users = [f"user{i}" for i in range(20)]
+    start = datetime(2024, 1, 1)
+    rng = random.Random(42)
+    batch = []
+    for qid in range(1, total_rows + 1):
+        batch.append((
+            qid, rng.choice(users), f"s{qid // 10}", "q", "SELECT 1 FROM DUAL",
+            "success" if rng.random() > 0.05 else "error", "source_db_1", "SOS",
+            (start + timedelta(seconds=qid * 3)).isoformat(sep=" "),
+        ))
+        if len(batch) == 50_000:
+            conn.executemany("INSERT INTO dashboard_query_history VALUES (?,?,?,?,?,?,?,?,?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO dashboard_query_history VALUES (?,?,?,?,?,?,?,?,?)", batch)
+    conn.execute("""
+        CREATE INDEX idx_qh_user_keyset ON dashboard_query_history
+            (user_id, execution_status, created_at DESC, query_id DESC, database_type, query_mode)
+    """)
+    conn.execute("""
+        CREATE INDEX idx_qh_user_created ON dashboard_query_history
+            (user_id, created_at DESC, query_id DESC)
+    """)
+    conn.commit()
+
+    base = """
+        SELECT query_id, user_id, session_id, user_query, final_sql, execution_status,
+               database_type, query_mode, created_at
+        FROM dashboard_query_history
+        WHERE user_id = ? AND execution_status = 'success'
+    """
+    user = users[0]
+
+    print(f"{total_rows:,} rows, page size {page_size}")
+    print(f"{'page':>6} {'offset ms':>10} {'keyset ms':>10}")
+    for page in pages:
+        t0 = time.perf_counter()
+        conn.execute(base + " ORDER BY created_at DESC, query_id DESC LIMIT ? OFFSET ?",
+                     (user, page_size, (page - 1) * page_size)).fetchall()
+        offset_ms = (time.perf_counter() - t0) * 1000
+
+        # Walk the cursor chain up to the page boundary (untimed), then time one fetch.
+        cursor_pos = None
+        for _ in range(page - 1):
+            if cursor_pos is None:
+                rows = conn.execute(base + " ORDER BY created_at DESC, query_id DESC LIMIT ?",
+                                    (user, page_size)).fetchall()
+            else:
+                rows = conn.execute(
+                    base + " AND created_at <= ? AND (created_at < ? OR query_id < ?)"
+                    " ORDER BY created_at DESC, query_id DESC LIMIT ?",
+                    (user, cursor_pos[0], cursor_pos[0], cursor_pos[1], page_size)).fetchall()
+            if not rows:
+                break
+            cursor_pos = (rows[-1][8], rows[-1][0])
+
+        t0 = time.perf_counter()
+        if cursor_pos is None:
+            conn.execute(base + " ORDER BY created_at DESC, query_id DESC LIMIT ?",
+                         (user, page_size)).fetchall()
+        else:
+            conn.execute(
+                base + " AND created_at <= ? AND (created_at < ? OR query_id < ?)"
+                " ORDER BY created_at DESC, query_id DESC LIMIT ?",
+                (user, cursor_pos[0], cursor_pos[0], cursor_pos[1], page_size)).fetchall()
+        keyset_ms = (time.perf_counter() - t0) * 1000
+        print(f"{page:>6} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    # python -m app.dashboard.query_history_service
+    _benchmark_pagination()
@@ -9,6 +9,7 @@ from contextlib import contextmanager
 from typing import List, Dict, Any, Tuple, Callable, Optional
 
 from app.config import FEEDBACK_DB_ID
+from app.sql_ast import split_top_level_unions
 from threading import Lock
 import threading
 
@@ -100,50 +101,7 @@ def _split_top_level_unions(sql: str):
     Split on top-level UNION / UNION ALL only (outside quotes/parentheses).
     Returns a list of SELECT arms (1+).
     """
-    s = sql or ""
-    parts, buf = [], []
-    par = 0
-    in_sq = False  # '...'
-    in_dq = False  # "..."
-    i, n = 0, len(s)
-
-    while i < n:
-        ch = s[i]
-
-        if ch == "'" and not in_dq:
-            in_sq = not in_sq
-            buf.append(ch); i += 1; continue
-        if ch == '"' and not in_sq:
-            in_dq = not in_dq
-            buf.append(ch); i += 1; continue
-
-        if not in_sq and not in_dq:
-            if ch == '(':
-                par += 1
-            elif ch == ')':
-                par = max(0, par - 1)
-
-            if par == 0 and s[i:i+5].upper() == "UNION":
-                # token boundary check
-                before = s[i-1] if i > 0 else " "
-                after = s[i+5] if i+5 < n else " "
-                if not (before.isalnum() or before == "_") and not (after.isalnum() or after == "_"):
-                    part = "".join(buf).strip()
-                    if part:
-                        parts.append(part)
-                    buf = []
-                    i += 5
-                    if s[i:i+4].upper() == " ALL":
-                        i += 4
-                    continue
-
-        buf.append(ch)
-        i += 1
-
-    tail = "".join(buf).strip()
-    if tail:
-        parts.append(tail)
-    return parts if parts else [s.strip()]
+    return split_top_level_unions(sql)
 
 def _extract_tables_and_aliases(sql_arm: str):
     """
@@ -0,0 +1,387 @@
+"""
+Pluggable embedding inference backends.
+
+``app.embeddings`` keeps its public API (``get_embedding``,
+``encode_texts_batch``, ``ChromaEmbeddingFunction``) and delegates the forward
+pass to the backend selected by ``EMBEDDING_CONFIG["backend"]``:
+
+- ``sentence_transformers``: the SentenceTransformer/PyTorch model (default)
+- ``onnx``: the same model exported to ONNX and run with ONNX Runtime on CPU.
+  When ``model_int8.onnx`` is present and ``onnx_int8`` is on, it uses the
+  dynamically int8-quantized weights.
+
+Both backends honour ``EMBEDDING_CONFIG["threads"]`` and sort a batch by text
+length, so each sub-batch is padded only to its own longest text.
+
+Export the ONNX model once per model version:
+
+    python -m app.embedding_backends export [out_dir]
+
+Compare speed and accuracy on the indexed schema documents:
+
+    python -m app.embedding_backends benchmark [selected_db]
+"""
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import EMBEDDING_CONFIG
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+ONNX_TOKENIZER_FILE = "tokenizer.json"
+ONNX_POOLING_FILE = "pooling.json"
+
+
+class EmbeddingBackend:
+    """Turns texts into a float32 matrix of shape (len(texts), dim)."""
+
+    name = "base"
+
+    def encode(self, texts: Sequence[str], batch_size: int = 64) -> np.ndarray:
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """The SentenceTransformer model on PyTorch."""
+
+    name = "sentence_transformers"
+
+    def __init__(self, model_name: str, threads: int = 0, max_seq_length: Optional[int] = None):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name)
+        if max_seq_length:
+            self.model.max_seq_length = min(max_seq_length, self.model.max_seq_length or max_seq_length)
+
+    def encode(self, texts: Sequence[str], batch_size: int = 64) -> np.ndarray:
+        # SentenceTransformer already sorts each call by length before batching.
+        vectors = self.model.encode(
+            list(texts), batch_size=batch_size, convert_to_numpy=True,
+            normalize_embeddings=False, show_progress_bar=False,
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """The exported transformer on ONNX Runtime (CPU), with the model's pooling applied in NumPy."""
+
+    name = "onnx"
+
+    def __init__(self, onnx_dir: str, int8: bool = True, threads: int = 0, max_seq_length: int = 512):
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("onnxruntime and tokenizers are required for the onnx embedding backend")
+        model_path = os.path.join(onnx_dir, ONNX_INT8_MODEL_FILE)
+        if not (int8 and os.path.exists(model_path)):
+            model_path = os.path.join(onnx_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"No ONNX model in {onnx_dir}; run `python -m app.embedding_backends export`")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.model_path = model_path
+        self.name = "onnx-int8" if model_path.endswith(ONNX_INT8_MODEL_FILE) else "onnx"
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(onnx_dir, ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        pad_id = self.tokenizer.token_to_id("[PAD]")
+        self.tokenizer.enable_padding(pad_id=pad_id if pad_id is not None else 0, pad_token="[PAD]")
+
+        pooling = {"pooling": "cls", "normalize": True}  # bge models: CLS token, L2-normalized
+        pooling_path = os.path.join(onnx_dir, ONNX_POOLING_FILE)
+        if os.path.exists(pooling_path):
+            with open(pooling_path, encoding="utf-8") as f:
+                pooling.update(json.load(f))
+        self.pooling = pooling["pooling"]
+        self.normalize = bool(pooling["normalize"])
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        if self.pooling == "mean":
+            mask = feeds["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        else:
+            pooled = hidden[:, 0]
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, texts: Sequence[str], batch_size: int = 64) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out: Optional[np.ndarray] = None
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            vectors = self._forward([texts[i] for i in idx])
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[idx] = vectors
+        return out
+
+
+def create_backend(config: Optional[dict] = None) -> EmbeddingBackend:
+    """
+    Build the configured backend, falling back to SentenceTransformer when ONNX cannot load.
+
+    Args:
+        config: Settings shaped like ``EMBEDDING_CONFIG`` (defaults to it)
+
+    Returns:
+        A ready-to-use EmbeddingBackend
+    """
+    config = config or EMBEDDING_CONFIG
+    if config["backend"] == "onnx":
+        try:
+            backend = OnnxBackend(
+                config["onnx_dir"], int8=config["onnx_int8"],
+                threads=config["threads"], max_seq_length=config["max_seq_length"],
+            )
+            logger.info(f"[EMBEDDINGS] Using {backend.name} backend: {backend.model_path}")
+            return backend
+        except Exception as e:
+            logger.warning(f"[EMBEDDINGS] ONNX backend unavailable ({e}); using sentence_transformers")
+    logger.info(f"[EMBEDDINGS] Initializing model: {config['model']}")
+    return SentenceTransformerBackend(config["model"], threads=config["threads"], max_seq_length=config["max_seq_length"])
+
+
+# One model per process. With `gunicorn --preload -k uvicorn.workers.UvicornWorker`
+# and EMBEDDING_PRELOAD=true, app.main loads it in the master before forking, so
+# the workers share the weight pages copy-on-write instead of each loading a copy.
+_backend: Optional[EmbeddingBackend] = None
+_backend_lock = threading.Lock()
+_stats: Dict[str, Any] = {}
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """The process-wide backend, created on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                t0 = time.perf_counter()
+                _backend = create_backend()
+                _stats.update(
+                    backend=_backend.name,
+                    load_ms=round((time.perf_counter() - t0) * 1000, 1),
+                    loaded_in_pid=os.getpid(),
+                )
+    return _backend
+
+
+def warm_up_embeddings(repeats: int = 10) -> Dict[str, Any]:
+    """
+    Load the model (unless already loaded or inherited) and run forward passes.
+
+    The first encode after loading pays for lazy kernel/thread-pool set-up (cold);
+    the following ones show steady-state latency (warm). Run it in each worker,
+    after any fork: thread pools started before fork() are not fork-safe.
+
+    Returns:
+        The embedding stats (see ``get_embedding_stats``)
+    """
+    backend = get_embedding_backend()
+    t0 = time.perf_counter()
+    backend.encode(["warm up"])
+    cold_ms = (time.perf_counter() - t0) * 1000
+    warm = []
+    for _ in range(max(repeats, 1)):
+        t0 = time.perf_counter()
+        backend.encode(["show floor wise production of last 7 days"])
+        warm.append((time.perf_counter() - t0) * 1000)
+    _stats.update(
+        cold_encode_ms=round(cold_ms, 2),
+        warm_encode_p50_ms=round(float(np.percentile(warm, 50)), 2),
+        warmed_in_pid=os.getpid(),
+    )
+    logger.info(
+        f"[EMBEDDINGS] {backend.name} warm: load {_stats.get('load_ms')} ms, "
+        f"cold encode {_stats['cold_encode_ms']} ms, warm p50 {_stats['warm_encode_p50_ms']} ms"
+    )
+    return get_embedding_stats()
+
+
+def get_embedding_stats() -> Dict[str, Any]:
+    """Load/warm-up timings and whether this worker inherited the model from a preloading parent."""
+    stats = dict(_stats, loaded=_backend is not None, pid=os.getpid())
+    if _backend is not None:
+        stats["inherited_from_parent"] = stats["loaded_in_pid"] != os.getpid()
+    return stats
+
+
+def export_onnx(model_name: str, out_dir: str, quantize: bool = True, opset: int = 14) -> str:
+    """
+    Export a Hugging Face encoder to ONNX (plus tokenizer and pooling settings).
+
+    Args:
+        model_name: Hugging Face model id or local path
+        out_dir: Target directory (``EMBEDDING_CONFIG["onnx_dir"]`` by default)
+        quantize: Also write dynamically int8-quantized weights
+        opset: ONNX opset version
+
+    Returns:
+        Path of the fp32 model
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, ONNX_TOKENIZER_FILE))
+
+    sample = tokenizer(["warm up", "a longer warm up sentence"], padding=True, return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _Encoder(torch.nn.Module):
+        # Positional inputs in a fixed order, whatever the model's forward() signature
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(names, inputs))).last_hidden_state
+
+    axes = {n: {0: "batch", 1: "sequence"} for n in names + ["last_hidden_state"]}
+    path = os.path.join(out_dir, ONNX_MODEL_FILE)
+    kwargs = dict(input_names=names, output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=opset)
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False  # TorchScript exporter: no onnxscript dependency
+    with torch.no_grad():
+        torch.onnx.export(_Encoder().eval(), tuple(sample[n] for n in names), path, **kwargs)
+
+    pooling = {"pooling": "cls", "normalize": True}
+    pooling_config = os.path.join(model_name, "1_Pooling", "config.json")
+    if os.path.exists(pooling_config):
+        with open(pooling_config, encoding="utf-8") as f:
+            pooling["pooling"] = "mean" if json.load(f).get("pooling_mode_mean_tokens") else "cls"
+    with open(os.path.join(out_dir, ONNX_POOLING_FILE), "w", encoding="utf-8") as f:
+        json.dump(pooling, f)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(path, os.path.join(out_dir, ONNX_INT8_MODEL_FILE), weight_type=QuantType.QInt8)
+    logger.info(f"[EMBEDDINGS] Exported {model_name} to {out_dir}")
+    return path
+
+
+_SAMPLE_DOCS = [
+    "ERP R12 Table 'HR_OPERATING_UNITS' from ERP database. Operating units with business group and set of books.",
+    "ERP R12 Table 'ORG_ORGANIZATION_DEFINITIONS' from ERP database. Inventory organizations and their codes.",
+    "Column HR_OPERATING_UNITS.ORGANIZATION_ID (NUMBER). Joins ORG_ORGANIZATION_DEFINITIONS.OPERATING_UNIT.",
+    "Column MTL_ONHAND_QUANTITIES_DETAIL.PRIMARY_TRANSACTION_QUANTITY (NUMBER). On-hand quantity.",
+    "Column MTL_SECONDARY_INVENTORIES.SECONDARY_INVENTORY_NAME (VARCHAR2). Subinventory code.",
+    "Table T_PROD_DAILY: daily production by floor with production quantity and defect quantity.",
+    "Column T_PROD_DAILY.FLOOR_EF (NUMBER). Floor efficiency percentage.",
+    "Table EMP: employees with job, manager, hire date, salary and department.",
+]
+_SAMPLE_QUERIES = [
+    "operating units and their organizations",
+    "onhand quantity by subinventory",
+    "floor wise efficiency",
+    "employee salary by department",
+]
+
+
+def _load_schema_docs(selected_db: str, limit: int = 2000) -> List[str]:
+    try:
+        if selected_db == "source_db_1":
+            from app.SOS.vector_store_chroma import get_chroma_client
+        else:
+            from app.ERP_R12_Test_DB.vector_store_chroma import get_chroma_client
+        collection = get_chroma_client(selected_db).get_or_create_collection(name=f"schema_docs_{selected_db}")
+        docs = [d for d in (collection.get(limit=limit, include=["documents"]).get("documents") or []) if d]
+        if docs:
+            return docs
+    except Exception as e:
+        print(f"could not read schema docs for {selected_db}: {e}")
+    return _SAMPLE_DOCS
+
+
+def _benchmark_embedding_backends(
+    docs: Sequence[str],
+    queries: Sequence[str],
+    backends: Sequence[EmbeddingBackend],
+    top_k: int = 5,
+) -> None:
+    """Throughput, single-query latency and agreement with the first backend (the reference)."""
+    import time
+
+    def unit(m: np.ndarray) -> np.ndarray:
+        return m / np.clip(np.linalg.norm(m, axis=1, keepdims=True), 1e-12, None)
+
+    reference = None
+    print(f"{len(docs)} docs, {len(queries)} queries")
+    for backend in backends:
+        backend.encode(["warm up"])
+        t0 = time.perf_counter()
+        doc_vectors = unit(backend.encode(docs))
+        docs_per_s = len(docs) / (time.perf_counter() - t0)
+
+        latencies = []
+        query_vectors = []
+        for q in queries:
+            t0 = time.perf_counter()
+            query_vectors.append(backend.encode([q])[0])
+            latencies.append((time.perf_counter() - t0) * 1000)
+        query_vectors = unit(np.asarray(query_vectors))
+        top = np.argsort(-(query_vectors @ doc_vectors.T), axis=1)[:, :top_k]
+
+        line = f"  {backend.name:22s} {docs_per_s:8.1f} docs/s  query p50 {np.percentile(latencies, 50):6.2f} ms"
+        if reference is None:
+            reference = (doc_vectors, top)
+            line += "  (reference)"
+        else:
+            cos = (doc_vectors * reference[0]).sum(axis=1)
+            overlap = np.mean([len(set(a) & set(b)) / top_k for a, b in zip(top, reference[1])])
+            line += f"  cosine vs ref mean {cos.mean():.4f} min {cos.min():.4f}  top-{top_k} overlap {overlap:.2%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "benchmark"
+    if command == "export":
+        export_onnx(EMBEDDING_CONFIG["model"], sys.argv[2] if len(sys.argv) > 2 else EMBEDDING_CONFIG["onnx_dir"])
+    else:
+        docs = _load_schema_docs(sys.argv[2] if len(sys.argv) > 2 else "source_db_2")
+        threads = EMBEDDING_CONFIG["threads"]
+        candidates = [SentenceTransformerBackend(EMBEDDING_CONFIG["model"], threads=threads)]
+        for int8 in (False, True):
+            try:
+                candidates.append(OnnxBackend(EMBEDDING_CONFIG["onnx_dir"], int8=int8, threads=threads))
+            except Exception as e:
+                print(f"skipping onnx (int8={int8}): {e}")
+        _benchmark_embedding_backends(docs, _SAMPLE_QUERIES, candidates)
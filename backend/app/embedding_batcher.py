@@ -0,0 +1,202 @@
+"""
+In-process micro-batching for embedding requests.
+
+Under load, every concurrent /chat request embeds a single string, so the
+model runs batch-size-1 forward passes that leave most of the CPU's vector
+width idle. ``EmbeddingMicroBatcher`` queues those single-text requests. A
+dedicated worker thread takes the first queued text, keeps collecting until
+``max_batch_size`` texts or ``max_wait_ms`` have passed, runs one ``encode``
+for the whole group, and resolves each caller's future with its own row.
+
+Queue depth and batch sizes are exposed through ``stats()`` (and /health).
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import EMBEDDING_BATCH_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def on_event_loop_thread() -> bool:
+    """
+    True when called on a thread that is running an asyncio event loop.
+
+    A blocking wait there stops every other request on that loop from
+    enqueueing, so the batch can only ever hold the caller's own text and the
+    wait is pure latency. Such callers should encode directly (or ``aencode``).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class EmbeddingMicroBatcher:
+    """Group concurrent encode requests into batched forward passes on one worker thread."""
+
+    def __init__(
+        self,
+        encode: Callable[[Sequence[str], int], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        """
+        Args:
+            encode: ``(texts, batch_size) -> float32 matrix``, e.g. a backend's ``encode``
+            max_batch_size: Most texts per forward pass
+            max_wait_ms: Longest a request waits for others to join its batch
+        """
+        self._encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stats = {"requests": 0, "batches": 0, "errors": 0, "max_queue_depth": 0, "max_batch": 0}
+
+    def _ensure_worker(self) -> None:
+        # Threads do not survive fork(); a forked worker starts its own.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the future resolves to its embedding row (float32 array)."""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future))
+        depth = self._queue.qsize()
+        with self._lock:
+            self._stats["requests"] += 1
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+        return future
+
+    def encode(self, texts: Sequence[str]) -> List[np.ndarray]:
+        """Blocking: queue every text and wait for all of them."""
+        futures = [self.submit(t) for t in texts]
+        return [f.result() for f in futures]
+
+    async def aencode(self, text: str) -> np.ndarray:
+        """Await one embedding without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            live = [(t, f) for t, f in batch if f.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            try:
+                vectors = self._encode([t for t, _ in live], len(live))
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                for _, f in live:
+                    f.set_exception(e)
+                continue
+            for (_, f), v in zip(live, vectors):
+                f.set_result(v)
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(live))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait_s * 1000
+        return stats
+
+
+_batcher: Optional[EmbeddingMicroBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_embedding_batcher() -> EmbeddingMicroBatcher:
+    """The process-wide batcher over the configured embedding backend."""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                from app.embedding_backends import get_embedding_backend
+
+                def encode(texts: Sequence[str], batch_size: int) -> np.ndarray:
+                    return get_embedding_backend().encode(texts, batch_size=batch_size)
+
+                _batcher = EmbeddingMicroBatcher(
+                    encode,
+                    max_batch_size=EMBEDDING_BATCH_CONFIG["max_batch_size"],
+                    max_wait_ms=EMBEDDING_BATCH_CONFIG["max_wait_ms"],
+                )
+    return _batcher
+
+
+def get_embedding_batcher_stats() -> Dict[str, Any]:
+    """Batcher metrics for /health (empty until the first batched request)."""
+    stats = _batcher.stats() if _batcher is not None else {}
+    return {"enabled": EMBEDDING_BATCH_CONFIG["enabled"], **stats}
+
+
+def _benchmark_micro_batching(concurrency: int = 16, requests_per_thread: int = 20) -> None:
+    """Throughput of concurrent single-text embeddings, direct vs. micro-batched."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.embedding_backends import get_embedding_backend
+
+    backend = get_embedding_backend()
+    backend.encode(["warm up"])
+    texts = [f"show floor wise production of line {i} for last {i % 7 + 1} days" for i in range(requests_per_thread)]
+
+    def direct(_):
+        for t in texts:
+            backend.encode([t])
+
+    batcher = get_embedding_batcher()
+
+    def batched(_):
+        for t in texts:
+            batcher.submit(t).result()
+
+    for name, fn in (("batch-size-1", direct), ("micro-batched", batched)):
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(fn, range(concurrency)))
+        elapsed = time.perf_counter() - t0
+        print(f"  {name:14s} {concurrency * requests_per_thread / elapsed:8.1f} texts/s")
+    print(f"  batcher stats: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    _benchmark_micro_batching()
@@ -0,0 +1,212 @@
+"""
+Persistent content-hash store for document embeddings.
+
+Across reindex runs, most table, column and alias documents the schema
+loaders generate are byte-identical to the previous run, yet every vector was
+recomputed. ``EmbeddingStore`` keeps each vector under (model key, sha1(text)).
+A reindex fetches the cached vectors in bulk and encodes only the misses.
+
+On disk there is one directory per model key, holding:
+- ``keys.sha1``: append-only, 20 raw bytes per entry; entry i is row i
+- ``vectors.f32``: float32 rows, memory-mapped for reads
+- ``meta.json``: model key and dimension
+
+The vector row is written before its key, so every key on disk has a complete
+vector behind it. A torn tail from a crash is trimmed when the store is
+opened. Appends hold an exclusive ``flock`` on the key file and first pick up
+rows other processes appended, so concurrent loaders can share one store.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import EMBEDDING_STORE_CONFIG
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: single-writer only
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+KEYS_FILE = "keys.sha1"
+VECTORS_FILE = "vectors.f32"
+META_FILE = "meta.json"
+_DIGEST_SIZE = 20
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """Append-only (sha1(text) -> float32 vector) store for one embedding model."""
+
+    def __init__(self, root: str, model_key: str):
+        """
+        Args:
+            root: Directory holding the per-model stores
+            model_key: Identifies the model that produced the vectors (name,
+                backend and sequence length); vectors never mix across keys
+        """
+        self.model_key = model_key
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_key)[:80]
+        self.path = os.path.join(root, f"{slug}-{hashlib.sha1(model_key.encode('utf-8')).hexdigest()[:10]}")
+        os.makedirs(self.path, exist_ok=True)
+        self._keys_path = os.path.join(self.path, KEYS_FILE)
+        self._vectors_path = os.path.join(self.path, VECTORS_FILE)
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0
+        self._map: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        with self._locked_keys() as keys:
+            self._sync(keys)
+
+    def __len__(self) -> int:
+        return self._count
+
+    # ---------- file handling ----------
+    @contextmanager
+    def _locked_keys(self):
+        with open(self._keys_path, "a+b") as f:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _sync(self, keys) -> None:
+        """Read keys appended since the last sync; trim a torn tail. Caller holds the file lock."""
+        if self.dim is None:
+            meta_path = os.path.join(self.path, META_FILE)
+            if not os.path.exists(meta_path):
+                return
+            with open(meta_path, encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        keys.seek(0, os.SEEK_END)
+        key_rows = keys.tell() // _DIGEST_SIZE
+        row_bytes = self.dim * 4
+        vec_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        rows = min(key_rows, vec_rows)
+        if keys.tell() != rows * _DIGEST_SIZE:
+            keys.truncate(rows * _DIGEST_SIZE)
+            logger.warning(f"[EMBSTORE] Trimmed incomplete tail of {self.path} to {rows} rows")
+        if rows > self._count:
+            keys.seek(self._count * _DIGEST_SIZE)
+            data = keys.read((rows - self._count) * _DIGEST_SIZE)
+            for i in range(rows - self._count):
+                self._rows.setdefault(data[i * _DIGEST_SIZE:(i + 1) * _DIGEST_SIZE], self._count + i)
+            self._count = rows
+            self._map = None
+
+    def _matrix(self) -> Optional[np.memmap]:
+        if self._map is None and self._count and self.dim:
+            self._map = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dim))
+        return self._map
+
+    # ---------- public API ----------
+    def get_many(self, texts: Sequence[str]) -> Tuple[Optional[np.ndarray], List[int]]:
+        """
+        Bulk lookup.
+
+        Returns:
+            ``(vectors, misses)``: a (len(texts), dim) float32 array with the
+            cached rows filled in (None when the store has no dimension yet),
+            and the positions of ``texts`` that were not found
+        """
+        digests = [text_digest(t) for t in texts]
+        with self._lock:
+            rows = [self._rows.get(d) for d in digests]
+            matrix = self._matrix()
+            misses = [i for i, r in enumerate(rows) if r is None]
+            self.hits += len(texts) - len(misses)
+            self.misses += len(misses)
+        if matrix is None:
+            return None, list(range(len(texts)))
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        hit_pos = [i for i, r in enumerate(rows) if r is not None]
+        if hit_pos:
+            out[hit_pos] = matrix[[rows[i] for i in hit_pos]]
+        return out, misses
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray) -> int:
+        """Append vectors for texts not stored yet; returns the number of rows written."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return 0
+        with self._lock, self._locked_keys() as keys:
+            self._sync(keys)
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+                    json.dump({"model_key": self.model_key, "dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"vector dim {vectors.shape[1]} != store dim {self.dim}")
+
+            new_digests: List[bytes] = []
+            new_rows: List[int] = []
+            seen = set()
+            for i, t in enumerate(texts):
+                d = text_digest(t)
+                if d in self._rows or d in seen:
+                    continue
+                seen.add(d)
+                new_digests.append(d)
+                new_rows.append(i)
+            if not new_rows:
+                return 0
+
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(self._count * self.dim * 4)  # drop any torn vector tail
+                f.write(vectors[new_rows].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            keys.seek(0, os.SEEK_END)
+            keys.write(b"".join(new_digests))
+            keys.flush()
+            for d in new_digests:
+                self._rows[d] = self._count
+                self._count += 1
+            self._map = None
+            return len(new_rows)
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(model_key: str) -> Optional[EmbeddingStore]:
+    """The process-wide store for ``model_key``, or None when the store is disabled or unusable."""
+    if not EMBEDDING_STORE_CONFIG["enabled"]:
+        return None
+    store = _stores.get(model_key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(model_key)
+            if store is None:
+                try:
+                    store = EmbeddingStore(EMBEDDING_STORE_CONFIG["path"], model_key)
+                except Exception as e:
+                    logger.warning(f"[EMBSTORE] Store unavailable, encoding everything: {e}")
+                    return None
+                _stores[model_key] = store
+                logger.info(f"[EMBSTORE] Opened {store.path}: {len(store)} cached vectors")
+    return store
+
+
+def get_embedding_store_stats() -> Dict[str, Dict[str, int]]:
+    """Rows, hits and misses of every store opened in this process."""
+    return {key: {"rows": len(store), "hits": store.hits, "misses": store.misses} for key, store in _stores.items()}
@@ -2,56 +2,28 @@ import re
 import numpy as np
 from typing import List, Sequence
 import logging
-from sentence_transformers import SentenceTransformer
-import logging
 import os
 from functools import partialmethod
 
+from app.config import EMBEDDING_BATCH_CONFIG, EMBEDDING_CONFIG
+from app.embedding_backends import EmbeddingBackend, get_embedding_backend
+from app.embedding_batcher import get_embedding_batcher, on_event_loop_thread
+from app.embedding_store import get_embedding_store
+
 # Disable tqdm progress bars
 from tqdm import tqdm
 tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
 
 logger = logging.getLogger(__name__)
 
-# Global model cache
-_model_cache = {}
-
-def get_embedding(text: str) -> list:
-    """Generate embedding for a text string."""
-    model = get_embedding_model()
-    embedding = model.encode([text], show_progress_bar=False)  # Disable progress bar
-    return embedding[0].tolist()
-
-def encode_texts_batch(texts: list[str], batch_size: int = 32) -> list[list]:
-    """Generate embeddings for a batch of texts."""
-    if not texts:
-        return []
-    model = get_embedding_model()
-    embeddings = model.encode(texts, batch_size=batch_size, show_progress_bar=False)  # Disable progress bar
-    return embeddings.tolist()
-
-def get_embedding_model():
-    """Get or create embedding model instance."""
-    model_name = "BAAI/bge-small-en"
-    if model_name not in _model_cache:
-        logger.info(f"[EMBEDDINGS] Initializing model: {model_name}")
-        _model_cache[model_name] = SentenceTransformer(model_name, trust_remote_code=True)
-    return _model_cache[model_name]
-
 # ✅ Match Oracle VECTOR(384, FLOAT32, DENSE)
 EMBEDDING_DIMENSIONS = 384
 MAX_TEXT_LENGTH = 10000
-LOCAL_MODEL_NAME = "BAAI/bge-small-en"
-
-_local_model = None
+LOCAL_MODEL_NAME = EMBEDDING_CONFIG["model"]
 
-def initialize_local_model():
-    global _local_model
-    if _local_model is None:
-        logger.info(f"[EMBEDDINGS] Initializing model: {LOCAL_MODEL_NAME}")
-        # If you have GPU: SentenceTransformer(LOCAL_MODEL_NAME, device="cuda")
-        _local_model = SentenceTransformer(LOCAL_MODEL_NAME)
-    return _local_model
+def initialize_local_model() -> EmbeddingBackend:
+    # The one model instance per process (SentenceTransformer or ONNX Runtime, per EMBEDDING_CONFIG)
+    return get_embedding_backend()
 
 def _truncate(s: str) -> str:
     return str(s)[:MAX_TEXT_LENGTH]
@@ -64,8 +36,12 @@ def normalize_embedding(embedding: List[float]) -> List[float]:
     return np.array(embedding, dtype=np.float32).tolist()
 
 def get_local_embedding(text: str) -> List[float]:
-    model = initialize_local_model()
-    return model.encode(_truncate(text)).tolist()
+    if EMBEDDING_BATCH_CONFIG["enabled"] and not on_event_loop_thread():
+        # Shares a forward pass with other requests arriving within a few ms.
+        # On an event-loop thread nothing else can enqueue while we block, so encode directly.
+        return get_embedding_batcher().submit(_truncate(text)).result().tolist()
+    backend = initialize_local_model()
+    return backend.encode([_truncate(text)])[0].tolist()
 
 def get_embedding(text: str) -> List[float]:
     if not text or not isinstance(text, str):
@@ -78,25 +54,33 @@ def get_embedding(text: str) -> List[float]:
         return normalize_embedding(rng.normal(0, 0.5, EMBEDDING_DIMENSIONS).tolist())
 
 # ---------- NEW: batched encoders ----------
+def _as_lists(vectors) -> List[List[float]]:
+    # Ensure shape/length
+    out = []
+    for v in vectors:
+        v = v.tolist()
+        if len(v) != EMBEDDING_DIMENSIONS:
+            v = normalize_embedding(v)
+        out.append(np.array(v, dtype=np.float32).tolist())
+    return out
+
 def encode_texts_batch(texts: Sequence[str], batch_size: int = 64) -> List[List[float]]:
     """
-    Efficiently encode a list of texts using SentenceTransformers batching.
+    Efficiently encode a list of texts with the configured backend's batching.
     Always returns float32 lists of length EMBEDDING_DIMENSIONS.
     """
     if not texts:
         return []
-    model = initialize_local_model()
+    backend = initialize_local_model()
     cleaned = [_truncate(t if isinstance(t, str) else str(t)) for t in texts]
     try:
-        vectors = model.encode(cleaned, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=False)
-        # Ensure shape/length
-        out = []
-        for v in vectors:
-            v = v.tolist()
-            if len(v) != EMBEDDING_DIMENSIONS:
-                v = normalize_embedding(v)
-            out.append(np.array(v, dtype=np.float32).tolist())
-        return out
+        if (EMBEDDING_BATCH_CONFIG["enabled"] and len(cleaned) < EMBEDDING_BATCH_CONFIG["max_batch_size"]
+                and not on_event_loop_thread()):
+            # Small query batches join concurrent requests; bulk indexing goes straight to the backend
+            vectors = get_embedding_batcher().encode(cleaned)
+        else:
+            vectors = backend.encode(cleaned, batch_size=batch_size)
+        return _as_lists(vectors)
     except Exception as e:
         logger.warning(f"[EMBEDDINGS] Fallback (batch) due to: {e}")
         rng = np.random.default_rng()
@@ -105,6 +89,53 @@ def encode_texts_batch(texts: Sequence[str], batch_size: int = 64) -> List[List[
             for _ in cleaned
         ]
 
+def _store_model_key(backend: EmbeddingBackend) -> str:
+    # Vectors differ across models, runtimes (torch vs. ONNX int8) and truncation length
+    return f"{LOCAL_MODEL_NAME}|{backend.name}|{EMBEDDING_CONFIG['max_seq_length']}"
+
+def encode_texts_cached(texts: Sequence[str], batch_size: int = 64) -> List[List[float]]:
+    """
+    ``encode_texts_batch`` for indexing: reuse vectors from the persistent
+    embedding store and run the model only on texts it has not seen.
+
+    Args:
+        texts: Documents to embed
+        batch_size: Forward-pass batch size for the misses
+
+    Returns:
+        Float32 lists of length EMBEDDING_DIMENSIONS, in input order
+    """
+    if not texts:
+        return []
+    backend = initialize_local_model()
+    cleaned = [_truncate(t if isinstance(t, str) else str(t)) for t in texts]
+    store = get_embedding_store(_store_model_key(backend))
+    if store is None:
+        return encode_texts_batch(cleaned, batch_size=batch_size)
+    try:
+        vectors, misses = store.get_many(cleaned)
+    except Exception as e:
+        logger.warning(f"[EMBEDDINGS] Embedding store lookup failed, encoding everything: {e}")
+        return encode_texts_batch(cleaned, batch_size=batch_size)
+
+    if misses:
+        miss_texts = [cleaned[i] for i in misses]
+        try:
+            fresh = backend.encode(miss_texts, batch_size=batch_size)
+        except Exception as e:
+            # encode_texts_batch's random fallback must never reach the store
+            logger.warning(f"[EMBEDDINGS] Encoding {len(misses)} store misses failed: {e}")
+            return encode_texts_batch(cleaned, batch_size=batch_size)
+        try:
+            store.put_many(miss_texts, fresh)
+        except Exception as e:
+            logger.warning(f"[EMBEDDINGS] Could not write {len(misses)} vectors to the embedding store: {e}")
+        if vectors is None:
+            vectors = np.zeros((len(cleaned), fresh.shape[1]), dtype=np.float32)
+        vectors[misses] = fresh
+    logger.debug(f"[EMBEDDINGS] Store: {len(cleaned) - len(misses)} cached, {len(misses)} encoded")
+    return _as_lists(vectors)
+
 class ChromaEmbeddingFunction:
     def __call__(self, texts: list[str]) -> list[list[float]]:
         return encode_texts_batch(texts, batch_size=64)
@@ -4,8 +4,11 @@ JWT utility functions for token creation and validation.
 """
 import jwt
 import os
+import hashlib
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +18,12 @@ JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))  # 24 hours
 
+# Verified-token cache: sha256(token) -> (payload or None, cache expiry on time.time())
+JWT_VERIFY_CACHE_TTL_SEC = float(os.getenv("JWT_VERIFY_CACHE_TTL_SEC", "60"))
+_JWT_VERIFY_CACHE_MAX = 10000
+_verify_cache: Dict[str, Tuple[Optional[Dict[str, Any]], float]] = {}
+_verify_cache_lock = threading.Lock()
+
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -61,4 +70,39 @@ def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
         return None
     except Exception as e:
         logger.error(f"Error decoding JWT token: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def decode_access_token_cached(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Decode a JWT access token, reusing a recent verification of the same token.
+    
+    Entries never outlive the token's own ``exp`` claim, and failed
+    verifications are cached too so a bad token is not re-verified per request.
+    
+    Args:
+        token: JWT token string
+        
+    Returns:
+        Decoded token data or None if invalid
+    """
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    now = time.time()
+    with _verify_cache_lock:
+        cached = _verify_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+    
+    payload = decode_access_token(token)
+    expires_at = now + JWT_VERIFY_CACHE_TTL_SEC
+    if payload and isinstance(payload.get("exp"), (int, float)):
+        expires_at = min(expires_at, float(payload["exp"]))
+    
+    with _verify_cache_lock:
+        if len(_verify_cache) >= _JWT_VERIFY_CACHE_MAX:
+            for stale in [k for k, v in _verify_cache.items() if v[1] <= now]:
+                del _verify_cache[stale]
+            if len(_verify_cache) >= _JWT_VERIFY_CACHE_MAX:
+                _verify_cache.clear()
+        _verify_cache[key] = (payload, expires_at)
+    return payload
@@ -0,0 +1,257 @@
+"""
+In-memory BM25 index over the schema documents, fused with vector search.
+
+Embedding search ranks by meaning, so exact identifiers such as
+``PO_HEADERS_ALL``, ``CTL-25-01234`` or ``SOUTPUT`` can be outranked by fuzzy
+neighbours. ``hybrid_search`` combines two rankings with reciprocal rank
+fusion (RRF): BM25 over the same documents the vector store holds, and the
+vector search.
+
+When the query contains an exact identifier that the index knows, the lexical
+path answers on its own and the embedding model is never run.
+
+The index is built from the Chroma collection on first use (or at warm-up) and
+rebuilt when the collection's document count changes.
+"""
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Environment switches
+# =========================
+HYBRID_LEXICAL_ENABLED = os.getenv("HYBRID_LEXICAL_ENABLED", "true").lower() == "true"
+# RRF constant: larger values flatten the advantage of top ranks
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Each ranking contributes this many candidates (times top_k) to the fusion
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "3"))
+
+_TOKEN_RX = re.compile(r"[A-Za-z0-9_$#]+(?:-[A-Za-z0-9_$#]+)*")
+_PART_RX = re.compile(r"[_\-$#]+")
+
+
+def _terms(token: str) -> List[str]:
+    """BM25 terms of one upper-cased token: the token plus its ``_``/``-`` separated parts."""
+    parts = [p for p in _PART_RX.split(token) if p]
+    return [token] + parts if len(parts) > 1 else [token]
+
+
+# Documents whose tokens are literal values/aliases users type verbatim
+_VALUE_KINDS = {"column_value", "alias"}
+
+
+def _looks_like_identifier(raw: str) -> bool:
+    """Letters plus a digit or ``_``/``-``/``$``/``#`` (``PO_HEADERS_ALL``, ``CTL-25-01234``); never a bare number."""
+    return any(ch.isalpha() for ch in raw) and any(ch.isdigit() or ch in "_-$#" for ch in raw)
+
+
+class Bm25Index:
+    """BM25 (Okapi) over a fixed list of documents, plus an exact-identifier lookup."""
+
+    def __init__(
+        self,
+        ids: Sequence[Any],
+        documents: Sequence[str],
+        metadatas: Sequence[Optional[Dict[str, Any]]],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = [m or {} for m in metadatas]
+        self.k1 = k1
+        self.b = b
+
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)  # term -> [(doc, tf)]
+        self._exact: Dict[str, set] = defaultdict(set)  # identifier-shaped name/value token -> docs
+        self._names: Dict[str, set] = defaultdict(set)  # table/column name -> docs
+        lengths = []
+        for i, (doc, meta) in enumerate(zip(self.documents, self.metadatas)):
+            raw_tokens = _TOKEN_RX.findall(doc or "")
+            tokens = [t.upper() for t in raw_tokens]
+            exact = [t for t in raw_tokens if _looks_like_identifier(t)] if meta.get("kind") in _VALUE_KINDS else []
+            if meta.get("value"):
+                exact += [t for t in _TOKEN_RX.findall(str(meta["value"])) if _looks_like_identifier(t)]
+            for name in (meta.get("source_table"), meta.get("table"), meta.get("column")):
+                if name:
+                    self._names[str(name).upper()].add(i)
+                    tokens.append(str(name).upper())
+                    exact.append(str(name))
+            tf = Counter(term for t in tokens for term in _terms(t))
+            for term, n in tf.items():
+                self._postings[term].append((i, n))
+            for t in exact:
+                if _looks_like_identifier(t):
+                    self._exact[t.upper()].add(i)
+            lengths.append(sum(tf.values()))
+
+        self._lengths = lengths
+        self._avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+        n_docs = len(self.documents)
+        self._idf = {
+            term: math.log(1 + (n_docs - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """BM25 score for every document sharing a term with ``query``."""
+        out: Dict[int, float] = defaultdict(float)
+        terms = {term for t in _TOKEN_RX.findall(query or "") for term in _terms(t.upper())}
+        for term in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                norm = 1 - self.b + self.b * (self._lengths[i] / self._avg_len if self._avg_len else 1)
+                out[i] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return out
+
+    def search(self, query: str, top_k: int) -> List[int]:
+        """Document positions ranked by BM25, best first."""
+        scored = self.scores(query)
+        return sorted(scored, key=lambda i: -scored[i])[:top_k]
+
+    def exact_identifiers(self, query: str) -> Dict[str, set]:
+        """
+        Identifiers in ``query`` that occur verbatim in the index.
+
+        A token counts when it is identifier-shaped (letters plus a digit,
+        ``_``, ``-``, ``$`` or ``#``) and is a table/column name or occurs in a
+        sampled-value or alias document, or when it is written in upper case
+        (4+ characters) and is a table or column name. Plain numbers and words
+        that merely appear in descriptions ("7", "2025", ``NUMBER(10)``) never
+        count, so those queries go through fusion.
+        """
+        found: Dict[str, set] = {}
+        for raw in _TOKEN_RX.findall(query or ""):
+            token = raw.upper()
+            if _looks_like_identifier(raw) and token in self._exact:
+                found[token] = self._exact[token]
+            elif raw.isupper() and len(raw) >= 4 and token in self._names:
+                found[token] = self._names[token]
+        return found
+
+    def hit(self, i: int) -> Dict[str, Any]:
+        return {"id": self.ids[i], "document": self.documents[i], "metadata": self.metadatas[i]}
+
+
+_indexes: Dict[str, Tuple[int, Bm25Index]] = {}
+_indexes_lock = threading.Lock()
+_stats = {"builds": 0, "identifier_short_circuits": 0, "fused_searches": 0}
+
+
+def get_lexical_index(selected_db: str, collection) -> Bm25Index:
+    """The BM25 index for ``selected_db``, (re)built when the collection's document count changes."""
+    count = collection.count()
+    cached = _indexes.get(selected_db)
+    if cached is not None and cached[0] == count:
+        return cached[1]
+    with _indexes_lock:
+        cached = _indexes.get(selected_db)
+        if cached is not None and cached[0] == count:
+            return cached[1]
+        data = collection.get(include=["documents", "metadatas"]) if count else {}
+        index = Bm25Index(data.get("ids") or [], data.get("documents") or [], data.get("metadatas") or [])
+        _indexes[selected_db] = (count, index)
+        _stats["builds"] += 1
+        logger.info(f"[LEXICAL] Built BM25 index for {selected_db}: {len(index)} docs")
+        return index
+
+
+def _key(hit: Dict[str, Any]) -> Any:
+    # Document text, not id: some Chroma versions omit ids from query results.
+    return hit.get("document")
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Dict[str, Any]]], k: int = HYBRID_RRF_K) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    Fuse ranked hit lists: each hit scores ``sum(1 / (k + rank))`` over the lists it appears in.
+
+    Returns:
+        (hit, fused score) pairs, best first. The hit object is taken from the
+        first list that contains it.
+    """
+    fused: Dict[Any, float] = defaultdict(float)
+    first: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = _key(hit)
+            fused[key] += 1.0 / (k + rank)
+            first.setdefault(key, hit)
+    return sorted(((first[key], score) for key, score in fused.items()), key=lambda pair: -pair[1])
+
+
+def _with_rank_scores(hits: List[Dict[str, Any]], match: str) -> List[Dict[str, Any]]:
+    # Callers sort by "score" as a distance (lower is better); keep the fused order.
+    n = max(len(hits), 1)
+    return [{**hit, "score": rank / n, "match": match} for rank, hit in enumerate(hits)]
+
+
+def hybrid_search(
+    selected_db: str,
+    collection,
+    query: str,
+    top_k: int,
+    vector_search: Callable[[int], List[Dict[str, Any]]],
+) -> List[Dict[str, Any]]:
+    """
+    BM25 + vector retrieval fused with RRF, with an exact-identifier short-circuit.
+
+    Args:
+        selected_db: Database ID (keys the cached index)
+        collection: Chroma collection the index is built from
+        query: User query
+        top_k: Number of hits to return
+        vector_search: Runs the embedding search for ``n`` candidates; only
+            called when the lexical path does not answer on its own
+
+    Returns:
+        Hits shaped like ``search_vector_store_detailed`` output. ``score`` is a
+        rank-based distance in [0, 1) (lower is better) and ``match`` is
+        "identifier" or "hybrid".
+    """
+    if not HYBRID_LEXICAL_ENABLED:
+        return vector_search(top_k)
+
+    try:
+        index = get_lexical_index(selected_db, collection)
+    except Exception as e:
+        logger.warning(f"[LEXICAL] Index unavailable for {selected_db}, using vector search only: {e}")
+        return vector_search(top_k)
+    if not len(index):
+        return vector_search(top_k)
+
+    identifiers = index.exact_identifiers(query)
+    if identifiers:
+        scored = index.scores(query)
+        exact = set().union(*identifiers.values())
+        ranked = sorted(exact, key=lambda i: -scored.get(i, 0.0))
+        ranked += [i for i in index.search(query, top_k + len(ranked)) if i not in exact]
+        _stats["identifier_short_circuits"] += 1
+        logger.debug(f"[LEXICAL] Exact identifiers {sorted(identifiers)} answered '{query}' without embedding")
+        return _with_rank_scores([index.hit(i) for i in ranked[:top_k]], "identifier")
+
+    n_candidates = max(top_k * HYBRID_CANDIDATE_FACTOR, top_k)
+    lexical = [index.hit(i) for i in index.search(query, n_candidates)]
+    vector = vector_search(n_candidates)
+    fused = reciprocal_rank_fusion([vector, lexical])
+    _stats["fused_searches"] += 1
+    return _with_rank_scores([hit for hit, _ in fused[:top_k]], "hybrid")
+
+
+def get_lexical_stats() -> Dict[str, Any]:
+    """Index sizes and short-circuit counters, for /health."""
+    return {
+        **_stats,
+        "enabled": HYBRID_LEXICAL_ENABLED,
+        "indexes": {db: count for db, (count, _) in _indexes.items()},
+    }
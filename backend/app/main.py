@@ -38,13 +38,12 @@ import os
 import logging
 import time
 import json
-import csv
 import re
 import hashlib
 import uuid
 import asyncio
 import threading
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence
 from fastapi.middleware.cors import CORSMiddleware
 
 # Load environment variables from .env file
@@ -165,10 +164,27 @@ from app.ERP_R12_Test_DB.rag_engine import answer as erp_rag_answer
 from app.SOS.vector_store_chroma import hybrid_schema_value_search  # noqa: F401 (kept for parity)
 
 # Optional feedback DB exports
-from app.db_connector import connect_feedback
+from app.training_export import ExportSession, ExportError
+from app.rate_limiter import SlidingWindowRateLimiter
+from starlette.background import BackgroundTask
 
 # Import the user access module
 import app.user_access as user_access
+from app.auth_context import resolve_auth_context
+from app.processor_registry import get_processor_registry
+from app.ollama_llm import get_async_ollama_client, preload_ollama_models
+from app.sql_stream import get_sql_stream_stats
+from app.singleflight import SingleFlight
+from app.lexical_index import get_lexical_stats
+from app.memory_index import get_memory_index_stats
+from app.embedding_backends import get_embedding_backend, get_embedding_stats
+from app.embedding_batcher import get_embedding_batcher_stats
+from app.SOS.query_engine import (
+    extract_explicit_date_range,
+    extract_relative_date_range,
+    extract_month_token_range,
+)
+from app.config import OLLAMA_CLIENT_CONFIG, CHAT_SINGLEFLIGHT_ENABLED, EMBEDDING_CONFIG
 
 # Import the dashboard recorder
 from app.dashboard_recorder import get_dashboard_recorder
@@ -256,10 +272,11 @@ FILE_UPLOAD_LIMIT_PER_USER = 10  # Max uploads per user per hour
 PROCESSING_RATE_LIMIT = 5  # Max file processing requests per user per minute
 API_QUOTA_LIMIT = 1000  # Max API calls per day
 
-# In-memory storage for rate limiting (in production, use Redis or database)
-user_upload_counts = {}  # user_id: count
-user_processing_counts = {}  # user_id: count
-api_usage_counts = {}  # date: count
+# Sliding-window limiters; RATE_LIMIT_BACKEND=sqlite shares them across uvicorn workers
+upload_limiter = SlidingWindowRateLimiter("file_upload", FILE_UPLOAD_LIMIT_PER_USER, 3600)
+processing_limiter = SlidingWindowRateLimiter("file_processing", PROCESSING_RATE_LIMIT, 60)
+api_quota_limiter = SlidingWindowRateLimiter("api_quota", API_QUOTA_LIMIT, 86400)
+_API_QUOTA_KEY = "global"
 
 def _get_client_identifier(request: Request) -> str:
     """
@@ -286,51 +303,53 @@ def _check_rate_limits(client_id: str) -> Dict[str, bool]:
     Returns:
         Dictionary with rate limit status
     """
-    import time
-    current_time = time.time()
-    
-    # Check file upload limit (per hour)
-    upload_key = f"{client_id}:{int(current_time // 3600)}"
-    upload_count = user_upload_counts.get(upload_key, 0)
-    upload_limited = upload_count >= FILE_UPLOAD_LIMIT_PER_USER
-    
-    # Check processing rate limit (per minute)
-    processing_key = f"{client_id}:{int(current_time // 60)}"
-    processing_count = user_processing_counts.get(processing_key, 0)
-    processing_limited = processing_count >= PROCESSING_RATE_LIMIT
-    
-    # Check API quota (per day)
-    date_key = time.strftime("%Y-%m-%d", time.gmtime(current_time))
-    api_count = api_usage_counts.get(date_key, 0)
-    api_limited = api_count >= API_QUOTA_LIMIT
-    
     return {
-        "upload_limited": upload_limited,
-        "processing_limited": processing_limited,
-        "api_limited": api_limited
+        "upload_limited": upload_limiter.is_limited(client_id),
+        "processing_limited": processing_limiter.is_limited(client_id),
+        "api_limited": api_quota_limiter.is_limited(_API_QUOTA_KEY)
     }
 
-def _increment_rate_counters(client_id: str):
+def _rate_limiters(client_id: str):
+    return (
+        ("upload_limited", upload_limiter, client_id),
+        ("processing_limited", processing_limiter, client_id),
+        ("api_limited", api_quota_limiter, _API_QUOTA_KEY),
+    )
+
+def _admit_request(client_id: str, enforced: Sequence[str]) -> Optional[str]:
     """
-    Increment rate limit counters for a client.
+    Atomically count one request against every rate limit for a client.
+    
+    Check and increment happen in one limiter ``hit``, so concurrent requests
+    cannot all pass a check made before any of them is counted.
     
     Args:
         client_id: Client identifier
+        enforced: Limit names (keys of ``_check_rate_limits``) that reject the request
+        
+    Returns:
+        The name of the exceeded limit, in which case nothing is counted, or None
+    """
+    consumed = []
+    for name, limiter, key in _rate_limiters(client_id):
+        if name not in enforced:
+            limiter.record(key)
+        elif not limiter.hit(key):
+            for limiter_done, key_done in consumed:
+                limiter_done.refund(key_done)
+            return name
+        consumed.append((limiter, key))
+    return None
+
+def _refund_rate_counters(client_id: str):
     """
-    import time
-    current_time = time.time()
-    
-    # Increment upload counter
-    upload_key = f"{client_id}:{int(current_time // 3600)}"
-    user_upload_counts[upload_key] = user_upload_counts.get(upload_key, 0) + 1
-    
-    # Increment processing counter
-    processing_key = f"{client_id}:{int(current_time // 60)}"
-    user_processing_counts[processing_key] = user_processing_counts.get(processing_key, 0) + 1
+    Give back the counts taken by ``_admit_request`` for a request that failed validation.
     
-    # Increment API usage counter
-    date_key = time.strftime("%Y-%m-%d", time.gmtime(current_time))
-    api_usage_counts[date_key] = api_usage_counts.get(date_key, 0) + 1
+    Args:
+        client_id: Client identifier
+    """
+    for _, limiter, key in _rate_limiters(client_id):
+        limiter.refund(key)
 
 def _sanitize_filename(filename: str) -> str:
     """
@@ -467,14 +486,35 @@ def generate_session_id(request: Request) -> Optional[str]:
 
 app = FastAPI(title="Oracle SQL Assistant (RAG-enabled)", version="2.0")
 
+# Load the embedding weights at import so a pre-fork server (gunicorn --preload) loads
+# them once in the master and the workers share them. The forward-pass warm-up stays in
+# the per-worker startup hook.
+if EMBEDDING_CONFIG["preload"]:
+    get_embedding_backend()
+
 # Add background task to clean up expired tokens periodically
 @app.on_event("startup")
 async def startup_event():
-    """Start background task for cleaning up expired tokens."""
+    """Warm the processor registry and start background task for cleaning up expired tokens."""
+    # Build the SOS/ERP processors, embedding model, Chroma clients and LLM clients once,
+    # off the event loop, so the first request does not pay for them.
+    try:
+        await asyncio.to_thread(get_processor_registry().warm_up)
+    except Exception as e:
+        logger.error(f"Processor registry warm-up failed: {e}")
+    # Load the configured local models in the background so they are resident (keep_alive)
+    if OLLAMA_CLIENT_CONFIG["preload_models"]:
+        asyncio.create_task(preload_ollama_models())
     # In a production system, you would implement a proper background task
     # For now, we'll just log that cleanup is needed
     logger.info("Token cleanup task would start here in production")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the pooled Ollama HTTP session."""
+    await get_async_ollama_client().close()
+
 # Simple timing middleware to see every request
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -522,6 +562,14 @@ def health():
         except Exception as e:
             health_data["quality_metrics"] = {"error": str(e)}
     
+    health_data["processor_registry"] = get_processor_registry().stats()
+    health_data["sql_stream"] = get_sql_stream_stats()
+    health_data["chat_singleflight"] = _chat_flight.stats()
+    health_data["lexical_search"] = get_lexical_stats()
+    health_data["memory_index"] = get_memory_index_stats()
+    health_data["embeddings"] = get_embedding_stats()
+    health_data["embedding_batcher"] = get_embedding_batcher_stats()
+
     # Add token usage tracking
     try:
         from app.token_tracker import get_token_tracker
@@ -534,6 +582,7 @@ def health():
             "total_completion_tokens": usage["total"]["completion_tokens"],
             "total_tokens": usage["total"]["total_tokens"],
             "total_requests": usage["total"]["requests_count"],
+            "total_prompt_tokens_saved": usage["total"].get("prompt_tokens_saved", 0),
             "estimated_cost": round(cost["total_cost"], 6)
         }
     except Exception as e:
@@ -578,35 +627,61 @@ def reset_token_usage():
         )
 
 @app.get("/token-usage/detailed-logs")
-def get_detailed_token_logs():
-    """Get detailed token usage logs."""
+def get_detailed_token_logs(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    module: Optional[str] = None,
+    limit: int = 500,
+    cursor: Optional[str] = None,
+    stream: bool = False
+):
+    """
+    Get detailed token usage logs for a time window.
+    
+    Args:
+        start: Inclusive ISO timestamp lower bound (optional)
+        end: Inclusive ISO timestamp upper bound (optional)
+        module: Filter by module, e.g. SOS or ERP (optional)
+        limit: Page size (default: 500)
+        cursor: next_cursor from the previous page (optional)
+        stream: Stream the whole window as NDJSON instead of one page
+    """
     try:
         from app.token_logger import get_token_logger
         token_logger = get_token_logger()
         
-        # Read the detailed log file
-        import json
-        from pathlib import Path
-        
-        log_file = Path("logs") / "token_usage_detailed.log"
-        logs = []
-        
-        if log_file.exists():
-            with open(log_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            log_entry = json.loads(line.strip())
-                            logs.append(log_entry)
-                        except json.JSONDecodeError:
-                            # Skip invalid lines
-                            continue
+        if stream:
+            window = token_logger.store.iter_window(start, end, module, cursor)
+            # Pull the first entry now: the generator parses its arguments lazily, and a
+            # bad cursor must be a 400 before the 200 streaming response has started.
+            try:
+                first = next(window, None)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+            def ndjson():
+                if first is None:
+                    return
+                yield json.dumps(first[0]) + "\n"
+                for entry, _ in window:
+                    yield json.dumps(entry) + "\n"
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+        
+        try:
+            logs, next_cursor = token_logger.read_logs(
+                start=start, end=end, module=module, limit=max(1, min(limit, 5000)), cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "status": "success",
             "logs": logs,
-            "count": len(logs)
+            "count": len(logs),
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to get detailed token logs")
         raise HTTPException(
@@ -799,6 +874,36 @@ def _normalize_selected_db(selected_db: Optional[str], mode: str) -> str:
     # Unknown → leave empty to force General-like behavior (safe)
     return ""
 
+# Concurrent identical /chat questions share one RAG run (see app/singleflight.py)
+_chat_flight = SingleFlight("chat")
+_FLIGHT_WS_RX = re.compile(r"\s+")
+
+def _chat_flight_key(question: str, mode: str, selected_db: str, *extra: Any) -> tuple:
+    """
+    Coalescing key for a /chat question: (mode, selected_db, normalized question, resolved date range).
+
+    Relative phrases ("last 7 days") resolve against today's date, so the same
+    text asked on different days never shares an answer; questions with no
+    resolvable range are keyed on today's date for the same reason.
+    """
+    normalized = _FLIGHT_WS_RX.sub(" ", question.strip().lower()).rstrip("?.! ")
+    rng = (
+        extract_explicit_date_range(question)
+        or extract_relative_date_range(question)
+        or extract_month_token_range(question)
+    )
+    date_key = (rng["start"], rng["end"]) if rng else _dt.now().date().isoformat()
+    return (mode, selected_db, normalized, date_key) + extra
+
+async def _coalesced_answer(key: tuple, factory) -> Dict[str, Any]:
+    """Run ``factory`` once for all concurrent callers with ``key``; joiners get ``coalesced=True``."""
+    if not CHAT_SINGLEFLIGHT_ENABLED:
+        return await factory()
+    output, shared = await _chat_flight.run(key, factory)
+    if shared and isinstance(output, dict):
+        output["coalesced"] = True
+    return output
+
 # ---------------------------
 # Oracle exception handler (expanded map)
 # ---------------------------
@@ -894,17 +999,23 @@ async def chat_api(question: Question, request: Request):
             
             # For both ERP modes, use the ERP R12 engine but with different databases
             # Pass chat_id to ERP RAG engine for message recording
-            output = await erp_rag_answer(
-                question.question, 
-                selected_db=selected_db,
-                mode=mode,
-                # Phase 5: Pass training data collection parameters for hybrid processing
-                session_id=session_id,
-                client_ip=request.client.host if request and request.client else None,
-                user_agent=request.headers.get('user-agent') if request and request.headers else None,
-                page=question.page or 1,
-                page_size=question.page_size or 1000,
-                chat_id=chat_id  # Pass chat_id for message recording
+            # Identical concurrent questions share one run; the leader's chat_id is
+            # recorded inside the engine, every caller's chat is recorded below
+            output = await _coalesced_answer(
+                _chat_flight_key(question.question, mode, selected_db,
+                                 question.page or 1, question.page_size or 1000),
+                lambda: erp_rag_answer(
+                    question.question, 
+                    selected_db=selected_db,
+                    mode=mode,
+                    # Phase 5: Pass training data collection parameters for hybrid processing
+                    session_id=session_id,
+                    client_ip=request.client.host if request and request.client else None,
+                    user_agent=request.headers.get('user-agent') if request and request.headers else None,
+                    page=question.page or 1,
+                    page_size=question.page_size or 1000,
+                    chat_id=chat_id  # Pass chat_id for message recording
+                ),
             )
         else:
             # Record session and chat in dashboard first for SOS modes
@@ -937,15 +1048,25 @@ async def chat_api(question: Question, request: Request):
                     )
             
             # Pass chat_id to RAG engine for message recording
-            output = await sos_rag_answer(
-                question.question, 
-                selected_db=selected_db,
-                mode=mode,  # Pass the new mode parameter
-                # Phase 5: Pass training data collection parameters for hybrid processing
-                session_id=session_id,
-                client_ip=request.client.host if request and request.client else None,
-                user_agent=request.headers.get('user-agent') if request and request.headers else None,
-                chat_id=chat_id  # Pass chat_id for message recording
+            output = await _coalesced_answer(
+                _chat_flight_key(question.question, mode, selected_db),
+                lambda: sos_rag_answer(
+                    question.question, 
+                    selected_db=selected_db,
+                    mode=mode,  # Pass the new mode parameter
+                    # Phase 5: Pass training data collection parameters for hybrid processing
+                    session_id=session_id,
+                    client_ip=request.client.host if request and request.client else None,
+                    user_agent=request.headers.get('user-agent') if request and request.headers else None,
+                    chat_id=chat_id  # Pass chat_id for message recording
+                ),
+            )
+
+        if output and output.get("coalesced") and chat_id:
+            dashboard_recorder.record_system_message(
+                chat_id=chat_id,
+                content="Answer shared with an identical question already in progress",
+                status="success"
             )
 
         # Log the output
@@ -983,8 +1104,9 @@ async def chat_api(question: Question, request: Request):
                 
                 # Query history will be recorded after results variable is defined
                 
-                # Record token usage if available in hybrid metadata
-                if output.get("hybrid_metadata") and chat_id and ai_response_message_id:
+                # Record token usage if available in hybrid metadata; a coalesced
+                # answer spent its tokens on the request that computed it
+                if output.get("hybrid_metadata") and chat_id and ai_response_message_id and not output.get("coalesced"):
                     hybrid_meta = output["hybrid_metadata"]
                     
                     # Extract token usage data from various possible locations
@@ -2096,70 +2218,40 @@ async def get_processor_training_dataset(dataset_type: str, time_window: int = 7
 # ---------------------------
 # GET /export/sql  and  GET /export/summary
 # ---------------------------
-def _stream_view_as_csv(cur, sql: str):
-    """
-    Execute a SELECT against a view and stream the result as CSV.
-    Converts None -> "" to keep CSV clean.
-    """
-    cur.execute(sql)
-    cols = [d[0] for d in cur.description] if cur.description else []
-    # Write header
-    yield ",".join(cols) + "\n"
-
-    def _clean(v):
-        if v is None:
-            return ""
-        return str(v)
-
-    import io
-    buf = io.StringIO()
-    writer = csv.writer(buf)
-
-    while True:
-        batch = cur.fetchmany(1000)
-        if not batch:
-            break
-        for r in batch:
-            buf.seek(0)
-            buf.truncate(0)
-            writer.writerow([_clean(v) for v in r])
-            yield buf.getvalue()
-
-@app.get("/export/sql")
-async def export_sql():
+async def _export_view(export_name: str, fmt: str, compress: bool, max_rows: Optional[int]):
     """
-    Export rows from V_TRAIN_SQL as CSV.
+    Stream a training view. The export session owns its DB connection until the
+    response finishes; the background task releases it if the client disconnects early.
     """
     try:
-        with connect_feedback() as conn:
-            cur = conn.cursor()
-            gen = _stream_view_as_csv(cur, "SELECT * FROM V_TRAIN_SQL")
-            headers = {
-                "Content-Disposition": 'attachment; filename="train_sql.csv"',
-                "Cache-Control": "no-store",
-            }
-            return StreamingResponse(gen, media_type="text/csv", headers=headers)
+        session = ExportSession(export_name, fmt=fmt, compress=compress, max_rows=max_rows)
+        # Connecting and running the first query block; keep them off the event loop
+        await asyncio.to_thread(session.open)
+    except ExportError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        logging.getLogger(__name__).error(f"/export/sql failed: {e}", exc_info=True)
+        logging.getLogger(__name__).error(f"/export/{export_name} failed: {e}", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "export failed"})
+    return StreamingResponse(
+        session.iter_chunks(),
+        media_type=session.media_type,
+        headers=session.headers,
+        background=BackgroundTask(session.close),
+    )
+
+@app.get("/export/sql")
+async def export_sql(format: str = "csv", gzip: bool = False, max_rows: Optional[int] = None):
+    """
+    Export rows from V_TRAIN_SQL as CSV, NDJSON or Parquet (optionally gzip-compressed).
+    """
+    return await _export_view("sql", format, gzip, max_rows)
 
 @app.get("/export/summary")
-async def export_summary():
+async def export_summary(format: str = "csv", gzip: bool = False, max_rows: Optional[int] = None):
     """
-    Export rows from V_TRAIN_SUMMARY as CSV.
+    Export rows from V_TRAIN_SUMMARY as CSV, NDJSON or Parquet (optionally gzip-compressed).
     """
-    try:
-        with connect_feedback() as conn:
-            cur = conn.cursor()
-            gen = _stream_view_as_csv(cur, "SELECT * FROM V_TRAIN_SUMMARY")
-            headers = {
-                "Content-Disposition": 'attachment; filename="train_summary.csv"',
-                "Cache-Control": "no-store",
-            }
-            return StreamingResponse(gen, media_type="text/csv", headers=headers)
-    except Exception as e:
-        logging.getLogger(__name__).error(f"/export/summary failed: {e}", exc_info=True)
-        return JSONResponse(status_code=500, content={"error": "export failed"})
+    return await _export_view("summary", format, gzip, max_rows)
 
 # ---------------------------
 # File Upload and Analysis Endpoints
@@ -2177,18 +2269,17 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
     Returns:
         File upload response with file metadata
     """
+    admitted_client = None
     try:
-        # Rate limiting check
+        # Rate limiting: check and count in one step
         if request:
             client_id = _get_client_identifier(request)
-            rate_limits = _check_rate_limits(client_id)
-
-            
-            if rate_limits["upload_limited"]:
+            if _admit_request(client_id, ("upload_limited",)):
                 raise HTTPException(
                     status_code=429,
                     detail="File upload rate limit exceeded. Maximum 10 uploads per hour."
                 )
+            admitted_client = client_id
         
         # Validate file size (5MB limit)
         contents = await file.read()
@@ -2227,10 +2318,8 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
                 detail="File content validation failed. File may contain unsafe content."
             )
         
-        # Increment rate counter
-        if request:
-            client_id = _get_client_identifier(request)
-            _increment_rate_counters(client_id)
+        # Upload accepted; the admission count stands
+        admitted_client = None
         
         # Cleanup expired files periodically
         import random
@@ -2246,8 +2335,12 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
         )
         
     except HTTPException:
+        if admitted_client:
+            _refund_rate_counters(admitted_client)
         raise
     except Exception as e:
+        if admitted_client:
+            _refund_rate_counters(admitted_client)
         logger.exception("Failed to upload file")
         raise HTTPException(
             status_code=500, 
@@ -2266,24 +2359,25 @@ async def analyze_file(request: FileAnalysisRequest, req: Request):
     Returns:
         File analysis response with summary from Gemini Flash 1.5
     """
+    admitted_client = None
     try:
-        # Rate limiting check
+        # Rate limiting: check and count in one step
         if req:
             client_id = _get_client_identifier(req)
-            rate_limits = _check_rate_limits(client_id)
-            
-            if rate_limits["processing_limited"]:
+            exceeded = _admit_request(client_id, ("processing_limited", "api_limited"))
+            if exceeded == "processing_limited":
                 raise HTTPException(
                     status_code=429,
                     detail="File processing rate limit exceeded. Maximum 5 processing requests per minute."
                 )
             
             # Check API quota
-            if rate_limits["api_limited"]:
+            if exceeded == "api_limited":
                 raise HTTPException(
                     status_code=429,
                     detail="API quota limit exceeded. Please try again tomorrow."
                 )
+            admitted_client = client_id
         
         # Validate file exists
         file_path = FILE_STORAGE_PATH / f"{request.file_id}"
@@ -2334,10 +2428,8 @@ async def analyze_file(request: FileAnalysisRequest, req: Request):
                 }
             ]
             
-            # Increment rate counters
-            if req:
-                client_id = _get_client_identifier(req)
-                _increment_rate_counters(client_id)
+            # The model is called from here on; the admission count stands
+            admitted_client = None
             
             response = await client.chat_completion(
                 messages=messages,
@@ -2367,8 +2459,12 @@ async def analyze_file(request: FileAnalysisRequest, req: Request):
             )
         
     except HTTPException:
+        if admitted_client:
+            _refund_rate_counters(admitted_client)
         raise
     except Exception as e:
+        if admitted_client:
+            _refund_rate_counters(admitted_client)
         logger.exception("Failed to analyze file")
         raise HTTPException(
             status_code=500, 
@@ -2407,39 +2503,20 @@ async def get_file_upload_status(request: Request):
         client_id = _get_client_identifier(request)
         rate_limits = _check_rate_limits(client_id)
         
-        import time
-        current_time = time.time()
-        
-        # Get current counts
-        upload_key = f"{client_id}:{int(current_time // 3600)}"
-        upload_count = user_upload_counts.get(upload_key, 0)
-        
-        processing_key = f"{client_id}:{int(current_time // 60)}"
-        processing_count = user_processing_counts.get(processing_key, 0)
-        
-        date_key = time.strftime("%Y-%m-%d", time.gmtime(current_time))
-        api_count = api_usage_counts.get(date_key, 0)
-        
         return {
             "status": "success",
             "rate_limits": {
                 "upload": {
-                    "current": upload_count,
-                    "limit": FILE_UPLOAD_LIMIT_PER_USER,
-                    "remaining": max(0, FILE_UPLOAD_LIMIT_PER_USER - upload_count),
-                    "reset_time": "Next hour"
+                    **upload_limiter.usage(client_id),
+                    "reset_time": "Rolling hour"
                 },
                 "processing": {
-                    "current": processing_count,
-                    "limit": PROCESSING_RATE_LIMIT,
-                    "remaining": max(0, PROCESSING_RATE_LIMIT - processing_count),
-                    "reset_time": "Next minute"
+                    **processing_limiter.usage(client_id),
+                    "reset_time": "Rolling minute"
                 },
                 "api_quota": {
-                    "current": api_count,
-                    "limit": API_QUOTA_LIMIT,
-                    "remaining": max(0, API_QUOTA_LIMIT - api_count),
-                    "reset_time": "Tomorrow"
+                    **api_quota_limiter.usage(_API_QUOTA_KEY),
+                    "reset_time": "Rolling 24 hours"
                 }
             },
             "limits_exceeded": rate_limits
@@ -2459,42 +2536,16 @@ def _get_username_from_request(request: Request) -> str | None:
     """
     Extract username from request using JWT token.
     
+    The token is verified once per request (see app.auth_context); repeated
+    calls within the same request reuse the result.
+    
     Args:
         request: FastAPI Request object
         
     Returns:
         Username if found, None otherwise
     """
-    try:
-        # Extract token from Authorization header
-        auth_header = request.headers.get("Authorization")
-        token = None
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header[7:]  # Remove "Bearer " prefix
-        else:
-            # Check for custom auth token header
-            token = request.headers.get("X-Auth-Token") or request.headers.get("authToken")
-        
-        # Decode JWT token to get username
-        if token:
-            from app.jwt_utils import decode_access_token
-            payload = decode_access_token(token)
-            if payload and "sub" in payload:
-                username = payload["sub"]
-                logger.info(f"Successfully decoded JWT token for user: {username}")
-                return username
-            else:
-                logger.warning("Invalid or expired JWT token")
-        else:
-            logger.info("No token found in request")
-            logger.info(f"Authorization header: {auth_header}")
-            logger.info(f"All headers: {dict(request.headers)}")
-    except Exception as e:
-        logger.warning(f"Failed to extract username from request: {e}")
-        import traceback
-        logger.warning(f"Traceback: {traceback.format_exc()}")
-    
-    return None
+    return resolve_auth_context(request).username
 
 def _is_admin_user(request: Request) -> bool:
     """
@@ -2506,10 +2557,7 @@ def _is_admin_user(request: Request) -> bool:
     Returns:
         True if user is admin, False otherwise
     """
-    username = _get_username_from_request(request)
-    if not username:
-        return False
-    return user_access.is_user_admin(username)
+    return resolve_auth_context(request).is_admin
 
 @app.get("/admin/metrics")
 async def get_admin_metrics(request: Request):
@@ -3501,7 +3549,8 @@ async def get_query_history(
     request: Request,
     user_id: Optional[str] = None,
     session_id: Optional[str] = None,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ):
     """
     Get query history from the dashboard query history table.
@@ -3511,6 +3560,7 @@ async def get_query_history(
         user_id: Filter by user ID (optional)
         session_id: Filter by session ID (optional)
         limit: Maximum number of records to return (default: 100)
+        cursor: Keyset cursor returned as next_cursor by the previous page (optional)
         
     Returns:
         Query history records
@@ -3532,25 +3582,33 @@ async def get_query_history(
             )
         
         # Get query history based on filters
-        if user_id:
-            queries = dashboard_recorder.dashboard_service.query_history.get_queries_by_user(
-                user_id=user_id, 
-                limit=limit
-            )
-        elif session_id:
-            queries = dashboard_recorder.dashboard_service.query_history.get_queries_by_session(
-                session_id=session_id, 
-                limit=limit
-            )
-        else:
-            queries = dashboard_recorder.dashboard_service.query_history.get_recent_queries(
-                limit=limit
-            )
+        query_history = dashboard_recorder.dashboard_service.query_history
+        try:
+            if user_id:
+                queries = query_history.get_queries_by_user(
+                    user_id=user_id, 
+                    limit=limit,
+                    cursor=cursor
+                )
+            elif session_id:
+                queries = query_history.get_queries_by_session(
+                    session_id=session_id, 
+                    limit=limit,
+                    cursor=cursor
+                )
+            else:
+                queries = query_history.get_recent_queries(
+                    limit=limit,
+                    cursor=cursor
+                )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "success": True,
             "queries": queries,
-            "count": len(queries)
+            "count": len(queries),
+            "next_cursor": query_history.next_cursor(queries, limit)
         }
                 
     except HTTPException:
@@ -3664,7 +3722,8 @@ async def get_chat_history(
     request: Request,
     database_type: Optional[str] = None,
     query_mode: Optional[str] = None,
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None
 ):
     """
     Get filtered chat history for the current user.
@@ -3674,6 +3733,7 @@ async def get_chat_history(
         database_type: Filter by database type (optional)
         query_mode: Filter by query mode (optional)
         limit: Maximum number of records to return (default: 50)
+        cursor: Keyset cursor returned as next_cursor by the previous page (optional)
         
     Returns:
         Filtered chat history records
@@ -3696,17 +3756,23 @@ async def get_chat_history(
             )
         
         # Get filtered query history
-        queries = dashboard_recorder.dashboard_service.query_history.get_filtered_query_history(
-            user_id=username,
-            database_type=database_type,
-            query_mode=query_mode,
-            limit=limit
-        )
+        query_history = dashboard_recorder.dashboard_service.query_history
+        try:
+            queries = query_history.get_filtered_query_history(
+                user_id=username,
+                database_type=database_type,
+                query_mode=query_mode,
+                limit=limit,
+                cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "success": True,
             "queries": queries,
-            "count": len(queries)
+            "count": len(queries),
+            "next_cursor": query_history.next_cursor(queries, limit)
         }
                 
     except HTTPException:
@@ -0,0 +1,412 @@
+"""
+In-memory NumPy search over small schema collections.
+
+The SOS schema collection holds a few thousand table, column and alias
+documents, yet every lookup goes through Chroma's persistent client and its
+sqlite layer. ``MemoryVectorIndex`` loads the collection once into a
+contiguous float32 matrix with parallel id/document/metadata lists and answers
+top-k with one matrix-vector product over it.
+
+The index is a drop-in for the collection's read path: ``query`` takes the
+same arguments as ``Collection.query`` (including the ``where`` and
+``where_document`` filters built by ``app.schema_filters``) and returns the
+same result shape, with distances in the collection's ``hnsw:space``. Filters
+it cannot evaluate are passed through to Chroma.
+
+Consistency mode (``MEMORY_INDEX_CONFIG["consistency_every"]``) also sends one
+in N searches to Chroma and compares the returned ids. Chroma's HNSW is
+approximate and this index is exact, so small differences in the tail are
+expected; the overlap is reported in /health.
+
+Run ``python -m app.memory_index [db]`` for the p50/p99 latency benchmark.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import MEMORY_INDEX_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class _UnsupportedFilter(Exception):
+    """A filter operator the in-memory evaluator does not implement."""
+
+
+_COMPARE = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def _match_where(meta: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_match_where(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(_match_where(meta, c) for c in cond):
+                return False
+        elif key.startswith("$"):
+            raise _UnsupportedFilter(key)
+        elif isinstance(cond, dict):
+            if key not in meta:
+                return False
+            for op, value in cond.items():
+                if op not in _COMPARE:
+                    raise _UnsupportedFilter(op)
+                if not _COMPARE[op](meta[key], value):
+                    return False
+        elif key not in meta or meta[key] != cond:
+            return False
+    return True
+
+
+def _match_document(doc: str, where_document: Dict[str, Any]) -> bool:
+    for op, cond in where_document.items():
+        if op == "$contains":
+            if cond not in doc:
+                return False
+        elif op == "$not_contains":
+            if cond in doc:
+                return False
+        elif op == "$and":
+            if not all(_match_document(doc, c) for c in cond):
+                return False
+        elif op == "$or":
+            if not any(_match_document(doc, c) for c in cond):
+                return False
+        else:
+            raise _UnsupportedFilter(op)
+    return True
+
+
+class MemoryVectorIndex:
+    """Exact top-k search over a Chroma collection's embeddings, held in memory."""
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        embeddings: Any,
+        documents: Sequence[Optional[str]],
+        metadatas: Sequence[Optional[Dict[str, Any]]],
+        space: str = "l2",
+        collection=None,
+    ):
+        """
+        Args:
+            ids: Document ids, one per row
+            embeddings: (n, dim) embedding matrix, any array-like
+            documents: Document texts, one per row
+            metadatas: Metadata dicts, one per row
+            space: Distance reported to callers, as in Chroma's ``hnsw:space``
+                ("l2" squared euclidean, "cosine" or "ip")
+            collection: The source collection; used for filters this index
+                cannot evaluate and for consistency checks
+        """
+        self.ids = list(ids)
+        self.documents = [d or "" for d in documents]
+        self.metadatas = [m or {} for m in metadatas]
+        matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32).reshape(len(self.ids), -1))
+        self.matrix = matrix
+        self.sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        self.space = space if space in ("l2", "cosine", "ip") else "l2"
+        if self.space == "cosine":
+            # Pre-normalised rows: cosine similarity becomes a plain dot product.
+            norms = np.sqrt(self.sq_norms)
+            norms[norms == 0] = 1.0
+            self.matrix = np.ascontiguousarray(matrix / norms[:, None])
+        self.collection = collection
+        self._mask_cache: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def distances(self, vector: Sequence[float]) -> np.ndarray:
+        """Distance from ``vector`` to every row, in the index's space."""
+        q = np.asarray(vector, dtype=np.float32).ravel()
+        if self.space == "cosine":
+            norm = float(np.linalg.norm(q))
+            dots = self.matrix @ (q / norm if norm else q)
+            return 1.0 - dots
+        dots = self.matrix @ q
+        if self.space == "ip":
+            return 1.0 - dots
+        return np.maximum(self.sq_norms + float(q @ q) - 2.0 * dots, 0.0)
+
+    def _mask(self, where: Optional[Dict[str, Any]], where_document: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where and not where_document:
+            return None
+        key = repr((where, where_document))
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            mask = np.fromiter(
+                (
+                    (not where or _match_where(meta, where)) and (not where_document or _match_document(doc, where_document))
+                    for meta, doc in zip(self.metadatas, self.documents)
+                ),
+                dtype=bool,
+                count=len(self.ids),
+            )
+            if len(self._mask_cache) >= 256:
+                self._mask_cache.clear()
+            self._mask_cache[key] = mask
+        return mask
+
+    def top_k(
+        self,
+        vector: Sequence[float],
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+    ) -> List[tuple]:
+        """``(row, distance)`` pairs of the ``k`` nearest rows passing the filters, nearest first."""
+        if not len(self.ids) or k <= 0:
+            return []
+        dist = self.distances(vector)
+        mask = self._mask(where, where_document)
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            if not len(rows):
+                return []
+            dist = dist[rows]
+        else:
+            rows = None
+        k = min(k, len(dist))
+        part = np.argpartition(dist, k - 1)[:k] if k < len(dist) else np.arange(len(dist))
+        order = part[np.argsort(dist[part], kind="stable")]
+        picked = rows[order] if rows is not None else order
+        return list(zip(picked.tolist(), dist[order].tolist()))
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> Dict[str, Any]:
+        """
+        Same arguments and result shape as Chroma's ``Collection.query``.
+
+        Filters using operators this index does not evaluate are sent to the
+        source collection instead.
+        """
+        try:
+            hits = [self.top_k(v, n_results, where, where_document) for v in query_embeddings]
+        except _UnsupportedFilter as e:
+            if self.collection is None:
+                raise
+            _stats["passthrough"] += 1
+            logger.debug(f"[MEMINDEX] Filter operator {e} not supported in memory; querying Chroma")
+            return self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                where_document=where_document,
+                include=list(include),
+            )
+
+        out: Dict[str, Any] = {"ids": [[self.ids[i] for i, _ in h] for h in hits]}
+        if "documents" in include:
+            out["documents"] = [[self.documents[i] for i, _ in h] for h in hits]
+        if "metadatas" in include:
+            out["metadatas"] = [[self.metadatas[i] for i, _ in h] for h in hits]
+        if "distances" in include:
+            out["distances"] = [[d for _, d in h] for h in hits]
+        _stats["searches"] += 1
+        self._maybe_check(query_embeddings, n_results, where, where_document, out["ids"])
+        return out
+
+    def _maybe_check(self, query_embeddings, n_results, where, where_document, ids: List[List[str]]) -> None:
+        every = MEMORY_INDEX_CONFIG["consistency_every"]
+        if every <= 0 or self.collection is None or _stats["searches"] % every:
+            return
+        try:
+            kwargs: Dict[str, Any] = {"query_embeddings": query_embeddings, "n_results": n_results, "include": ["distances"]}
+            if where:
+                kwargs["where"] = where
+            if where_document:
+                kwargs["where_document"] = where_document
+            expected = self.collection.query(**kwargs).get("ids") or []
+        except Exception as e:
+            logger.warning(f"[MEMINDEX] Consistency check query failed: {e}")
+            return
+        for got, want in zip(ids, expected):
+            overlap = len(set(got) & set(want)) / len(want) if want else 1.0
+            _consistency["checks"] += 1
+            _consistency["overlap_sum"] += overlap
+            _consistency["min_overlap"] = min(_consistency["min_overlap"], overlap)
+            if got[:1] != want[:1]:
+                _consistency["top1_mismatches"] += 1
+            if overlap < 1.0:
+                logger.warning(f"[MEMINDEX] Top-{n_results} differs from Chroma (overlap {overlap:.2f}): {got} vs {want}")
+
+
+def build_memory_index(collection) -> MemoryVectorIndex:
+    """Load every embedding, document and metadata of ``collection`` into a ``MemoryVectorIndex``."""
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    embeddings = data.get("embeddings")
+    if embeddings is None:
+        embeddings = []
+    space = ((getattr(collection, "metadata", None) or {}).get("hnsw:space")) or "l2"
+    return MemoryVectorIndex(
+        data.get("ids") or [],
+        embeddings,
+        data.get("documents") or [],
+        data.get("metadatas") or [],
+        space=space,
+        collection=collection,
+    )
+
+
+# db -> (collection count, checked at, index)
+_indexes: Dict[str, tuple] = {}
+_indexes_lock = threading.Lock()
+_stats = {"builds": 0, "searches": 0, "passthrough": 0}
+_consistency = {"checks": 0, "overlap_sum": 0.0, "min_overlap": 1.0, "top1_mismatches": 0}
+
+
+def memory_index_enabled(selected_db: str) -> bool:
+    return selected_db in MEMORY_INDEX_CONFIG["dbs"]
+
+
+def get_memory_index(selected_db: str, collection) -> Optional[MemoryVectorIndex]:
+    """
+    The in-memory index for ``selected_db``, or None when the mode is off or the collection is too large.
+
+    The collection's document count is re-checked at most every
+    ``MEMORY_INDEX_CONFIG["refresh_s"]`` seconds; a changed count rebuilds the index.
+    """
+    if not memory_index_enabled(selected_db):
+        return None
+    now = time.monotonic()
+    cached = _indexes.get(selected_db)
+    if cached is not None and now - cached[1] < MEMORY_INDEX_CONFIG["refresh_s"]:
+        return cached[2]
+    with _indexes_lock:
+        cached = _indexes.get(selected_db)
+        if cached is not None and now - cached[1] < MEMORY_INDEX_CONFIG["refresh_s"]:
+            return cached[2]
+        count = collection.count()
+        if cached is not None and cached[0] == count:
+            _indexes[selected_db] = (count, now, cached[2])
+            return cached[2]
+        if count > MEMORY_INDEX_CONFIG["max_docs"]:
+            logger.info(f"[MEMINDEX] {selected_db} has {count} docs (> {MEMORY_INDEX_CONFIG['max_docs']}); staying on Chroma")
+            _indexes[selected_db] = (count, now, None)
+            return None
+        t0 = time.perf_counter()
+        index = build_memory_index(collection)
+        _indexes[selected_db] = (count, now, index)
+        _stats["builds"] += 1
+        logger.info(
+            f"[MEMINDEX] Loaded {selected_db}: {len(index)} x {index.matrix.shape[1] if len(index) else 0} "
+            f"float32 ({index.matrix.nbytes / 1e6:.1f} MB, {index.space}) in {(time.perf_counter() - t0) * 1000:.0f} ms"
+        )
+        return index
+
+
+def search_collection(selected_db: str, collection):
+    """What to send a read query to: the in-memory index when available, else the collection itself."""
+    try:
+        index = get_memory_index(selected_db, collection)
+    except Exception as e:
+        logger.warning(f"[MEMINDEX] Index unavailable for {selected_db}, using Chroma: {e}")
+        return collection
+    return index if index is not None and len(index) else collection
+
+
+def invalidate_memory_index(selected_db: str) -> None:
+    """Drop the cached index so the next search reloads it (call after re-indexing)."""
+    with _indexes_lock:
+        _indexes.pop(selected_db, None)
+
+
+def get_memory_index_stats() -> Dict[str, Any]:
+    """Loaded indexes, search counters and consistency results, for /health."""
+    checks = _consistency["checks"]
+    return {
+        **_stats,
+        "dbs": MEMORY_INDEX_CONFIG["dbs"],
+        "indexes": {db: (len(entry[2]) if entry[2] is not None else None) for db, entry in _indexes.items()},
+        "consistency": {
+            "every": MEMORY_INDEX_CONFIG["consistency_every"],
+            "checks": checks,
+            "mean_overlap": round(_consistency["overlap_sum"] / checks, 4) if checks else None,
+            "min_overlap": _consistency["min_overlap"] if checks else None,
+            "top1_mismatches": _consistency["top1_mismatches"],
+        },
+    }
+
+
+def _percentiles(samples: List[float]) -> str:
+    ms = np.asarray(samples) * 1000
+    return f"p50 {np.percentile(ms, 50):7.3f} ms   p99 {np.percentile(ms, 99):7.3f} ms"
+
+
+def _benchmark_memory_index(collection, n_queries: int = 200, top_k: int = 10) -> None:
+    """p50/p99 search latency, Chroma vs. the in-memory index, plus top-k agreement."""
+    index = build_memory_index(collection)
+    if not len(index):
+        print("collection is empty")
+        return
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(index), n_queries)
+    # Perturbed copies of stored vectors: realistic neighbourhoods without running the model.
+    queries = index.matrix[rows] + rng.normal(0, 0.05, (n_queries, index.matrix.shape[1])).astype(np.float32)
+    where = {"kind": "column"}
+
+    for label, kwargs in (("unfiltered", {}), ("where kind=column", {"where": where})):
+        chroma_t, memory_t, overlap = [], [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            want = collection.query(query_embeddings=[q.tolist()], n_results=top_k, include=["distances"], **kwargs)
+            chroma_t.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            got = index.query(query_embeddings=[q], n_results=top_k, include=["distances"], **kwargs)
+            memory_t.append(time.perf_counter() - t0)
+            w = want["ids"][0]
+            overlap.append(len(set(w) & set(got["ids"][0])) / len(w) if w else 1.0)
+        print(f"{len(index)} docs x {index.matrix.shape[1]} dims, top_k={top_k}, {label}")
+        print(f"  chroma   {_percentiles(chroma_t)}")
+        print(f"  memory   {_percentiles(memory_t)}")
+        print(f"  top-{top_k} id overlap with chroma: mean {np.mean(overlap):.3f}, min {np.min(overlap):.3f}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    import chromadb
+
+    db = sys.argv[1] if len(sys.argv) > 1 else "source_db_1"
+    if db == "synthetic":
+        _rng = np.random.default_rng(1)
+        _collection = chromadb.EphemeralClient().get_or_create_collection("memory_index_benchmark")
+        _n = 4000
+        _vectors = _rng.normal(size=(_n, 384)).astype(np.float32)
+        _vectors /= np.linalg.norm(_vectors, axis=1, keepdims=True)
+        for _start in range(0, _n, 1000):
+            _collection.add(
+                ids=[f"doc{i}" for i in range(_start, _start + 1000)],
+                embeddings=_vectors[_start:_start + 1000].tolist(),
+                documents=[f"doc {i}" for i in range(_start, _start + 1000)],
+                metadatas=[{"kind": "column" if i % 3 else "table"} for i in range(_start, _start + 1000)],
+            )
+    else:
+        from app.SOS.vector_store_chroma import get_chroma_client
+
+        _collection = get_chroma_client(db).get_or_create_collection(name=f"schema_docs_{db}")
+    _benchmark_memory_index(_collection)
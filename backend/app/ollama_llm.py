@@ -1,7 +1,12 @@
 #app/ollama_llm.py
+import asyncio
+import json
 import requests
 import logging
-from typing import Optional, Dict, Any
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, AsyncIterator, Callable
+import aiohttp
 from tenacity import retry, stop_after_attempt, wait_exponential
 from app.config import (
     OLLAMA_SQL_URL,
@@ -24,7 +29,9 @@ from app.config import (
     OLLAMA_SQL_NUM_PREDICT,
     OLLAMA_SQL_NUM_CTX,
     OLLAMA_SQL_SEED,
+    OLLAMA_CLIENT_CONFIG,
 )
+from app.sql_stream import SqlEarlyStop
 
 logger = logging.getLogger(__name__)
 
@@ -34,17 +41,17 @@ OLLAMA_RETRY_CONFIG = {
     "reraise": True
 }
 
-# ---------------------------
-# Generic Ollama caller
-# ---------------------------
-def _ask_ollama_generic(
-    url: str,
+# Pooled HTTP connections for the blocking callers
+_http = requests.Session()
+
+
+def _build_payload(
     model: str,
-    timeout: int,
     prompt: str,
     options: Optional[Dict[str, Any]] = None,
-    format_mode: Optional[str] = None,  # ← set to "json" for strict JSON responses
-) -> str:
+    format_mode: Optional[str] = None,
+    stream: bool = False,
+) -> Dict[str, Any]:
     if not prompt or not isinstance(prompt, str):
         raise ValueError("Prompt must be a non-empty string")
 
@@ -53,31 +60,50 @@ def _ask_ollama_generic(
     payload: Dict[str, Any] = {
         "model": model,
         "prompt": truncated,
-        "stream": False,
+        "stream": stream,
+        "keep_alive": OLLAMA_CLIENT_CONFIG["keep_alive"],  # keep the model resident between requests
     }
     if options:
         payload["options"] = options
     if format_mode:
         payload["format"] = format_mode  # Ollama supports strict JSON via this field
+    return payload
+
+
+def _clean_output(out: str, model: str) -> str:
+    out = (out or "").strip()
+
+    # In case some models still wrap JSON in fences
+    if out.startswith("```") and "```" in out[3:]:
+        out = out.split("```", 1)[1].strip()
+
+    if not out:
+        raise ValueError("Empty response from Ollama")
+
+    logger.debug("[LLM] Response from %s: %s", model, (out or "")[:300].replace("\n", " "))
+    return out
+
+
+# ---------------------------
+# Generic Ollama caller
+# ---------------------------
+def _ask_ollama_generic(
+    url: str,
+    model: str,
+    timeout: int,
+    prompt: str,
+    options: Optional[Dict[str, Any]] = None,
+    format_mode: Optional[str] = None,  # ← set to "json" for strict JSON responses
+) -> str:
+    payload = _build_payload(model, prompt, options, format_mode)
 
     try:
-        resp = requests.post(url, json=payload, timeout=timeout)
+        resp = _http.post(url, json=payload, timeout=timeout)
         resp.raise_for_status()
         data = resp.json()
         if "response" not in data:
             raise ValueError("Invalid response format from Ollama API")
-
-        out = (data["response"] or "").strip()
-
-        # In case some models still wrap JSON in fences
-        if out.startswith("```") and "```" in out[3:]:
-            out = out.split("```", 1)[1].strip()
-
-        if not out:
-            raise ValueError("Empty response from Ollama")
-
-        logger.debug("[LLM] Response from %s: %s", model, (out or "")[:300].replace("\n", " "))
-        return out
+        return _clean_output(data["response"], model)
     except requests.exceptions.RequestException as e:
         logger.error(f"Ollama API request failed: {e}", exc_info=True)
         raise
@@ -85,12 +111,195 @@ def _ask_ollama_generic(
         logger.error(f"Unexpected error in Ollama query: {e}", exc_info=True)
         raise
 
+
+# ---------------------------
+# Async streaming client
+# ---------------------------
+@dataclass
+class OllamaGeneration:
+    """One streamed Ollama completion."""
+    text: str
+    model: str
+    done: bool  # the model finished on its own
+    stopped_early: bool  # the stop condition cut the stream
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    first_token_s: float = 0.0
+    elapsed_s: float = 0.0
+
+
+class AsyncOllamaClient:
+    """
+    Non-blocking Ollama client.
+
+    * One ``aiohttp`` session (pooled keep-alive connections) per event loop.
+    * Streams the NDJSON ``/api/generate`` response and can stop as soon as a
+      caller-supplied condition holds; closing the stream makes Ollama stop
+      generating.
+    * A semaphore per model bounds in-flight requests so a burst of users
+      queues here instead of overloading the GPU host.
+    * Every request carries ``keep_alive`` so the model stays loaded, and
+      ``preload`` loads models ahead of the first question.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config or OLLAMA_CLIENT_CONFIG
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.config["connection_limit"],
+                keepalive_timeout=self.config["keepalive_timeout_s"],
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+        return self._session
+
+    def _limit_for(self, model: str) -> asyncio.Semaphore:
+        sem = self._limits.get(model)
+        if sem is None:
+            limit = self.config["model_concurrency"].get(model, self.config["default_concurrency"])
+            sem = self._limits.setdefault(model, asyncio.Semaphore(max(1, limit)))
+        return sem
+
+    async def stream(
+        self,
+        url: str,
+        model: str,
+        timeout: float,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        format_mode: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the decoded NDJSON chunks of one generation.
+
+        Breaking out of the iteration closes the connection, which cancels the
+        generation on the Ollama side.
+        """
+        payload = _build_payload(model, prompt, options, format_mode, stream=True)
+        async with self._limit_for(model):
+            session = self._get_session()
+            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                resp.raise_for_status()
+                async for raw in resp.content:
+                    line = raw.strip()
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise ValueError(f"Ollama error: {chunk['error']}")
+                    yield chunk
+                    if chunk.get("done"):
+                        return
+
+    async def generate(
+        self,
+        url: str,
+        model: str,
+        timeout: float,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        format_mode: Optional[str] = None,
+        stop_when: Optional[Callable[[str], bool]] = None,
+    ) -> OllamaGeneration:
+        """
+        Stream one completion and collect it.
+
+        Args:
+            url: Ollama ``/api/generate`` endpoint
+            model: Model name
+            timeout: Total request timeout in seconds
+            prompt: Prompt text
+            options: Ollama decoding options
+            format_mode: "json" for strict JSON output
+            stop_when: Called with the text so far after each chunk; returning
+                True ends the generation early
+
+        Returns:
+            OllamaGeneration with the text and token/latency counters
+        """
+        start = time.perf_counter()
+        text = ""
+        result = OllamaGeneration(text="", model=model, done=False, stopped_early=False)
+        stream = self.stream(url, model, timeout, prompt, options, format_mode)
+        try:
+            async for chunk in stream:
+                piece = chunk.get("response") or ""
+                if piece:
+                    if not text:
+                        result.first_token_s = time.perf_counter() - start
+                    text += piece
+                    result.completion_tokens += 1
+                if chunk.get("done"):
+                    result.done = True
+                    result.prompt_tokens = chunk.get("prompt_eval_count", 0) or 0
+                    result.completion_tokens = chunk.get("eval_count", result.completion_tokens) or result.completion_tokens
+                    break
+                if stop_when and piece and stop_when(text):
+                    result.stopped_early = True
+                    break
+        finally:
+            await stream.aclose()
+        result.text = text
+        result.elapsed_s = time.perf_counter() - start
+        if result.stopped_early:
+            logger.debug(f"[LLM] {model} stopped early after {result.completion_tokens} tokens "
+                         f"({result.elapsed_s:.2f}s)")
+        return result
+
+    async def preload(self, url: str, model: str) -> None:
+        """Load ``model`` into memory (an empty prompt only applies ``keep_alive``)."""
+        async with self._limit_for(model):
+            session = self._get_session()
+            payload = {"model": model, "keep_alive": self.config["keep_alive"]}
+            async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=300)) as resp:
+                resp.raise_for_status()
+                await resp.read()
+        logger.info(f"[LLM] Preloaded {model} (keep_alive={self.config['keep_alive']})")
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_async_client: Optional[AsyncOllamaClient] = None
+
+
+def get_async_ollama_client() -> AsyncOllamaClient:
+    """Get the process-wide async Ollama client."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOllamaClient()
+    return _async_client
+
+
+async def preload_ollama_models() -> None:
+    """Load the models listed in ``OLLAMA_PRELOAD_MODELS`` so they are resident before the first query."""
+    urls = {
+        OLLAMA_SQL_MODEL: OLLAMA_SQL_URL,
+        OLLAMA_SUMMARY_MODEL: OLLAMA_SUMMARY_URL,
+        OLLAMA_ANALYTICAL_MODEL: OLLAMA_ANALYTICAL_URL,
+        OLLAMA_R1_MODEL: OLLAMA_R1_URL,
+    }
+    client = get_async_ollama_client()
+    for model in OLLAMA_CLIENT_CONFIG["preload_models"]:
+        try:
+            await client.preload(urls.get(model, OLLAMA_SQL_URL), model)
+        except Exception as e:
+            logger.warning(f"[LLM] Could not preload {model}: {e}")
+
+
 # ---------------------------
 # Retry wrappers
 # ---------------------------
-@retry(**OLLAMA_RETRY_CONFIG)
-def ask_sql_model(prompt: str) -> str:
-    sql_options = {
+def _sql_options() -> Dict[str, Any]:
+    return {
         "temperature": OLLAMA_SQL_TEMP,
         "top_p": OLLAMA_SQL_TOP_P,
         "top_k": OLLAMA_SQL_TOP_K,
@@ -99,20 +308,16 @@ def ask_sql_model(prompt: str) -> str:
         "num_ctx": OLLAMA_SQL_NUM_CTX,
         "seed": OLLAMA_SQL_SEED,
     }
+
+@retry(**OLLAMA_RETRY_CONFIG)
+def ask_sql_model(prompt: str) -> str:
+    sql_options = _sql_options()
     return _ask_ollama_generic(OLLAMA_SQL_URL, OLLAMA_SQL_MODEL, OLLAMA_SQL_TIMEOUT, prompt, sql_options)
 
 # NEW: strict-JSON wrapper for the planner
 @retry(**OLLAMA_RETRY_CONFIG)
 def ask_sql_planner(prompt: str) -> str:
-    sql_options = {
-        "temperature": OLLAMA_SQL_TEMP,
-        "top_p": OLLAMA_SQL_TOP_P,
-        "top_k": OLLAMA_SQL_TOP_K,
-        "repeat_penalty": OLLAMA_SQL_REPEAT_PENALTY,
-        "num_predict": OLLAMA_SQL_NUM_PREDICT,
-        "num_ctx": OLLAMA_SQL_NUM_CTX,
-        "seed": OLLAMA_SQL_SEED,
-    }
+    sql_options = _sql_options()
     resp_text = _ask_ollama_generic(
         OLLAMA_SQL_URL,
         OLLAMA_SQL_MODEL,
@@ -133,11 +338,38 @@ def ask_summary_model(prompt: str) -> str:
 def ask_analytical_model(prompt: str) -> str:
     return _ask_ollama_generic(OLLAMA_ANALYTICAL_URL, OLLAMA_ANALYTICAL_MODEL, OLLAMA_ANALYTICAL_TIMEOUT, prompt)
 
-# Async version for use in async contexts
+# Async versions for use in async contexts (no worker thread per call)
+@retry(**OLLAMA_RETRY_CONFIG)
+async def ask_sql_model_async(prompt: str, stop_at_statement: bool = True) -> str:
+    """SQL model over the streaming client; stops once a complete statement is out."""
+    stop = SqlEarlyStop(f"ollama:{OLLAMA_SQL_MODEL}") if stop_at_statement else None
+    result = await get_async_ollama_client().generate(
+        OLLAMA_SQL_URL, OLLAMA_SQL_MODEL, OLLAMA_SQL_TIMEOUT, prompt,
+        options=_sql_options(), stop_when=stop,
+    )
+    text = result.text
+    if stop is not None:
+        stop.finish(result.completion_tokens, result.stopped_early)
+        if result.stopped_early:
+            text = stop.text
+    return _clean_output(text, OLLAMA_SQL_MODEL)
+
+@retry(**OLLAMA_RETRY_CONFIG)
+async def ask_sql_planner_async(prompt: str) -> str:
+    result = await get_async_ollama_client().generate(
+        OLLAMA_SQL_URL, OLLAMA_SQL_MODEL, OLLAMA_SQL_TIMEOUT, prompt,
+        options=_sql_options(), format_mode="json",
+    )
+    resp_text = _clean_output(result.text, OLLAMA_SQL_MODEL)
+    logger.debug("[LLM] Planner raw: %s", (resp_text or "")[:300].replace("\n", " "))
+    return resp_text
+
+@retry(**OLLAMA_RETRY_CONFIG)
 async def ask_analytical_model_async(prompt: str) -> str:
-    # Run the synchronous function in a thread pool to avoid blocking
-    import asyncio
-    return await asyncio.get_event_loop().run_in_executor(None, ask_analytical_model, prompt)
+    result = await get_async_ollama_client().generate(
+        OLLAMA_ANALYTICAL_URL, OLLAMA_ANALYTICAL_MODEL, OLLAMA_ANALYTICAL_TIMEOUT, prompt,
+    )
+    return _clean_output(result.text, OLLAMA_ANALYTICAL_MODEL)
 
 def call_ollama(prompt: str, model: str) -> str:
     if model == OLLAMA_SQL_MODEL:
@@ -152,9 +384,10 @@ def call_ollama(prompt: str, model: str) -> str:
 
 def ask_deepseek_r1(prompt: str) -> str:
     try:
-        resp = requests.post(
+        resp = _http.post(
             OLLAMA_R1_URL,
-            json={"model": OLLAMA_R1_MODEL, "prompt": prompt, "stream": False},
+            json={"model": OLLAMA_R1_MODEL, "prompt": prompt, "stream": False,
+                  "keep_alive": OLLAMA_CLIENT_CONFIG["keep_alive"]},
             timeout=OLLAMA_R1_TIMEOUT,
         )
         resp.raise_for_status()
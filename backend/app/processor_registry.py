@@ -0,0 +1,188 @@
+"""
+Application-scoped registry of warmed SOS / ERP hybrid processors.
+
+Building a ``HybridProcessor`` constructs a SQLValidator, QueryClassifier
+(regex tables), threshold managers and an AdvancedResponseSelector; the ERP
+processor builds its own QueryClassifier. The registry builds one prototype of
+each at startup and hands every request a shallow copy: the heavy components
+are shared, while per-request attributes the processors assign during a query
+(timeouts, last API response, timings) stay private to that request.
+
+``warm_up`` is called from the FastAPI startup hook and also loads the
+embedding model, opens the Chroma clients, creates the DeepSeek clients,
+builds the ERP router vocabulary and loads the prompt tokenizer so the first
+user request does not pay for them.
+"""
+import copy
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.config import PROCESSOR_REGISTRY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessorRegistry:
+    """Owns one prototype HybridProcessor and ERPHybridProcessor per process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sos = None
+        self._erp = None
+        self.timings_ms: Dict[str, float] = {}
+        self.warmed = False
+
+    def _build(self, name: str, factory):
+        t0 = time.perf_counter()
+        processor = factory()
+        self.timings_ms[f"{name}_construct"] = round((time.perf_counter() - t0) * 1000, 3)
+        return processor
+
+    def _sos_prototype(self):
+        if self._sos is None:
+            with self._lock:
+                if self._sos is None:
+                    from app.SOS.hybrid_processor import HybridProcessor
+                    self._sos = self._build("sos", HybridProcessor)
+        return self._sos
+
+    def _erp_prototype(self):
+        if self._erp is None:
+            with self._lock:
+                if self._erp is None:
+                    from app.ERP_R12_Test_DB.hybrid_processor import ERPHybridProcessor
+                    self._erp = self._build("erp", ERPHybridProcessor)
+        return self._erp
+
+    def sos_processor(self):
+        """HybridProcessor for one request (shares the warmed components)."""
+        return copy.copy(self._sos_prototype())
+
+    def erp_processor(self):
+        """ERPHybridProcessor for one request (shares the warmed components)."""
+        return copy.copy(self._erp_prototype())
+
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Build the processors and warm their shared dependencies.
+
+        Each step is independent; a failure is logged and the remaining steps
+        still run, so the app can start with a partially warm registry.
+
+        Returns:
+            The registry stats (see ``stats``).
+        """
+        steps = [
+            ("sos_processor", self._sos_prototype),
+            ("erp_processor", self._erp_prototype),
+            ("deepseek_clients", _warm_llm_clients),
+            ("erp_vocabulary", _warm_erp_vocabulary),
+            ("prompt_tokenizer", _warm_prompt_tokenizer),
+        ]
+        if PROCESSOR_REGISTRY_CONFIG["warm_embeddings"]:
+            steps.append(("embeddings", _warm_embeddings))
+        for db in PROCESSOR_REGISTRY_CONFIG["warm_chroma_dbs"]:
+            steps.append((f"chroma_{db}", lambda db=db: _warm_chroma(db)))
+
+        for name, step in steps:
+            t0 = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logger.warning(f"[REGISTRY] Warm-up step '{name}' failed: {e}")
+                continue
+            self.timings_ms[f"warm_{name}"] = round((time.perf_counter() - t0) * 1000, 3)
+
+        self._measure_checkout()
+        self.warmed = True
+        logger.info(f"[REGISTRY] Warm-up complete: {self.timings_ms}")
+        return self.stats()
+
+    def _measure_checkout(self, repeats: int = 20) -> None:
+        """Compare a fresh (warm-cache) construction against a registry checkout."""
+        for name, prototype, checkout in (
+            ("sos", self._sos, self.sos_processor),
+            ("erp", self._erp, self.erp_processor),
+        ):
+            if prototype is None:
+                continue
+            try:
+                t0 = time.perf_counter()
+                type(prototype)()
+                construct_ms = (time.perf_counter() - t0) * 1000
+                t0 = time.perf_counter()
+                for _ in range(repeats):
+                    checkout()
+                checkout_ms = (time.perf_counter() - t0) * 1000 / repeats
+            except Exception as e:
+                logger.warning(f"[REGISTRY] Could not measure {name} setup time: {e}")
+                continue
+            self.timings_ms[f"{name}_per_request_construct"] = round(construct_ms, 3)
+            self.timings_ms[f"{name}_per_request_checkout"] = round(checkout_ms, 4)
+            logger.info(
+                f"[REGISTRY] {name.upper()} per-request setup: {construct_ms:.2f} ms constructed "
+                f"vs {checkout_ms:.4f} ms from registry"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "warmed": self.warmed,
+            "sos_ready": self._sos is not None,
+            "erp_ready": self._erp is not None,
+            "timings_ms": dict(self.timings_ms),
+        }
+
+
+def _warm_llm_clients() -> None:
+    from app.SOS.deepseek_client import get_deepseek_client
+    from app.ERP_R12_Test_DB.deepseek_client import get_erp_deepseek_client
+    get_deepseek_client()
+    get_erp_deepseek_client()
+
+
+def _warm_erp_vocabulary() -> None:
+    from app.ERP_R12_Test_DB.query_router import get_erp_vocabulary
+    get_erp_vocabulary()
+
+
+def _warm_prompt_tokenizer() -> None:
+    from app.prompt_budget import count_tokens
+    count_tokens("warm up")
+
+
+def _warm_embeddings() -> None:
+    from app.embedding_backends import warm_up_embeddings
+    # Loads the model (unless inherited from a preloading parent) and runs forward
+    # passes so lazy kernels and thread pools are initialized in this worker.
+    warm_up_embeddings()
+
+
+def _warm_chroma(selected_db: str) -> None:
+    from app.lexical_index import get_lexical_index
+    if selected_db == "source_db_1":
+        from app.memory_index import get_memory_index
+        from app.SOS.table_features import get_table_features
+        from app.SOS.vector_store_chroma import get_chroma_client
+        collection = get_chroma_client(selected_db).get_or_create_collection(name=f"schema_docs_{selected_db}")
+        get_memory_index(selected_db, collection)
+        get_table_features(selected_db)
+    else:
+        from app.ERP_R12_Test_DB.vector_store_chroma import get_chroma_client, load_schema_probes
+        collection = get_chroma_client(selected_db).get_or_create_collection(name=f"schema_docs_{selected_db}")
+        load_schema_probes(selected_db)
+    get_lexical_index(selected_db, collection)
+
+
+_registry: Optional[ProcessorRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_processor_registry() -> ProcessorRegistry:
+    """Return the process-wide processor registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProcessorRegistry()
+        return _registry
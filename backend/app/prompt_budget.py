@@ -0,0 +1,399 @@
+"""
+Prompt assembly under a token budget.
+
+SQL-generation prompts embed whatever schema text the caller collected: raw
+Chroma documents, the SOS comprehensive context, or the ERP table list. Those
+sources overlap (a table document plus its alias tokens plus several column
+documents for the same table), and nothing bounded their size. This module:
+
+* counts tokens with a real tokenizer (Hugging Face ``PROMPT_TOKENIZER``,
+  else tiktoken ``cl100k_base``, else a 4-characters-per-token estimate),
+* dedupes overlapping schema documents and ranks them by retrieval score
+  (``assemble_schema_context``) or by overlap with the question
+  (``fit_schema_context``),
+* keeps the best-ranked chunks that fit ``PROMPT_BUDGET_CONFIG`` and reports
+  how many prompt tokens were saved, which the DeepSeek clients forward to the
+  token usage log.
+
+Run ``python -m app.prompt_budget`` for the micro-benchmark.
+"""
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config import PROMPT_BUDGET_CONFIG
+
+try:
+    from transformers import AutoTokenizer
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_BLOCK_SPLIT_RX = re.compile(r"\n[ \t]*\n")
+_WS_RX = re.compile(r"\s+")
+_TERM_RX = re.compile(r"[a-z0-9_]{3,}")
+_STOP_TERMS = frozenset({
+    "the", "and", "for", "all", "show", "list", "give", "what", "which", "with",
+    "from", "that", "this", "are", "was", "how", "many", "much", "get", "find",
+})
+
+# Chunk kinds that only restate the table they belong to.
+_REDUNDANT_WITH_TABLE = frozenset({"alias"})
+
+
+# ---------------------------------------------------------------------------
+# Token counting
+# ---------------------------------------------------------------------------
+
+_encoder: Optional[Tuple[str, Callable[[str], int]]] = None
+_encoder_lock = threading.Lock()
+
+
+def _load_encoder() -> Tuple[str, Callable[[str], int]]:
+    name = PROMPT_BUDGET_CONFIG["tokenizer"]
+    if TRANSFORMERS_AVAILABLE and name:
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(name)
+            logger.info(f"[PROMPT] Counting tokens with Hugging Face tokenizer '{name}'")
+            return f"hf:{name}", lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            logger.warning(f"[PROMPT] Could not load tokenizer '{name}': {e}")
+    if TIKTOKEN_AVAILABLE:
+        encoding = tiktoken.get_encoding("cl100k_base")
+        logger.info("[PROMPT] Counting tokens with tiktoken cl100k_base")
+        return "tiktoken:cl100k_base", lambda text: len(encoding.encode(text, disallowed_special=()))
+    logger.warning("[PROMPT] No tokenizer available; estimating 4 characters per token")
+    return "chars/4", lambda text: (len(text) + 3) // 4
+
+
+def get_encoder_name() -> str:
+    """Name of the tokenizer behind ``count_tokens`` (loads it on first use)."""
+    return _get_encoder()[0]
+
+
+def _get_encoder() -> Tuple[str, Callable[[str], int]]:
+    global _encoder
+    encoder = _encoder
+    if encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = _load_encoder()
+            encoder = _encoder
+    return encoder
+
+
+@lru_cache(maxsize=PROMPT_BUDGET_CONFIG["count_cache_size"])
+def count_tokens(text: str) -> int:
+    """
+    Count tokens in ``text`` with the configured tokenizer.
+
+    Args:
+        text: Prompt text or one prompt chunk
+
+    Returns:
+        Number of tokens. Results are memoized, so schema chunks that recur
+        across requests are only encoded once.
+    """
+    if not text:
+        return 0
+    return _get_encoder()[1](text)
+
+
+def count_message_tokens(messages: Sequence[Dict[str, Any]]) -> int:
+    """Token count of the string contents of chat messages (images and files are skipped)."""
+    # Whole prompts rarely repeat, so they bypass the chunk cache.
+    encode_len = _get_encoder()[1]
+    total = 0
+    for message in messages or ():
+        if isinstance(message, dict) and isinstance(message.get("content"), str) and message["content"]:
+            total += encode_len(message["content"])
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Assembly
+# ---------------------------------------------------------------------------
+
+@dataclass
+class AssembledContext:
+    """Schema context that fits the budget, with what it cost and what was dropped."""
+    text: str
+    chunks: List[str] = field(default_factory=list)
+    ids: List[str] = field(default_factory=list)
+    tokens: int = 0
+    original_tokens: int = 0
+    dropped_duplicates: int = 0
+    dropped_over_budget: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+
+def _normalize(text: str) -> str:
+    return _WS_RX.sub(" ", text or "").strip().lower()
+
+
+def _resolve_budget(budget_tokens: Optional[int]) -> int:
+    return PROMPT_BUDGET_CONFIG["schema_context_tokens"] if budget_tokens is None else budget_tokens
+
+
+def _fill_budget(
+    ranked: List[int],
+    costs: List[int],
+    budget_tokens: int,
+    separator_tokens: int,
+) -> Tuple[List[int], int]:
+    """
+    Greedily take chunks in rank order while they fit.
+
+    The top-ranked chunk is always kept. A chunk that does not fit is skipped
+    rather than ending the scan, so smaller lower-ranked chunks can still use
+    the remaining budget.
+    """
+    kept: List[int] = []
+    used = 0
+    for i in ranked:
+        cost = costs[i] + (separator_tokens if kept else 0)
+        if kept and budget_tokens > 0 and used + cost > budget_tokens:
+            continue
+        kept.append(i)
+        used += cost
+    return kept, used
+
+
+def _score_key(result: Dict[str, Any]) -> float:
+    score = result.get("score")
+    # Chroma returns distances: lower is better. Unscored results go last.
+    return float(score) if isinstance(score, (int, float)) else float("inf")
+
+
+def rank_schema_results(results: Sequence[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Order vector-store hits by retrieval score and drop overlapping documents.
+
+    A hit is dropped when it repeats an id already kept, when its text (after
+    whitespace and case folding) is identical to or contained in a better
+    ranked document, or when it is an alias token for a table whose table
+    document is also present.
+
+    Args:
+        results: Hits shaped like ``search_vector_store_detailed`` output
+
+    Returns:
+        Tuple of (ranked unique hits, number of hits dropped)
+    """
+    ranked = sorted((r for r in results or () if r and r.get("document")), key=_score_key)
+    tables_present = {
+        str((r.get("metadata") or {}).get("source_table") or (r.get("metadata") or {}).get("table") or "").upper()
+        for r in ranked
+        if (r.get("metadata") or {}).get("kind") == "table"
+    }
+
+    kept: List[Dict[str, Any]] = []
+    kept_texts: List[str] = []
+    seen_ids = set()
+    for r in ranked:
+        meta = r.get("metadata") or {}
+        doc_id = r.get("id")
+        if doc_id and doc_id in seen_ids:
+            continue
+        table = str(meta.get("source_table") or meta.get("table") or "").upper()
+        if meta.get("kind") in _REDUNDANT_WITH_TABLE and table in tables_present:
+            continue
+        norm = _normalize(r["document"])
+        if any(norm in other for other in kept_texts):
+            continue
+        kept.append(r)
+        kept_texts.append(norm)
+        if doc_id:
+            seen_ids.add(doc_id)
+    return kept, len(results or ()) - len(kept)
+
+
+def assemble_schema_context(
+    results: Sequence[Dict[str, Any]],
+    budget_tokens: Optional[int] = None,
+    separator: str = "\n\n",
+) -> AssembledContext:
+    """
+    Build schema context from vector-store hits within a token budget.
+
+    Args:
+        results: Hits with ``document``, ``score`` (distance), ``id`` and ``metadata``
+        budget_tokens: Token budget for the joined text; None uses
+            ``PROMPT_BUDGET_CONFIG["schema_context_tokens"]``, 0 disables it
+        separator: String placed between documents
+
+    Returns:
+        AssembledContext with documents in rank order. ``original_tokens`` is
+        what joining every hit would have cost.
+    """
+    budget_tokens = _resolve_budget(budget_tokens)
+    all_docs = [r.get("document") for r in results or () if r and r.get("document")]
+    sep_tokens = count_tokens(separator)
+    original = sum(count_tokens(d) for d in all_docs) + sep_tokens * max(0, len(all_docs) - 1)
+
+    unique, duplicates = rank_schema_results(results)
+    costs = [count_tokens(r["document"]) for r in unique]
+    kept, used = _fill_budget(list(range(len(unique))), costs, budget_tokens, sep_tokens)
+    chunks = [unique[i]["document"] for i in kept]
+    return AssembledContext(
+        text=separator.join(chunks),
+        chunks=chunks,
+        ids=[unique[i].get("id") or "" for i in kept],
+        tokens=used,
+        original_tokens=original,
+        dropped_duplicates=duplicates,
+        dropped_over_budget=len(unique) - len(kept),
+    )
+
+
+def _query_terms(query: str) -> List[str]:
+    return [t for t in dict.fromkeys(_TERM_RX.findall((query or "").lower())) if t not in _STOP_TERMS]
+
+
+def fit_schema_context(
+    schema_context: str,
+    budget_tokens: Optional[int] = None,
+    query: Optional[str] = None,
+) -> AssembledContext:
+    """
+    Fit an already assembled schema context string into the token budget.
+
+    The text is split into blocks (blank-line separated paragraphs, or lines
+    when there is only one paragraph) and repeated blocks are removed. The
+    first block is always kept, so callers put instructions that must survive
+    there. The remaining blocks are ranked by how many question terms they
+    mention (ties keep their original order) and taken while they fit. Kept
+    blocks are emitted in their original order so headings stay with their
+    sections.
+
+    Args:
+        schema_context: Schema text as passed to the SQL prompt
+        budget_tokens: Token budget; None uses the configured default, 0 disables it
+        query: The user's question, used to rank blocks
+
+    Returns:
+        AssembledContext for the fitted text
+    """
+    budget_tokens = _resolve_budget(budget_tokens)
+    if not schema_context:
+        return AssembledContext(text=schema_context or "")
+
+    blocks = _BLOCK_SPLIT_RX.split(schema_context)
+    separator = "\n\n"
+    if len(blocks) == 1:
+        blocks = schema_context.splitlines()
+        separator = "\n"
+    sep_tokens = count_tokens(separator)
+    original = count_tokens(schema_context)
+
+    unique: List[str] = []
+    seen = set()
+    for block in blocks:
+        norm = _normalize(block)
+        if norm and norm not in seen:
+            seen.add(norm)
+            unique.append(block.strip("\n"))
+    duplicates = sum(1 for b in blocks if _normalize(b)) - len(unique)
+
+    costs = [count_tokens(b) for b in unique]
+    unbudgeted = sum(costs) + sep_tokens * max(0, len(unique) - 1)
+    if duplicates == 0 and (budget_tokens <= 0 or unbudgeted <= budget_tokens):
+        return AssembledContext(text=schema_context, chunks=unique, tokens=original, original_tokens=original)
+
+    terms = _query_terms(query)
+    order = list(range(1, len(unique)))
+    if terms:
+        lowered = [b.lower() for b in unique]
+        order.sort(key=lambda i: -sum(1 for t in terms if t in lowered[i]))
+    kept, used = _fill_budget([0] + order, costs, budget_tokens, sep_tokens)
+    kept.sort()
+    chunks = [unique[i] for i in kept]
+    return AssembledContext(
+        text=separator.join(chunks),
+        chunks=chunks,
+        tokens=used,
+        original_tokens=original,
+        dropped_duplicates=duplicates,
+        dropped_over_budget=len(unique) - len(kept),
+    )
+
+
+def thin_lines_to_budget(lines: Sequence[str], budget_tokens: int) -> Tuple[List[str], int]:
+    """
+    Evenly subsample a series of prompt lines (e.g. trend data points) to fit a budget.
+
+    The first and last lines are always kept so the range of the series is
+    preserved.
+
+    Args:
+        lines: Lines in series order
+        budget_tokens: Token budget for the joined lines; 0 disables it
+
+    Returns:
+        Tuple of (kept lines, tokens saved)
+    """
+    lines = list(lines)
+    costs = [count_tokens(line) for line in lines]
+    total = sum(costs)
+    if budget_tokens <= 0 or total <= budget_tokens or len(lines) <= 2:
+        return lines, 0
+    average = total / len(lines)
+    keep = max(2, int(budget_tokens // max(average, 1)))
+    step = (len(lines) - 1) / (keep - 1)
+    picked = sorted({round(i * step) for i in range(keep)})
+    return [lines[i] for i in picked], total - sum(costs[i] for i in picked)
+
+
+_SAMPLE_RESULTS = [
+    {"id": "source_db_1.T_PROD_DAILY", "score": 0.21, "metadata": {"kind": "table", "source_table": "T_PROD_DAILY"},
+     "document": "Table 'T_PROD_DAILY' from SOURCE_DB_1 database. Description: Daily floor-wise production, defects and efficiency."},
+    {"id": "source_db_1.T_PROD_DAILY::ALIAS::prod daily", "score": 0.25, "metadata": {"kind": "alias", "source_table": "T_PROD_DAILY"},
+     "document": "Alias token for table 'T_PROD_DAILY': prod daily"},
+    {"id": "source_db_1.T_PROD_DAILY.FLOOR_NAME", "score": 0.27, "metadata": {"kind": "column", "source_table": "T_PROD_DAILY", "column": "FLOOR_NAME"},
+     "document": "Column 'FLOOR_NAME' in table 'T_PROD_DAILY' from SOURCE_DB_1 database. Type: VARCHAR2. Purpose: Sewing floor name"},
+    {"id": "source_db_1.T_PROD.FLOOR_NAME", "score": 0.31, "metadata": {"kind": "column", "source_table": "T_PROD", "column": "FLOOR_NAME"},
+     "document": "Column 'FLOOR_NAME' in table 'T_PROD' from SOURCE_DB_1 database. Type: VARCHAR2. Purpose: Sewing floor name"},
+    {"id": "source_db_1.T_PROD_DAILY.PRODUCTION_QTY", "score": 0.29, "metadata": {"kind": "column", "source_table": "T_PROD_DAILY", "column": "PRODUCTION_QTY"},
+     "document": "Column 'PRODUCTION_QTY' in table 'T_PROD_DAILY' from SOURCE_DB_1 database. Type: NUMBER. Purpose: Pieces produced"},
+    {"id": "source_db_1.T_PROD_DAILY.PRODUCTION_QTY#dup", "score": 0.33, "metadata": {"kind": "column", "source_table": "T_PROD_DAILY", "column": "PRODUCTION_QTY"},
+     "document": "Column 'PRODUCTION_QTY'  in table 'T_PROD_DAILY' from SOURCE_DB_1 database. Type: NUMBER. Purpose: Pieces produced"},
+]
+
+
+def _benchmark_prompt_budget(repeats: int = 2000) -> None:
+    """Report tokens saved on a sample hit list and the cost of assembly."""
+    import time
+
+    results = _SAMPLE_RESULTS * 3
+    joined = "\n\n".join(r["document"] for r in results)
+    print(f"tokenizer: {get_encoder_name()}")
+    for budget in (0, 120, 60):
+        assembled = assemble_schema_context(results, budget_tokens=budget)
+        print(f"  budget {budget:4d}: {assembled.original_tokens} -> {assembled.tokens} tokens "
+              f"(saved {assembled.saved_tokens}, {assembled.dropped_duplicates} duplicates, "
+              f"{assembled.dropped_over_budget} over budget)")
+    fitted = fit_schema_context(joined, budget_tokens=80, query="floor wise production")
+    print(f"  fit string (80): {fitted.original_tokens} -> {fitted.tokens} tokens")
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        assemble_schema_context(results)
+    print(f"  assemble_schema_context {(time.perf_counter() - t0) * 1e6 / repeats:8.1f} us/call (token counts cached)")
+
+
+if __name__ == "__main__":
+    _benchmark_prompt_budget()
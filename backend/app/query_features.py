@@ -0,0 +1,244 @@
+"""
+Shared query-understanding stage.
+
+The ERP router, the SOS and ERP ``QueryClassifier``s and the SOS RAG engine
+all test the same question against their own keyword lists
+(``keyword in query.lower()``). Each of those modules registers its lists here
+with ``register_keywords``. The lists are compiled into one Aho-Corasick
+automaton, and ``analyze_query`` scans a question with it once. The resulting
+``QueryFeatures`` object holds every registered keyword found in the question.
+
+``analyze_query`` is memoized per question text, so the router, the classifiers
+and the RAG engine get the same object and can share derived results through
+``QueryFeatures.memo``.
+
+Run ``python -m app.query_features`` for the micro-benchmark.
+"""
+import logging
+import re
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.config import QUERY_FEATURES_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton that reports which keywords occur in a text.
+
+    Matching has the same semantics as ``keyword in text`` for every keyword,
+    including overlapping ones ("order" inside "sales order"), which a regex
+    alternation would miss. Failure links are folded into the transition
+    tables, so scanning costs one dict lookup per character.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: FrozenSet[str] = frozenset(k for k in keywords if k)
+        delta: List[Dict[str, int]] = [{}]
+        out: List[Tuple[str, ...]] = [()]
+        for keyword in self.keywords:
+            state = 0
+            for ch in keyword:
+                nxt = delta[state].get(ch)
+                if nxt is None:
+                    nxt = len(delta)
+                    delta[state][ch] = nxt
+                    delta.append({})
+                    out.append(())
+                state = nxt
+            out[state] += (keyword,)
+
+        # BFS over the trie: each state inherits the transitions and outputs of its
+        # failure state, turning the trie into a DFA.
+        fail = [0] * len(delta)
+        queue = deque(delta[0].values())
+        trie = [dict(d) for d in delta]
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in trie[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in trie[f]:
+                    f = fail[f]
+                fail[nxt] = trie[f][ch] if state and ch in trie[f] else 0
+                out[nxt] += out[fail[nxt]]
+            if state:
+                for ch, nxt in delta[fail[state]].items():
+                    delta[state].setdefault(ch, nxt)
+        self._delta = delta
+        self._out = out
+
+    def find(self, text: str) -> Set[str]:
+        """Return the set of keywords that occur in ``text``."""
+        delta, out = self._delta, self._out
+        root = delta[0]
+        found: Set[str] = set()
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch) or root.get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield ``(end, keyword)`` for every occurrence, ``end`` being the exclusive end index."""
+        delta, out = self._delta, self._out
+        root = delta[0]
+        state = 0
+        for i, ch in enumerate(text):
+            state = delta[state].get(ch) or root.get(ch, 0)
+            for keyword in out[state]:
+                yield i + 1, keyword
+
+
+def compile_any(patterns: Iterable[str], flags: int = 0) -> "re.Pattern[str]":
+    """One alternation for a pattern list that is only ever tested with ``any(re.search(...))``."""
+    return re.compile("|".join(f"(?:{p})" for p in patterns), flags)
+
+
+class QueryFeatures:
+    """Keyword hits for one question; shared by every stage that inspects it."""
+
+    __slots__ = ("text", "lower", "hits", "_vocabulary", "_memo")
+
+    def __init__(self, text: str, hits: Set[str], vocabulary: FrozenSet[str]):
+        self.text = text
+        self.lower = text.lower()
+        self.hits: FrozenSet[str] = frozenset(hits)
+        self._vocabulary = vocabulary
+        self._memo: Dict[Any, Any] = {}
+
+    def has(self, keyword: str) -> bool:
+        """``keyword in question.lower()``, answered from the automaton when it is registered."""
+        if keyword in self._vocabulary:
+            return keyword in self.hits
+        return keyword in self.lower
+
+    def has_any(self, keywords: Iterable[str]) -> bool:
+        return any(self.has(k) for k in keywords)
+
+    def count(self, keywords: Iterable[str]) -> int:
+        return sum(1 for k in keywords if self.has(k))
+
+    def matched(self, keywords: Iterable[str]) -> List[str]:
+        """The keywords present in the question, in the order given."""
+        return [k for k in keywords if self.has(k)]
+
+    def memo(self, key: Any, factory: Callable[[], Any]) -> Any:
+        """Compute ``factory()`` once per question and reuse it for later callers."""
+        try:
+            return self._memo[key]
+        except KeyError:
+            return self._memo.setdefault(key, factory())
+
+
+_vocabulary: Set[str] = set()
+_automaton: Optional[KeywordAutomaton] = None
+_lock = threading.Lock()
+
+
+def register_keywords(*groups: Iterable[str]) -> None:
+    """
+    Add keyword lists to the shared automaton.
+
+    Modules call this at import time with the lists they test against
+    ``query.lower()``. Keywords are stored as given, so mixed-case entries keep
+    their old behaviour: they never match a lowercased question.
+    """
+    global _automaton
+    new = {k for group in groups for k in group if k} - _vocabulary
+    if not new:
+        return
+    with _lock:
+        _vocabulary.update(new)
+        _automaton = None
+    analyze_query.cache_clear()
+
+
+def _get_automaton() -> KeywordAutomaton:
+    global _automaton
+    automaton = _automaton
+    if automaton is None:
+        with _lock:
+            if _automaton is None:
+                _automaton = KeywordAutomaton(_vocabulary)
+                logger.debug(f"[FEATURES] Compiled keyword automaton over {len(_vocabulary)} keywords")
+            automaton = _automaton
+    return automaton
+
+
+@lru_cache(maxsize=QUERY_FEATURES_CONFIG["cache_size"])
+def analyze_query(text: str) -> QueryFeatures:
+    """
+    Scan a question once with the shared keyword automaton.
+
+    Args:
+        text: The user's natural language question
+
+    Returns:
+        The QueryFeatures for ``text``. Repeated calls with the same text
+        return the same object.
+    """
+    automaton = _get_automaton()
+    lower = (text or "").lower()
+    return QueryFeatures(text or "", automaton.find(lower), automaton.keywords)
+
+
+_SAMPLE_QUESTIONS = [
+    "show floor wise production summary of CAL for last 7 days",
+    "which floor produced most defect qty in Aug-2025",
+    "who is the president of the company and what is his salary",
+    "give me task status of CTL-25-12345 pp approval",
+    "trend analysis of monthly efficiency for Winner BIP sewing floors",
+    "list all operating units with their business group and legal entity",
+    "show onhand quantity of item by subinventory for organization code PRN",
+    "top 10 customers by sales order amount last month as bar chart",
+]
+
+
+def _benchmark_query_features(questions: Optional[List[str]] = None, repeats: int = 2000) -> None:
+    """Compare per-keyword substring checks against one automaton scan per question."""
+    import time
+
+    questions = questions or _SAMPLE_QUESTIONS
+    keywords = sorted(_vocabulary)
+    automaton = KeywordAutomaton(keywords)
+    for q in questions:
+        lower = q.lower()
+        assert automaton.find(lower) == {k for k in keywords if k in lower}
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for q in questions:
+            lower = q.lower()
+            [k for k in keywords if k in lower]
+    scan_us = (time.perf_counter() - t0) * 1e6 / (repeats * len(questions))
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for q in questions:
+            automaton.find(q.lower())
+    auto_us = (time.perf_counter() - t0) * 1e6 / (repeats * len(questions))
+
+    print(f"{len(keywords)} keywords, {len(questions)} questions, {repeats} repeats")
+    print(f"  substring scans  {scan_us:8.1f} us/question")
+    print(f"  automaton        {auto_us:8.1f} us/question")
+
+
+if __name__ == "__main__":
+    # Import the modules that register keywords so the benchmark sees the real vocabulary.
+    for _module in (
+        "app.SOS.query_classifier",
+        "app.SOS.rag_engine",
+        "app.ERP_R12_Test_DB.query_classifier",
+        "app.ERP_R12_Test_DB.query_router",
+    ):
+        try:
+            __import__(_module)
+        except Exception as e:
+            print(f"skipping {_module}: {e}")
+    _benchmark_query_features()
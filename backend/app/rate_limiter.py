@@ -0,0 +1,223 @@
+"""
+Sliding-window rate limiting for upload, file-processing and API quotas.
+
+Each limiter keeps one small record per active key: the start of the current
+fixed window plus the counts for the current and previous windows. The allowed
+count is estimated as ``previous * (1 - elapsed / window) + current`` (the
+sliding-window counter approximation), so memory is O(1) per client and keys
+whose windows have fully elapsed are expired automatically.
+
+Two backends are provided:
+- ``MemoryRateLimitBackend``: per-process, bounded LRU of active keys.
+- ``SQLiteRateLimitBackend``: a small SQLite file shared by all uvicorn workers
+  on the host, so a multi-worker deployment enforces one quota.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import RATE_LIMIT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# (window_start, current_count, previous_count)
+_Record = Tuple[float, int, int]
+
+
+def _roll(record: Optional[_Record], now: float, window_s: float) -> _Record:
+    """Advance a record to the window containing ``now``."""
+    window_start = now - (now % window_s)
+    if record is None:
+        return window_start, 0, 0
+    start, current, previous = record
+    if start == window_start:
+        return record
+    if start == window_start - window_s:
+        return window_start, 0, current
+    return window_start, 0, 0
+
+
+def _estimate(record: _Record, now: float, window_s: float) -> float:
+    start, current, previous = record
+    weight = 1.0 - (now - start) / window_s
+    return previous * max(0.0, weight) + current
+
+
+class MemoryRateLimitBackend:
+    """In-process record store with LRU bounding and expiry."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # One LRU per limiter so expiry can use that limiter's window length.
+        self._records: Dict[str, "OrderedDict[str, _Record]"] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, limiter: str, key: str, window_s: float, limit: Optional[int], cost: int,
+            now: float) -> Tuple[bool, float]:
+        with self._lock:
+            records = self._records.setdefault(limiter, OrderedDict())
+            record = _roll(records.get(key), now, window_s)
+            count = _estimate(record, now, window_s)
+            allowed = limit is None or count + cost <= limit
+            if allowed and cost:
+                record = (record[0], max(0, record[1] + cost), record[2])
+                count += cost
+            self._store(records, key, record, now, window_s)
+            return allowed, count
+
+    def peek(self, limiter: str, key: str, window_s: float, now: float) -> float:
+        with self._lock:
+            record = self._records.get(limiter, {}).get(key)
+            if record is None:
+                return 0.0
+            return _estimate(_roll(record, now, window_s), now, window_s)
+
+    def _store(self, records: "OrderedDict[str, _Record]", key: str, record: _Record,
+               now: float, window_s: float) -> None:
+        if record[1] == 0 and record[2] == 0:
+            records.pop(key, None)
+        else:
+            records[key] = record
+            records.move_to_end(key)
+        # Evict from the cold end: fully expired records first, then LRU overflow.
+        while records:
+            start = next(iter(records.values()))[0]
+            if len(records) > self.max_keys or start <= now - 2 * window_s:
+                records.popitem(last=False)
+            else:
+                break
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._records.values())
+
+
+class SQLiteRateLimitBackend:
+    """Record store in a SQLite file shared by every worker process on the host."""
+
+    def __init__(self, path: str, sweep_interval_s: float = 60.0):
+        self.path = path
+        self.sweep_interval_s = sweep_interval_s
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                limiter TEXT NOT NULL,
+                key TEXT NOT NULL,
+                window_start REAL NOT NULL,
+                current_count INTEGER NOT NULL,
+                previous_count INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (limiter, key)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits(expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, conn: sqlite3.Connection, limiter: str, key: str) -> Optional[_Record]:
+        row = conn.execute(
+            "SELECT window_start, current_count, previous_count FROM rate_limits WHERE limiter = ? AND key = ?",
+            (limiter, key),
+        ).fetchone()
+        return (row[0], row[1], row[2]) if row else None
+
+    def hit(self, limiter: str, key: str, window_s: float, limit: Optional[int], cost: int,
+            now: float) -> Tuple[bool, float]:
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front so check-and-increment is atomic across workers.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            record = _roll(self._load(conn, limiter, key), now, window_s)
+            count = _estimate(record, now, window_s)
+            allowed = limit is None or count + cost <= limit
+            if allowed and cost:
+                record = (record[0], max(0, record[1] + cost), record[2])
+                count += cost
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?, ?)",
+                (limiter, key, record[0], record[1], record[2], record[0] + 2 * window_s),
+            )
+            if now - self._last_sweep >= self.sweep_interval_s:
+                conn.execute("DELETE FROM rate_limits WHERE expires_at < ?", (now,))
+                self._last_sweep = now
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, count
+
+    def peek(self, limiter: str, key: str, window_s: float, now: float) -> float:
+        record = self._load(self._conn(), limiter, key)
+        if record is None:
+            return 0.0
+        return _estimate(_roll(record, now, window_s), now, window_s)
+
+
+class SlidingWindowRateLimiter:
+    """A named quota of ``limit`` events per ``window_s`` seconds per key."""
+
+    def __init__(self, name: str, limit: int, window_s: float, backend=None):
+        self.name = name
+        self.limit = limit
+        self.window_s = window_s
+        self.backend = backend if backend is not None else get_rate_limit_backend()
+
+    def is_limited(self, key: str) -> bool:
+        """True if one more event for ``key`` would exceed the quota (does not consume)."""
+        return self.backend.peek(self.name, key, self.window_s, time.time()) + 1 > self.limit
+
+    def hit(self, key: str, cost: int = 1) -> bool:
+        """Consume ``cost`` events if allowed; returns whether they were allowed."""
+        allowed, _ = self.backend.hit(self.name, key, self.window_s, self.limit, cost, time.time())
+        return allowed
+
+    def record(self, key: str, cost: int = 1) -> None:
+        """Count ``cost`` events unconditionally (the caller already checked the quota)."""
+        self.backend.hit(self.name, key, self.window_s, None, cost, time.time())
+
+    def refund(self, key: str, cost: int = 1) -> None:
+        """Give back ``cost`` events consumed by ``hit`` for a request that was then rejected."""
+        self.backend.hit(self.name, key, self.window_s, None, -cost, time.time())
+
+    def usage(self, key: str) -> Dict[str, int]:
+        """Current (estimated) usage for ``key``."""
+        current = int(round(self.backend.peek(self.name, key, self.window_s, time.time())))
+        return {
+            "current": current,
+            "limit": self.limit,
+            "remaining": max(0, self.limit - current),
+        }
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_rate_limit_backend():
+    """Return the process-wide backend selected by RATE_LIMIT_BACKEND (memory or sqlite)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            kind = RATE_LIMIT_CONFIG["backend"]
+            if kind == "sqlite":
+                try:
+                    _backend = SQLiteRateLimitBackend(RATE_LIMIT_CONFIG["sqlite_path"])
+                except Exception as e:
+                    logger.warning(f"SQLite rate limit backend unavailable ({e}); using in-memory limiter")
+            if _backend is None:
+                _backend = MemoryRateLimitBackend(RATE_LIMIT_CONFIG["max_keys"])
+        return _backend
@@ -0,0 +1,118 @@
+"""
+Typed, metadata-filtered schema search for the Chroma vector stores.
+
+Schema documents are indexed with ``kind`` (table, column, alias,
+business_context, column_value, ...), ``source_table`` and, for critical
+tables, ``is_critical`` metadata. Instead of over-fetching a mixed top-k and
+sorting the hits out in Python, callers ask for a quota per kind. Each kind is
+one Chroma query with a server-side ``where`` clause that reuses the same query
+embedding, so a caller gets exactly the document mix it needs.
+
+``RELATIONSHIP_KIND`` is a pseudo-kind. The index has no relationship
+documents of its own, so it matches documents whose text mentions a
+relationship or join (a ``where_document`` filter).
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+RELATIONSHIP_KIND = "relationship"
+
+# where_document $contains is case-sensitive; cover the spellings the loaders emit
+_RELATIONSHIP_DOCUMENT_FILTER = {
+    "$or": [{"$contains": term} for term in ("relationship", "Relationship", "RELATIONSHIP", "join", "Join", "JOIN")]
+}
+
+
+def _match(field: str, value: Union[str, Sequence[str]]) -> Dict[str, Any]:
+    if isinstance(value, str):
+        return {field: value}
+    values = list(value)
+    return {field: values[0]} if len(values) == 1 else {field: {"$in": values}}
+
+
+def schema_where(
+    kind: Optional[Union[str, Sequence[str]]] = None,
+    source_table: Optional[Union[str, Sequence[str]]] = None,
+    is_critical: Optional[bool] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Build a Chroma ``where`` clause over schema document metadata.
+
+    Args:
+        kind: Document kind, or several kinds (matched with ``$in``)
+        source_table: Table name, or several table names
+        is_critical: Restrict to (True) critical-table documents
+
+    Returns:
+        The ``where`` dict, or None when no condition is given
+    """
+    clauses = []
+    if kind is not None:
+        clauses.append(_match("kind", kind))
+    if source_table is not None:
+        clauses.append(_match("source_table", source_table))
+    if is_critical is not None:
+        clauses.append({"is_critical": is_critical})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def query_by_kind(
+    collection,
+    query_vector: List[float],
+    quotas: Dict[str, int],
+    source_table: Optional[Union[str, Sequence[str]]] = None,
+    is_critical: Optional[bool] = None,
+    include_distances: bool = False,
+) -> Dict[str, List[Dict]]:
+    """
+    Run one filtered query per kind and return at most ``quotas[kind]`` hits for each.
+
+    Args:
+        collection: Chroma collection holding the schema documents
+        query_vector: Embedding of the (synonym-expanded) query
+        quotas: Kind -> number of hits wanted. ``RELATIONSHIP_KIND`` matches by
+            document text rather than metadata.
+        source_table: Restrict metadata kinds to these tables
+        is_critical: Restrict metadata kinds to critical-table documents
+        include_distances: Add a ``score`` (distance) to every hit
+
+    Returns:
+        Kind -> hits shaped like ``{"id", "document", "metadata"[, "score"]}``,
+        nearest first. A kind whose query fails yields an empty list.
+    """
+    include = ["documents", "metadatas"] + (["distances"] if include_distances else [])
+    out: Dict[str, List[Dict]] = {}
+    for kind, quota in quotas.items():
+        out[kind] = []
+        if quota <= 0:
+            continue
+        kwargs: Dict[str, Any] = {"query_embeddings": [query_vector], "n_results": quota, "include": include}
+        if kind == RELATIONSHIP_KIND:
+            kwargs["where_document"] = _RELATIONSHIP_DOCUMENT_FILTER
+            where = schema_where(source_table=source_table, is_critical=is_critical)
+        else:
+            where = schema_where(kind=kind, source_table=source_table, is_critical=is_critical)
+        if where:
+            kwargs["where"] = where
+        try:
+            results = collection.query(**kwargs)
+        except Exception as e:
+            logger.warning(f"[SCHEMA FILTER] Query for kind '{kind}' failed: {e}")
+            continue
+
+        docs = (results.get("documents") or [[]])[0]
+        metas = (results.get("metadatas") or [[]])[0]
+        ids = (results.get("ids") or [[None] * len(docs)])[0]
+        dists = (results.get("distances") or [[None] * len(docs)])[0]
+        for _id, doc, meta, dist in zip(ids, docs, metas, dists):
+            if not doc:
+                continue
+            hit = {"id": _id, "document": doc, "metadata": meta or {}}
+            if include_distances:
+                hit["score"] = dist
+            out[kind].append(hit)
+    return out
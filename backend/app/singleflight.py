@@ -0,0 +1,75 @@
+"""
+Request coalescing for identical in-flight work.
+
+When a shift report is due, many users ask the same question against the same
+database within seconds, and each request would run its own vector search, LLM
+generation and Oracle query. ``SingleFlight.run`` lets the first caller for a
+key (the leader) start the computation. Every caller that arrives with the same
+key while it is still running awaits that same result instead of starting
+another. Nothing is cached: once the computation finishes, the next caller
+starts a fresh one.
+
+The computation runs as its own task, so a leader whose request is cancelled
+does not take the result away from the callers still waiting on it.
+"""
+import asyncio
+import copy
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one computation."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0, "errors": 0}
+
+    async def run(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, bool]:
+        """
+        Await the in-flight computation for ``key``, starting it if there is none.
+
+        Args:
+            key: Identity of the computation; equal keys share one result
+            factory: Called (only by the leader) to create the awaitable
+
+        Returns:
+            (result, shared): ``shared`` is True for callers that joined a
+            computation started by another caller. Those callers get a deep copy
+            so nobody mutates a result another request is still using.
+        """
+        with self._lock:
+            task = self._inflight.get(key)
+            shared = task is not None
+            if shared:
+                self._stats["coalesced"] += 1
+            else:
+                self._stats["leaders"] += 1
+                task = asyncio.ensure_future(factory())
+                self._inflight[key] = task
+                task.add_done_callback(lambda t, k=key: self._done(k, t))
+
+        if shared:
+            logger.info(f"[SINGLEFLIGHT] {self.name}: joined in-flight computation for {key!r}")
+        result = await asyncio.shield(task)
+        return (copy.deepcopy(result), True) if shared else (result, False)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            if not task.cancelled() and task.exception() is not None:
+                self._stats["errors"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._inflight)}
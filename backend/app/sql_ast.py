@@ -0,0 +1,698 @@
+"""
+Shared Oracle SQL tokenizer and clause-level AST.
+
+Both pipelines post-process every generated SQL candidate with a chain of
+rewriters (date normalization, projection widening, label filters, Oracle
+fix-ups...). Each used to re-scan the whole text with its own regexes.
+``parse_sql`` tokenizes a candidate once into a small tree:
+
+    Statement
+      prefix      WITH ... (tokens before the first query block)
+      blocks      one QueryBlock per set-operator arm (UNION / INTERSECT / MINUS)
+        clauses   SELECT / FROM / WHERE / GROUP BY / HAVING / ORDER BY / FETCH ...
+      set_ops     the UNION [ALL] / INTERSECT / MINUS tokens between the arms
+
+Nested parentheses (subqueries, function calls) stay as flat tokens inside the
+clause that owns them; helpers such as ``iter_calls`` and ``split_top_level``
+walk them by depth. Every token keeps the whitespace/comments that preceded
+it, so ``Statement.to_sql()`` reproduces the input exactly until a pass
+changes something. Rewriters mutate the tree and the text is rendered once at
+the end of the chain.
+
+Run ``python -m app.sql_ast [corpus.sql]`` for the micro-benchmark; the corpus
+file holds one statement per line (e.g. an export of
+``dashboard_query_history.final_sql``).
+"""
+import logging
+import re
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+NAME, QNAME, STRING, NUMBER, BIND, LPAREN, RPAREN, COMMA, OP, OTHER = (
+    "name", "qname", "string", "number", "bind", "lparen", "rparen", "comma", "op", "other"
+)
+
+_IDENT_PART = r'(?:"(?:[^"]|"")*"|[A-Za-z_][\w$#]*|\*)'
+_TOKEN_RX = re.compile(
+    r"""
+      (?P<trivia>(?:\s+|--[^\n]*|/\*.*?(?:\*/|\Z))+)
+    | (?P<string>[nN]?'(?:[^']|'')*(?:'|\Z))
+    | (?P<name>[A-Za-z_][\w$#]*(?:\.""" + _IDENT_PART + r""")*)
+    | (?P<comma>,)
+    | (?P<lparen>\()
+    | (?P<rparen>\))
+    | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<qname>"(?:[^"]|"")*(?:"|\Z)(?:\.""" + _IDENT_PART + r""")*)
+    | (?P<bind>:(?:[A-Za-z_]\w*|\d+))
+    | (?P<op><>|!=|\^=|<=|>=|\|\||=>|[-+*/%=<>.;@])
+    | (?P<other>.)
+    """,
+    re.S | re.X,
+)
+_HINT_RX = re.compile(r"/\*\+.*?\*/", re.S)
+
+
+class Token:
+    """One lexical token plus the whitespace/comments that preceded it."""
+
+    __slots__ = ("kind", "text", "upper", "ws")
+
+    def __init__(self, kind: str, text: str, ws: str = ""):
+        self.kind = kind
+        self.text = text
+        self.upper = text.upper() if kind == NAME else text
+        self.ws = ws
+
+    def is_name(self, *names: str) -> bool:
+        return self.kind == NAME and self.upper in names
+
+    @property
+    def value(self) -> str:
+        """Unquoted value of a string literal."""
+        body = self.text[1:] if self.text[:1] in "nN" else self.text
+        return body[1:-1].replace("''", "'")
+
+    def __repr__(self) -> str:
+        return f"Token({self.kind}, {self.text!r})"
+
+
+def tokenize(sql: str) -> Tuple[List[Token], str]:
+    """
+    Split ``sql`` into tokens.
+
+    Returns:
+        The tokens and the trailing whitespace/comments after the last token.
+    """
+    tokens: List[Token] = []
+    ws = ""
+    for m in _TOKEN_RX.finditer(sql or ""):
+        kind = m.lastgroup
+        if kind == "trivia":
+            ws = m.group()
+            continue
+        tokens.append(Token(kind, m.group(), ws))
+        ws = ""
+    return tokens, ws
+
+
+def fragment(text: str, lead: str = " ") -> List[Token]:
+    """Tokens for a SQL snippet that is spliced into a tree; the first token gets ``lead``."""
+    tokens, _ = tokenize(text)
+    if tokens:
+        tokens[0].ws = lead
+    return tokens
+
+
+def render(tokens: Sequence[Token]) -> str:
+    return "".join(t.ws + t.text for t in tokens)
+
+
+def unquote_ident(text: str) -> str:
+    """``"OWNER"."TABLE"`` / ``owner.table`` -> ``OWNER.TABLE`` parts without quotes."""
+    return ".".join(p[1:-1] if p.startswith('"') else p for p in _split_ident(text))
+
+
+def _split_ident(text: str) -> List[str]:
+    return re.findall(r'"(?:[^"]|"")*"|[^.]+', text)
+
+
+# --------------------------------------------------------------------------
+# Depth-aware helpers over flat token lists
+# --------------------------------------------------------------------------
+def matching_paren(tokens: Sequence[Token], start: int) -> int:
+    """Index of the ``)`` closing the ``(`` at ``start`` (``len(tokens)`` if unbalanced)."""
+    depth = 0
+    for i in range(start, len(tokens)):
+        kind = tokens[i].kind
+        if kind == LPAREN:
+            depth += 1
+        elif kind == RPAREN:
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(tokens)
+
+
+def split_top_level(tokens: Sequence[Token], start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+    """``(start, end)`` spans of ``tokens[start:end]`` separated by depth-0 commas."""
+    end = len(tokens) if end is None else end
+    spans = []
+    depth = 0
+    s = start
+    for i in range(start, end):
+        kind = tokens[i].kind
+        if kind == LPAREN:
+            depth += 1
+        elif kind == RPAREN:
+            depth -= 1
+        elif kind == COMMA and depth == 0:
+            spans.append((s, i))
+            s = i + 1
+    if s < end or spans:
+        spans.append((s, end))
+    return spans
+
+
+def iter_calls(tokens: Sequence[Token], names: Sequence[str]) -> Iterator[Tuple[int, int, List[Tuple[int, int]]]]:
+    """
+    Yield ``(start, close, arg_spans)`` for every ``NAME(...)`` call in ``names``.
+
+    ``start`` is the function-name index, ``close`` the index of its ``)`` and
+    ``arg_spans`` the argument token spans. Nested calls are yielded too.
+    """
+    n = len(tokens)
+    for i in range(n - 1):
+        tok = tokens[i]
+        if tok.kind == NAME and tok.upper in names and tokens[i + 1].kind == LPAREN:
+            close = matching_paren(tokens, i + 1)
+            if close < n:
+                yield i, close, split_top_level(tokens, i + 2, close)
+
+
+def rewrite_calls(tokens: List[Token], names: Sequence[str],
+                  fn: Callable[[List[Token], int, int, List[Tuple[int, int]]], Optional[str]]) -> bool:
+    """
+    Replace ``NAME(...)`` calls in place with the SQL ``fn`` returns (``None`` keeps the call).
+
+    Replacement text is not re-scanned; calls nested in a kept call are still visited.
+
+    Returns:
+        True when at least one call was replaced.
+    """
+    changed = False
+    i = 0
+    while i < len(tokens) - 1:
+        tok = tokens[i]
+        if tok.kind == NAME and tok.upper in names and tokens[i + 1].kind == LPAREN:
+            close = matching_paren(tokens, i + 1)
+            if close < len(tokens):
+                new_sql = fn(tokens, i, close, split_top_level(tokens, i + 2, close))
+                if new_sql is not None:
+                    new_tokens = fragment(new_sql, tok.ws)
+                    tokens[i:close + 1] = new_tokens
+                    i += len(new_tokens)
+                    changed = True
+                    continue
+        i += 1
+    return changed
+
+
+def has_top_level(tokens: Sequence[Token], *names: str) -> bool:
+    depth = 0
+    for tok in tokens:
+        if tok.kind == LPAREN:
+            depth += 1
+        elif tok.kind == RPAREN:
+            depth -= 1
+        elif depth == 0 and tok.kind == NAME and tok.upper in names:
+            return True
+    return False
+
+
+# --------------------------------------------------------------------------
+# Tree
+# --------------------------------------------------------------------------
+# Canonical clause order, used to place clauses a pass inserts.
+CLAUSE_ORDER = (
+    "SELECT", "FROM", "WHERE", "START WITH", "CONNECT BY", "GROUP BY", "HAVING",
+    "ORDER BY", "OFFSET", "FETCH", "LIMIT", "FOR UPDATE",
+)
+_CLAUSE_RANK = {name: i for i, name in enumerate(CLAUSE_ORDER)}
+_SINGLE_WORD_CLAUSES = {"SELECT", "FROM", "WHERE", "HAVING", "OFFSET", "FETCH", "LIMIT"}
+_TWO_WORD_CLAUSES = {("GROUP", "BY"), ("CONNECT", "BY"), ("START", "WITH"), ("FOR", "UPDATE"), ("ORDER", "BY")}
+_SET_OPERATORS = {"UNION", "INTERSECT", "MINUS", "EXCEPT"}
+
+# Words that end a FROM item's table reference instead of naming an alias.
+_FROM_STOPWORDS = {
+    "ON", "USING", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS", "NATURAL",
+    "WHERE", "GROUP", "ORDER", "HAVING", "CONNECT", "START", "FETCH", "OFFSET", "LIMIT",
+    "PARTITION", "SAMPLE", "PIVOT", "UNPIVOT", "FOR", "UNION", "MINUS", "INTERSECT", "AS",
+}
+_JOIN_WORDS = {"JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS", "NATURAL"}
+
+
+def _clause_head(tokens: Sequence[Token], i: int) -> Tuple[Optional[str], int]:
+    """Clause name starting at ``tokens[i]`` and its head length (``None`` if not a clause keyword)."""
+    tok = tokens[i]
+    if tok.kind != NAME:
+        return None, 0
+    word = tok.upper
+    if word in _SINGLE_WORD_CLAUSES:
+        return word, 1
+    if i + 1 < len(tokens) and tokens[i + 1].kind == NAME:
+        nxt = tokens[i + 1].upper
+        if (word, nxt) in _TWO_WORD_CLAUSES:
+            return f"{word} {nxt}", 2
+        if word == "ORDER" and nxt == "SIBLINGS" and i + 2 < len(tokens) and tokens[i + 2].is_name("BY"):
+            return "ORDER BY", 3
+    return None, 0
+
+
+class Clause:
+    """A top-level clause of a query block: its keyword tokens and body tokens."""
+
+    __slots__ = ("name", "head", "body")
+
+    def __init__(self, name: str, head: List[Token], body: List[Token]):
+        self.name = name
+        self.head = head
+        self.body = body
+
+    def text(self) -> str:
+        return render(self.body).strip()
+
+    def items(self) -> List[List[Token]]:
+        """Body tokens split on depth-0 commas (select list, GROUP BY keys...)."""
+        return [self.body[s:e] for s, e in split_top_level(self.body)]
+
+    def set_body(self, sql: str) -> None:
+        lead = self.body[0].ws if self.body and self.body[0].ws else " "
+        self.body = fragment(sql, lead)
+
+    def __repr__(self) -> str:
+        return f"Clause({self.name}: {self.text()!r})"
+
+
+class QueryBlock:
+    """One SELECT arm: ``lead`` tokens (e.g. a wrapping parenthesis) and its clauses."""
+
+    def __init__(self, tokens: List[Token]):
+        self.lead: List[Token] = []
+        self.clauses: List[Clause] = []
+        depth = 0
+        current: Optional[Clause] = None
+        i, n = 0, len(tokens)
+        while i < n:
+            tok = tokens[i]
+            if tok.kind == LPAREN:
+                depth += 1
+            elif tok.kind == RPAREN:
+                depth -= 1
+            elif depth == 0:
+                name, size = _clause_head(tokens, i)
+                if name and (name != "SELECT" or current is None):
+                    current = Clause(name, tokens[i:i + size], [])
+                    self.clauses.append(current)
+                    i += size
+                    continue
+            (current.body if current is not None else self.lead).append(tok)
+            i += 1
+
+    def clause(self, name: str) -> Optional[Clause]:
+        for c in self.clauses:
+            if c.name == name:
+                return c
+        return None
+
+    def has(self, name: str) -> bool:
+        return self.clause(name) is not None
+
+    def insert_clause(self, name: str, body_sql: str) -> Clause:
+        """Add a clause at its canonical position (e.g. WHERE after FROM)."""
+        rank = _CLAUSE_RANK.get(name, len(CLAUSE_ORDER))
+        pos = len(self.clauses)
+        for idx, c in enumerate(self.clauses):
+            if _CLAUSE_RANK.get(c.name, len(CLAUSE_ORDER)) > rank:
+                pos = idx
+                break
+        clause = Clause(name, fragment(name), fragment(body_sql))
+        if pos == 0 and not self.lead:
+            clause.head[0].ws = ""
+        self.clauses.insert(pos, clause)
+        return clause
+
+    def remove_clause(self, name: str) -> bool:
+        before = len(self.clauses)
+        self.clauses = [c for c in self.clauses if c.name != name]
+        return len(self.clauses) != before
+
+    def add_predicate(self, predicate: str) -> None:
+        """
+        AND ``predicate`` in front of the existing WHERE condition (or create the WHERE).
+
+        The existing condition is parenthesized when it has a top-level OR.
+        """
+        where = self.clause("WHERE")
+        if where is None or not where.body:
+            if where is not None:
+                self.remove_clause("WHERE")
+            self.insert_clause("WHERE", predicate)
+            return
+        existing = where.text()
+        if has_top_level(where.body, "OR"):
+            existing = f"({existing})"
+        where.set_body(f"{predicate} AND {existing}")
+
+    def from_items(self) -> List[List[Token]]:
+        """FROM-clause items split on depth-0 commas and JOIN keywords."""
+        frm = self.clause("FROM")
+        if frm is None:
+            return []
+        items: List[List[Token]] = []
+        current: List[Token] = []
+        depth = 0
+        for tok in frm.body:
+            if tok.kind == LPAREN:
+                depth += 1
+            elif tok.kind == RPAREN:
+                depth -= 1
+            elif depth == 0 and (tok.kind == COMMA or (tok.kind == NAME and tok.upper in _JOIN_WORDS)):
+                if current:
+                    items.append(current)
+                current = []
+                continue
+            current.append(tok)
+        if current:
+            items.append(current)
+        return items
+
+    def tables(self) -> List[Tuple[str, Optional[str]]]:
+        """``(table, alias)`` for each named table in FROM (subquery items are skipped)."""
+        out = []
+        for item in self.from_items():
+            head = item[0]
+            if head.kind not in (NAME, QNAME):
+                continue
+            alias = None
+            rest = item[1:]
+            if rest and rest[0].is_name("AS"):
+                rest = rest[1:]
+            if rest and rest[0].kind in (NAME, QNAME) and rest[0].upper not in _FROM_STOPWORDS:
+                alias = unquote_ident(rest[0].text)
+            out.append((unquote_ident(head.text), alias))
+        return out
+
+    def main_table(self) -> Optional[str]:
+        """First table in FROM, or None when FROM starts with a subquery."""
+        items = self.from_items()
+        if not items or items[0][0].kind not in (NAME, QNAME):
+            return None
+        return unquote_ident(items[0][0].text)
+
+    def tokens(self) -> Iterator[Token]:
+        yield from self.lead
+        for c in self.clauses:
+            yield from c.head
+            yield from c.body
+
+    def token_lists(self) -> Iterator[List[Token]]:
+        yield self.lead
+        for c in self.clauses:
+            yield c.head
+            yield c.body
+
+
+class Statement:
+    """A parsed SQL statement; see the module docstring for the layout."""
+
+    def __init__(self, prefix: List[Token], blocks: List[QueryBlock], set_ops: List[List[Token]],
+                 trailer: List[Token], tail_ws: str):
+        self.prefix = prefix
+        self.blocks = blocks
+        self.set_ops = set_ops
+        self.trailer = trailer
+        self.tail_ws = tail_ws
+
+    @property
+    def main(self) -> QueryBlock:
+        """The first query block (the one a plain SELECT consists of)."""
+        return self.blocks[0]
+
+    @property
+    def last(self) -> QueryBlock:
+        """The last query block; it owns ORDER BY / FETCH of a compound query."""
+        return self.blocks[-1]
+
+    def token_lists(self) -> Iterator[List[Token]]:
+        yield self.prefix
+        for i, block in enumerate(self.blocks):
+            if i:
+                yield self.set_ops[i - 1]
+            yield from block.token_lists()
+        yield self.trailer
+
+    def tokens(self) -> Iterator[Token]:
+        for tokens in self.token_lists():
+            yield from tokens
+
+    def to_sql(self, compact: bool = False) -> str:
+        """
+        Render the tree back to SQL.
+
+        Args:
+            compact: Collapse whitespace to single spaces and drop comments
+                (optimizer hints are kept); otherwise the original layout is preserved.
+        """
+        if not compact:
+            return "".join(t.ws + t.text for t in self.tokens()) + self.tail_ws
+        parts = []
+        for tok in self.tokens():
+            if tok.ws:
+                if parts:
+                    parts.append(" ")
+                if "/*+" in tok.ws:
+                    parts.append(" ".join(_HINT_RX.findall(tok.ws)) + " ")
+            parts.append(tok.text)
+        return "".join(parts)
+
+    def __str__(self) -> str:
+        return self.to_sql()
+
+
+def parse_sql(sql: str) -> Statement:
+    """
+    Parse ``sql`` into a Statement.
+
+    Parsing never fails: unknown constructs stay as tokens in the clause (or
+    block ``lead``) that contains them and are rendered unchanged.
+    """
+    tokens, tail_ws = tokenize(sql)
+
+    trailer: List[Token] = []
+    while tokens and tokens[-1].text == ";":
+        trailer.insert(0, tokens.pop())
+
+    prefix: List[Token] = []
+    start = 0
+    if tokens and tokens[0].is_name("WITH"):
+        depth = 0
+        for i, tok in enumerate(tokens):
+            if tok.kind == LPAREN:
+                depth += 1
+            elif tok.kind == RPAREN:
+                depth -= 1
+            elif depth == 0 and tok.is_name("SELECT"):
+                start = i
+                break
+        prefix = tokens[:start]
+
+    arms: List[List[Token]] = []
+    set_ops: List[List[Token]] = []
+    depth = 0
+    s = start
+    i = start
+    n = len(tokens)
+    while i < n:
+        tok = tokens[i]
+        if tok.kind == LPAREN:
+            depth += 1
+        elif tok.kind == RPAREN:
+            depth -= 1
+        elif depth == 0 and tok.kind == NAME and tok.upper in _SET_OPERATORS:
+            j = i + 1
+            if j < n and tokens[j].is_name("ALL", "DISTINCT"):
+                j += 1
+            arms.append(tokens[s:i])
+            set_ops.append(tokens[i:j])
+            s = i = j
+            continue
+        i += 1
+    arms.append(tokens[s:])
+
+    return Statement(prefix, [QueryBlock(arm) for arm in arms], set_ops, trailer, tail_ws)
+
+
+def split_top_level_unions(sql: str) -> List[str]:
+    """
+    Split on top-level UNION / UNION ALL only (outside quotes/parentheses).
+
+    Returns:
+        The SELECT arms (1+), each stripped. A WITH prefix stays on the first arm.
+    """
+    tokens, _ = tokenize(sql)
+    parts: List[str] = []
+    depth = 0
+    s = i = 0
+    n = len(tokens)
+    while i < n:
+        tok = tokens[i]
+        if tok.kind == LPAREN:
+            depth += 1
+        elif tok.kind == RPAREN:
+            depth = max(0, depth - 1)
+        elif depth == 0 and tok.is_name("UNION"):
+            part = render(tokens[s:i]).strip()
+            if part:
+                parts.append(part)
+            i += 2 if i + 1 < n and tokens[i + 1].is_name("ALL") else 1
+            s = i
+            continue
+        i += 1
+    tail = render(tokens[s:]).strip()
+    if tail:
+        parts.append(tail)
+    return parts if parts else [(sql or "").strip()]
+
+
+# --------------------------------------------------------------------------
+# Generic passes shared by the pipelines
+# --------------------------------------------------------------------------
+def drop_stray_commas(stmt: Statement) -> bool:
+    """
+    Remove commas that cannot be valid Oracle syntax: ``a, )``, ``a, , b`` and a
+    comma right before a clause keyword or the end of the statement
+    (``GROUP BY a, ORDER BY b``, ``SELECT a, FROM t``).
+
+    Returns:
+        True when a comma was removed.
+    """
+    flat = [(tokens, i) for tokens in stmt.token_lists() for i in range(len(tokens))]
+    doomed = []
+    for k, (tokens, i) in enumerate(flat):
+        if tokens[i].kind != COMMA:
+            continue
+        if k + 1 < len(flat):
+            nxt_tokens, j = flat[k + 1]
+            nxt = nxt_tokens[j]
+            if nxt.kind not in (RPAREN, COMMA) and not _clause_head(nxt_tokens, j)[0]:
+                continue
+            if not nxt.ws:
+                # keep "a,ORDER BY" from collapsing into "aORDER BY"
+                nxt.ws = tokens[i].ws or " "
+        doomed.append((tokens, i))
+    for tokens, i in reversed(doomed):
+        del tokens[i]
+    return bool(doomed)
+
+
+# --------------------------------------------------------------------------
+# Micro-benchmark
+# --------------------------------------------------------------------------
+_SAMPLE_CORPUS = [
+    "SELECT FLOOR_NAME, SUM(PRODUCTION_QTY) AS TOTAL_PRODUCTION FROM T_PROD_DAILY "
+    "WHERE PROD_DATE BETWEEN TO_DATE('2025-05-01','YYYY-MM-DD') AND TO_DATE('2025-05-31','YYYY-MM-DD') "
+    "GROUP BY FLOOR_NAME ORDER BY TOTAL_PRODUCTION DESC",
+    "SELECT PROD_DATE, FLOOR_NAME, PRODUCTION_QTY, DEFECT_QTY, DHU FROM T_PROD_DAILY "
+    "WHERE UPPER(FLOOR_NAME) LIKE UPPER('%Sewing CAL-2A%') AND PROD_DATE >= TO_DATE('01/06/2025','DD/MM/YYYY') "
+    "ORDER BY PROD_DATE",
+    "SELECT t.FLOOR_NAME, t.PM_OR_APM_NAME, ROUND(AVG(t.FLOOR_EF), 2) AS AVG_EFF FROM T_PROD_DAILY t "
+    "WHERE t.PROD_DATE >= TRUNC(SYSDATE, 'MM') GROUP BY t.FLOOR_NAME, t.PM_OR_APM_NAME "
+    "ORDER BY AVG_EFF DESC FETCH FIRST 10 ROWS ONLY",
+    "SELECT * FROM T_TNA_STATUS WHERE JOB_NO = 'CTL-25-01175'",
+    "SELECT e.FULL_NAME, e.EMAIL, d.DEPARTMENT_NAME FROM EMP e JOIN DEPT d ON e.DEPT_ID = d.DEPT_ID "
+    "WHERE e.STATUS = 'ACTIVE' ORDER BY e.FULL_NAME",
+    "SELECT TO_CHAR(PROD_DATE, 'YYYY-MM') AS MONTH, SUM(PRODUCTION_QTY) QTY, SUM(DEFECT_QTY) DEFECTS "
+    "FROM T_PROD WHERE PROD_DATE >= ADD_MONTHS(TRUNC(SYSDATE, 'MM'), -6) "
+    "GROUP BY TO_CHAR(PROD_DATE, 'YYYY-MM') ORDER BY MONTH",
+    "SELECT msib.segment1 AS item_code, msib.description, SUM(moqd.transaction_quantity) AS onhand_qty "
+    "FROM mtl_onhand_quantities_detail moqd JOIN mtl_system_items_b msib "
+    "ON moqd.inventory_item_id = msib.inventory_item_id AND moqd.organization_id = msib.organization_id "
+    "WHERE moqd.organization_id = 101 GROUP BY msib.segment1, msib.description, ORDER BY onhand_qty DESC",
+    "SELECT hou.name, hou.organization_id FROM hr_operating_units hou "
+    "WHERE (hou.date_to IS NULL OR hou.date_to >= SYSDATE) AND hou.business_group_id = 81",
+    "SELECT ooha.order_number, oola.ordered_item, oola.ordered_quantity, oola.unit_selling_price "
+    "FROM oe_order_headers_all ooha JOIN oe_order_lines_all oola ON ooha.header_id = oola.header_id "
+    "WHERE oola.actual_shipment_date >= TRUNC(ADD_MONTHS(SYSDATE, -1), 'MM') "
+    "AND oola.actual_shipment_date < TRUNC(SYSDATE, 'MM') ORDER BY ooha.order_number",
+    "SELECT FLOOR_NAME, SUM(PRODUCTION_QTY) QTY FROM T_PROD_DAILY WHERE PROD_DATE = "
+    "(SELECT MAX(PROD_DATE) FROM T_PROD_DAILY) GROUP BY FLOOR_NAME UNION ALL "
+    "SELECT 'TOTAL', SUM(PRODUCTION_QTY) FROM T_PROD_DAILY WHERE PROD_DATE = "
+    "(SELECT MAX(PROD_DATE) FROM T_PROD_DAILY)",
+]
+
+
+def _benchmark_rewrites(corpus: Optional[List[str]] = None, repeats: int = 200) -> None:
+    """
+    Compare the regex rewrite chain against one parse + AST passes + one render.
+
+    The regex side mirrors the DB-independent steps the pipelines ran per
+    candidate (TO_DATE normalization, WHERE-block scans, main-table lookup,
+    projection widening, predicate injection, trailing-comma clean-ups); the AST
+    side performs the same edits on one tree. Passes that query the database
+    for column metadata are excluded from both sides.
+    """
+    import time
+
+    corpus = corpus or _SAMPLE_CORPUS
+    to_date_rx = re.compile(r"(?is)TO_DATE\s*\(\s*'([^']+)'\s*,\s*'([^']+)'\s*\)")
+    where_rx = re.compile(r"(?is)\bWHERE\b(.*?)(?=\bGROUP\b|\bORDER\b|\bFETCH\b|\bOFFSET\b|\bLIMIT\b|$)")
+    from_rx = re.compile(r'(?is)\bfrom\b\s+(.*?)\s*(?:\bwhere\b|\bgroup\b|\border\b|\bfetch\b|\bunion\b|\bminus\b|\bintersect\b|$)')
+    head_rx = re.compile(r"(?is)^\s*select\s+.*?\bfrom\b")
+    pred = "PROD_DATE BETWEEN TO_DATE('01-MAY-2025','DD-MON-YYYY') AND TO_DATE('31-MAY-2025','DD-MON-YYYY')"
+
+    def regex_chain(sql: str) -> str:
+        sql = to_date_rx.sub(lambda m: m.group(0), sql)
+        m = where_rx.search(sql)
+        if m:
+            w = re.sub(r"(?is)TO_DATE\s*\(\s*'[^']+'\s*,\s*'[^']+'\s*\)", "X", m.group(1))
+            re.search(r"'[^']+'", w)
+        m = from_rx.search(sql)
+        if m:
+            re.match(r'\s*(?:"([^"]+)"|([A-Za-z0-9_\.]+))', re.split(r'(?i)\bjoin\b|\bnatural\b|\bon\b|,', m.group(1))[0])
+        wide = head_rx.sub("SELECT * FROM ", sql, count=1)
+        if not re.search(r"(?is)\bfetch\s+first\s+\d+\s+rows\s+only\b", wide):
+            re.search(r"(?is)\b(offset|limit)\b", wide)
+        parts = re.split(r"(?i)\bWHERE\b", sql, maxsplit=1)
+        if len(parts) == 2:
+            sql = f"{parts[0]}WHERE ({pred}) AND ({parts[1].strip()})"
+        sql = re.sub(r'(GROUP BY\s+[^,]+(?:\s*,\s*[^,]+)*)\s*,\s*(ORDER BY)', r'\1 \2', sql, flags=re.I)
+        sql = re.sub(r',\s*\)', ')', sql)
+        sql = re.sub(r',\s*,', ',', sql)
+        return re.sub(r'\s+', ' ', sql)
+
+    def ast_chain(sql: str) -> str:
+        stmt = parse_sql(sql)
+        for tokens in stmt.token_lists():
+            rewrite_calls(tokens, ("TO_DATE",), lambda *_: None)
+        where = stmt.main.clause("WHERE")
+        if where is not None:
+            any(t.kind == STRING for t in where.body)
+        stmt.main.main_table()
+        stmt.last.has("FETCH")
+        stmt.main.add_predicate(pred)
+        drop_stray_commas(stmt)
+        return stmt.to_sql(compact=True)
+
+    for fn in (regex_chain, ast_chain):  # warm regex caches
+        for sql in corpus:
+            fn(sql)
+
+    timings = {}
+    for name, fn in (("regex chain", regex_chain), ("AST passes", ast_chain)):
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            for sql in corpus:
+                fn(sql)
+        timings[name] = (time.perf_counter() - t0) * 1e6 / (repeats * len(corpus))
+
+    avg_len = sum(map(len, corpus)) / len(corpus)
+    print(f"{len(corpus)} statements, avg {avg_len:.0f} chars, {repeats} repeats")
+    for name, us in timings.items():
+        print(f"  {name:<12} {us:8.1f} us/statement")
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for sql in corpus:
+            parse_sql(sql)
+    print(f"  parse only   {(time.perf_counter() - t0) * 1e6 / (repeats * len(corpus)):8.1f} us/statement")
+
+
+if __name__ == "__main__":
+    # python -m app.sql_ast [corpus.sql]   (one statement per line)
+    import sys
+
+    _corpus = None
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as fh:
+            _corpus = [line.strip().rstrip(";") for line in fh if line.strip()]
+    _benchmark_rewrites(_corpus)
@@ -0,0 +1,450 @@
+"""
+Early-terminating SQL generation.
+
+The SQL prompts ask for one statement, but the models often keep going with an
+explanation, a second variant or a closing summary. ``_extract_sql_from_response``
+throws all of that away, and the tokens were still generated, billed and waited
+for. ``StreamingSqlExtractor`` follows the generated text as it streams and
+reports the moment the first complete SELECT/WITH statement is out:
+
+* the statement starts at a line beginning with SELECT or WITH (optionally
+  inside a code fence, never inside a ``<think>`` block),
+* quotes, quoted identifiers and comments are tracked so a ``;`` or ``)``
+  inside them does not count,
+* it ends at ``;`` or a closing fence with parentheses balanced, or at a blank
+  line followed by prose (a Titlecase SQL clause such as "Order by" is not
+  prose),
+* a candidate only counts if it has a FROM clause (and, for WITH, a CTE body),
+  so prose that merely starts with "Select ..." is skipped.
+
+``SqlEarlyStop`` wraps an extractor as the ``stop_when`` callback of the
+streaming Ollama and DeepSeek clients and records how many completion tokens
+and seconds stopping early saved. Tokens that were never generated cannot be
+counted, so one run in ``SQL_STREAM_CONFIG["observe_every"]`` is left to
+finish; the tail it produces after the statement is the per-stop saving
+estimate. ``get_sql_stream_stats`` reports the totals (``/health``).
+
+Run ``python -m app.sql_stream`` for the micro-benchmark.
+"""
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.config import SQL_STREAM_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_START_RX = re.compile(r"^[ \t]*(SELECT|WITH)(?=[\s(*])", re.IGNORECASE | re.MULTILINE)
+_VALID_RX = re.compile(
+    r"^(?:SELECT\b.*\bFROM\b|WITH\b.*\bAS\s*\(.*\bSELECT\b.*\bFROM\b)",
+    re.IGNORECASE | re.DOTALL,
+)
+# Titlecase words that continue a statement ("Order by", "Group by") rather than start prose
+_CLAUSE_WORDS = (
+    "Select", "From", "Where", "And", "Or", "Not", "Group", "Order", "Having", "Union",
+    "Intersect", "Minus", "Except", "Fetch", "Offset", "Limit", "Join", "Inner", "Left",
+    "Right", "Full", "Cross", "Outer", "On", "Using", "Connect", "Start", "Case", "When",
+    "Then", "Else", "End", "Partition", "Over", "For", "Pivot", "Unpivot", "Model",
+)
+# First line after a blank line that reads as prose rather than SQL.
+_PROSE_RX = re.compile(
+    r"[ \t]*(?:(?!(?:%s)\b)[A-Z][a-z]+[ ,:]|\*\*|#|[-*] |\d+\. )" % "|".join(_CLAUSE_WORDS)
+)
+_PROSE_LOOKAHEAD = 32
+
+
+class StreamingSqlExtractor:
+    """
+    Incremental scanner for the first complete SQL statement in streamed text.
+
+    Feed it pieces with ``feed`` (or call it with the whole text so far, as
+    ``stop_when`` callbacks are). Each call only scans the new characters, so a
+    full generation is scanned once.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.complete = False
+        self.start: Optional[int] = None  # index of SELECT/WITH
+        self.end: Optional[int] = None  # index just past the terminator
+        self._statement_end: Optional[int] = None
+        self._seek_from = 0
+        self._fence_from = 0  # fence parity is counted from here
+        self._pos = 0
+        self._fenced = False
+        self._upper_keyword = False
+        self._depth = 0
+        self._quote: Optional[str] = None  # "'" or '"'
+        self._comment: Optional[str] = None  # "--" or "/*"
+
+    def __call__(self, text: str) -> bool:
+        if len(text) > len(self.buffer):
+            return self.feed(text[len(self.buffer):])
+        return self.complete
+
+    @property
+    def statement(self) -> Optional[str]:
+        """The complete statement without its terminator, once found."""
+        if not self.complete:
+            return None
+        return self.buffer[self.start:self._statement_end].strip()
+
+    @property
+    def text(self) -> Optional[str]:
+        """The generated text up to and including the terminator, once found."""
+        if not self.complete:
+            return None
+        return self.buffer[:self.end]
+
+    def feed(self, piece: str) -> bool:
+        """Append ``piece`` and return True once a complete statement has been seen."""
+        if self.complete:
+            return True
+        self.buffer += piece
+        while not self.complete:
+            if self.start is None and not self._seek():
+                break
+            if not self._scan():
+                break
+        return self.complete
+
+    def _seek(self) -> bool:
+        buf = self.buffer
+        if "<think>" in buf:
+            closed = buf.rfind("</think>")
+            if closed < buf.rfind("<think>"):
+                return False
+            self._seek_from = max(self._seek_from, closed + len("</think>"))
+            self._fence_from = max(self._fence_from, closed + len("</think>"))
+        m = _START_RX.search(buf, self._seek_from)
+        if not m:
+            # Only the unfinished last line can still turn into a statement start.
+            self._seek_from = max(self._seek_from, buf.rfind("\n") + 1)
+            return False
+        self.start = m.start(1)
+        self._pos = m.end(1)
+        self._fenced = buf.count("```", self._fence_from, self.start) % 2 == 1
+        self._upper_keyword = m.group(1).isupper()
+        self._depth = 0
+        self._quote = None
+        self._comment = None
+        return True
+
+    def _finish(self, statement_end: int, end: int) -> bool:
+        """Accept the candidate if it is a balanced query, else resume seeking after it."""
+        if self._depth == 0 and _VALID_RX.match(self.buffer[self.start:statement_end].strip()):
+            self._statement_end = statement_end
+            self.end = end
+            self.complete = True
+            return True
+        self.start = None
+        self._seek_from = self._fence_from = end
+        return True
+
+    def _prose_follows(self, i: int) -> Optional[bool]:
+        """After a newline at ``i``: True/False if a blank line then prose follows, None to wait."""
+        buf = self.buffer
+        j = i + 1
+        nl = buf.find("\n", j)
+        if nl < 0:
+            return None if not buf[j:].strip() else False
+        if buf[j:nl].strip():
+            return False
+        k = nl + 1
+        while k < len(buf) and buf[k] in " \t\n":
+            k += 1
+        if k >= len(buf):
+            return None
+        if _PROSE_RX.match(buf, k):
+            return True
+        if "\n" not in buf[k:k + _PROSE_LOOKAHEAD] and len(buf) - k < _PROSE_LOOKAHEAD:
+            return None
+        return False
+
+    def _scan(self) -> bool:
+        """Advance through the candidate statement; False when more input is needed."""
+        buf = self.buffer
+        n = len(buf)
+        i = self._pos
+        while i < n:
+            ch = buf[i]
+            if self._quote:
+                if ch == self._quote:
+                    self._quote = None
+            elif self._comment == "--":
+                if ch == "\n":
+                    self._comment = None
+            elif self._comment == "/*":
+                if ch == "*":
+                    if i + 1 >= n:
+                        break
+                    if buf[i + 1] == "/":
+                        self._comment = None
+                        i += 1
+            elif ch == "'" or ch == '"':
+                self._quote = ch
+            elif ch == "-" or ch == "/":
+                if i + 1 >= n:
+                    break
+                nxt = buf[i + 1]
+                if ch == "-" and nxt == "-":
+                    self._comment = "--"
+                    i += 1
+                elif ch == "/" and nxt == "*":
+                    self._comment = "/*"
+                    i += 1
+            elif ch == "(":
+                self._depth += 1
+            elif ch == ")":
+                self._depth -= 1
+            elif ch == ";" and self._depth == 0:
+                self._pos = i + 1
+                return self._finish(i, i + 1)
+            elif ch == "`":
+                if n - i < 3:
+                    break
+                if buf.startswith("```", i):
+                    self._pos = i + 3
+                    return self._finish(i, i + 3)
+            elif ch == "\n" and self._depth == 0 and not self._fenced and self._upper_keyword:
+                prose = self._prose_follows(i)
+                if prose is None:
+                    break
+                if prose and _VALID_RX.match(buf[self.start:i].strip()):
+                    self._pos = i + 1
+                    return self._finish(i, i + 1)
+            i += 1
+        self._pos = i
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Early-stop callback and savings accounting
+# ---------------------------------------------------------------------------
+
+class _SqlStreamStats:
+    """Per-source counters; a source is ``"ollama:<model>"`` or ``"deepseek:<model>"``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sources: Dict[str, Dict[str, float]] = {}
+
+    def _source(self, source: str) -> Dict[str, float]:
+        stats = self._sources.get(source)
+        if stats is None:
+            stats = self._sources.setdefault(source, {
+                "started": 0,
+                "runs": 0,
+                "early_stops": 0,
+                "no_statement": 0,
+                "buffered": 0,
+                "completion_tokens": 0,
+                "observed_runs": 0,
+                "observed_tail_tokens": 0,
+                "observed_tail_s": 0.0,
+            })
+        return stats
+
+    def start(self, source: str) -> bool:
+        """Count a new generation and return whether it should run to completion for observation."""
+        every = SQL_STREAM_CONFIG["observe_every"]
+        with self._lock:
+            stats = self._source(source)
+            observe = not SQL_STREAM_CONFIG["early_stop"] or (every > 0 and stats["started"] % every == 0)
+            stats["started"] += 1
+        return observe
+
+    def record(
+        self,
+        source: str,
+        completion_tokens: int,
+        stopped_early: bool,
+        tail_tokens: Optional[int],
+        tail_s: Optional[float],
+        buffered: bool = False,
+    ) -> None:
+        with self._lock:
+            stats = self._source(source)
+            stats["runs"] += 1
+            stats["completion_tokens"] += completion_tokens
+            if buffered:
+                # Not streamed: nothing was cut and the statement end was never timed
+                stats["buffered"] += 1
+            elif stopped_early:
+                stats["early_stops"] += 1
+            elif tail_tokens is None:
+                stats["no_statement"] += 1
+            else:
+                stats["observed_runs"] += 1
+                stats["observed_tail_tokens"] += tail_tokens
+                stats["observed_tail_s"] += tail_s
+
+    def tail_estimate(self, source: str) -> tuple:
+        """Mean (tokens, seconds) generated after the statement in observed runs."""
+        with self._lock:
+            stats = self._source(source)
+            observed = stats["observed_runs"]
+            if not observed:
+                return 0.0, 0.0
+            return stats["observed_tail_tokens"] / observed, stats["observed_tail_s"] / observed
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        with self._lock:
+            items = [(name, dict(stats)) for name, stats in self._sources.items()]
+        for name, stats in items:
+            observed = stats["observed_runs"]
+            tail_tokens = stats["observed_tail_tokens"] / observed if observed else 0.0
+            tail_s = stats["observed_tail_s"] / observed if observed else 0.0
+            report[name] = {
+                "runs": stats["runs"],
+                "early_stops": stats["early_stops"],
+                "no_statement": stats["no_statement"],
+                "buffered": stats["buffered"],
+                "observed_runs": observed,
+                "completion_tokens": stats["completion_tokens"],
+                "avg_tail_tokens": round(tail_tokens, 1),
+                "avg_tail_s": round(tail_s, 3),
+                "estimated_tokens_saved": int(stats["early_stops"] * tail_tokens),
+                "estimated_seconds_saved": round(stats["early_stops"] * tail_s, 2),
+            }
+        return report
+
+
+_stats = _SqlStreamStats()
+
+
+class SqlEarlyStop:
+    """
+    ``stop_when`` callback that ends a SQL generation at the first complete statement.
+
+    Create one per generation just before starting it, pass it as ``stop_when``
+    (it is called with the text so far after every streamed token), then call
+    ``finish`` with the generation's outcome to record the savings.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.extractor = StreamingSqlExtractor()
+        self.observe = _stats.start(source)
+        self.tokens_at_statement: Optional[int] = None
+        self.seconds_at_statement: Optional[float] = None
+        self._start = time.perf_counter()
+        self._calls = 0
+
+    def __call__(self, text: str) -> bool:
+        self._calls += 1
+        if self.tokens_at_statement is None and self.extractor(text):
+            self.tokens_at_statement = self._calls
+            self.seconds_at_statement = time.perf_counter() - self._start
+        return self.tokens_at_statement is not None and not self.observe
+
+    @property
+    def text(self) -> Optional[str]:
+        """Generated text up to the end of the statement, once found."""
+        return self.extractor.text
+
+    def finish(self, completion_tokens: int, stopped_early: bool, buffered: bool = False) -> Dict[str, Any]:
+        """
+        Record the outcome of the generation.
+
+        Args:
+            completion_tokens: Tokens the model actually produced
+            stopped_early: Whether the stream was cut by this callback
+            buffered: The client fell back to a non-streamed request, so the
+                callback never saw the full generation
+
+        Returns:
+            Per-request summary for response metadata
+        """
+        elapsed = time.perf_counter() - self._start
+        tail_tokens = tail_s = None
+        if buffered:
+            stopped_early = False
+        elif not stopped_early and self.tokens_at_statement is not None:
+            tail_tokens = max(0, completion_tokens - self.tokens_at_statement)
+            tail_s = max(0.0, elapsed - self.seconds_at_statement)
+        _stats.record(self.source, completion_tokens, stopped_early, tail_tokens, tail_s, buffered)
+
+        saved_tokens, saved_s = _stats.tail_estimate(self.source) if stopped_early else (0.0, 0.0)
+        if stopped_early:
+            logger.info(f"[SQL-STREAM] {self.source} stopped at token {self.tokens_at_statement} "
+                        f"({self.seconds_at_statement:.2f}s); est. saved {saved_tokens:.0f} tokens, {saved_s:.2f}s")
+        elif tail_tokens is not None:
+            logger.debug(f"[SQL-STREAM] {self.source} observed {tail_tokens} tokens ({tail_s:.2f}s) after the statement")
+        return {
+            "stopped_early": stopped_early,
+            "buffered": buffered,
+            "tokens_at_statement": None if buffered else self.tokens_at_statement,
+            "estimated_tokens_saved": int(saved_tokens),
+            "estimated_seconds_saved": round(saved_s, 3),
+        }
+
+
+def get_sql_stream_stats() -> Dict[str, Dict[str, Any]]:
+    """Early-stop counters and estimated savings per generation source."""
+    return _stats.snapshot()
+
+
+_SAMPLE_RESPONSE = """```sql
+SELECT FLOOR_NAME,
+       SUM(PRODUCTION_QTY) AS TOTAL_QTY,
+       ROUND(SUM(DEFECT_QTY) / NULLIF(SUM(PRODUCTION_QTY), 0) * 100, 2) AS "Defect %"
+FROM T_PROD_DAILY
+WHERE UPPER(FLOOR_NAME) LIKE '%CAL%'  -- company filter; matches 'CAL (Sewing)'
+  AND PROD_DATE >= TRUNC(SYSDATE) - 7
+GROUP BY FLOOR_NAME
+ORDER BY TOTAL_QTY DESC
+```
+
+Explanation:
+1. The query sums production and defect quantities per floor for the last seven days.
+2. `UPPER(FLOOR_NAME) LIKE '%CAL%'` restricts the result to CAL floors.
+3. The defect percentage guards against division by zero with NULLIF.
+
+Alternatively, if you need a daily breakdown you can group by PROD_DATE as well:
+
+```sql
+SELECT PROD_DATE, FLOOR_NAME, SUM(PRODUCTION_QTY) FROM T_PROD_DAILY GROUP BY PROD_DATE, FLOOR_NAME;
+```
+"""
+
+
+def _benchmark_sql_stream(repeats: int = 500) -> None:
+    """Compare incremental extraction against rescanning the whole text after every token."""
+    tokens = re.findall(r"\s*\S+", _SAMPLE_RESPONSE)
+
+    def rescan_complete(text: str) -> bool:
+        fresh = StreamingSqlExtractor()
+        return fresh.feed(text)
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        extractor = StreamingSqlExtractor()
+        text = ""
+        for at, tok in enumerate(tokens, 1):
+            text += tok
+            if extractor(text):
+                break
+    incremental_us = (time.perf_counter() - t0) * 1e6 / repeats
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        text = ""
+        for tok in tokens:
+            text += tok
+            if rescan_complete(text):
+                break
+    rescan_us = (time.perf_counter() - t0) * 1e6 / repeats
+
+    print(f"{len(tokens)} streamed tokens, statement complete at token {at} "
+          f"({len(tokens) - at} tokens / {100 * (len(tokens) - at) / len(tokens):.0f}% not generated)")
+    print(f"  statement: {extractor.statement.splitlines()[0]} ...")
+    print(f"  rescan per token   {rescan_us:8.1f} us/response")
+    print(f"  incremental        {incremental_us:8.1f} us/response")
+
+
+if __name__ == "__main__":
+    _benchmark_sql_stream()
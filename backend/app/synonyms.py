@@ -0,0 +1,204 @@
+"""
+Compiled query-time synonym expansion for the vector stores.
+
+Each vector store keeps a ``COLUMN_SYNONYMS`` table (canonical column ->
+business phrases). The ERP table has hundreds of entries. The old expansion
+tested every phrase of every entry with ``in`` on each search call, and one
+chat request expands the same question several times.
+
+``SynonymExpander`` compiles the table once into a single Aho-Corasick
+automaton over all phrases and canonical names. Each expansion is then one
+scan of the question, and results are memoized per question text. Matches
+must start on a word boundary and end on one, optionally after a plural
+suffix ("lines", "addresses", "subinventories"), so "pin" no longer fires
+inside "shipping".
+
+Run ``python -m app.synonyms`` for the benchmark on the ERP dictionary.
+"""
+import logging
+from collections import defaultdict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Set
+
+from app.config import QUERY_FEATURES_CONFIG
+from app.query_features import KeywordAutomaton
+
+logger = logging.getLogger(__name__)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+# Plural endings a phrase may carry before its right word boundary
+_PLURAL_SUFFIXES = ("", "s", "es")
+
+
+class SynonymExpander:
+    """Expand a query with the canonical names of the synonym phrases it contains."""
+
+    def __init__(
+        self,
+        column_synonyms: Dict[str, Sequence[str]],
+        hints: Optional[Callable[[str, str], List[str]]] = None,
+        log_tag: str = "[QuerySynonyms]",
+        cache_size: int = QUERY_FEATURES_CONFIG["cache_size"],
+    ):
+        """
+        Args:
+            column_synonyms: Canonical column -> synonym phrases
+            hints: Optional ``(canonical, lowered query) -> extra tokens``, added
+                before the canonical name
+            log_tag: Prefix for the debug log line
+            cache_size: Number of expanded queries memoized
+        """
+        self._order = {canonical: i for i, canonical in enumerate(column_synonyms)}
+        targets: Dict[str, Set[str]] = defaultdict(set)  # phrase -> canonicals it expands to
+        for canonical, syns in column_synonyms.items():
+            for phrase in syns:
+                if phrase:
+                    targets[phrase.lower()].add(canonical)
+        self._targets = targets
+        self._canonicals: Dict[str, Set[str]] = defaultdict(set)  # lowered canonical -> canonicals
+        for canonical in column_synonyms:
+            self._canonicals[canonical.lower()].add(canonical)
+        keys = set(targets) | set(self._canonicals)
+        # "subinventory" -> "subinventories": the automaton also looks for the stem before "ies"
+        self._y_stems: Dict[str, str] = {k[:-1]: k for k in keys if len(k) > 2 and k.endswith("y")}
+        self._automaton = KeywordAutomaton(keys | set(self._y_stems))
+        self._hints = hints
+        self._log_tag = log_tag
+        self.expand = lru_cache(maxsize=cache_size)(self._expand)
+
+    def phrases_in(self, ql: str) -> Set[str]:
+        """Phrases and canonical names occurring in ``ql`` as whole words, singular or plural."""
+        return set(self._matches(ql))
+
+    def _matches(self, ql: str) -> Dict[str, bool]:
+        """Whole-word matches in ``ql``, each mapped to whether it occurred verbatim (no plural suffix)."""
+        found: Dict[str, bool] = {}
+        n = len(ql)
+
+        def ends_word(i: int) -> bool:
+            return i == n or not _is_word_char(ql[i])
+
+        for end, key in self._automaton.iter_matches(ql):
+            start = end - len(key)
+            if start and _is_word_char(ql[start - 1]):
+                continue
+            if key in self._targets or key in self._canonicals:
+                for suffix in _PLURAL_SUFFIXES:
+                    if ql.startswith(suffix, end) and ends_word(end + len(suffix)):
+                        found[key] = found.get(key, False) or not suffix
+                        break
+            stem_of = self._y_stems.get(key)
+            if stem_of and ql.startswith("ies", end) and ends_word(end + 3):
+                found.setdefault(stem_of, False)
+        return found
+
+    def _expand(self, query: str) -> str:
+        if not query:
+            return query
+        ql = query.lower()
+        found = self._matches(ql)
+
+        # A canonical written as a plural ("subinventories") is still added verbatim
+        present: Set[str] = set()
+        matched: Set[str] = set()
+        for phrase, verbatim in found.items():
+            if verbatim:
+                present |= self._canonicals.get(phrase, set())
+            matched |= self._targets.get(phrase, set()) | self._canonicals.get(phrase, set())
+
+        extras: List[str] = []
+        for canonical in sorted(matched - present, key=self._order.__getitem__):
+            if self._hints:
+                extras.extend(self._hints(canonical, ql))
+            extras.append(canonical)
+
+        if not extras:
+            return query
+        expanded = query + " " + " ".join(extras)
+        logger.debug(f"{self._log_tag} Expanded query: '{query}' → '{expanded}'")
+        return expanded
+
+
+def _expand_by_scan(column_synonyms: Dict[str, Sequence[str]], query: str) -> str:
+    """The per-phrase substring loop the expander replaced; kept for the benchmark."""
+    ql = query.lower()
+    extras = []
+    for canonical, syns in column_synonyms.items():
+        if canonical.lower() in ql:
+            continue
+        if any(s.lower() in ql for s in syns):
+            extras.append(canonical)
+    return query + " " + " ".join(extras) if extras else query
+
+
+# Plural forms the substring loop caught; the expander must add the same canonicals
+_EQUIVALENT_QUERIES = [
+    "which items are in subinventories",
+    "show efficiencies of lines",
+    "top 10 suppliers by invoice amount",
+]
+
+_SAMPLE_QUERIES = [
+    "list all operating units with their business group and legal entity",
+    "show onhand quantity of item by subinventory for organization code PRN",
+    "top 10 suppliers by invoice amount last month",
+    "purchase order lines with need by date and unit price for vendor site",
+    "which employees joined the finance department this year",
+    "open sales orders by customer and ship to location",
+]
+
+
+def _benchmark_synonym_expansion(
+    column_synonyms: Dict[str, Sequence[str]],
+    queries: Optional[List[str]] = None,
+    repeats: int = 200,
+) -> None:
+    """Per-call cost of the substring loop vs. the compiled automaton, cold and memoized."""
+    import time
+
+    queries = queries or _SAMPLE_QUERIES
+    t0 = time.perf_counter()
+    expander = SynonymExpander(column_synonyms)
+    compile_ms = (time.perf_counter() - t0) * 1000
+
+    for q in _EQUIVALENT_QUERIES:
+        by_scan = set(_expand_by_scan(column_synonyms, q)[len(q):].split())
+        by_automaton = set(expander._expand(q)[len(q):].split())
+        missing = by_scan - by_automaton
+        print(f"  equivalence {'ok' if not missing else 'MISSING ' + ' '.join(sorted(missing))}: {q}")
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for q in queries:
+            _expand_by_scan(column_synonyms, q)
+    scan_us = (time.perf_counter() - t0) * 1e6 / (repeats * len(queries))
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for q in queries:
+            expander._expand(q)
+    auto_us = (time.perf_counter() - t0) * 1e6 / (repeats * len(queries))
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for q in queries:
+            expander.expand(q)
+    memo_us = (time.perf_counter() - t0) * 1e6 / (repeats * len(queries))
+
+    n_phrases = sum(len(s) for s in column_synonyms.values())
+    print(f"{len(column_synonyms)} canonicals, {n_phrases} phrases; compiled in {compile_ms:.1f} ms")
+    print(f"  substring loop   {scan_us:8.1f} us/call")
+    print(f"  automaton        {auto_us:8.1f} us/call")
+    print(f"  memoized         {memo_us:8.1f} us/call")
+
+
+if __name__ == "__main__":
+    from app.ERP_R12_Test_DB.vector_store_chroma import COLUMN_SYNONYMS
+    from app.SOS.vector_store_chroma import COLUMN_SYNONYMS as SOS_COLUMN_SYNONYMS
+
+    _benchmark_synonym_expansion(COLUMN_SYNONYMS)
+    _benchmark_synonym_expansion(SOS_COLUMN_SYNONYMS)
@@ -1,18 +1,32 @@
 """
 Token usage logger for detailed cost tracking and monitoring.
+
+Detailed entries go through ``TokenUsageLogStore``: an append-only JSONL file
+written through a buffered handle, rotated daily into gzip archives, with a
+sidecar offset index (one line per minute bucket, per-module totals) so
+windowed reads can seek instead of parsing whole files and daily summaries can
+be rebuilt on restart.
 """
+import atexit
+import gzip
 import logging
 import json
-from typing import Dict, Any, Optional
-from datetime import datetime
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
 from pathlib import Path
 
+from app.config import TOKEN_LOG_CONFIG
+
 # Create a dedicated logger for token tracking
 logger = logging.getLogger("token_tracker")
 logger.setLevel(logging.INFO)
 
 # Create file handler for token tracking logs
-log_dir = Path("logs")
+log_dir = Path(TOKEN_LOG_CONFIG["dir"])
 log_dir.mkdir(exist_ok=True)
 
 file_handler = logging.FileHandler(log_dir / "token_usage.log")
@@ -33,12 +47,450 @@ console_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 
+LOG_BASENAME = "token_usage_detailed"
+
+
+def _empty_day_summary() -> Dict[str, Any]:
+    return {
+        "total_prompt_tokens": 0,
+        "total_completion_tokens": 0,
+        "total_requests": 0,
+        "total_prompt_tokens_saved": 0,
+        "modules": {}
+    }
+
+
+def _add_to_day_summary(day_summary: Dict[str, Any], module: str, prompt_tokens: int,
+                        completion_tokens: int, requests: int = 1, prompt_tokens_saved: int = 0) -> None:
+    day_summary["total_prompt_tokens"] += prompt_tokens
+    day_summary["total_completion_tokens"] += completion_tokens
+    day_summary["total_requests"] += requests
+    day_summary["total_prompt_tokens_saved"] = day_summary.get("total_prompt_tokens_saved", 0) + prompt_tokens_saved
+    module_summary = day_summary["modules"].setdefault(module, {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "requests": 0,
+        "prompt_tokens_saved": 0
+    })
+    module_summary["prompt_tokens"] += prompt_tokens
+    module_summary["completion_tokens"] += completion_tokens
+    module_summary["requests"] += requests
+    module_summary["prompt_tokens_saved"] = module_summary.get("prompt_tokens_saved", 0) + prompt_tokens_saved
+
+
+class TokenUsageLogStore:
+    """
+    Append-only token usage log with daily rotation and an offset index.
+
+    Layout under ``log_dir``:
+        token_usage_detailed.log                 active day (JSONL)
+        token_usage_detailed.idx                 index for the active day
+        token_usage_detailed.<date>[.N].log.gz   archived days
+        token_usage_detailed.<date>[.N].idx      index for each archive
+
+    Each index line describes one minute bucket:
+        {"date", "minute", "offset", "end", "modules": {module: {prompt_tokens,
+        completion_tokens, total_tokens, requests, prompt_tokens_saved}}}
+    Offsets are positions in the uncompressed log stream.
+    """
+
+    def __init__(self, directory: Path, flush_entries: int = 50, flush_interval_s: float = 2.0,
+                 buffer_bytes: int = 65536, retention_days: int = 90):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.active_log = self.directory / f"{LOG_BASENAME}.log"
+        self.active_idx = self.directory / f"{LOG_BASENAME}.idx"
+        self.flush_entries = max(1, flush_entries)
+        self.flush_interval_s = flush_interval_s
+        self.buffer_bytes = buffer_bytes
+        self.retention_days = retention_days
+
+        self._lock = threading.RLock()
+        self._fh = None
+        self._offset = 0
+        self._active_date: Optional[str] = None
+        self._active_buckets: List[Dict[str, Any]] = []
+        self._bucket: Optional[Dict[str, Any]] = None
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._daily: Dict[str, Dict[str, Any]] = {}
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
+        self._recover()
+
+    # ---------------------------
+    # Recovery / rotation
+    # ---------------------------
+
+    def _recover(self) -> None:
+        """Rebuild daily summaries from the indexes and re-index any unindexed tail."""
+        for idx_path in sorted(self.directory.glob(f"{LOG_BASENAME}.*.idx")):
+            for bucket in self._read_index(idx_path):
+                self._add_bucket_to_daily(bucket)
+
+        if self.active_log.exists():
+            self._active_buckets = self._read_index(self.active_idx)
+            for bucket in self._active_buckets:
+                self._add_bucket_to_daily(bucket)
+            if self._active_buckets:
+                self._active_date = self._active_buckets[0]["date"]
+            tail_start = self._active_buckets[-1]["end"] if self._active_buckets else 0
+            self._reindex_tail(tail_start)
+            if self._active_buckets:
+                self._active_date = self._active_buckets[0]["date"]
+        elif self.active_idx.exists():
+            self.active_idx.unlink()
+
+        self._offset = self.active_log.stat().st_size if self.active_log.exists() else 0
+        if self._active_date and self._active_date != datetime.now().date().isoformat():
+            self._rotate()
+
+    def _reindex_tail(self, start: int) -> None:
+        """Index entries written after the last indexed bucket (e.g. after a crash)."""
+        size = self.active_log.stat().st_size
+        if start >= size:
+            return
+        with open(self.active_log, "rb") as f:
+            f.seek(start)
+            offset = start
+            for raw in f:
+                line_start = offset
+                offset += len(raw)
+                if not raw.endswith(b"\n"):
+                    # Torn final write; drop it so the next append starts on a clean line.
+                    with open(self.active_log, "r+b") as w:
+                        w.truncate(line_start)
+                    break
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                self._index_entry(entry, line_start, offset)
+        self._close_bucket()
+
+    def _rotate(self) -> None:
+        """Move the active day to a dated archive and compress it in the background."""
+        with self._lock:
+            self._close_bucket()
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            if self._active_date is None or not self.active_log.exists():
+                self._active_date = None
+                return
+
+            stem = self._next_archive_stem(self._active_date)
+            plain_log = self.directory / f"{stem}.log"
+            os.replace(self.active_log, plain_log)
+            if self.active_idx.exists():
+                os.replace(self.active_idx, self.directory / f"{stem}.idx")
+
+            self._active_date = None
+            self._active_buckets = []
+            self._offset = 0
+
+        threading.Thread(target=self._compress_archive, args=(plain_log,), daemon=True).start()
+        self._apply_retention()
+
+    def _next_archive_stem(self, date: str) -> str:
+        stem = f"{LOG_BASENAME}.{date}"
+        n = 1
+        while (self.directory / f"{stem}.idx").exists() or (self.directory / f"{stem}.log.gz").exists():
+            stem = f"{LOG_BASENAME}.{date}.{n}"
+            n += 1
+        return stem
+
+    def _compress_archive(self, plain_log: Path) -> None:
+        gz_path = plain_log.with_name(plain_log.name + ".gz")
+        tmp_path = plain_log.with_name(plain_log.name + ".gz.tmp")
+        try:
+            with open(plain_log, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp_path, gz_path)
+            plain_log.unlink()
+        except Exception as e:
+            logger.error(f"Failed to compress token log archive {plain_log}: {e}")
+
+    def _apply_retention(self) -> None:
+        if self.retention_days <= 0:
+            return
+        cutoff = (datetime.now().date() - timedelta(days=self.retention_days)).isoformat()
+        for path in self.directory.glob(f"{LOG_BASENAME}.*"):
+            date = path.name[len(LOG_BASENAME) + 1:len(LOG_BASENAME) + 11]
+            if len(date) == 10 and date < cutoff:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+        with self._lock:
+            for date in [d for d in self._daily if d < cutoff]:
+                del self._daily[date]
+
+    # ---------------------------
+    # Writing
+    # ---------------------------
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Append one entry; rotates on date change and flushes by count/interval."""
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with self._lock:
+            date = entry["timestamp"][:10]
+            if self._active_date is not None and date != self._active_date:
+                self._rotate()
+            if self._fh is None:
+                self._fh = open(self.active_log, "ab", buffering=self.buffer_bytes)
+                self._start_flusher()
+            if self._active_date is None:
+                self._active_date = date
+
+            start = self._offset
+            self._fh.write(line)
+            self._offset += len(line)
+            self._index_entry(entry, start, self._offset)
+
+            self._pending += 1
+            if (self._pending >= self.flush_entries
+                    or time.monotonic() - self._last_flush >= self.flush_interval_s):
+                self._flush_locked()
+
+    def _index_entry(self, entry: Dict[str, Any], start: int, end: int) -> None:
+        timestamp = entry.get("timestamp", "")
+        minute = timestamp[:16]
+        if self._bucket is None or self._bucket["minute"] != minute:
+            self._close_bucket()
+            self._bucket = {"date": timestamp[:10], "minute": minute, "offset": start, "end": start, "modules": {}}
+        self._bucket["end"] = end
+
+        module = entry.get("module") or "unknown"
+        prompt_tokens = int(entry.get("prompt_tokens") or 0)
+        completion_tokens = int(entry.get("completion_tokens") or 0)
+        prompt_tokens_saved = int(entry.get("prompt_tokens_saved") or 0)
+        stats = self._bucket["modules"].setdefault(module, {
+            "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "requests": 0,
+            "prompt_tokens_saved": 0
+        })
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["total_tokens"] += int(entry.get("total_tokens") or 0)
+        stats["requests"] += 1
+        stats["prompt_tokens_saved"] += prompt_tokens_saved
+
+        day_summary = self._daily.setdefault(self._bucket["date"], _empty_day_summary())
+        _add_to_day_summary(day_summary, module, prompt_tokens, completion_tokens,
+                            prompt_tokens_saved=prompt_tokens_saved)
+
+    def _close_bucket(self) -> None:
+        """Persist the open minute bucket to the index (log bytes first)."""
+        if self._bucket is None:
+            return
+        bucket, self._bucket = self._bucket, None
+        if self._fh is not None:
+            self._fh.flush()
+        with open(self.active_idx, "a", encoding="utf-8") as f:
+            f.write(json.dumps(bucket) + "\n")
+        self._active_buckets.append(bucket)
+
+    def _flush_locked(self) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _start_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+
+        def run():
+            while not self._closed:
+                time.sleep(self.flush_interval_s)
+                with self._lock:
+                    if self._pending:
+                        self._flush_locked()
+                    if self._active_date and self._active_date != datetime.now().date().isoformat():
+                        self._rotate()
+
+        self._flusher = threading.Thread(target=run, name="token-log-flusher", daemon=True)
+        self._flusher.start()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._close_bucket()
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    # ---------------------------
+    # Reading
+    # ---------------------------
+
+    @staticmethod
+    def _read_index(idx_path: Path) -> List[Dict[str, Any]]:
+        buckets = []
+        if not idx_path.exists():
+            return buckets
+        with open(idx_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    buckets.append(json.loads(line))
+                except ValueError:
+                    continue
+        return buckets
+
+    def _add_bucket_to_daily(self, bucket: Dict[str, Any]) -> None:
+        day_summary = self._daily.setdefault(bucket["date"], _empty_day_summary())
+        for module, stats in bucket.get("modules", {}).items():
+            _add_to_day_summary(day_summary, module, stats.get("prompt_tokens", 0),
+                                stats.get("completion_tokens", 0), stats.get("requests", 0),
+                                stats.get("prompt_tokens_saved", 0))
+
+    def get_daily_summary(self, date: str) -> Dict[str, Any]:
+        with self._lock:
+            summary = self._daily.get(date)
+            return json.loads(json.dumps(summary)) if summary else {}
+
+    @property
+    def daily_summary(self) -> Dict[str, Dict[str, Any]]:
+        return self._daily
+
+    def _segments(self) -> List[Tuple[str, int, Path, List[Dict[str, Any]]]]:
+        """
+        List readable segments in chronological order as (date, ordinal, log path, buckets).
+        The active segment's buckets include the still-open bucket.
+        """
+        segments = []
+        per_date: Dict[str, int] = {}
+        archives = []
+        for idx_path in self.directory.glob(f"{LOG_BASENAME}.*.idx"):
+            stem = idx_path.name[:-len(".idx")]
+            parts = stem[len(LOG_BASENAME) + 1:].split(".")
+            seq = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+            archives.append((parts[0], seq, stem, idx_path))
+        for date, _, stem, idx_path in sorted(archives):
+            log_path = self.directory / f"{stem}.log.gz"
+            if not log_path.exists():
+                log_path = self.directory / f"{stem}.log"
+            ordinal = per_date.get(date, 0)
+            per_date[date] = ordinal + 1
+            segments.append((date, ordinal, log_path, self._read_index(idx_path)))
+
+        with self._lock:
+            if self._active_date is not None:
+                self._flush_locked()
+                buckets = list(self._active_buckets)
+                if self._bucket is not None:
+                    buckets.append(dict(self._bucket))
+                segments.append((self._active_date, per_date.get(self._active_date, 0),
+                                 self.active_log, buckets))
+        return segments
+
+    def iter_window(self, start: Optional[str] = None, end: Optional[str] = None,
+                    module: Optional[str] = None,
+                    cursor: Optional[str] = None) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """
+        Stream entries with ``start <= timestamp <= end`` (ISO strings), optionally for one module.
+
+        Only minute buckets overlapping the window (and containing the module) are read.
+        Yields (entry, cursor) where the cursor resumes after that entry.
+        """
+        resume: Optional[Tuple[str, int, int]] = None
+        if cursor:
+            try:
+                c_date, c_ordinal, c_offset = cursor.split(":")
+                resume = (c_date, int(c_ordinal), int(c_offset))
+            except ValueError:
+                raise ValueError(f"Invalid token log cursor: {cursor}")
+
+        start_minute = start[:16] if start else None
+        end_minute = end[:16] if end else None
+
+        for date, ordinal, log_path, buckets in self._segments():
+            if start and date < start[:10]:
+                continue
+            if end and date > end[:10]:
+                break
+            if resume and (date, ordinal) < resume[:2]:
+                continue
+            min_offset = resume[2] if resume and (date, ordinal) == resume[:2] else 0
+
+            ranges = []
+            for bucket in buckets:
+                if bucket["end"] <= min_offset:
+                    continue
+                if start_minute and bucket["minute"] < start_minute:
+                    continue
+                if end_minute and bucket["minute"] > end_minute:
+                    continue
+                if module and module not in bucket.get("modules", {}):
+                    continue
+                lo = max(bucket["offset"], min_offset)
+                if ranges and ranges[-1][1] == bucket["offset"]:
+                    ranges[-1][1] = bucket["end"]
+                else:
+                    ranges.append([lo, bucket["end"]])
+            if not ranges:
+                continue
+
+            opener = gzip.open if log_path.suffix == ".gz" else open
+            with opener(log_path, "rb") as f:
+                for lo, hi in ranges:
+                    f.seek(lo)
+                    offset = lo
+                    while offset < hi:
+                        raw = f.readline()
+                        if not raw:
+                            break
+                        offset += len(raw)
+                        try:
+                            entry = json.loads(raw)
+                        except ValueError:
+                            continue
+                        ts = entry.get("timestamp", "")
+                        if start and ts < start:
+                            continue
+                        if end and ts > end:
+                            continue
+                        if module and entry.get("module") != module:
+                            continue
+                        yield entry, f"{date}:{ordinal}:{offset}"
+
+    def read_window(self, start: Optional[str] = None, end: Optional[str] = None,
+                    module: Optional[str] = None, limit: int = 500,
+                    cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one page of ``iter_window`` plus the cursor for the next page (or None)."""
+        entries: List[Dict[str, Any]] = []
+        next_cursor = None
+        for entry, position in self.iter_window(start, end, module, cursor):
+            if len(entries) == limit:
+                return entries, next_cursor
+            entries.append(entry)
+            next_cursor = position
+        return entries, None
+
+
 class TokenUsageLogger:
     """Detailed token usage logger for cost monitoring and analysis."""
     
-    def __init__(self):
-        self.log_file = log_dir / "token_usage_detailed.log"
-        self.daily_summary = {}
+    def __init__(self, store: Optional[TokenUsageLogStore] = None):
+        self.log_file = log_dir / f"{LOG_BASENAME}.log"
+        self.store = store or TokenUsageLogStore(
+            log_dir,
+            flush_entries=TOKEN_LOG_CONFIG["flush_entries"],
+            flush_interval_s=TOKEN_LOG_CONFIG["flush_interval_s"],
+            buffer_bytes=TOKEN_LOG_CONFIG["buffer_bytes"],
+            retention_days=TOKEN_LOG_CONFIG["retention_days"],
+        )
+        atexit.register(self.store.close)
+    
+    @property
+    def daily_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-day summaries, rebuilt from the log index on startup."""
+        return self.store.daily_summary
         
     def log_token_usage(self, module: str, model: str, usage: Dict[str, int], request_content: Optional[str] = None):
         """
@@ -48,6 +500,7 @@ class TokenUsageLogger:
             module: Module name (SOS, ERP, etc.)
             model: Model name used
             usage: Token usage dictionary with prompt_tokens, completion_tokens, total_tokens
+                and optionally prompt_tokens_saved (tokens trimmed by prompt budgeting)
             request_content: Optional request content for context (first 100 chars)
         """
         timestamp = datetime.now().isoformat()
@@ -60,6 +513,7 @@ class TokenUsageLogger:
             "prompt_tokens": usage.get("prompt_tokens", 0),
             "completion_tokens": usage.get("completion_tokens", 0),
             "total_tokens": usage.get("total_tokens", 0),
+            "prompt_tokens_saved": usage.get("prompt_tokens_saved", 0),
             "request_preview": request_content[:100] if request_content else None
         }
         
@@ -68,42 +522,15 @@ class TokenUsageLogger:
             f"TOKEN_USAGE | Module: {module} | Model: {model} | "
             f"Prompt: {usage.get('prompt_tokens', 0)} | "
             f"Completion: {usage.get('completion_tokens', 0)} | "
-            f"Total: {usage.get('total_tokens', 0)}"
+            f"Total: {usage.get('total_tokens', 0)} | "
+            f"Saved: {usage.get('prompt_tokens_saved', 0)}"
         )
         
-        # Write detailed entry to file
+        # Append to the detailed log store (also updates the daily summary)
         try:
-            with open(self.log_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry) + "\n")
+            self.store.append(log_entry)
         except Exception as e:
             logger.error(f"Failed to write detailed token log: {e}")
-        
-        # Update daily summary
-        today = datetime.now().date().isoformat()
-        if today not in self.daily_summary:
-            self.daily_summary[today] = {
-                "total_prompt_tokens": 0,
-                "total_completion_tokens": 0,
-                "total_requests": 0,
-                "modules": {}
-            }
-        
-        day_summary = self.daily_summary[today]
-        day_summary["total_prompt_tokens"] += usage.get("prompt_tokens", 0)
-        day_summary["total_completion_tokens"] += usage.get("completion_tokens", 0)
-        day_summary["total_requests"] += 1
-        
-        if module not in day_summary["modules"]:
-            day_summary["modules"][module] = {
-                "prompt_tokens": 0,
-                "completion_tokens": 0,
-                "requests": 0
-            }
-        
-        module_summary = day_summary["modules"][module]
-        module_summary["prompt_tokens"] += usage.get("prompt_tokens", 0)
-        module_summary["completion_tokens"] += usage.get("completion_tokens", 0)
-        module_summary["requests"] += 1
     
     def get_daily_summary(self, date: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -118,7 +545,25 @@ class TokenUsageLogger:
         if date is None:
             date = datetime.now().date().isoformat()
         
-        return self.daily_summary.get(date, {})
+        return self.store.get_daily_summary(date)
+    
+    def read_logs(self, start: Optional[str] = None, end: Optional[str] = None,
+                  module: Optional[str] = None, limit: int = 500,
+                  cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Read one page of detailed log entries within a time window.
+        
+        Args:
+            start: Inclusive ISO timestamp lower bound (optional)
+            end: Inclusive ISO timestamp upper bound (optional)
+            module: Restrict to one module (optional)
+            limit: Maximum entries to return
+            cursor: Cursor returned by the previous page (optional)
+            
+        Returns:
+            Tuple of (entries, next_cursor); next_cursor is None on the last page
+        """
+        return self.store.read_window(start, end, module, limit, cursor)
     
     def calculate_daily_cost(self, date: Optional[str] = None, pricing: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
         """
@@ -45,7 +45,8 @@ class TokenTracker:
                 "prompt_tokens": sos_usage.get("prompt_tokens", 0) + erp_usage.get("prompt_tokens", 0),
                 "completion_tokens": sos_usage.get("completion_tokens", 0) + erp_usage.get("completion_tokens", 0),
                 "total_tokens": sos_usage.get("total_tokens", 0) + erp_usage.get("total_tokens", 0),
-                "requests_count": sos_usage.get("requests_count", 0) + erp_usage.get("requests_count", 0)
+                "requests_count": sos_usage.get("requests_count", 0) + erp_usage.get("requests_count", 0),
+                "prompt_tokens_saved": sos_usage.get("prompt_tokens_saved", 0) + erp_usage.get("prompt_tokens_saved", 0)
             }
         }
         
@@ -0,0 +1,281 @@
+"""
+Streaming exporter for the training-data views (V_TRAIN_SQL, V_TRAIN_SUMMARY).
+
+An ``ExportSession`` owns its feedback-DB connection for the whole life of the
+HTTP response: it is opened before the response starts (so SQL errors can still
+be returned as JSON) and released when the stream is exhausted, aborted, or the
+response's background task runs. Rows are fetched in large ``fetchmany``
+batches and each batch is encoded into a single chunk, so memory stays
+constant regardless of export size.
+"""
+import csv
+import io
+import json
+import logging
+import zlib
+from contextlib import ExitStack
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import cx_Oracle
+
+from app.config import EXPORT_CONFIG
+from app.db_connector import connect_feedback
+
+logger = logging.getLogger(__name__)
+
+# Views that may be exported, keyed by the public export name.
+EXPORT_VIEWS = {
+    "sql": "V_TRAIN_SQL",
+    "summary": "V_TRAIN_SUMMARY",
+}
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ExportError(ValueError):
+    """Raised for invalid export requests (unknown view/format, missing optional dependency)."""
+
+
+def _output_type_handler(cursor, name, default_type, size, precision, scale):
+    # Fetch LOBs inline as strings/bytes so batches do not need a round trip per LOB.
+    if default_type == cx_Oracle.DB_TYPE_CLOB:
+        return cursor.var(cx_Oracle.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    if default_type == cx_Oracle.DB_TYPE_BLOB:
+        return cursor.var(cx_Oracle.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+    return None
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+class _ChunkSink:
+    """Minimal writable file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+class ExportSession:
+    """One streaming export of a training view."""
+
+    def __init__(self, export_name: str, fmt: str = "csv", compress: bool = False,
+                 max_rows: Optional[int] = None, batch_size: Optional[int] = None):
+        if export_name not in EXPORT_VIEWS:
+            raise ExportError(f"Unknown export: {export_name}")
+        fmt = (fmt or "csv").lower()
+        if fmt not in EXPORT_FORMATS:
+            raise ExportError(f"Unsupported export format: {fmt}")
+        if fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ExportError("Parquet export requires pyarrow to be installed")
+
+        server_cap = EXPORT_CONFIG["max_rows"]
+        self.export_name = export_name
+        self.view = EXPORT_VIEWS[export_name]
+        self.fmt = fmt
+        # Parquet is already compressed internally; gzip would only add CPU.
+        self.compress = compress and fmt != "parquet"
+        self.max_rows = min(max_rows, server_cap) if max_rows else server_cap
+        self.batch_size = batch_size or EXPORT_CONFIG["fetch_batch_size"]
+
+        self._stack: Optional[ExitStack] = None
+        self._cursor = None
+        self._columns: List[str] = []
+        self._type_names: List[str] = []
+        self._numeric_specs: List[Tuple[Optional[int], Optional[int]]] = []  # (precision, scale)
+        self.rows_written = 0
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+
+    def open(self) -> "ExportSession":
+        """Acquire the connection and execute the export query."""
+        self._stack = ExitStack()
+        try:
+            conn = self._stack.enter_context(connect_feedback())
+            cur = conn.cursor()
+            # On the cursor, not the pooled connection, so later users keep default LOB handling.
+            cur.outputtypehandler = _output_type_handler
+            cur.arraysize = self.batch_size
+            cur.prefetchrows = self.batch_size + 1
+            self._stack.callback(cur.close)
+            # View name comes from EXPORT_VIEWS, never from the request.
+            cur.execute(f"SELECT * FROM {self.view} FETCH FIRST :max_rows ROWS ONLY",
+                        {"max_rows": self.max_rows})
+            self._cursor = cur
+            self._columns = [d[0] for d in cur.description] if cur.description else []
+            self._type_names = [getattr(d[1], "name", str(d[1])).upper() for d in cur.description or []]
+            self._numeric_specs = [(d[4], d[5]) for d in cur.description or []]
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self) -> None:
+        """Release the cursor and connection; safe to call more than once."""
+        stack, self._stack = self._stack, None
+        self._cursor = None
+        if stack is not None:
+            try:
+                stack.close()
+            except Exception as e:
+                logger.warning(f"Error releasing export connection: {e}")
+
+    # ---------------------------
+    # Response metadata
+    # ---------------------------
+
+    @property
+    def media_type(self) -> str:
+        return "application/gzip" if self.compress else EXPORT_FORMATS[self.fmt][0]
+
+    @property
+    def filename(self) -> str:
+        name = f"train_{self.export_name}.{EXPORT_FORMATS[self.fmt][1]}"
+        return name + ".gz" if self.compress else name
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Disposition": f'attachment; filename="{self.filename}"',
+            "Cache-Control": "no-store",
+            "X-Export-Row-Cap": str(self.max_rows),
+        }
+
+    # ---------------------------
+    # Streaming
+    # ---------------------------
+
+    def _batches(self) -> Iterator[List[tuple]]:
+        while self._cursor is not None:
+            batch = self._cursor.fetchmany(self.batch_size)
+            if not batch:
+                break
+            self.rows_written += len(batch)
+            yield batch
+
+    def _iter_csv(self) -> Iterator[bytes]:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(self._columns)
+        yield buf.getvalue().encode("utf-8")
+        for batch in self._batches():
+            buf.seek(0)
+            buf.truncate(0)
+            writer.writerows(["" if v is None else v for v in row] for row in batch)
+            yield buf.getvalue().encode("utf-8")
+
+    def _iter_ndjson(self) -> Iterator[bytes]:
+        cols = self._columns
+        for batch in self._batches():
+            lines = [json.dumps(dict(zip(cols, row)), default=_json_default) for row in batch]
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _arrow_schema(self):
+        import pyarrow as pa
+        fields = []
+        for name, type_name, (precision, scale) in zip(self._columns, self._type_names, self._numeric_specs):
+            if "NUMBER" in type_name and scale == 0 and precision:
+                # Integer NUMBER(p): exact, so IDs above 2**53 survive
+                arrow_type = pa.int64() if precision <= 18 else pa.decimal128(min(precision, 38), 0)
+            elif "NUMBER" in type_name or "BINARY_DOUBLE" in type_name or "BINARY_FLOAT" in type_name:
+                arrow_type = pa.float64()
+            elif "DATE" in type_name or "TIMESTAMP" in type_name:
+                arrow_type = pa.timestamp("us")
+            elif "RAW" in type_name or "BLOB" in type_name:
+                arrow_type = pa.binary()
+            else:
+                arrow_type = pa.string()
+            fields.append(pa.field(name, arrow_type))
+        return pa.schema(fields)
+
+    def _iter_parquet(self) -> Iterator[bytes]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = self._arrow_schema()
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        try:
+            for batch in self._batches():
+                columns = list(zip(*batch))
+                arrays = []
+                for field, values in zip(schema, columns):
+                    if pa.types.is_floating(field.type):
+                        values = [float(v) if v is not None else None for v in values]
+                    elif pa.types.is_integer(field.type):
+                        values = [int(v) if v is not None else None for v in values]
+                    elif pa.types.is_decimal(field.type):
+                        values = [Decimal(int(v)) if v is not None else None for v in values]
+                    elif pa.types.is_string(field.type):
+                        values = [str(v) if v is not None else None for v in values]
+                    arrays.append(pa.array(values, type=field.type))
+                # One row group per fetch batch keeps writer memory bounded.
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        finally:
+            writer.close()
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """Yield encoded (and optionally gzip-compressed) chunks; releases the connection at the end."""
+        encoders = {"csv": self._iter_csv, "ndjson": self._iter_ndjson, "parquet": self._iter_parquet}
+        try:
+            if not self.compress:
+                yield from encoders[self.fmt]()
+                return
+            gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+            for chunk in encoders[self.fmt]():
+                out = gz.compress(chunk)
+                if out:
+                    yield out
+            yield gz.flush()
+        finally:
+            logger.info(f"Export {self.view} ({self.fmt}{', gzip' if self.compress else ''}): "
+                        f"{self.rows_written} rows")
+            self.close()
@@ -6,6 +6,9 @@ This module handles user registration, access requests, and authentication.
 
 import cx_Oracle
 import logging
+import os
+import threading
+import time
 from typing import Dict, List, Optional, Tuple
 from app.db_connector import _get_connection_pool
 from app.config import FEEDBACK_DB_ID
@@ -15,6 +18,14 @@ logger = logging.getLogger(__name__)
 # Use the feedback database for user access tables
 USER_ACCESS_DB_ID = FEEDBACK_DB_ID
 
+# Short-lived per-process cache of (authorized, admin) flags used by request
+# authorization. Writes in this module invalidate it; the TTL bounds staleness
+# for changes made by other workers.
+_ACCESS_CACHE_TTL_SEC = float(os.getenv("USER_ACCESS_CACHE_TTL_SEC", "30"))
+_ACCESS_CACHE_MAX = 10000
+_access_cache: Dict[str, Tuple[bool, bool, float]] = {}
+_access_cache_lock = threading.Lock()
+
 def get_db_connection():
     """Get a database connection from the pool."""
     pool = _get_connection_pool(USER_ACCESS_DB_ID)
@@ -25,6 +36,64 @@ def release_db_connection(conn):
     pool = _get_connection_pool(USER_ACCESS_DB_ID)
     pool.release(conn)
 
+def invalidate_access_cache(user_id: Optional[str] = None) -> None:
+    """
+    Drop cached authorization flags.
+    
+    Args:
+        user_id: Employee ID to invalidate; None clears the whole cache
+    """
+    with _access_cache_lock:
+        if user_id is None:
+            _access_cache.clear()
+        else:
+            _access_cache.pop(user_id, None)
+
+def _fetch_access_flags(user_id: str) -> Tuple[bool, bool]:
+    """Read (authorized, admin) for a user in one query. Raises on DB errors."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT status, admin_access
+            FROM user_access_list
+            WHERE user_id = :user_id
+        """, {'user_id': user_id})
+        row = cursor.fetchone()
+        cursor.close()
+    finally:
+        release_db_connection(conn)
+    if not row:
+        return False, False
+    authorized = row[0] == 'Y'
+    return authorized, authorized and row[1] == 'Y'
+
+def _get_access_flags_cached(user_id: str) -> Tuple[bool, bool]:
+    now = time.monotonic()
+    with _access_cache_lock:
+        cached = _access_cache.get(user_id)
+        if cached and cached[2] > now:
+            return cached[0], cached[1]
+    try:
+        authorized, admin = _fetch_access_flags(user_id)
+    except Exception as e:
+        # Do not cache failures; a transient DB error must not lock users out for a TTL.
+        logger.error(f"Error checking user access flags: {e}")
+        return False, False
+    with _access_cache_lock:
+        if len(_access_cache) >= _ACCESS_CACHE_MAX:
+            _access_cache.clear()
+        _access_cache[user_id] = (authorized, admin, now + _ACCESS_CACHE_TTL_SEC)
+    return authorized, admin
+
+def is_user_authorized_cached(user_id: str) -> bool:
+    """Cached variant of is_user_authorized for per-request authorization checks."""
+    return _get_access_flags_cached(user_id)[0]
+
+def is_user_admin_cached(user_id: str) -> bool:
+    """Cached variant of is_user_admin for per-request authorization checks."""
+    return _get_access_flags_cached(user_id)[1]
+
 def create_user_access_request(user_data: Dict) -> bool:
     """
     Create a new user access request in the user_access_request table.
@@ -175,6 +244,7 @@ def approve_user_access(request_id: int, added_by_admin: bool = False) -> bool:
         
         conn.commit()
         cursor.close()
+        invalidate_access_cache(user_id)
         return True
         
     except cx_Oracle.IntegrityError as e:
@@ -262,6 +332,7 @@ def add_user_directly(user_data: Dict) -> bool:
         
         conn.commit()
         cursor.close()
+        invalidate_access_cache(user_data.get('user_id'))
         return True
         
     except cx_Oracle.IntegrityError as e:
@@ -380,6 +451,7 @@ def disable_user_access(user_id: str) -> bool:
         conn.commit()
         cursor.close()
         
+        invalidate_access_cache(user_id)
         return rows_affected > 0
         
     except cx_Oracle.Error as e:
@@ -418,6 +490,7 @@ def enable_user_access(user_id: str) -> bool:
         conn.commit()
         cursor.close()
         
+        invalidate_access_cache(user_id)
         return rows_affected > 0
         
     except cx_Oracle.Error as e:
@@ -547,6 +620,7 @@ def grant_admin_access(user_id: str) -> bool:
         conn.commit()
         cursor.close()
         
+        invalidate_access_cache(user_id)
         return rows_affected > 0
         
     except cx_Oracle.Error as e:
@@ -586,6 +660,7 @@ def revoke_admin_access(user_id: str) -> bool:
         conn.commit()
         cursor.close()
         
+        invalidate_access_cache(user_id)
         return rows_affected > 0
         
     except cx_Oracle.Error as e:
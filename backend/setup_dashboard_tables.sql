@@ -253,9 +253,14 @@ CREATE INDEX IDX_DASHBOARD_USER_SESSIONS_LOGIN ON dashboard_user_sessions(login_
 CREATE INDEX IDX_DASHBOARD_USER_SESSIONS_STATUS ON dashboard_user_sessions(status);
 
 -- Create indexes for the new query history table
-CREATE INDEX IDX_DASHBOARD_QUERY_HISTORY_USER_ID ON dashboard_query_history(user_id);
-CREATE INDEX IDX_DASHBOARD_QUERY_HISTORY_SESSION_ID ON dashboard_query_history(session_id);
-CREATE INDEX IDX_DASHBOARD_QUERY_HISTORY_CREATED_AT ON dashboard_query_history(created_at);
+-- Keyset pagination reads ORDER BY created_at DESC, query_id DESC, so the composite
+-- indexes end in that pair. USER_CREATED serves get_queries_by_user (no status filter).
+-- USER_KEYSET serves the /chat-history read, which filters execution_status = 'success';
+-- it also carries database_type/query_mode so those filters are evaluated in the index.
+CREATE INDEX IDX_DASHBOARD_QUERY_HISTORY_USER_CREATED ON dashboard_query_history(user_id, created_at DESC, query_id DESC);
+CREATE INDEX IDX_DASHBOARD_QUERY_HISTORY_USER_KEYSET ON dashboard_query_history(user_id, execution_status, created_at DESC, query_id DESC, database_type, query_mode);
+CREATE INDEX IDX_DASHBOARD_QUERY_HISTORY_SESSION_KEYSET ON dashboard_query_history(session_id, created_at DESC, query_id DESC);
+CREATE INDEX IDX_DASHBOARD_QUERY_HISTORY_CREATED_KEYSET ON dashboard_query_history(created_at DESC, query_id DESC);
 CREATE INDEX IDX_DASHBOARD_QUERY_HISTORY_STATUS ON dashboard_query_history(execution_status);
 CREATE INDEX IDX_DASHBOARD_QUERY_HISTORY_FEEDBACK ON dashboard_query_history(feedback_type);
 